@@ -1,12 +1,24 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from huggingface_hub import snapshot_download
-from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Optional
+import json
 import logging
-import os
 from pathlib import Path
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import shutil
+import httpx
+
+from app.core.blob_store import BlobStore, BLOBS_DIRNAME
+from app.core.download_manager import DownloadJob, DownloadManager
+from app.core.download_progress import TERMINAL_STATUSES
+from app.core.fast_load import remove_converted
+from app.core.model_index import build_profile
+from app.core.model_inventory import get_inventory
+from app.core.hub_download import (
+    DownloadCancelled, download_snapshot, fetch_repo_files, select_files,
+    INCOMPLETE_SUFFIX, STATE_SUFFIX, TIMEOUT as HUB_TIMEOUT
+)
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -15,12 +27,29 @@ logger = logging.getLogger(__name__)
 MODELS_DIR = Path("./downloaded_models")
 MODELS_DIR.mkdir(exist_ok=True)
 
+# Hub base URL; None uses HF_ENDPOINT or huggingface.co
+HUB_ENDPOINT: Optional[str] = None
+
+# How often SSE watchers check for progress updates
+EVENT_INTERVAL = 0.5
+
 class DownloadRequest(BaseModel):
     model_config = ConfigDict(protected_namespaces=())
 
     model_id: str
     revision: Optional[str] = "main"
     token: Optional[str] = None
+    max_mb_per_second: Optional[float] = Field(None, gt=0, description="Bandwidth cap for this download in MB/s")
+    allow_patterns: Optional[List[str]] = Field(
+        None, description="Glob patterns of files to download; default: safetensors weights, tokenizer and config"
+    )
+    ignore_patterns: Optional[List[str]] = Field(None, description="Glob patterns of files to skip")
+    priority: int = Field(0, description="Queue priority; higher priorities start first")
+
+    @property
+    def auth_token(self) -> Optional[str]:
+        # Empty tokens from the settings form mean no token
+        return self.token if self.token and self.token.strip() else None
 
 class DownloadResponse(BaseModel):
     model_config = ConfigDict(protected_namespaces=())
@@ -29,115 +58,303 @@ class DownloadResponse(BaseModel):
     message: str
     model_id: str
     local_path: Optional[str] = None
+    queue_position: Optional[int] = None
+
+class PriorityRequest(BaseModel):
+    priority: int
 
-download_status = {}
-executor = ThreadPoolExecutor(max_workers=3)
+class DownloadLimits(BaseModel):
+    max_concurrent: Optional[int] = Field(None, ge=1, description="Downloads that run at the same time")
+    max_mb_per_second: Optional[float] = Field(None, ge=0, description="Bandwidth cap for all downloads in MB/s; 0 removes it")
+
+# Shown when the Hub refuses a download for lack of a token
+TOKEN_REQUIRED_MESSAGE = "This model requires authentication. Please add your Hugging Face token in Settings."
+
+# Download queue state, next to the models
+DOWNLOAD_QUEUE_FILENAME = ".downloads.json"
+
+def get_blob_store() -> BlobStore:
+    """Content-addressed store shared by all models in MODELS_DIR"""
+    return BlobStore(MODELS_DIR / BLOBS_DIRNAME)
+
+def run_download(job: DownloadJob) -> dict:
+    """
+    Download a queued model; runs on the download manager's worker thread
+    """
+    request = DownloadRequest(**job.request, token=job.token)
+    model_id = request.model_id
+
+    auth_token = request.auth_token
+    if auth_token:
+        logger.info(f"Using authentication token for {model_id}")
+    else:
+        logger.info(f"Downloading {model_id} without authentication token")
+
+    try:
+        local_path = download_snapshot(
+            model_id,
+            MODELS_DIR / model_id.replace("/", "_"),
+            revision=request.revision or "main",
+            token=auth_token,
+            endpoint=HUB_ENDPOINT,
+            progress=job.progress,
+            max_bytes_per_second=request.max_mb_per_second * 1024 * 1024 if request.max_mb_per_second else None,
+            allow_patterns=request.allow_patterns,
+            ignore_patterns=request.ignore_patterns,
+            blob_store=get_blob_store(),
+            shared_limiter=download_manager.limiter,
+            cancel_event=job.cancel_event
+        )
+    except DownloadCancelled:
+        raise
+    except Exception as e:
+        error_msg = str(e)
+        # Check if it's a gated model error
+        if "401" in error_msg or "Cannot access gated repo" in error_msg or "restricted" in error_msg.lower():
+            raise PermissionError(TOKEN_REQUIRED_MESSAGE) from e
+        raise
+
+    get_inventory(MODELS_DIR).update(local_path.name)
+    return {"local_path": str(local_path)}
+
+def cleanup_download(job: DownloadJob):
+    """
+    Delete the partial files of a cancelled download, and the model
+    directory if the download created it
+    """
+    folder_name = job.model_id.replace("/", "_")
+    model_path = MODELS_DIR / folder_name
+    if not model_path.exists():
+        return
+
+    if job.extra.get("new_directory"):
+        shutil.rmtree(model_path)
+        get_blob_store().release(folder_name)
+        get_inventory(MODELS_DIR).remove(folder_name)
+        return
+
+    for pattern in (f"*{INCOMPLETE_SUFFIX}", f"*{STATE_SUFFIX}"):
+        for partial in model_path.rglob(pattern):
+            partial.unlink(missing_ok=True)
+
+download_manager = DownloadManager(run_download, cleanup_download, state_file=MODELS_DIR / DOWNLOAD_QUEUE_FILENAME)
 
 @router.post("/start", response_model=DownloadResponse)
-async def start_download(request: DownloadRequest, background_tasks: BackgroundTasks):
+async def start_download(request: DownloadRequest):
     """
-    Start downloading a model from Hugging Face Hub
+    Queue a model download from Hugging Face Hub
+
+    Downloads start in priority order as slots in the global concurrency
+    budget free up.
     """
     model_id = request.model_id
 
-    if model_id in download_status and download_status[model_id]["status"] == "downloading":
+    current = download_manager.get(model_id)
+    if current and current.status in ("queued", "downloading"):
         return DownloadResponse(
             status="already_downloading",
             message=f"Model {model_id} is already being downloaded",
-            model_id=model_id
+            model_id=model_id,
+            queue_position=download_manager.position(model_id)
         )
 
-    # 백그라운드에서 다운로드 시작
-    download_status[model_id] = {"status": "downloading", "progress": 0}
-    background_tasks.add_task(download_model_async, model_id, request.revision, request.token)
+    download_manager.submit(
+        model_id,
+        request.model_dump(exclude={"token", "priority"}),
+        token=request.auth_token,
+        priority=request.priority,
+        extra={"new_directory": not (MODELS_DIR / model_id.replace("/", "_")).exists()}
+    )
+    position = download_manager.position(model_id)
 
     return DownloadResponse(
         status="started",
-        message=f"Download started for {model_id}",
-        model_id=model_id
+        message=f"Download queued for {model_id} at position {position}" if position else f"Download started for {model_id}",
+        model_id=model_id,
+        queue_position=position
     )
 
-def download_model_sync(model_id: str, revision: str = "main", token: Optional[str] = None):
+@router.get("/queue")
+async def get_download_queue():
+    """
+    List all downloads with their state, priority and progress, in start order
+    """
+    return {
+        "downloads": download_manager.queue(),
+        **download_manager.limits()
+    }
+
+@router.get("/limits")
+async def get_download_limits():
+    """
+    Get the global download concurrency and bandwidth budget
     """
-    Synchronous download function to run in thread pool
+    return download_manager.limits()
+
+@router.put("/limits")
+async def update_download_limits(limits: DownloadLimits):
     """
+    Change the global download concurrency and bandwidth budget
+    """
+    download_manager.configure(
+        max_concurrent=limits.max_concurrent,
+        max_bytes_per_second=limits.max_mb_per_second * 1024 * 1024 if limits.max_mb_per_second is not None else None
+    )
+    return download_manager.limits()
+
+def _control(model_id: str, action):
     try:
-        logger.info(f"Starting download for {model_id}")
+        job = action()
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"No download for model: {model_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {
+        "model_id": model_id,
+        "status": job.status,
+        "priority": job.priority,
+        "queue_position": download_manager.position(model_id)
+    }
 
-        # Convert empty string to None for token
-        auth_token = token if token and token.strip() else None
-        if auth_token:
-            logger.info(f"Using authentication token for {model_id}")
-        else:
-            logger.info(f"Downloading {model_id} without authentication token")
-
-        local_path = snapshot_download(
-            repo_id=model_id,
-            revision=revision,
-            cache_dir=str(MODELS_DIR),
-            local_dir=str(MODELS_DIR / model_id.replace("/", "_")),
-            local_dir_use_symlinks=False,
-            token=auth_token
-        )
+@router.post("/pause/{model_id:path}")
+async def pause_download(model_id: str):
+    """
+    Pause a queued or running download; its partial files are kept for resuming
+    """
+    return _control(model_id, lambda: download_manager.pause(model_id))
 
-        download_status[model_id] = {
-            "status": "completed",
-            "progress": 100,
-            "local_path": str(local_path)
-        }
-        logger.info(f"Download completed for {model_id}")
+@router.post("/resume/{model_id:path}")
+async def resume_download(model_id: str):
+    """
+    Queue a paused, cancelled or failed download again
+    """
+    return _control(model_id, lambda: download_manager.resume(model_id))
 
-    except Exception as e:
-        error_msg = str(e)
-        logger.error(f"Download failed for {model_id}: {error_msg}")
+@router.post("/cancel/{model_id:path}")
+async def cancel_download(model_id: str):
+    """
+    Cancel a download and delete its partial files
+    """
+    return _control(model_id, lambda: download_manager.cancel(model_id))
 
-        # Check if it's a gated model error
-        if "401" in error_msg or "Cannot access gated repo" in error_msg or "restricted" in error_msg.lower():
-            error_msg = "This model requires authentication. Please add your Hugging Face token in Settings."
+@router.post("/priority/{model_id:path}")
+async def set_download_priority(model_id: str, request: PriorityRequest):
+    """
+    Change a download's priority; higher priorities start first
+    """
+    return _control(model_id, lambda: download_manager.set_priority(model_id, request.priority))
 
-        download_status[model_id] = {
-            "status": "failed",
-            "progress": 0,
-            "error": error_msg
+def plan_download(request: DownloadRequest):
+    """List the files a download would fetch, without downloading them"""
+    with httpx.Client(timeout=HUB_TIMEOUT) as client:
+        commit, files = fetch_repo_files(
+            client, request.model_id, request.revision or "main", request.auth_token, HUB_ENDPOINT
+        )
+
+    selected = select_files(files, request.allow_patterns, request.ignore_patterns)
+    selected_paths = {repo_file.path for repo_file in selected}
+    local_dir = MODELS_DIR / request.model_id.replace("/", "_")
+    blob_store = get_blob_store()
+
+    def describe(repo_file):
+        local_file = local_dir / repo_file.path
+        return {
+            "path": repo_file.path,
+            "size": repo_file.size,
+            # Files another model already stored are linked, not downloaded
+            "present": (local_file.exists() and local_file.stat().st_size == repo_file.size)
+            or bool(repo_file.sha256 and blob_store.has(repo_file.sha256))
         }
 
-async def download_model_async(model_id: str, revision: str = "main", token: Optional[str] = None):
+    files_to_download = [describe(repo_file) for repo_file in selected]
+    total_bytes = sum(entry["size"] for entry in files_to_download)
+    return {
+        "model_id": request.model_id,
+        "revision": commit,
+        "files": files_to_download,
+        "excluded": [repo_file.path for repo_file in files if repo_file.path not in selected_paths],
+        "total_bytes": total_bytes,
+        "total_mb": round(total_bytes / (1024 * 1024), 2),
+        "bytes_to_download": sum(entry["size"] for entry in files_to_download if not entry["present"])
+    }
+
+@router.post("/dry-run")
+async def dry_run_download(request: DownloadRequest):
     """
-    Async wrapper for download_model_sync
+    List the files a download request would fetch and their total size,
+    applying its allow/ignore patterns, without downloading anything
     """
     loop = asyncio.get_event_loop()
-    await loop.run_in_executor(executor, download_model_sync, model_id, revision, token)
+    try:
+        return await loop.run_in_executor(None, plan_download, request)
+    except httpx.HTTPStatusError as e:
+        status_code = e.response.status_code
+        if status_code in (401, 403):
+            detail = TOKEN_REQUIRED_MESSAGE
+        else:
+            detail = f"Failed to list files of {request.model_id}: {e}"
+        raise HTTPException(status_code=status_code, detail=detail)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Failed to reach the Hugging Face Hub: {e}")
 
 @router.get("/status/{model_id:path}")
 async def get_download_status(model_id: str):
     """
     Get download status for a specific model
     """
-    status = download_status.get(model_id, {"status": "not_started", "progress": 0})
+    progress = download_manager.get(model_id)
+    status = progress.snapshot() if progress else {"status": "not_started", "progress": 0}
     return {
         "model_id": model_id,
         **status
     }
 
+@router.get("/events/{model_id:path}")
+async def stream_download_events(model_id: str):
+    """
+    Stream download progress as Server-Sent Events
+
+    Sends a "progress" event whenever the download advances or changes
+    state and ends with a "completed", "failed" or "cancelled" event.
+    """
+    if model_id not in download_manager:
+        raise HTTPException(status_code=404, detail=f"No download for model: {model_id}")
+
+    async def events():
+        last_version = None
+        while True:
+            progress = download_manager.get(model_id)
+            if progress is None:
+                break
+            # Resumed downloads get a fresh progress object
+            if (id(progress), progress.version) != last_version:
+                last_version = (id(progress), progress.version)
+                snapshot = progress.snapshot()
+                event = snapshot["status"] if snapshot["status"] in TERMINAL_STATUSES else "progress"
+                yield f"event: {event}\ndata: {json.dumps({'model_id': model_id, **snapshot})}\n\n"
+                if event != "progress":
+                    break
+            await asyncio.sleep(EVENT_INTERVAL)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/list")
 async def list_downloaded_models():
     """
     List all downloaded models
     """
-    downloaded = []
-    if MODELS_DIR.exists():
-        for model_dir in MODELS_DIR.iterdir():
-            if model_dir.is_dir():
-                # Calculate size in MB
-                size_mb = sum(f.stat().st_size for f in model_dir.rglob('*') if f.is_file()) / (1024 * 1024)
-
-                # Only include models with size > 1 MB (filter out empty/incomplete downloads)
-                if size_mb > 1.0:
-                    downloaded.append({
-                        "model_id": model_dir.name.replace("_", "/"),
-                        "local_path": str(model_dir),
-                        "size_mb": size_mb
-                    })
+    # Served from the inventory; only model directories that changed are rescanned
+    loop = asyncio.get_event_loop()
+    downloaded = await loop.run_in_executor(None, get_inventory(MODELS_DIR).models)
+    # Memory estimates from the indexed config and safetensors headers
+    downloaded = [
+        {**entry, "memory": build_profile(entry.get("config"), entry.get("parameters_by_dtype"))["memory"]}
+        for entry in downloaded
+    ]
 
     return {
         "models": downloaded,
@@ -145,6 +362,27 @@ async def list_downloaded_models():
     }
 
 
+@router.get("/storage")
+async def get_storage_report():
+    """
+    Report how much disk space sharing identical files between models saves
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, get_blob_store().report)
+
+
+def remove_model_files(folder_name: str) -> dict:
+    """Delete a model directory, its converted copies and the blobs only it used; runs in a worker thread"""
+    model_path = MODELS_DIR / folder_name
+    shutil.rmtree(model_path)
+
+    # Drop its converted copies and its blobs unless another model shares them
+    remove_converted(model_path)
+    released = get_blob_store().release(folder_name)
+    get_inventory(MODELS_DIR).remove(folder_name)
+    return released
+
+
 @router.delete("/delete/{model_id:path}")
 async def delete_model(model_id: str):
     """
@@ -157,19 +395,23 @@ async def delete_model(model_id: str):
     if not model_path.exists():
         raise HTTPException(status_code=404, detail=f"Model not found: {model_id}")
 
+    current = download_manager.get(model_id)
+    if current and current.status in ("queued", "downloading"):
+        raise HTTPException(status_code=409, detail=f"Model {model_id} is being downloaded; cancel the download first")
+
     try:
-        # Delete the model directory
-        import shutil
-        shutil.rmtree(model_path)
+        # Removing gigabytes of weights takes a while
+        loop = asyncio.get_event_loop()
+        released = await loop.run_in_executor(None, remove_model_files, folder_name)
 
         # Clear download status if exists
-        if model_id in download_status:
-            del download_status[model_id]
+        download_manager.remove(model_id)
 
         return {
             "status": "success",
             "message": f"Model {model_id} deleted successfully",
-            "model_id": model_id
+            "model_id": model_id,
+            **released
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete model: {str(e)}")
@@ -1,10 +1,12 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
+import asyncio
 import psutil
 import platform
-import subprocess
-import json
 from datetime import datetime
-from typing import Optional
+from typing import Optional, List, Dict, Any
+
+from app.core.hardware_sampler import HardwareSampler
+from app.core.hardware_info import get_static_facts, read_linux_drm_gpus
 
 try:
     import GPUtil
@@ -15,172 +17,113 @@ except ImportError:
 router = APIRouter()
 
 
-def get_apple_silicon_gpu_info():
+def get_apple_silicon_gpu_info(facts: Dict[str, Any]):
     """Get GPU info for Apple Silicon Macs"""
-    try:
-        # Get system info to detect Apple Silicon
-        machine = platform.machine()
-        if machine != 'arm64':
-            return None
-
-        # Get GPU info using system_profiler
-        result = subprocess.run(
-            ['system_profiler', 'SPDisplaysDataType', '-json'],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-
-        if result.returncode != 0:
-            return None
-
-        data = json.loads(result.stdout)
-
-        # Extract GPU information
-        gpu_info = None
-        if 'SPDisplaysDataType' in data:
-            for display in data['SPDisplaysDataType']:
-                if 'sppci_model' in display:
-                    gpu_name = display['sppci_model']
-                    # For Apple Silicon, memory is shared with system
-                    memory = psutil.virtual_memory()
-
-                    gpu_info = {
-                        'id': 0,
-                        'name': gpu_name,
-                        'load': 0,  # Apple Silicon doesn't easily expose GPU usage
-                        'memory_used': memory.used / (1024**3),  # Shared memory
-                        'memory_total': memory.total / (1024**3),
-                        'memory_util': memory.percent,
-                        'temperature': 0  # Requires additional tools
-                    }
-                    break
-
-        return gpu_info
-    except Exception as e:
-        print(f"Error getting Apple Silicon GPU info: {e}")
+    gpu_name = facts["apple_gpu_name"]
+    if not gpu_name:
         return None
 
+    # For Apple Silicon, memory is shared with system
+    memory = psutil.virtual_memory()
 
-def get_macos_disk_info():
-    """Get accurate disk info for macOS using diskutil"""
-    try:
-        # Get diskutil info for root volume
-        result = subprocess.run(
-            ['diskutil', 'info', '-plist', '/'],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-
-        if result.returncode != 0:
-            return None
-
-        # Parse plist output
-        import plistlib
-        data = plistlib.loads(result.stdout.encode())
-
-        # Get Container information (more accurate for APFS)
-        container_total = data.get('APFSContainerSize', data.get('IOKitSize', 0))
-        container_free = data.get('APFSContainerFree', data.get('FreeSpace', 0))
-
-        if container_total > 0:
-            total_gb = container_total / (1024**3)
-            free_gb = container_free / (1024**3)
-            used_gb = total_gb - free_gb
-            percent = (used_gb / total_gb) * 100
-
-            return {
-                'total': round(total_gb, 2),
-                'used': round(used_gb, 2),
-                'free': round(free_gb, 2),
-                'percent': round(percent, 1)
-            }
+    return {
+        'id': 0,
+        'name': gpu_name,
+        'driver': 'Apple',
+        'uuid': 'apple-silicon-gpu',
+        'load': 0,  # Apple Silicon doesn't easily expose GPU usage
+        'memory_used': memory.used / (1024**3),  # Shared memory
+        'memory_total': memory.total / (1024**3),
+        'memory_util': memory.percent,
+        'temperature': 0  # Requires additional tools
+    }
 
-        return None
-    except Exception as e:
-        print(f"Error getting macOS disk info: {e}")
-        return None
 
+def get_disk_info(facts: Dict[str, Any]):
+    """
+    Get root disk usage.
 
-@router.get("/stats")
-async def get_hardware_stats():
-    """Get comprehensive hardware statistics"""
+    On macOS the APFS container size (detected once with diskutil) is the
+    real total; free space comes from statfs, which reports the container's
+    shared free space.
+    """
+    disk = psutil.disk_usage('/')
+    total = facts["disk_total_bytes"] or disk.total
+    used = max(total - disk.free, 0)
 
-    # CPU information
-    cpu_percent = psutil.cpu_percent(interval=1, percpu=False)
-    cpu_count = psutil.cpu_count(logical=True)
-    cpu_freq = psutil.cpu_freq()
+    return {
+        "total": round(total / (1024**3), 2),
+        "used": round(used / (1024**3), 2),
+        "free": round(disk.free / (1024**3), 2),
+        "percent": round(used / total * 100, 1) if total else 0.0
+    }
 
-    # Get CPU model - macOS specific method
-    cpu_model = "Unknown"
-    if platform.system() == 'Darwin':
-        try:
-            result = subprocess.run(
-                ['sysctl', '-n', 'machdep.cpu.brand_string'],
-                capture_output=True,
-                text=True,
-                timeout=2
-            )
-            if result.returncode == 0:
-                cpu_model = result.stdout.strip()
-        except Exception:
-            pass
-
-    # Fallback to platform methods
-    if cpu_model == "Unknown":
-        cpu_model = platform.uname().processor or platform.processor() or "Unknown"
 
-    # Memory information
-    memory = psutil.virtual_memory()
+def get_nvidia_gpu_info() -> List[Dict[str, Any]]:
+    """Get NVIDIA GPU info through GPUtil (runs nvidia-smi)"""
+    gpu_info = []
+    try:
+        for gpu in GPUtil.getGPUs():
+            gpu_info.append({
+                "id": gpu.id,
+                "name": gpu.name,
+                "driver": gpu.driver,
+                "uuid": gpu.uuid,
+                "load": round(gpu.load * 100, 1),
+                "memory_used": round(gpu.memoryUsed, 1),
+                "memory_total": round(gpu.memoryTotal, 1),
+                "memory_util": round(gpu.memoryUtil * 100, 1),
+                "temperature": gpu.temperature
+            })
+    except Exception as e:
+        print(f"Error getting GPU info: {e}")
+    return gpu_info
 
-    # Disk information
-    # Try macOS-specific disk info first (more accurate for APFS)
-    disk_info = get_macos_disk_info() if platform.system() == 'Darwin' else None
-
-    if disk_info:
-        disk_data = disk_info
-    else:
-        # Fall back to psutil for other systems
-        disk = psutil.disk_usage('/')
-        disk_data = {
-            "total": round(disk.total / (1024**3), 2),
-            "used": round(disk.used / (1024**3), 2),
-            "free": round(disk.free / (1024**3), 2),
-            "percent": round(disk.percent, 1)
-        }
 
-    # GPU information
-    gpu_info = []
+def get_gpu_info(facts: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Get dynamic GPU counters from the cheapest source for this machine"""
 
     # Try Apple Silicon GPU first
-    apple_gpu = get_apple_silicon_gpu_info()
+    apple_gpu = get_apple_silicon_gpu_info(facts)
     if apple_gpu:
-        gpu_info.append(apple_gpu)
-    # Otherwise try NVIDIA GPUs
-    elif GPU_AVAILABLE:
-        try:
-            gpus = GPUtil.getGPUs()
-            for gpu in gpus:
-                gpu_info.append({
-                    "id": gpu.id,
-                    "name": gpu.name,
-                    "load": round(gpu.load * 100, 1),
-                    "memory_used": round(gpu.memoryUsed, 1),
-                    "memory_total": round(gpu.memoryTotal, 1),
-                    "memory_util": round(gpu.memoryUtil * 100, 1),
-                    "temperature": gpu.temperature
-                })
-        except Exception as e:
-            print(f"Error getting GPU info: {e}")
+        return [apple_gpu]
+
+    if facts["system"] == "Linux":
+        # sysfs exposes amdgpu and similar drivers without a subprocess;
+        # only shell out to nvidia-smi when the NVIDIA driver is present
+        drm_gpus = read_linux_drm_gpus()
+        if drm_gpus:
+            return drm_gpus
+        if not facts["nvidia_gpu_names"]:
+            return []
+
+    return get_nvidia_gpu_info() if GPU_AVAILABLE else []
+
+
+def prime_cpu_percent():
+    """Start psutil's CPU usage measurement; its first non-blocking call always returns 0.0"""
+    psutil.cpu_percent(interval=None, percpu=True)
+
+
+def collect_sample():
+    """Collect one hardware sample; called periodically by the background sampler"""
+    facts = get_static_facts()
+
+    # CPU information (non-blocking: usage since the previous sample)
+    cpu_per_core = psutil.cpu_percent(interval=None, percpu=True)
+    cpu_freq = psutil.cpu_freq()
+
+    # Memory information
+    memory = psutil.virtual_memory()
 
     return {
         "timestamp": datetime.now().isoformat(),
         "cpu": {
-            "usage": round(cpu_percent, 1),
-            "cores": cpu_count,
+            "usage": round(sum(cpu_per_core) / len(cpu_per_core), 1) if cpu_per_core else 0.0,
+            "usage_per_core": [round(p, 1) for p in cpu_per_core],
+            "cores": facts["cores_logical"],
             "frequency": round(cpu_freq.current, 0) if cpu_freq else None,
-            "model": cpu_model
+            "model": facts["cpu_model"]
         },
         "memory": {
             "total": round(memory.total / (1024**3), 2),  # GB
@@ -188,8 +131,46 @@ async def get_hardware_stats():
             "available": round(memory.available / (1024**3), 2),  # GB
             "percent": round(memory.percent, 1)
         },
-        "disk": disk_data,
-        "gpu": gpu_info
+        "disk": get_disk_info(facts),
+        "gpu": get_gpu_info(facts)
+    }
+
+
+# 백그라운드 하드웨어 샘플러
+sampler = HardwareSampler(collect_sample, prime=prime_cpu_percent)
+
+
+async def get_latest_sample():
+    """Latest sample from the background sampler, starting it on first use"""
+    sampler.start()
+    sample = sampler.latest()
+    if sample is None:
+        # The first sample follows a short priming delay
+        loop = asyncio.get_event_loop()
+        sample = await loop.run_in_executor(None, sampler.wait_latest, sampler.prime_seconds + sampler.interval)
+    return sample
+
+
+@router.get("/stats")
+async def get_hardware_stats():
+    """Get comprehensive hardware statistics (latest background sample)"""
+    return await get_latest_sample()
+
+
+@router.get("/history")
+async def get_hardware_history(
+    since: Optional[float] = Query(None, description="Only samples taken after this Unix timestamp"),
+    limit: Optional[int] = Query(None, ge=1, description="Return at most this many of the newest samples")
+):
+    """Get buffered hardware samples for charts, oldest first"""
+    await get_latest_sample()
+    samples = sampler.history(since=since, limit=limit)
+
+    return {
+        "interval": sampler.interval,
+        "count": len(samples),
+        "latest_time": samples[-1]["time"] if samples else since,
+        "samples": samples
     }
 
 
@@ -197,22 +178,20 @@ async def get_hardware_stats():
 async def get_system_info():
     """Get system information"""
 
-    uname = platform.uname()
-
-    # Get Python version
-    python_version = platform.python_version()
+    facts = get_static_facts()
 
     # Get boot time
     boot_time = datetime.fromtimestamp(psutil.boot_time())
 
     return {
-        "system": uname.system,
-        "node_name": uname.node,
-        "release": uname.release,
-        "version": uname.version,
-        "machine": uname.machine,
-        "processor": uname.processor,
-        "python_version": python_version,
+        "system": facts["system"],
+        "node_name": facts["node_name"],
+        "release": facts["release"],
+        "version": facts["version"],
+        "machine": facts["machine"],
+        "processor": facts["processor"],
+        "cpu_model": facts["cpu_model"],
+        "python_version": platform.python_version(),
         "boot_time": boot_time.isoformat()
     }
 
@@ -221,14 +200,15 @@ async def get_system_info():
 async def get_cpu_stats():
     """Get detailed CPU statistics"""
 
-    cpu_percent = psutil.cpu_percent(interval=1, percpu=True)
+    sample = await get_latest_sample()
+    facts = get_static_facts()
     cpu_freq = psutil.cpu_freq(percpu=False)
 
     return {
-        "usage_total": round(psutil.cpu_percent(interval=0.1), 1),
-        "usage_per_core": [round(p, 1) for p in cpu_percent],
-        "cores_logical": psutil.cpu_count(logical=True),
-        "cores_physical": psutil.cpu_count(logical=False),
+        "usage_total": sample["cpu"]["usage"],
+        "usage_per_core": sample["cpu"]["usage_per_core"],
+        "cores_logical": facts["cores_logical"],
+        "cores_physical": facts["cores_physical"],
         "frequency": {
             "current": round(cpu_freq.current, 0) if cpu_freq else None,
             "min": round(cpu_freq.min, 0) if cpu_freq and cpu_freq.min > 0 else None,
@@ -262,76 +242,48 @@ async def get_memory_stats():
 
 @router.get("/gpu")
 async def get_gpu_stats():
-    """Get GPU statistics"""
+    """Get GPU statistics (latest background sample)"""
 
-    # Try Apple Silicon GPU first
-    apple_gpu = get_apple_silicon_gpu_info()
-    if apple_gpu:
-        return {
-            "available": True,
-            "count": 1,
-            "gpus": [{
-                "id": apple_gpu["id"],
-                "name": apple_gpu["name"],
-                "driver": "Apple",
-                "load": apple_gpu["load"],
-                "memory": {
-                    "used": round(apple_gpu["memory_used"], 1),
-                    "total": round(apple_gpu["memory_total"], 1),
-                    "free": round(apple_gpu["memory_total"] - apple_gpu["memory_used"], 1),
-                    "util": round(apple_gpu["memory_util"], 1)
-                },
-                "temperature": apple_gpu["temperature"],
-                "uuid": "apple-silicon-gpu"
-            }]
-        }
+    sample = await get_latest_sample()
+    gpus = sample["gpu"]
 
-    # Try NVIDIA GPUs
-    if not GPU_AVAILABLE:
+    if not gpus and not GPU_AVAILABLE and not get_static_facts()["apple_gpu_name"]:
         return {
             "available": False,
             "message": "GPUtil not available"
         }
 
-    try:
-        gpus = GPUtil.getGPUs()
-
-        if not gpus:
-            return {
-                "available": True,
-                "count": 0,
-                "gpus": [],
-                "message": "No GPU detected"
-            }
-
-        gpu_list = []
-        for gpu in gpus:
-            gpu_list.append({
-                "id": gpu.id,
-                "name": gpu.name,
-                "driver": gpu.driver,
-                "load": round(gpu.load * 100, 1),
-                "memory": {
-                    "used": round(gpu.memoryUsed, 1),
-                    "total": round(gpu.memoryTotal, 1),
-                    "free": round(gpu.memoryFree, 1),
-                    "util": round(gpu.memoryUtil * 100, 1)
-                },
-                "temperature": gpu.temperature,
-                "uuid": gpu.uuid
-            })
-
+    if not gpus:
         return {
             "available": True,
-            "count": len(gpus),
-            "gpus": gpu_list
-        }
-    except Exception as e:
-        return {
-            "available": False,
-            "error": str(e)
+            "count": 0,
+            "gpus": [],
+            "message": "No GPU detected"
         }
 
+    gpu_list = []
+    for gpu in gpus:
+        gpu_list.append({
+            "id": gpu["id"],
+            "name": gpu["name"],
+            "driver": gpu.get("driver"),
+            "load": gpu["load"],
+            "memory": {
+                "used": round(gpu["memory_used"], 1),
+                "total": round(gpu["memory_total"], 1),
+                "free": round(gpu["memory_total"] - gpu["memory_used"], 1),
+                "util": round(gpu["memory_util"], 1)
+            },
+            "temperature": gpu["temperature"],
+            "uuid": gpu.get("uuid")
+        })
+
+    return {
+        "available": True,
+        "count": len(gpu_list),
+        "gpus": gpu_list
+    }
+
 
 @router.get("/disk")
 async def get_disk_stats():
@@ -3,9 +3,11 @@ from fastapi.responses import FileResponse
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 from pathlib import Path
+import asyncio
 import random
 import json
 import logging
+import multiprocessing
 import threading
 
 from app.core.storage import (
@@ -16,7 +18,19 @@ from app.core.storage import (
     find_by_id,
     remove_by_id
 )
-from app.core.trainer import start_training_job
+from app.core.hardware_info import get_static_facts
+from app.core.model_export import export_merged_model, MERGED_MODEL_DIRNAME
+from app.core.model_index import estimate_memory
+from app.core.metrics import REGISTRY
+from app.core.training_profiler import load_profile_report
+from app.core.resource_monitor import (
+    JobResourceMonitor,
+    RESOURCES_FILE,
+    check_admission,
+    estimate_job_memory,
+    load_job_resources
+)
+from app.models.schemas import ExportModelRequest, EvaluateModelRequest
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -24,8 +38,24 @@ router = APIRouter()
 # Track running training jobs
 running_jobs: Dict[str, threading.Thread] = {}
 
+# Resource monitors of running training worker processes
+resource_monitors: Dict[str, JobResourceMonitor] = {}
+
+# Track running merge-and-export operations
+running_exports: Dict[str, threading.Thread] = {}
+
+# Track running evaluations
+running_evaluations: Dict[str, threading.Thread] = {}
+
+# Live state of running evaluations; progress is served from here instead
+# of rewriting jobs_meta.json after every batch
+evaluation_states: Dict[str, Dict[str, Any]] = {}
+
 # 데이터 저장 디렉토리
 JOBS_DIR = Path("./training_jobs")
+
+# How long /start waits for the Hub when estimating a model's memory
+MODEL_ESTIMATE_TIMEOUT = 5.0
 JOBS_META_FILE = JOBS_DIR / "jobs_meta.json"
 LOGS_DIR = JOBS_DIR / "logs"
 CHECKPOINTS_DIR = JOBS_DIR / "checkpoints"
@@ -38,6 +68,31 @@ ensure_directory(CHECKPOINTS_DIR)
 # 실시간 메트릭을 위한 메모리 캐시
 training_jobs: Dict[str, Dict[str, Any]] = {}
 
+# Prometheus metrics
+active_jobs_gauge = REGISTRY.gauge("training_jobs_active", "Training jobs currently running")
+job_tokens_per_second_gauge = REGISTRY.gauge(
+    "training_job_tokens_per_second", "Token throughput of running training jobs at their last log step", ("job_id",)
+)
+
+
+@REGISTRY.on_collect
+def collect_training_metrics():
+    """Refresh training gauges at scrape time"""
+    active = [job_id for job_id, thread in running_jobs.items() if thread.is_alive()]
+    active_jobs_gauge.set(len(active))
+
+    job_tokens_per_second_gauge.clear()
+    if not active:
+        return
+
+    # Running jobs have already imported the trainer
+    from app.core.trainer import PROGRESS_FILE
+
+    for job_id in active:
+        progress = load_json_file(JOBS_DIR / job_id / PROGRESS_FILE, default={})
+        if progress.get("tokens_per_second") is not None:
+            job_tokens_per_second_gauge.set(progress["tokens_per_second"], job_id=job_id)
+
 
 def load_jobs_metadata() -> List[Dict[str, Any]]:
     """Load jobs metadata from file"""
@@ -235,6 +290,28 @@ async def list_jobs():
     }
 
 
+async def estimate_from_model_index(model: str, batch_size: int, seq_len: int, lora_r: int) -> Optional[Dict[str, Any]]:
+    """Static training-memory estimate from the model's config and safetensors headers"""
+    from app.api.routes import models
+
+    try:
+        profile = await asyncio.wait_for(models.get_model_profile(model), MODEL_ESTIMATE_TIMEOUT)
+    except Exception as e:
+        logger.info(f"No memory estimate for {model}: {e}")
+        return None
+    if not profile["num_parameters"]:
+        return None
+    memory = estimate_memory(profile["num_parameters"], profile["config"], lora_r, batch_size, seq_len)
+    # The trainer uses 4-bit QLoRA on NVIDIA GPUs and fp32 LoRA elsewhere
+    precision = "4bit" if get_static_facts()["nvidia_gpu_names"] else "fp32"
+    return {
+        "precision": precision,
+        "num_parameters": profile["num_parameters"],
+        "training_bytes": memory[precision]["training_bytes"],
+        "assumptions": memory["assumptions"],
+    }
+
+
 @router.post("/{job_id}/start")
 async def start_job(job_id: str):
     """Start a training job"""
@@ -250,46 +327,97 @@ async def start_job(job_id: str):
     if job_id in running_jobs and running_jobs[job_id].is_alive():
         raise HTTPException(status_code=400, detail="Job is already running")
 
+    # Admission: make sure the job's expected peak memory fits next to running jobs
+    model = job.get("model", "TinyLlama/TinyLlama-1.1B-Chat-v1.0")
+    batch_size = job.get("batch_size", 4)
+    max_seq_length = job.get("max_seq_length", 512)
+    lora_r = job.get("lora_r", 8)
+    running = [monitor.snapshot(include_samples=False) for monitor in resource_monitors.values()]
+    expected_peak = estimate_job_memory([j["resources"] for j in jobs if j.get("resources")], model)
+    admitted, reason = check_admission(expected_peak, running)
+    if not admitted:
+        raise HTTPException(status_code=503, detail=reason)
+
+    # No earlier run of this model: the model index's estimate only warns, it's
+    # too coarse to refuse a job on
+    model_estimate = warning = None
+    if expected_peak is None:
+        model_estimate = await estimate_from_model_index(model, batch_size, max_seq_length, lora_r)
+        # On a GPU the weights live in GPU memory, so the estimate doesn't bound RSS
+        if model_estimate and model_estimate["precision"] == "fp32":
+            fits, estimate_reason = check_admission(model_estimate["training_bytes"], running)
+            if not fits:
+                warning = f"{estimate_reason} (estimated from the model's config)"
+                logger.warning(f"Starting job {job_id} anyway: {warning}")
+
     # Update job status to running
     job["status"] = "running"
     job["started_at"] = datetime.now().isoformat()
+    job["admission"] = {
+        "expected_peak_bytes": expected_peak,
+        "reason": reason,
+        "model_estimate": model_estimate,
+        "warning": warning,
+    }
     save_jobs_metadata(jobs)
 
-    # Start training in background thread
+    # Start training in a worker process, supervised from a background thread
     def run_training():
+        # torch/transformers load in the worker process, not here
+        from app.core.trainer import run_training_process
+
         try:
             logger.info(f"Starting training for job {job_id}")
 
-            # Load job metadata to get configuration
-            jobs = load_jobs_metadata()
-            job = find_by_id(jobs, job_id)
-
-            if not job:
-                logger.error(f"Job {job_id} not found in metadata")
-                return
-
             # Get job configuration
             config = {
-                "model": job.get("model", "TinyLlama/TinyLlama-1.1B-Chat-v1.0"),
+                "model": model,
                 "dataset": job.get("dataset", "timdettmers/openassistant-guanaco"),
                 "epochs": job.get("epochs", 3),
-                "batch_size": job.get("batch_size", 4),
+                "batch_size": batch_size,
+                "max_seq_length": max_seq_length,
+                "lora_r": lora_r,
                 "learning_rate": job.get("learning_rate", 2e-4),
+                "profile": job.get("profile", False),
+                "peak_tflops": job.get("peak_tflops"),
             }
 
-            # Start training
-            success = start_training_job(job_id, config)
+            # A separate process per job, so its CPU, memory and I/O can be accounted for
+            process = multiprocessing.get_context("spawn").Process(
+                target=run_training_process,
+                args=(job_id, config),
+                name=f"training-{job_id}",
+                daemon=True
+            )
+            process.start()
+
+            monitor = JobResourceMonitor(
+                job_id,
+                process.pid,
+                JOBS_DIR / job_id / RESOURCES_FILE,
+                model=model,
+                expected_peak_bytes=expected_peak
+            )
+            resource_monitors[job_id] = monitor
+            monitor.start()
+
+            process.join()
+            success = process.exitcode == 0
+            # Only finished runs count towards later jobs' memory estimates
+            resources = monitor.stop(status="finished" if success else "failed")
+            resource_monitors.pop(job_id, None)
 
             # Update job status
             jobs = load_jobs_metadata()
-            job = find_by_id(jobs, job_id)
-            if job:
+            job_meta = find_by_id(jobs, job_id)
+            if job_meta:
+                job_meta["resources"] = resources
                 if success:
-                    job["status"] = "completed"
-                    job["progress"] = 100
-                    job["completed_at"] = datetime.now().isoformat()
+                    job_meta["status"] = "completed"
+                    job_meta["progress"] = 100
+                    job_meta["completed_at"] = datetime.now().isoformat()
                 else:
-                    job["status"] = "failed"
+                    job_meta["status"] = "failed"
 
                 save_jobs_metadata(jobs)
 
@@ -297,9 +425,9 @@ async def start_job(job_id: str):
             logger.exception(f"Training failed for job {job_id}")
             # Update job status to failed
             jobs = load_jobs_metadata()
-            job = find_by_id(jobs, job_id)
-            if job:
-                job["status"] = "failed"
+            job_meta = find_by_id(jobs, job_id)
+            if job_meta:
+                job_meta["status"] = "failed"
                 save_jobs_metadata(jobs)
 
     # Create and start training thread
@@ -310,7 +438,252 @@ async def start_job(job_id: str):
     return {
         "job_id": job_id,
         "status": "running",
-        "message": "Training started successfully"
+        "message": "Training started successfully",
+        "warning": warning
+    }
+
+
+@router.get("/{job_id}/resources")
+async def get_job_resources(job_id: str):
+    """Get CPU time, memory, I/O and GPU memory used by a job's training worker"""
+
+    jobs = load_jobs_metadata()
+    job = find_by_id(jobs, job_id)
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    monitor = resource_monitors.get(job_id)
+    resources = monitor.snapshot() if monitor else load_job_resources(JOBS_DIR / job_id)
+
+    if not resources:
+        return {
+            "job_id": job_id,
+            "status": "not_available",
+            "message": "Job has not run yet"
+        }
+
+    return resources
+
+
+@router.get("/{job_id}/profile")
+async def get_job_profile(job_id: str):
+    """Get the phase and step-time profile of a job trained with "profile": true"""
+
+    jobs = load_jobs_metadata()
+    job = find_by_id(jobs, job_id)
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    report = load_profile_report(JOBS_DIR / job_id)
+    if not report:
+        return {
+            "job_id": job_id,
+            "status": "not_profiled",
+            "message": "Create the job with \"profile\": true to record a profile"
+        }
+
+    return {
+        "job_id": job_id,
+        **report
+    }
+
+
+@router.post("/{job_id}/export")
+async def export_job_model(job_id: str, request: Optional[ExportModelRequest] = None):
+    """Merge a job's LoRA adapter into its base model and save it for inference"""
+
+    request = request or ExportModelRequest()
+
+    jobs = load_jobs_metadata()
+    job = find_by_id(jobs, job_id)
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    adapter_dir = JOBS_DIR / job_id / "final_model"
+    if not adapter_dir.exists():
+        raise HTTPException(status_code=404, detail="Fine-tuned model not found. Train the job first")
+
+    if request.quantization == "int8_dynamic" and request.dtype != "float32":
+        raise HTTPException(status_code=400, detail="int8_dynamic quantization requires float32 dtype")
+
+    if job_id in running_exports and running_exports[job_id].is_alive():
+        raise HTTPException(status_code=400, detail="Export is already running")
+
+    job["export"] = {
+        "status": "exporting",
+        "dtype": request.dtype,
+        "quantization": request.quantization,
+        "started_at": datetime.now().isoformat()
+    }
+    save_jobs_metadata(jobs)
+
+    # Merge in background thread
+    def run_export():
+        try:
+            export_info = export_merged_model(
+                job_id,
+                adapter_dir,
+                JOBS_DIR / job_id / MERGED_MODEL_DIRNAME,
+                dtype=request.dtype,
+                quantization=request.quantization
+            )
+            export_state = {"status": "completed", **export_info}
+
+        except Exception as e:
+            logger.exception(f"Export failed for job {job_id}")
+            export_state = {"status": "failed", "error": str(e)}
+
+        # Drop any stale copy so the playground picks up the new export, or
+        # falls back to the adapter after a failed one
+        from app.api.routes import playground
+        playground.evict_model(f"ft:{job_id}")
+
+        jobs = load_jobs_metadata()
+        job = find_by_id(jobs, job_id)
+        if job:
+            job["export"] = export_state
+            save_jobs_metadata(jobs)
+
+    export_thread = threading.Thread(target=run_export, daemon=True)
+    export_thread.start()
+    running_exports[job_id] = export_thread
+
+    return {
+        "job_id": job_id,
+        "status": "exporting",
+        "message": "Export started successfully"
+    }
+
+
+@router.get("/{job_id}/export")
+async def get_job_export(job_id: str):
+    """Get the merge-and-export status of a training job"""
+
+    jobs = load_jobs_metadata()
+    job = find_by_id(jobs, job_id)
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        "job_id": job_id,
+        **job.get("export", {"status": "not_exported"})
+    }
+
+
+def _update_job_field(job_id: str, field: str, value: Dict[str, Any]):
+    """Replace one field of a job's metadata"""
+    jobs = load_jobs_metadata()
+    job = find_by_id(jobs, job_id)
+    if job:
+        job[field] = value
+        save_jobs_metadata(jobs)
+
+
+@router.post("/{job_id}/evaluate")
+async def evaluate_job_model(job_id: str, request: Optional[EvaluateModelRequest] = None):
+    """Evaluate a job's fine-tuned model on a held-out dataset"""
+
+    request = request or EvaluateModelRequest()
+
+    jobs = load_jobs_metadata()
+    job = find_by_id(jobs, job_id)
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if not (JOBS_DIR / job_id / "final_model").exists():
+        raise HTTPException(status_code=404, detail="Fine-tuned model not found. Train the job first")
+
+    if job_id in running_evaluations and running_evaluations[job_id].is_alive():
+        raise HTTPException(status_code=400, detail="Evaluation is already running")
+
+    dataset_name = request.dataset or job.get("dataset")
+    if not dataset_name:
+        raise HTTPException(status_code=400, detail="No dataset given and the job has no dataset")
+
+    job["evaluation"] = {
+        "status": "running",
+        "dataset": dataset_name,
+        "processed": 0,
+        "started_at": datetime.now().isoformat()
+    }
+    save_jobs_metadata(jobs)
+
+    # Evaluate in background thread
+    def run_evaluation_job():
+        from app.api.routes import playground
+        from app.core.evaluator import build_eval_examples, run_evaluation, select_eval_split
+        from app.core.trainer import QLoRATrainer, TrainingConfig
+
+        state = dict(job["evaluation"])
+        evaluation_states[job_id] = state
+        try:
+            # Reuse the trainer's dataset loading (uploaded datasets, files, Hub)
+            trainer = QLoRATrainer(
+                TrainingConfig(model_name=job.get("model", ""), dataset_path=dataset_name, output_dir=str(JOBS_DIR / job_id)),
+                job_id
+            )
+            dataset, split = select_eval_split(trainer.load_dataset_source(), request.split)
+            if request.max_samples:
+                dataset = dataset.select(range(min(request.max_samples, len(dataset))))
+            examples = build_eval_examples(list(dataset))
+
+            state.update(split=split, total=len(examples))
+            _update_job_field(job_id, "evaluation", state)
+
+            def on_progress(processed, total):
+                state["processed"] = processed
+
+            summary = run_evaluation(
+                lambda: playground.load_model(job_id, "fine-tuned"),
+                examples,
+                JOBS_DIR / job_id / "evaluation",
+                batch_size=request.batch_size,
+                max_length=request.max_length,
+                exact_match=request.exact_match,
+                max_new_tokens=request.max_new_tokens,
+                lock=playground.inference_lock,
+                on_progress=on_progress
+            )
+            state.update(status="completed", completed_at=datetime.now().isoformat(), **summary)
+
+        except Exception as e:
+            logger.exception(f"Evaluation failed for job {job_id}")
+            state.update(status="failed", error=str(e))
+
+        _update_job_field(job_id, "evaluation", state)
+        evaluation_states.pop(job_id, None)
+
+    evaluation_thread = threading.Thread(target=run_evaluation_job, daemon=True)
+    evaluation_thread.start()
+    running_evaluations[job_id] = evaluation_thread
+
+    return {
+        "job_id": job_id,
+        "status": "running",
+        "message": "Evaluation started successfully"
+    }
+
+
+@router.get("/{job_id}/evaluate")
+async def get_job_evaluation(job_id: str):
+    """Get the status and summary of a job's latest evaluation"""
+
+    jobs = load_jobs_metadata()
+    job = find_by_id(jobs, job_id)
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    # A running evaluation's progress is only kept in memory
+    evaluation = evaluation_states.get(job_id) or job.get("evaluation", {"status": "not_evaluated"})
+    return {
+        "job_id": job_id,
+        **dict(evaluation)
     }
 
 
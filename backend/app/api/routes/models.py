@@ -1,48 +1,119 @@
 from fastapi import APIRouter, HTTPException, Query
-from huggingface_hub import HfApi, ModelCard
 from app.models.schemas import ModelInfo, ModelSearchResponse, ModelDetailResponse
-from typing import Optional
+from app.api.routes import download
+from app.core.hub_download import RepoFile, select_files
+from app.core.hub_metadata import HubMetadata, HubOffline
+from app.core.model_index import build_profile, summarize_config
+from app.core.model_inventory import get_inventory
+from app.core.model_search import ModelSearchIndex
+from typing import Any, Dict, List, Optional
+import asyncio
 import logging
 
 router = APIRouter()
-hf_api = HfApi()
-
 logger = logging.getLogger(__name__)
 
+# Hub 메타데이터 캐시 (TTL + stale-while-revalidate, 오프라인 지원)
+hub_metadata = HubMetadata()
+
+# 다운로드한 모델과 캐시된 Hub 메타데이터에 대한 로컬 검색 인덱스
+search_index = ModelSearchIndex()
+
+# How long a search waits for the Hub before answering from the local index alone
+HUB_SEARCH_TIMEOUT = 5.0
+
+RECOMMENDED_MODELS = [
+    "TinyLlama/TinyLlama-1.1B-Chat-v1.0",
+    "microsoft/phi-2",
+    "google/gemma-2b",
+    "Qwen/Qwen1.5-1.8B",
+    "meta-llama/Llama-3.2-1B",
+    "mistralai/Mistral-7B-v0.1"
+]
+
+GB = 1024 ** 3
+
+def _download_size(model: dict) -> Optional[int]:
+    """Bytes a default download of a Hub model fetches; None without file sizes"""
+    siblings = model.get("siblings") or []
+    if not siblings or any(sibling.get("size") is None for sibling in siblings):
+        return None
+    files = [RepoFile(path=sibling["rfilename"], size=sibling["size"]) for sibling in siblings]
+    return sum(repo_file.size for repo_file in select_files(files))
+
+def hub_profile(model: dict, config: Optional[dict] = None) -> Dict[str, Any]:
+    """Profile of a Hub model from its cached metadata and, if fetched, its config.json"""
+    safetensors = model.get("safetensors") or {}
+    summary = summarize_config(config or model.get("config"))
+    return {**build_profile(summary, safetensors.get("parameters"), _download_size(model)), "config": summary}
+
+def local_profile(entry: dict) -> Dict[str, Any]:
+    """Profile of a downloaded model from its inventory entry"""
+    profile = build_profile(entry.get("config"), entry.get("parameters_by_dtype"), entry["size_bytes"])
+    return {**profile, "config": entry.get("config") or summarize_config(None)}
+
+async def get_model_profile(model_id: str, token: Optional[str] = None, model: Optional[dict] = None) -> Dict[str, Any]:
+    """
+    Parameter count, size and memory estimates of a model: from the local
+    copy when it's downloaded, otherwise from cached Hub metadata
+    """
+    loop = asyncio.get_event_loop()
+    entry = await loop.run_in_executor(None, get_inventory(download.MODELS_DIR).get, model_id.replace("/", "_"))
+    if entry is not None:
+        return {**local_profile(entry), "source": "local"}
+
+    if model is None:
+        model = await hub_metadata.model_info(model_id, token, files_metadata=True)
+    try:
+        config = await hub_metadata.model_config(model_id, token)
+    except Exception as e:
+        logger.info(f"No config.json for {model_id}: {e}")
+        config = None
+    return {**hub_profile(model, config), "source": "hub"}
+
+def _size_gb(size_bytes: Optional[int]) -> Optional[float]:
+    return round(size_bytes / GB, 2) if size_bytes else None
+
+def _model_fields(model: dict, profile: Optional[dict] = None) -> dict:
+    """ModelInfo fields of a cached Hub model"""
+    profile = profile or hub_profile(model)
+    model_id = model["id"]
+    if "/" in model_id:
+        name, author = model_id.split("/")[-1], model.get("author") or model_id.split("/")[0]
+    else:
+        name, author = model_id, "unknown"
+    return {
+        "id": model_id,
+        "name": name,
+        "author": author,
+        "downloads": model.get("downloads") or 0,
+        "likes": model.get("likes") or 0,
+        "tags": model.get("tags") or [],
+        "pipeline_tag": model.get("pipeline_tag"),
+        "last_modified": model.get("last_modified"),
+        "size_gb": _size_gb(profile["size_bytes"]),
+        "num_parameters": profile["num_parameters"],
+    }
+
+def search_local(
+    query: Optional[str], task: Optional[str], sort: str, limit: int, token: Optional[str]
+) -> List[Dict[str, Any]]:
+    """Search downloaded models and cached Hub metadata, without the network"""
+    search_index.refresh(hub_metadata, get_inventory(download.MODELS_DIR).models())
+    return search_index.search(query, task, sort, limit, token)
+
+def _offline_error(e: HubOffline) -> HTTPException:
+    return HTTPException(status_code=503, detail=f"Hugging Face Hub is unavailable offline: {e}")
+
 @router.get("/recommended/small-language-models")
 async def get_recommended_slms(token: Optional[str] = Query(None, description="Hugging Face API token")):
     """
     Get recommended Small Language Models suitable for fine-tuning
     """
-    # Create API instance with token if provided
-    api = HfApi(token=token) if token else hf_api
-    recommended_models = [
-        "TinyLlama/TinyLlama-1.1B-Chat-v1.0",
-        "microsoft/phi-2",
-        "google/gemma-2b",
-        "Qwen/Qwen1.5-1.8B",
-        "meta-llama/Llama-3.2-1B",
-        "mistralai/Mistral-7B-v0.1"
-    ]
-
     try:
-        model_list = []
-        for model_id in recommended_models:
-            try:
-                model_info = api.model_info(model_id)
-                model_list.append(ModelInfo(
-                    id=model_info.id,
-                    name=model_info.id.split("/")[-1] if "/" in model_info.id else model_info.id,
-                    author=model_info.author or model_info.id.split("/")[0] if "/" in model_info.id else "unknown",
-                    downloads=model_info.downloads or 0,
-                    likes=model_info.likes or 0,
-                    tags=model_info.tags or [],
-                    pipeline_tag=model_info.pipeline_tag,
-                    last_modified=model_info.lastModified,
-                ))
-            except Exception as e:
-                logger.warning(f"Failed to get info for {model_id}: {e}")
-                continue
+        # 모든 추천 모델 정보를 동시에 조회
+        infos = await hub_metadata.model_infos(RECOMMENDED_MODELS, token)
+        model_list = [ModelInfo(**_model_fields(info)) for info in infos if info is not None]
 
         return ModelSearchResponse(
             models=model_list,
@@ -62,40 +133,36 @@ async def search_models(
     token: Optional[str] = Query(None, description="Hugging Face API token"),
 ):
     """
-    Search for models on Hugging Face Hub
+    Search for models on Hugging Face Hub, merged with downloaded and previously seen models
     """
+    task = task or "text-generation"
     try:
-        # Create API instance with token if provided
-        api = HfApi(token=token) if token else hf_api
-
-        # 허깅페이스 허브에서 모델 검색
-        models = api.list_models(
-            search=query,
-            task=task or "text-generation",
-            sort=sort,
-            direction=-1,
-            limit=limit,
-            cardData=True
+        # 허깅페이스 허브에서 모델 검색 (캐시 우선)
+        hub_models = await asyncio.wait_for(
+            hub_metadata.search(query=query, task=task, sort=sort, limit=limit, token=token),
+            HUB_SEARCH_TIMEOUT
         )
+    except HubOffline:
+        hub_models = []
+    except Exception as e:
+        logger.warning(f"Hub search failed, answering from the local index: {e}")
+        hub_models = []
+
+    try:
+        # 로컬 인덱스 검색 (네트워크 없이 수 ms)
+        loop = asyncio.get_event_loop()
+        local_models = await loop.run_in_executor(None, search_local, query, task, sort, limit, token)
+
+        # Hub results keep the Hub's order; local matches it didn't return follow
+        seen = {model["id"] for model in hub_models}
+        models = (hub_models + [model for model in local_models if model["id"] not in seen])[:limit]
 
         model_list = []
         for model in models:
             try:
-                model_info = ModelInfo(
-                    id=model.id,
-                    name=model.id.split("/")[-1] if "/" in model.id else model.id,
-                    author=model.author or model.id.split("/")[0] if "/" in model.id else "unknown",
-                    downloads=model.downloads or 0,
-                    likes=model.likes or 0,
-                    tags=model.tags or [],
-                    pipeline_tag=model.pipeline_tag,
-                    last_modified=model.lastModified,
-                    description=getattr(model.cardData, "model-index", None) if hasattr(model, "cardData") else None,
-                    size_gb=None  # 실제 구현시 model config에서 가져오기
-                )
-                model_list.append(model_info)
+                model_list.append(ModelInfo(**_model_fields(model)))
             except Exception as e:
-                logger.warning(f"Failed to process model {model.id}: {e}")
+                logger.warning(f"Failed to process model {model.get('id')}: {e}")
                 continue
 
         return ModelSearchResponse(
@@ -113,44 +180,40 @@ async def get_model_detail(model_id: str, token: Optional[str] = Query(None, des
     Get detailed information about a specific model
     """
     try:
-        # Create API instance with token if provided
-        api = HfApi(token=token) if token else hf_api
-
         # 모델 정보 가져오기
-        model_info = api.model_info(model_id, files_metadata=True)
-
-        # 모델 카드 가져오기
-        try:
-            model_card = ModelCard.load(model_id)
-            card_text = model_card.text if model_card else None
-        except:
-            card_text = None
-
-        # 모델 config 가져오기
-        config = None
-        try:
-            # config.json이 있으면 가져오기
-            config_info = next((f for f in model_info.siblings if f.rfilename == "config.json"), None)
-            if config_info:
-                config = {"available": True}
-        except:
-            pass
-
-        return ModelDetailResponse(
-            id=model_info.id,
-            name=model_info.id.split("/")[-1] if "/" in model_info.id else model_info.id,
-            author=model_info.author or model_info.id.split("/")[0] if "/" in model_info.id else "unknown",
-            downloads=model_info.downloads or 0,
-            likes=model_info.likes or 0,
-            tags=model_info.tags or [],
-            pipeline_tag=model_info.pipeline_tag,
-            last_modified=model_info.lastModified,
-            description=None,
-            model_card=card_text,
-            config=config,
-            size_gb=None
-        )
-
+        model_info = await hub_metadata.model_info(model_id, token, files_metadata=True)
+    except HubOffline as e:
+        raise _offline_error(e)
     except Exception as e:
         logger.error(f"Error getting model detail for {model_id}: {e}")
         raise HTTPException(status_code=404, detail=f"Model not found: {str(e)}")
+
+    # 모델 카드와 config/메모리 추정치를 동시에 가져오기
+    card_text, profile = await asyncio.gather(
+        hub_metadata.model_card(model_id, token),
+        get_model_profile(model_id, token, model_info),
+        return_exceptions=True
+    )
+    if isinstance(card_text, Exception):
+        card_text = None
+    if isinstance(profile, Exception):
+        logger.warning(f"Failed to profile {model_id}: {profile}")
+        profile = {**hub_profile(model_info), "source": "hub"}
+
+    siblings = model_info.get("siblings") or []
+    available = profile["source"] == "local" or any(f["rfilename"] == "config.json" for f in siblings)
+    config = {
+        "available": available,
+        **profile["config"],
+        "num_parameters": profile["num_parameters"],
+        "parameters_source": profile["parameters_source"],
+        "parameters_by_dtype": profile["parameters_by_dtype"],
+        "memory": profile["memory"],
+    } if available or profile["num_parameters"] else None
+
+    return ModelDetailResponse(
+        **_model_fields(model_info, profile),
+        description=None,
+        model_card=card_text,
+        config=config
+    )
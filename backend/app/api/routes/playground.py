@@ -1,35 +1,279 @@
 from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any, Optional
+import asyncio
+from typing import List, Dict, Any, Optional, Set, Tuple
+from dataclasses import dataclass, field
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 import logging
-import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
-from peft import PeftModel
+import re
+import threading
+import time
+
+from app.core.lazy_imports import LazyModule, warm_up as ml_warm_up
+from app.core.storage import load_json_file
+from app.core.model_export import (
+    ADAPTER_CONFIG_FILE,
+    MERGED_MODEL_DIRNAME,
+    load_export_info,
+    load_merged_model,
+    resolve_base_model_path,
+)
+from app.core.cpu_inference import (
+    DEFAULT_CPU_MODE,
+    benchmark_cpu_modes,
+    cpu_supports_bf16,
+    load_cpu_config,
+    optimize_for_cpu,
+    resolve_cpu_dtype,
+    save_cpu_config,
+    set_intra_op_threads,
+    warm_up,
+)
+from app.core.fast_load import convert_model, is_converted, load_causal_lm, needs_conversion
+from app.core.kv_cache import ConversationKVCache
+from app.core.metrics import REGISTRY
+from app.models.schemas import (
+    ChatRequest,
+    CompareRequest,
+    CpuInferenceConfig,
+    CpuThreadsConfig,
+    CpuBenchmarkRequest,
+    GenerationParams,
+)
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Imported on first use, so the server starts without loading the ML stack
+torch = LazyModule("torch")
+transformers = LazyModule("transformers")
+peft = LazyModule("peft")
+
+
+@dataclass
+class ResidentModel:
+    """A base model kept in memory, with any LoRA adapters attached to it"""
+    model: Any
+    tokenizer: Any
+    adapters: Set[str] = field(default_factory=set)
+
+
 # Model cache to avoid reloading models
 model_cache: Dict[str, tuple] = {}  # {model_id: (model, tokenizer)}
 
+# Resident base models shared by all fine-tuned adapters trained on them
+base_models: Dict[str, ResidentModel] = {}  # {base_model_id: ResidentModel}
+
+# Load time and peak RSS of the last load of each model path
+load_reports: Dict[str, Dict[str, Any]] = {}
+
+class InferenceLock:
+    """Reentrant lock that counts the callers waiting for it"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._waiting_lock = threading.Lock()
+        self.waiting = 0
+
+    def __enter__(self):
+        with self._waiting_lock:
+            self.waiting += 1
+        try:
+            self._lock.acquire()
+        finally:
+            with self._waiting_lock:
+                self.waiting -= 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+
+# Held while a model is activated and used, so callers sharing a resident
+# base model can't switch its adapter in the middle of another's forward pass
+inference_lock = InferenceLock()
+
+# Past key/values of recent conversations, reused across turns
+kv_cache = ConversationKVCache()
+
+# CPU inference settings: {"threads": int | None, "models": {model_id: {"mode", "compile"}}}
+cpu_config = load_cpu_config()
+
+
+@ml_warm_up.on_ready
+def apply_cpu_threads():
+    """Apply the saved intra-op thread count; deferred until torch is needed"""
+    set_intra_op_threads(cpu_config.get("threads"))
+
+
+# Number of history messages sent with requests that don't reuse a KV cache
+HISTORY_WINDOW = 5
+MAX_PROMPT_TOKENS = 2048
+
 # Downloaded models directory
 MODELS_DIR = Path("./downloaded_models")
 # Fine-tuned models directory
 FINETUNED_MODELS_DIR = Path("./training_jobs")
 
+# Prometheus metrics
+model_cache_requests = REGISTRY.counter(
+    "playground_model_cache_requests_total", "Playground model loads served from cache or disk", ("result",)
+)
+queue_depth_gauge = REGISTRY.gauge(
+    "playground_queue_depth", "Playground requests waiting for the inference lock"
+)
+models_loaded_gauge = REGISTRY.gauge(
+    "playground_models_loaded", "Distinct model weight copies resident in memory"
+)
+model_bytes_gauge = REGISTRY.gauge(
+    "playground_model_bytes_resident", "Bytes of parameters and buffers of resident models"
+)
+kv_cache_bytes_gauge = REGISTRY.gauge(
+    "playground_kv_cache_bytes", "Bytes held by cached conversation key/values"
+)
+
+
+def _module_nbytes(model) -> int:
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+@REGISTRY.on_collect
+def collect_playground_metrics():
+    """Refresh playground gauges at scrape time"""
+    models = [model for model, _ in model_cache.values()] + [resident.model for resident in base_models.values()]
+    unique = {id(_unwrap_peft(model)): _unwrap_peft(model) for model in models}
+
+    queue_depth_gauge.set(inference_lock.waiting)
+    models_loaded_gauge.set(len(unique))
+    model_bytes_gauge.set(sum(_module_nbytes(model) for model in unique.values()))
+    kv_cache_bytes_gauge.set(kv_cache.total_bytes)
+
+
+
+def default_dtype():
+    """Weight dtype models are loaded with when no CPU mode is selected"""
+    return torch.float16 if torch.cuda.is_available() else torch.float32
+
+
+def _load_pretrained(model_path: str, dtype=None):
+    """Load a full causal LM and its tokenizer with the device settings used for inference"""
+    if dtype is None:
+        dtype = default_dtype()
+
+    tokenizer = transformers.AutoTokenizer.from_pretrained(model_path)
+    model, report = load_causal_lm(
+        model_path,
+        dtype=dtype,
+        device_map="auto" if torch.cuda.is_available() else None
+    )
+    load_reports[model_path] = report
+    return model, tokenizer
+
+
+def resident_key(base_model_id: str, dtype=None) -> str:
+    """Key of a resident base model; copies with a non-default dtype are kept separately"""
+    return base_model_id if dtype is None else f"{base_model_id}@{str(dtype).replace('torch.', '')}"
+
+
+def get_resident_base(base_model_id: str, dtype=None) -> ResidentModel:
+    """
+    Get the shared in-memory copy of a base model, loading it on first use
+
+    Copies loaded with a non-default dtype are kept separately from the
+    default one.
+    """
+    key = resident_key(base_model_id, dtype)
+    resident = base_models.get(key)
+    if resident is None:
+        model_path = resolve_base_model_path(base_model_id)
+        logger.info(f"Loading shared base model from: {model_path}")
+        model, tokenizer = _load_pretrained(model_path, dtype=dtype)
+        resident = ResidentModel(model=model, tokenizer=tokenizer)
+        base_models[key] = resident
+    return resident
+
+
+def get_model_cpu_config(model_type: str, model_id: str) -> Optional[Dict[str, Any]]:
+    """
+    CPU inference settings selected for a playground model, or None when
+    running on CUDA or when the model uses the default float32 path
+    """
+    if torch.cuda.is_available():
+        return None
+    prefix = "base:" if model_type == "base" else "ft:"
+    return cpu_config["models"].get(f"{prefix}{model_id}")
+
+
+def activate_adapter(resident: ResidentModel, adapter_name: Optional[str], adapter_path: Optional[Path] = None):
+    """
+    Switch the active LoRA adapter on a resident base model.
+
+    Adapters are loaded once and then switched in place, so changing between
+    fine-tuned models does not reload any base weights. Passing None as the
+    adapter name disables all adapters and serves the plain base model.
+    """
+    model = resident.model
+
+    if adapter_name is None:
+        if isinstance(model, peft.PeftModel):
+            model.base_model.disable_adapter_layers()
+        return model
+
+    if adapter_name not in resident.adapters:
+        logger.info(f"Attaching LoRA adapter '{adapter_name}' from: {adapter_path}")
+        if isinstance(model, peft.PeftModel):
+            model.load_adapter(str(adapter_path), adapter_name=adapter_name)
+        else:
+            model = peft.PeftModel.from_pretrained(model, str(adapter_path), adapter_name=adapter_name)
+            model.eval()
+            resident.model = model
+        resident.adapters.add(adapter_name)
+
+    model.base_model.enable_adapter_layers()
+    model.set_adapter(adapter_name)
+    return model
+
+
+def parse_model_id(model_id: str) -> Tuple[str, str]:
+    """
+    Split a playground model ID ("base:{model_id}" or "ft:{job_id}") into
+    the model type and the actual model ID
+    """
+    if model_id.startswith("base:"):
+        return "base", model_id[5:]  # Remove "base:" prefix
+    if model_id.startswith("ft:"):
+        return "fine-tuned", model_id[3:]  # Remove "ft:" prefix
+    raise HTTPException(status_code=400, detail="Invalid model_id format. Use 'base:' or 'ft:' prefix")
+
 
 def load_model(model_id: str, model_type: str):
     """
     Load model and tokenizer from cache or disk
+
+    Base models and LoRA fine-tunes share one resident copy of the base
+    weights; fine-tuned models only add their adapter on top of it. Jobs
+    exported with POST /api/jobs/{job_id}/export load their merged model
+    directly instead.
     """
     cache_key = f"{model_type}:{model_id}"
 
     # Check cache first
     if cache_key in model_cache:
         logger.info(f"Loading model from cache: {cache_key}")
+        model_cache_requests.inc(result="hit")
         return model_cache[cache_key]
 
+    apply_cpu_threads()
+
+    # int8 and compiled models can't share a base with hot-swapped adapters
+    model_cpu_config = get_model_cpu_config(model_type, model_id)
+    cpu_mode = model_cpu_config["mode"] if model_cpu_config else DEFAULT_CPU_MODE
+    cpu_compile = bool(model_cpu_config and model_cpu_config.get("compile"))
+    cpu_dtype = resolve_cpu_dtype(cpu_mode) if model_cpu_config else None
+    standalone = cpu_mode == "int8" or cpu_compile
+
     try:
         if model_type == "base":
             # For base models, load from downloaded_models directory
@@ -41,14 +285,15 @@ def load_model(model_id: str, model_type: str):
                     detail=f"Model not found. Please download the model first: {model_id}"
                 )
 
-            logger.info(f"Loading base model from: {model_path}")
-            tokenizer = AutoTokenizer.from_pretrained(str(model_path))
-            model = AutoModelForCausalLM.from_pretrained(
-                str(model_path),
-                dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-                device_map="auto" if torch.cuda.is_available() else None,
-                low_cpu_mem_usage=True
-            )
+            if standalone:
+                logger.info(f"Loading base model for CPU mode {cpu_mode} from: {model_path}")
+                model, tokenizer = _load_pretrained(str(model_path), dtype=cpu_dtype)
+            else:
+                cached = resident_key(model_id, cpu_dtype) in base_models
+                model_cache_requests.inc(result="hit" if cached else "miss")
+                resident = get_resident_base(model_id, dtype=cpu_dtype)
+                model = activate_adapter(resident, None)
+                return model, resident.tokenizer
 
         elif model_type == "fine-tuned":
             # For fine-tuned models, load from training_jobs/{job_id}/final_model
@@ -60,86 +305,254 @@ def load_model(model_id: str, model_type: str):
                     detail=f"Fine-tuned model not found: {model_id}. Model path: {model_path}"
                 )
 
-            logger.info(f"Loading fine-tuned model from: {model_path}")
+            merged_path = FINETUNED_MODELS_DIR / model_id / MERGED_MODEL_DIRNAME
+            export_info = load_export_info(merged_path)
+            adapter_config = load_json_file(model_path / ADAPTER_CONFIG_FILE, default={})
+            base_model_id = adapter_config.get("base_model_name_or_path")
 
-            # Load tokenizer and model from the fine-tuned model directory
-            tokenizer = AutoTokenizer.from_pretrained(str(model_path))
-            model = AutoModelForCausalLM.from_pretrained(
-                str(model_path),
-                dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-                device_map="auto" if torch.cuda.is_available() else None,
-                low_cpu_mem_usage=True
-            )
+            if export_info:
+                # Merged export - a standalone model with no PEFT indirection
+                logger.info(f"Loading merged fine-tuned model from: {merged_path}")
+                model, tokenizer = _load_pretrained(str(merged_path), dtype=cpu_dtype or export_info.get("dtype"))
+                if export_info.get("quantization") == "int8_dynamic" and not torch.cuda.is_available():
+                    cpu_mode = "int8"
+            elif base_model_id and standalone:
+                # Merge the adapter into a private copy of the base for this CPU mode
+                logger.info(f"Merging fine-tuned model for CPU mode {cpu_mode}: {model_path}")
+                model, tokenizer, _ = load_merged_model(model_path)
+                model = model.to(cpu_dtype)
+            elif base_model_id:
+                # LoRA adapter - attach it to the shared base model
+                resident = base_models.get(resident_key(base_model_id, cpu_dtype))
+                cached = resident is not None and model_id in resident.adapters
+                model_cache_requests.inc(result="hit" if cached else "miss")
+                resident = get_resident_base(base_model_id, dtype=cpu_dtype)
+                model = activate_adapter(resident, model_id, model_path)
+                return model, resident.tokenizer
+            else:
+                # Full model checkpoint without an adapter config
+                logger.info(f"Loading fine-tuned model from: {model_path}")
+                model, tokenizer = _load_pretrained(str(model_path), dtype=cpu_dtype)
         else:
             raise HTTPException(status_code=400, detail=f"Unknown model type: {model_type}")
 
+        if cpu_mode != DEFAULT_CPU_MODE or cpu_compile:
+            model = optimize_for_cpu(model, cpu_mode, compile=cpu_compile)
+            warm_up_time = warm_up(model, tokenizer)
+            logger.info(f"Warmed up {cache_key} in CPU mode {cpu_mode} ({warm_up_time:.2f}s)")
+
         # Cache the loaded model
         model_cache[cache_key] = (model, tokenizer)
+        model_cache_requests.inc(result="miss")
         logger.info(f"Model loaded and cached: {cache_key}")
 
         return model, tokenizer
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error loading model {cache_key}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to load model: {str(e)}")
 
 
-def generate_response(model, tokenizer, message: str, history: List[Dict] = None, max_new_tokens: int = 256) -> str:
+def build_prompt(tokenizer, message: str, history: List[Dict] = None, history_window: Optional[int] = HISTORY_WINDOW) -> str:
+    """
+    Build the chat-templated prompt for a new user message
+    """
+    # Build conversation context using proper chat format
+    messages = []
+
+    # Add history messages
+    if history:
+        recent_history = history[-history_window:] if history_window else history
+        for msg in recent_history:
+            role = msg.get("role")
+            content = msg.get("content")
+            if role and content:
+                messages.append({"role": role, "content": content})
+
+    # Add current user message
+    messages.append({"role": "user", "content": message})
+
+    # Use chat template if available, otherwise fall back to simple format
+    if hasattr(tokenizer, 'apply_chat_template') and tokenizer.chat_template is not None:
+        return tokenizer.apply_chat_template(
+            messages,
+            tokenize=False,
+            add_generation_prompt=True
+        )
+
+    # Fallback for models without chat template
+    conversation = []
+    for msg in messages:
+        conversation.append(f"{msg['role']}: {msg['content']}")
+    conversation.append("assistant:")
+    return "\n".join(conversation)
+
+
+def fit_prompt(tokenizer, message: str, history: List[Dict] = None, history_window: Optional[int] = HISTORY_WINDOW):
+    """
+    Tokenize the prompt for a new user message within MAX_PROMPT_TOKENS.
+
+    The oldest history messages are dropped until it fits, so the new message
+    and the generation prompt are always kept; a message too long on its own
+    loses its beginning instead. Each message is tokenized once and its share
+    of the prompt subtracted, rather than re-tokenizing the prompt per drop.
+
+    Returns:
+        The tokenized prompt and the number of history messages dropped
+    """
+    history = [msg for msg in history or [] if msg.get("role") and msg.get("content")]
+    if history_window:
+        history = history[-history_window:]
+
+    inputs = tokenizer(build_prompt(tokenizer, message, history, None), return_tensors="pt")
+    total = inputs["input_ids"].shape[1]
+    dropped = 0
+    if total > MAX_PROMPT_TOKENS and history:
+        bare = len(tokenizer(build_prompt(tokenizer, message, [], None))["input_ids"])
+        lengths = [len(ids) for ids in tokenizer([msg["content"] for msg in history], add_special_tokens=False)["input_ids"]]
+        # Role markers and separators, spread evenly over the messages
+        overhead = max(total - bare - sum(lengths), 0) / len(history)
+        while dropped < len(history):
+            estimate = total - sum(lengths[:dropped]) - overhead * dropped
+            if estimate <= MAX_PROMPT_TOKENS:
+                inputs = tokenizer(build_prompt(tokenizer, message, history[dropped:], None), return_tensors="pt")
+                if inputs["input_ids"].shape[1] <= MAX_PROMPT_TOKENS:
+                    break
+            dropped += 1
+        if dropped == len(history):
+            inputs = tokenizer(build_prompt(tokenizer, message, [], None), return_tensors="pt")
+
+    return {key: value[:, -MAX_PROMPT_TOKENS:] for key, value in inputs.items()}, dropped
+
+
+def clean_response(text: str) -> str:
+    """Strip reasoning blocks and leftover special tokens from a decoded reply and collapse whitespace"""
+    # Remove <think> and </think> tags
+    text = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
+
+    # Remove any other common special tokens
+    text = re.sub(r'<\|.*?\|>', '', text)
+
+    # Clean up extra whitespace
+    return ' '.join(text.split()).strip()
+
+
+def _unwrap_peft(model):
+    """The causal LM underneath a (possibly PEFT-wrapped) model"""
+    return model.get_base_model() if isinstance(model, peft.PeftModel) else model
+
+
+@contextmanager
+def count_forward_passes(model):
+    """Count forward passes of the causal LM underneath a (possibly PEFT-wrapped) model"""
+    counter = {"calls": 0}
+    module = _unwrap_peft(model)
+
+    def hook(*_):
+        counter["calls"] += 1
+
+    handle = module.register_forward_hook(hook)
+    try:
+        yield counter
+    finally:
+        handle.remove()
+
+
+def generate_response(
+    model,
+    tokenizer,
+    message: str,
+    history: List[Dict] = None,
+    generation: Optional[GenerationParams] = None,
+    conversation_id: Optional[str] = None,
+    model_key: Optional[str] = None,
+    draft_model=None,
+    draft_tokenizer=None,
+) -> Tuple[str, Dict[str, Any]]:
     """
     Generate response using the loaded model
+
+    When a conversation_id is given, the full history is kept in the prompt
+    (up to MAX_PROMPT_TOKENS, dropping the oldest messages beyond that) and
+    the past key/values of the previous turn are reused, so only the tokens
+    after the shared prefix are prefilled. Replies the client sends back in
+    their cleaned form are swapped for the decoded text they were generated
+    as, so the prompt re-tokenizes to the cached tokens.
+
+    When a draft model is given, it proposes tokens that the model verifies
+    in a single forward pass (assisted/speculative decoding). Draft
+    acceptance is estimated from the forward passes each model runs.
+
+    Returns:
+        The cleaned response text and generation stats
     """
+    generation = generation or GenerationParams()
+
     try:
-        # Build conversation context using proper chat format
-        messages = []
-
-        # Add history messages
-        if history:
-            for msg in history[-5:]:  # Use last 5 messages for context
-                role = msg.get("role")
-                content = msg.get("content")
-                if role and content:
-                    messages.append({"role": role, "content": content})
-
-        # Add current user message
-        messages.append({"role": "user", "content": message})
-
-        # Use chat template if available, otherwise fall back to simple format
-        if hasattr(tokenizer, 'apply_chat_template') and tokenizer.chat_template is not None:
-            prompt = tokenizer.apply_chat_template(
-                messages,
-                tokenize=False,
-                add_generation_prompt=True
-            )
-        else:
-            # Fallback for models without chat template
-            conversation = []
-            for msg in messages:
-                conversation.append(f"{msg['role']}: {msg['content']}")
-            conversation.append("assistant:")
-            prompt = "\n".join(conversation)
+        # Assisted generation manages its own caches, so KV reuse is skipped with a draft model
+        reuse_cache = conversation_id is not None and draft_model is None
+        raw_responses: Dict[str, str] = {}
+        if reuse_cache:
+            # The client sends back cleaned replies; the cache holds the tokens of the raw ones
+            replies = {msg.get("content") for msg in history or [] if msg.get("role") == "assistant"}
+            raw_responses = {
+                cleaned: raw for cleaned, raw in kv_cache.raw_responses(conversation_id, model_key).items()
+                if cleaned in replies
+            }
+            history = [
+                {**msg, "content": raw_responses[msg["content"]]}
+                if msg.get("role") == "assistant" and msg.get("content") in raw_responses else msg
+                for msg in history or []
+            ]
 
-        # Tokenize input
-        inputs = tokenizer(prompt, return_tensors="pt", truncation=True, max_length=2048)
+        history_window = None if conversation_id else HISTORY_WINDOW
+        inputs, dropped_messages = fit_prompt(tokenizer, message, history, history_window)
 
         # Move to same device as model
         if hasattr(model, 'device'):
             inputs = {k: v.to(model.device) for k, v in inputs.items()}
 
-        # Generate response
-        with torch.no_grad():
-            outputs = model.generate(
-                **inputs,
-                max_new_tokens=max_new_tokens,
-                do_sample=True,
-                temperature=0.7,
-                top_p=0.9,
-                top_k=50,
-                repetition_penalty=1.2,
-                no_repeat_ngram_size=3,
-                pad_token_id=tokenizer.eos_token_id,
-                eos_token_id=tokenizer.eos_token_id
+        generate_kwargs = {
+            "max_new_tokens": generation.max_new_tokens,
+            "do_sample": generation.do_sample,
+            "repetition_penalty": generation.repetition_penalty,
+            "no_repeat_ngram_size": generation.no_repeat_ngram_size,
+            "pad_token_id": tokenizer.eos_token_id,
+            "eos_token_id": tokenizer.eos_token_id,
+        }
+        if generation.do_sample:
+            generate_kwargs.update(
+                temperature=generation.temperature,
+                top_p=generation.top_p,
+                top_k=generation.top_k,
             )
 
+        input_ids = inputs['input_ids'][0].tolist()
+        past_key_values, reused_tokens = None, 0
+        if reuse_cache:
+            past_key_values, reused_tokens = kv_cache.checkout(conversation_id, model_key, input_ids)
+            if past_key_values is None:
+                past_key_values = transformers.DynamicCache()
+            generate_kwargs["past_key_values"] = past_key_values
+
+        if draft_model is not None:
+            generate_kwargs["assistant_model"] = draft_model
+            # Drafts from a different vocabulary need both tokenizers (universal assisted decoding)
+            if draft_tokenizer is not None and draft_tokenizer.get_vocab() != tokenizer.get_vocab():
+                generate_kwargs.update(tokenizer=tokenizer, assistant_tokenizer=draft_tokenizer)
+
+        # Generate response
+        start_time = time.perf_counter()
+        with torch.no_grad(), count_forward_passes(model) as target_passes:
+            if draft_model is not None:
+                with count_forward_passes(draft_model) as draft_passes:
+                    outputs = model.generate(**inputs, **generate_kwargs)
+            else:
+                outputs = model.generate(**inputs, **generate_kwargs)
+        generation_time = time.perf_counter() - start_time
+
         # Decode only the newly generated tokens
         # Get the input length to extract only new tokens
         input_length = inputs['input_ids'].shape[1]
@@ -151,29 +564,84 @@ def generate_response(model, tokenizer, message: str, history: List[Dict] = None
         logger.info(f"[Playground] Raw response: {response_text[:200]}...")
 
         # Clean up special tokens that might not be in skip_special_tokens
-        # Remove <think> and </think> tags
-        import re
-        response_text = re.sub(r'<think>.*?</think>', '', response_text, flags=re.DOTALL)
-
-        # Remove any other common special tokens
-        response_text = re.sub(r'<\|.*?\|>', '', response_text)
+        raw_text = response_text
+        response_text = clean_response(raw_text)
 
-        # Clean up extra whitespace
-        response_text = ' '.join(response_text.split())
-        response_text = response_text.strip()
+        if past_key_values is not None:
+            # Remembered so the next turn's prompt re-tokenizes to the cached tokens
+            raw_responses[response_text] = raw_text
+            kv_cache.store(conversation_id, model_key, outputs[0].tolist(), past_key_values, raw_responses)
 
         logger.info(f"[Playground] Cleaned response length: {len(response_text)}")
         logger.info(f"[Playground] Cleaned response: {response_text[:200]}...")
 
-        return response_text
+        stats = {
+            "prompt_tokens": input_length,
+            "reused_prompt_tokens": reused_tokens,
+            "dropped_history_messages": dropped_messages,
+            "generated_tokens": len(generated_tokens),
+            "generation_time": round(generation_time, 4),
+            "tokens_per_second": round(len(generated_tokens) / generation_time, 2) if generation_time > 0 else None,
+            "target_forward_passes": target_passes["calls"],
+        }
+
+        if draft_model is not None:
+            # Every verification pass yields one token from the target model plus the accepted drafts
+            accepted = max(len(generated_tokens) - target_passes["calls"], 0)
+            stats["speculative"] = {
+                "draft_tokens_proposed": draft_passes["calls"],
+                "draft_tokens_accepted": accepted,
+                "acceptance_rate": round(accepted / draft_passes["calls"], 4) if draft_passes["calls"] else 0.0,
+                "estimated_speedup": round(len(generated_tokens) / target_passes["calls"], 2) if target_passes["calls"] else None,
+            }
+
+        return response_text, stats
 
     except Exception as e:
         logger.error(f"Error generating response: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate response: {str(e)}")
 
 
+def run_chat(request: ChatRequest, model_type: str, actual_model_id: str) -> Tuple[str, Dict[str, Any]]:
+    """Load the chat and draft models and generate a reply; runs in a worker thread"""
+    with inference_lock:
+        # Load the draft model first: if it shares a resident base with the
+        # target, loading the target afterwards leaves the target's adapter active
+        draft_model, draft_tokenizer = None, None
+        if request.draft_model_id:
+            draft_type, draft_actual_id = parse_model_id(request.draft_model_id)
+            draft_model, draft_tokenizer = load_model(draft_actual_id, draft_type)
+
+        # Load model and tokenizer
+        logger.info(f"[Playground] Loading model...")
+        model, tokenizer = load_model(actual_model_id, model_type)
+        logger.info(f"[Playground] Model loaded successfully")
+
+        if draft_model is not None and _unwrap_peft(draft_model) is _unwrap_peft(model):
+            raise HTTPException(
+                status_code=400,
+                detail="Draft model shares weights with the target model; choose a separately loaded, smaller model"
+            )
+
+        # Generate response
+        logger.info(f"[Playground] Generating response...")
+        response_text, stats = generate_response(
+            model,
+            tokenizer,
+            request.message,
+            request.history,
+            generation=request,
+            conversation_id=request.conversation_id,
+            model_key=request.model_id,
+            draft_model=draft_model,
+            draft_tokenizer=draft_tokenizer
+        )
+
+    return response_text, stats
+
+
 @router.post("/chat")
-async def chat_with_model(request: Dict[str, Any]):
+async def chat_with_model(request: ChatRequest):
     """
     Chat with a model (base or fine-tuned)
 
@@ -183,42 +651,23 @@ async def chat_with_model(request: Dict[str, Any]):
                         "ft:{job_id}" for fine-tuned models
     - message: User's message
     - history: Previous conversation history (list of messages)
+    - conversation_id: Optional ID to reuse the KV cache across turns
+    - draft_model_id: Optional smaller model for speculative decoding
+    - max_new_tokens, do_sample, temperature, top_p, top_k,
+      repetition_penalty, no_repeat_ngram_size: Generation parameters
     """
-    model_id = request.get("model_id")
-    message = request.get("message")
-    history = request.get("history", [])
-
-    logger.info(f"[Playground] Chat request received - model_id: {model_id}, message length: {len(message) if message else 0}")
+    model_id = request.model_id
 
-    if not model_id:
-        raise HTTPException(status_code=400, detail="model_id is required")
-
-    if not message:
-        raise HTTPException(status_code=400, detail="message is required")
+    logger.info(f"[Playground] Chat request received - model_id: {model_id}, message length: {len(request.message)}")
 
     # Parse model type and ID
-    model_type = "unknown"
-    actual_model_id = model_id
-
-    if model_id.startswith("base:"):
-        model_type = "base"
-        actual_model_id = model_id[5:]  # Remove "base:" prefix
-    elif model_id.startswith("ft:"):
-        model_type = "fine-tuned"
-        actual_model_id = model_id[3:]  # Remove "ft:" prefix
-    else:
-        raise HTTPException(status_code=400, detail="Invalid model_id format. Use 'base:' or 'ft:' prefix")
+    model_type, actual_model_id = parse_model_id(model_id)
 
     logger.info(f"[Playground] Parsed - type: {model_type}, actual_model_id: {actual_model_id}")
 
-    # Load model and tokenizer
-    logger.info(f"[Playground] Loading model...")
-    model, tokenizer = load_model(actual_model_id, model_type)
-    logger.info(f"[Playground] Model loaded successfully")
+    loop = asyncio.get_event_loop()
+    response_text, stats = await loop.run_in_executor(None, run_chat, request, model_type, actual_model_id)
 
-    # Generate response
-    logger.info(f"[Playground] Generating response...")
-    response_text = generate_response(model, tokenizer, message, history)
     logger.info(f"[Playground] Response generated: {len(response_text)} characters")
 
     return {
@@ -226,6 +675,96 @@ async def chat_with_model(request: Dict[str, Any]):
         "response": response_text,
         "model_id": model_id,
         "model_type": model_type,
+        "conversation_id": request.conversation_id,
+        "draft_model_id": request.draft_model_id,
+        "stats": stats,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+def compare_models(request: CompareRequest) -> Dict[str, Any]:
+    """
+    Run every prompt against every model, one model at a time.
+
+    Each model is loaded once and answers all prompts before the next one
+    is loaded, so fine-tunes of the same base take turns as adapters on one
+    resident copy instead of each loading its own.
+    """
+    models = []
+    weights = {}
+
+    for model_id in request.model_ids:
+        model_type, actual_model_id = parse_model_id(model_id)
+
+        with inference_lock:
+            start_time = time.perf_counter()
+            model, tokenizer = load_model(actual_model_id, model_type)
+            load_time = time.perf_counter() - start_time
+
+            outputs = []
+            for prompt in request.prompts:
+                response_text, stats = generate_response(model, tokenizer, prompt, generation=request)
+                outputs.append({"response": response_text, "stats": stats})
+
+        generated_tokens = sum(output["stats"]["generated_tokens"] for output in outputs)
+        generation_time = sum(output["stats"]["generation_time"] for output in outputs)
+        weights.setdefault(id(_unwrap_peft(model)), []).append(model_id)
+
+        models.append({
+            "model_id": model_id,
+            "model_type": model_type,
+            "load_time": round(load_time, 4),
+            "generated_tokens": generated_tokens,
+            "generation_time": round(generation_time, 4),
+            "mean_latency": round(generation_time / len(outputs), 4),
+            "tokens_per_second": round(generated_tokens / generation_time, 2) if generation_time > 0 else None,
+            "outputs": outputs
+        })
+
+    # Models that ran on the same resident weights
+    for model in models:
+        model["shares_weights_with"] = next(
+            [other for other in group if other != model["model_id"]]
+            for group in weights.values() if model["model_id"] in group
+        )
+
+    results = [
+        {
+            "prompt": prompt,
+            "responses": {model["model_id"]: model["outputs"][i]["response"] for model in models}
+        }
+        for i, prompt in enumerate(request.prompts)
+    ]
+
+    return {
+        "models": models,
+        "results": results,
+        "resident_weight_copies": len(weights)
+    }
+
+
+@router.post("/compare")
+async def compare_playground_models(request: CompareRequest):
+    """
+    Run the same prompt list against several models side by side
+
+    Request body:
+    - model_ids: Models to compare ("base:{model_id}" or "ft:{job_id}")
+    - prompts: Prompts sent to every model
+    - max_new_tokens, do_sample, temperature, top_p, top_k,
+      repetition_penalty, no_repeat_ngram_size: Generation parameters
+
+    Responses are aligned by prompt in "results"; per-model latency and
+    tokens/second are in "models".
+    """
+    logger.info(f"[Playground] Compare request - {len(request.model_ids)} models, {len(request.prompts)} prompts")
+
+    loop = asyncio.get_event_loop()
+    comparison = await loop.run_in_executor(None, compare_models, request)
+
+    return {
+        "status": "success",
+        **comparison,
         "timestamp": datetime.now().isoformat()
     }
 
@@ -243,3 +782,264 @@ async def list_available_models():
         "models": [],
         "message": "Use /api/jobs endpoint to get completed models"
     }
+
+
+@router.delete("/conversations/{conversation_id}")
+async def clear_conversation_cache(conversation_id: str):
+    """
+    Drop the cached key/values of a conversation
+    """
+    if not kv_cache.drop(conversation_id):
+        raise HTTPException(status_code=404, detail=f"Conversation not cached: {conversation_id}")
+
+    return {
+        "status": "success",
+        "message": f"Cache cleared for conversation {conversation_id}",
+        "conversation_id": conversation_id
+    }
+
+
+@router.get("/loaded")
+async def list_loaded_models():
+    """
+    List base models resident in memory and the LoRA adapters attached to each
+    """
+    loaded = []
+    for base_model_id, resident in base_models.items():
+        loaded.append({
+            "base_model": base_model_id,
+            "adapters": sorted(resident.adapters),
+            "active_adapter": resident.model.active_adapter if isinstance(resident.model, peft.PeftModel) else None
+        })
+
+    return {
+        "models": loaded,
+        "total": len(loaded),
+        "load_reports": list(load_reports.values())
+    }
+
+
+def detach_adapter(job_id: str) -> bool:
+    """Delete a fine-tuned adapter from its resident base model; runs in a worker thread"""
+    # The base model may be generating for another request
+    with inference_lock:
+        for resident in base_models.values():
+            if job_id in resident.adapters:
+                resident.model.base_model.delete_adapter(job_id)
+                resident.adapters.discard(job_id)
+                return True
+    return False
+
+
+@router.delete("/adapters/{job_id}")
+async def unload_adapter(job_id: str):
+    """
+    Detach a fine-tuned LoRA adapter from its resident base model
+    """
+    loop = asyncio.get_event_loop()
+    if not await loop.run_in_executor(None, detach_adapter, job_id):
+        raise HTTPException(status_code=404, detail=f"Adapter not loaded: {job_id}")
+
+    return {
+        "status": "success",
+        "message": f"Adapter {job_id} unloaded",
+        "job_id": job_id
+    }
+
+
+def _load_for_benchmark(model_type: str, model_id: str, mode: str, compile: bool = False):
+    """Load a private, CPU-optimized copy of a playground model"""
+    dtype = resolve_cpu_dtype(mode)
+
+    if model_type == "base":
+        model_path = MODELS_DIR / model_id.replace("/", "_")
+        model, tokenizer = _load_pretrained(str(model_path), dtype=dtype)
+    else:
+        model_path = FINETUNED_MODELS_DIR / model_id / "final_model"
+        if (model_path / ADAPTER_CONFIG_FILE).exists():
+            model, tokenizer, _ = load_merged_model(model_path)
+            model = model.to(dtype)
+        else:
+            model, tokenizer = _load_pretrained(str(model_path), dtype=dtype)
+
+    return optimize_for_cpu(model, mode, compile=compile), tokenizer
+
+
+def base_resident_key(base_model_id: str) -> Optional[str]:
+    """Key of the resident copy a base model is served from under its CPU config, or None if it's loaded standalone"""
+    model_cpu_config = get_model_cpu_config("base", base_model_id)
+    if not model_cpu_config:
+        return resident_key(base_model_id)
+    if model_cpu_config["mode"] == "int8" or model_cpu_config.get("compile"):
+        return None
+    return resident_key(base_model_id, resolve_cpu_dtype(model_cpu_config["mode"]))
+
+
+def evict_model(model_id: str):
+    """
+    Drop cached copies of a playground model so its next load applies new
+    settings; runs in a worker thread.
+
+    A fine-tune's adapter is detached from its resident base. Resident bases
+    left serving nothing - no adapters, and not the copy the base model
+    itself is served from - are unloaded with it.
+    """
+    model_type, actual_model_id = parse_model_id(model_id)
+    # The cached models may be generating for another request
+    with inference_lock:
+        model_cache.pop(f"{model_type}:{actual_model_id}", None)
+        kv_cache.drop_model(model_id)
+
+        if model_type == "base":
+            # The base model's settings are about to change, so none of its copies stays in use by it
+            stale = [
+                key for key, resident in base_models.items()
+                if key.split("@")[0] == actual_model_id and not resident.adapters
+            ]
+        else:
+            stale = []
+            for key, resident in base_models.items():
+                if actual_model_id not in resident.adapters:
+                    continue
+                if resident.adapters == {actual_model_id} and key != base_resident_key(key.split("@")[0]):
+                    stale.append(key)
+                else:
+                    resident.model.base_model.delete_adapter(actual_model_id)
+                    resident.adapters.discard(actual_model_id)
+
+        for key in stale:
+            logger.info(f"Unloading resident base model: {key}")
+            del base_models[key]
+
+
+def convert_base_model(model_id: str) -> Dict[str, Any]:
+    """Convert a downloaded base model to the dtype the playground loads it with"""
+    model_path = MODELS_DIR / model_id.replace("/", "_")
+    if not model_path.exists():
+        raise HTTPException(status_code=404, detail=f"Model not found. Please download the model first: {model_id}")
+    if torch.cuda.is_available():
+        raise HTTPException(status_code=400, detail="Weights are copied to the GPU on load; conversion only speeds up CPU loads")
+
+    model_cpu_config = get_model_cpu_config("base", model_id)
+    dtype = resolve_cpu_dtype(model_cpu_config["mode"]) if model_cpu_config else default_dtype()
+    if not needs_conversion(model_path, dtype):
+        return {"model_id": model_id, "status": "not_needed", "dtype": str(dtype).replace("torch.", "")}
+
+    status = "already_converted" if is_converted(model_path, dtype) else "converted"
+    record = convert_model(model_path, dtype)
+    return {"model_id": model_id, "status": status, **{key: value for key, value in record.items() if key != "source"}}
+
+
+@router.post("/convert/{model_id:path}")
+async def convert_model_for_loading(model_id: str):
+    """
+    Convert a downloaded base model once to its load dtype, so later loads map its weights without copying
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, convert_base_model, model_id)
+
+
+def read_cpu_support() -> Dict[str, Any]:
+    """What this machine supports for inference; imports torch if it isn't yet"""
+    return {
+        "cuda_available": torch.cuda.is_available(),
+        "bf16_supported": cpu_supports_bf16(),
+        # torch's thread count is per thread once set; the saved value is what inference uses
+        "threads": cpu_config.get("threads") or torch.get_num_threads(),
+    }
+
+
+@router.get("/cpu-config")
+async def get_cpu_config():
+    """
+    Get CPU inference settings and what this machine supports
+    """
+    # Before the warm-up finishes this imports torch, which takes seconds
+    loop = asyncio.get_event_loop()
+    support = await loop.run_in_executor(None, read_cpu_support)
+    return {
+        **support,
+        "models": cpu_config["models"]
+    }
+
+
+@router.put("/cpu-config")
+async def update_cpu_threads(request: CpuThreadsConfig):
+    """
+    Set the number of intra-op threads used for CPU inference
+    """
+    loop = asyncio.get_event_loop()
+    cpu_config["threads"] = await loop.run_in_executor(None, set_intra_op_threads, request.threads)
+    save_cpu_config(cpu_config)
+
+    return {
+        "status": "success",
+        "threads": cpu_config["threads"]
+    }
+
+
+@router.put("/cpu-config/{model_id:path}")
+async def update_model_cpu_config(model_id: str, request: CpuInferenceConfig):
+    """
+    Select the CPU inference mode for a model (base: or ft: prefix)
+    """
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, evict_model, model_id)
+    cpu_config["models"][model_id] = request.model_dump()
+    save_cpu_config(cpu_config)
+
+    return {
+        "status": "success",
+        "model_id": model_id,
+        **cpu_config["models"][model_id]
+    }
+
+
+@router.delete("/cpu-config/{model_id:path}")
+async def reset_model_cpu_config(model_id: str):
+    """
+    Return a model to the default float32 CPU path
+    """
+    if model_id not in cpu_config["models"]:
+        raise HTTPException(status_code=404, detail=f"No CPU config for model: {model_id}")
+
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, evict_model, model_id)
+    del cpu_config["models"][model_id]
+    save_cpu_config(cpu_config)
+
+    return {
+        "status": "success",
+        "message": f"CPU config reset for {model_id}",
+        "model_id": model_id
+    }
+
+
+@router.post("/cpu-benchmark")
+async def benchmark_cpu_inference(request: CpuBenchmarkRequest):
+    """
+    Benchmark CPU inference modes of a model for tokens/second and resident memory
+
+    Each mode is loaded as a private copy, so the benchmark doesn't disturb
+    models already serving the playground.
+    """
+    model_type, actual_model_id = parse_model_id(request.model_id)
+
+    def load_fn(mode):
+        return _load_for_benchmark(model_type, actual_model_id, mode, compile=request.compile)
+
+    try:
+        loop = asyncio.get_event_loop()
+        results = await loop.run_in_executor(
+            None, benchmark_cpu_modes, load_fn, request.modes, request.prompt, request.max_new_tokens
+        )
+    except Exception as e:
+        logger.error(f"Error benchmarking {request.model_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to benchmark model: {str(e)}")
+
+    return {
+        "model_id": request.model_id,
+        "threads": torch.get_num_threads(),
+        "bf16_supported": cpu_supports_bf16(),
+        "results": results
+    }
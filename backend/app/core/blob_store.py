@@ -0,0 +1,252 @@
+"""
+Content-addressed storage for downloaded model files
+
+Every distinct file is stored once under .blobs/sha256/, named by its
+sha256, and materialized into model directories as a reflink (copy-on-write
+clone) or hard link, falling back to a copy on filesystems that support
+neither. A manifest per model records which blob backs each of its files;
+a blob is deleted when the last manifest referencing it is released.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.core.storage import load_json_file, save_json_file
+
+logger = logging.getLogger(__name__)
+
+# Store directory inside the models directory; hidden so it isn't listed as a model
+BLOBS_DIRNAME = ".blobs"
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Linux FICLONE ioctl: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+# Adds, links and garbage collection of all stores are serialized, so a blob
+# can't be collected between being found and being recorded in a manifest
+_lock = threading.RLock()
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _reflink(source: Path, destination: Path) -> bool:
+    """Clone source as a copy-on-write file (APFS, Btrfs, XFS); False if unsupported"""
+    if sys.platform == "darwin":
+        import ctypes
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        clonefile = getattr(libc, "clonefile", None)
+        return clonefile is not None and clonefile(os.fsencode(source), os.fsencode(destination), 0) == 0
+
+    if sys.platform.startswith("linux"):
+        import fcntl
+
+        try:
+            with open(source, "rb") as src, open(destination, "wb") as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return True
+        except OSError:
+            destination.unlink(missing_ok=True)
+    return False
+
+
+def link_file(source: Path, destination: Path) -> str:
+    """
+    Make destination a reflink or hard link of source, or a copy as a last resort.
+
+    Returns:
+        "reflink", "hardlink" or "copy"
+    """
+    if _reflink(source, destination):
+        return "reflink"
+    try:
+        os.link(source, destination)
+        return "hardlink"
+    except OSError as e:
+        # Cross-device links, FAT/exFAT volumes, link count limits
+        logger.debug(f"Hard link {source} -> {destination} failed: {e}")
+    shutil.copyfile(source, destination)
+    return "copy"
+
+
+class BlobStore:
+    """
+    Blobs and per-model manifests under one root directory.
+
+    Manifests are keyed by the model's folder name in the models directory
+    and map each file's path to {"sha256", "size", "blob_id", "link"}.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.blobs_dir = root / "sha256"
+        self.manifests_dir = root / "manifests"
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blobs_dir / digest[:2] / digest
+
+    def has(self, digest: str) -> bool:
+        return self.blob_path(digest).exists()
+
+    def manifest_path(self, model: str) -> Path:
+        return self.manifests_dir / f"{model}.json"
+
+    def load_manifest(self, model: str) -> Optional[Dict[str, Any]]:
+        return load_json_file(self.manifest_path(model), default={}) or None
+
+    def manifests(self) -> Dict[str, Dict[str, Any]]:
+        if not self.manifests_dir.exists():
+            return {}
+        return {
+            path.stem: load_json_file(path, default={"files": {}})
+            for path in sorted(self.manifests_dir.glob("*.json"))
+        }
+
+    def begin(self, model: str, model_id: str, revision: str) -> None:
+        """Create or update a model's manifest before its files are added"""
+        with _lock:
+            manifest = self.load_manifest(model) or {"files": {}, "created_at": time.time()}
+            manifest.update({"model_id": model_id, "revision": revision, "updated_at": time.time()})
+            save_json_file(self.manifest_path(model), manifest)
+
+    def find_blob_id(self, blob_id: str) -> Optional[str]:
+        """sha256 of a stored file with this git blob ID, for files the Hub publishes no sha256 for"""
+        for manifest in self.manifests().values():
+            for entry in manifest.get("files", {}).values():
+                if entry.get("blob_id") == blob_id and self.has(entry["sha256"]):
+                    return entry["sha256"]
+        return None
+
+    def add(
+        self,
+        model: str,
+        path: str,
+        source: Path,
+        destination: Path,
+        sha256: Optional[str] = None,
+        blob_id: Optional[str] = None,
+    ) -> str:
+        """
+        Move a verified file into the store and materialize it at destination.
+
+        If an identical blob is already stored, source is dropped and the
+        existing blob is linked instead.
+
+        Returns:
+            The file's sha256
+        """
+        digest = sha256 or file_sha256(source)
+        with _lock:
+            blob = self.blob_path(digest)
+            if blob.exists():
+                source.unlink()
+            else:
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(source, blob)
+            self._materialize(model, path, digest, destination, blob_id)
+        return digest
+
+    def link(self, model: str, path: str, digest: str, destination: Path, blob_id: Optional[str] = None) -> bool:
+        """Materialize an already stored blob at destination; False if it isn't stored"""
+        with _lock:
+            if not self.has(digest):
+                return False
+            self._materialize(model, path, digest, destination, blob_id)
+        return True
+
+    def _materialize(self, model: str, path: str, digest: str, destination: Path, blob_id: Optional[str]) -> None:
+        blob = self.blob_path(digest)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        # Link next to the destination and swap it in, so a failure leaves the old file
+        temp = destination.with_name(destination.name + ".link")
+        temp.unlink(missing_ok=True)
+        method = link_file(blob, temp)
+        os.replace(temp, destination)
+
+        manifest = self.load_manifest(model) or {"files": {}, "created_at": time.time()}
+        manifest["files"][path] = {
+            "sha256": digest,
+            "size": blob.stat().st_size,
+            "blob_id": blob_id,
+            "link": method,
+        }
+        manifest["updated_at"] = time.time()
+        save_json_file(self.manifest_path(model), manifest)
+
+    def discard(self, digest: str) -> None:
+        """Delete a blob found to be corrupt, so the next add stores a good copy"""
+        with _lock:
+            self.blob_path(digest).unlink(missing_ok=True)
+
+    def release(self, model: str) -> Dict[str, int]:
+        """
+        Drop a model's manifest and delete the blobs no other model references.
+
+        Returns:
+            {"blobs_removed", "bytes_freed"}
+        """
+        with _lock:
+            self.manifest_path(model).unlink(missing_ok=True)
+            return self.collect_garbage()
+
+    def collect_garbage(self) -> Dict[str, int]:
+        """Delete blobs that no manifest references"""
+        removed = freed = 0
+        with _lock:
+            if not self.blobs_dir.exists():
+                return {"blobs_removed": 0, "bytes_freed": 0}
+            referenced = {
+                entry["sha256"]
+                for manifest in self.manifests().values()
+                for entry in manifest.get("files", {}).values()
+            }
+            for blob in self.blobs_dir.glob("*/*"):
+                if blob.name not in referenced:
+                    freed += blob.stat().st_size
+                    blob.unlink()
+                    removed += 1
+        if removed:
+            logger.info(f"Removed {removed} unreferenced blobs ({freed} bytes)")
+        return {"blobs_removed": removed, "bytes_freed": freed}
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Storage used by the store against the size of the model files it backs.
+
+        bytes_saved is the size of all model files less the space they take:
+        the blobs plus any files that had to be copied.
+        """
+        manifests = self.manifests()
+        references: Counter = Counter()
+        logical_bytes = copied_bytes = 0
+        for manifest in manifests.values():
+            for entry in manifest.get("files", {}).values():
+                references[entry["sha256"]] += 1
+                logical_bytes += entry["size"]
+                if entry.get("link") == "copy":
+                    copied_bytes += entry["size"]
+
+        blobs = list(self.blobs_dir.glob("*/*")) if self.blobs_dir.exists() else []
+        stored_bytes = sum(blob.stat().st_size for blob in blobs)
+        return {
+            "models": len(manifests),
+            "blobs": len(blobs),
+            "shared_blobs": sum(1 for count in references.values() if count > 1),
+            "stored_bytes": stored_bytes,
+            "logical_bytes": logical_bytes,
+            "bytes_saved": logical_bytes - stored_bytes - copied_bytes,
+        }
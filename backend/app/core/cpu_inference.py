@@ -0,0 +1,189 @@
+"""
+CPU-optimized inference settings for the playground
+"""
+import gc
+import logging
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+import psutil
+
+from app.core.lazy_imports import LazyModule
+from app.core.storage import load_json_file, save_json_file
+
+torch = LazyModule("torch")
+
+logger = logging.getLogger(__name__)
+
+CPU_CONFIG_FILE = Path("./cpu_inference_config.json")
+
+CPU_MODES = ("float32", "bfloat16", "int8")
+DEFAULT_CPU_MODE = "float32"
+
+WARM_UP_PROMPT = "Hello"
+
+
+def cpu_supports_bf16() -> bool:
+    """Check whether this CPU has native bfloat16 kernels (AVX512-BF16 / AMX)"""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
+
+
+def resolve_cpu_dtype(mode: str) -> "torch.dtype":
+    """
+    Weight dtype to load a model with for a CPU mode.
+
+    bfloat16 falls back to float32 on CPUs without native support, where it
+    would be emulated and slower than float32. int8 dynamic quantization
+    starts from float32 weights.
+    """
+    if mode == "bfloat16" and cpu_supports_bf16():
+        return torch.bfloat16
+    return torch.float32
+
+
+def quantize_int8_dynamic(model):
+    """Apply int8 dynamic quantization to the linear layers of a CPU model"""
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def optimize_for_cpu(model, mode: str = DEFAULT_CPU_MODE, compile: bool = False):
+    """
+    Apply a CPU inference mode to a loaded model.
+
+    The weight dtype is chosen at load time with resolve_cpu_dtype; this
+    applies the transformations that happen after loading.
+    """
+    if mode == "int8":
+        model = quantize_int8_dynamic(model)
+    if compile:
+        model.forward = _compile_forward(model)
+    return model
+
+
+def _compile_forward(model):
+    """
+    torch.compile a model's forward pass, reverting to eager mode for good
+    if compilation fails (e.g. no working C++ toolchain for inductor)
+    """
+    eager_forward = model.forward
+    compiled_forward = torch.compile(eager_forward, dynamic=True)
+
+    def forward(*args, **kwargs):
+        try:
+            return compiled_forward(*args, **kwargs)
+        except Exception as e:
+            logger.warning(f"torch.compile failed, falling back to eager mode: {e}")
+            model.forward = eager_forward
+            return eager_forward(*args, **kwargs)
+
+    return forward
+
+
+def warm_up(model, tokenizer, max_new_tokens: int = 2) -> float:
+    """
+    Run a short generation so compilation and first-call allocations happen
+    before the first user request. Returns the warm-up time in seconds.
+    """
+    start_time = time.perf_counter()
+    inputs = tokenizer(WARM_UP_PROMPT, return_tensors="pt")
+    with torch.no_grad():
+        model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=tokenizer.eos_token_id
+        )
+    return time.perf_counter() - start_time
+
+
+def set_intra_op_threads(threads: Optional[int]) -> int:
+    """Set the number of intra-op threads used by torch; None keeps the current value"""
+    if threads:
+        torch.set_num_threads(threads)
+    return torch.get_num_threads()
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process"""
+    return psutil.Process().memory_info().rss
+
+
+def benchmark_generation(model, tokenizer, prompt: str, max_new_tokens: int = 32) -> Dict[str, Any]:
+    """
+    Time a greedy generation and report tokens per second.
+    """
+    inputs = tokenizer(prompt, return_tensors="pt")
+    input_length = inputs["input_ids"].shape[1]
+
+    start_time = time.perf_counter()
+    with torch.no_grad():
+        outputs = model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            min_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=tokenizer.eos_token_id
+        )
+    elapsed = time.perf_counter() - start_time
+
+    generated = outputs.shape[1] - input_length
+    return {
+        "generated_tokens": generated,
+        "generation_time": round(elapsed, 4),
+        "tokens_per_second": round(generated / elapsed, 2) if elapsed > 0 else None,
+    }
+
+
+def benchmark_cpu_modes(load_fn, modes, prompt: str, max_new_tokens: int = 32) -> Dict[str, Dict[str, Any]]:
+    """
+    Benchmark a model in several CPU modes against each other.
+
+    load_fn(mode) must return a freshly loaded, optimized (model, tokenizer)
+    pair. Each mode is loaded, warmed up, timed and released before the next
+    one, and memory is reported as the RSS growth caused by loading it.
+    """
+    results = {}
+    for mode in modes:
+        gc.collect()
+        rss_before = current_rss_bytes()
+
+        start_time = time.perf_counter()
+        model, tokenizer = load_fn(mode)
+        load_time = time.perf_counter() - start_time
+
+        warm_up_time = warm_up(model, tokenizer)
+        stats = benchmark_generation(model, tokenizer, prompt, max_new_tokens)
+        rss_after = current_rss_bytes()
+
+        results[mode] = {
+            **stats,
+            "dtype": str(resolve_cpu_dtype(mode)).replace("torch.", ""),
+            "load_time": round(load_time, 4),
+            "warm_up_time": round(warm_up_time, 4),
+            "resident_memory_mb": round(max(rss_after - rss_before, 0) / (1024 * 1024), 2),
+        }
+
+        del model, tokenizer
+        gc.collect()
+
+    baseline = results.get(DEFAULT_CPU_MODE, {}).get("tokens_per_second")
+    if baseline:
+        for result in results.values():
+            if result["tokens_per_second"]:
+                result["speedup_vs_float32"] = round(result["tokens_per_second"] / baseline, 2)
+
+    return results
+
+
+def load_cpu_config() -> Dict[str, Any]:
+    """Load the saved CPU inference settings"""
+    return load_json_file(CPU_CONFIG_FILE, default={"threads": None, "models": {}})
+
+
+def save_cpu_config(config: Dict[str, Any]) -> bool:
+    """Save the CPU inference settings"""
+    return save_json_file(CPU_CONFIG_FILE, config)
@@ -0,0 +1,354 @@
+"""
+Download queue: priorities, pause/resume/cancel and a global budget
+
+Downloads wait in a queue ordered by priority and run at most
+max_concurrent at a time, all under one shared bandwidth cap. Jobs and
+limits are saved to a JSON file so the queue survives restarts; tokens
+are kept in memory only, so restored downloads of gated models need
+their token again.
+"""
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.download_progress import DownloadProgress, TERMINAL_STATUSES
+from app.core.hub_download import DownloadCancelled, RateLimiter
+from app.core.storage import load_json_file, save_json_file
+
+logger = logging.getLogger(__name__)
+
+# "downloading" is the active state
+DOWNLOAD_STATES = ("queued", "downloading", "paused", "cancelled", "failed", "completed")
+# States a download can't be paused or cancelled from
+FINISHED_STATES = TERMINAL_STATUSES
+
+DEFAULT_MAX_CONCURRENT = 2
+
+
+class DownloadJob:
+    """One model download in the queue"""
+
+    def __init__(
+        self,
+        model_id: str,
+        request: Dict[str, Any],
+        token: Optional[str] = None,
+        priority: int = 0,
+        sequence: int = 0,
+        extra: Optional[Dict[str, Any]] = None,
+        status: str = "queued",
+    ):
+        self.model_id = model_id
+        # Request fields, without the token
+        self.request = request
+        self.token = token
+        self.priority = priority
+        self.sequence = sequence
+        self.extra = extra or {}
+        self.progress = DownloadProgress(model_id, status)
+        self.cancel_event = threading.Event()
+        # State to enter when the running transfer stops: "paused", "cancelled" or "queued"
+        self.stop_reason: Optional[str] = None
+
+    @property
+    def status(self) -> str:
+        return self.progress.status
+
+    def reset(self, status: str = "queued") -> None:
+        """Start over with fresh progress, e.g. when resumed"""
+        self.progress = DownloadProgress(self.model_id, status)
+        self.cancel_event = threading.Event()
+        self.stop_reason = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        snapshot = self.progress.snapshot(include_files=False)
+        return {
+            "model_id": self.model_id,
+            "priority": self.priority,
+            "sequence": self.sequence,
+            "request": self.request,
+            "extra": self.extra,
+            **snapshot,
+        }
+
+
+class DownloadManager:
+    """
+    Runs queued downloads through runner(job), which performs the transfer
+    and returns extra fields for the completed status (e.g. local_path).
+    runner must stop with DownloadCancelled once job.cancel_event is set.
+    cleanup(job) removes the partial files of a cancelled download.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[DownloadJob], Dict[str, Any]],
+        cleanup: Callable[[DownloadJob], None],
+        state_file: Optional[Path] = None,
+        max_concurrent: int = DEFAULT_MAX_CONCURRENT,
+        max_bytes_per_second: Optional[float] = None,
+    ):
+        self.runner = runner
+        self.cleanup = cleanup
+        self.state_file = state_file
+        self.max_concurrent = max_concurrent
+        self.limiter = RateLimiter(max_bytes_per_second)
+        self._jobs: Dict[str, DownloadJob] = {}
+        self._threads: Dict[str, threading.Thread] = {}
+        self._sequence = 0
+        self._stopping = False
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._restore()
+
+    # Queue state
+
+    def get(self, model_id: str) -> Optional[DownloadProgress]:
+        with self._lock:
+            job = self._jobs.get(model_id)
+            return job.progress if job else None
+
+    def job(self, model_id: str) -> Optional[DownloadJob]:
+        with self._lock:
+            return self._jobs.get(model_id)
+
+    def __contains__(self, model_id: str) -> bool:
+        with self._lock:
+            return model_id in self._jobs
+
+    def remove(self, model_id: str) -> None:
+        with self._lock:
+            job = self._jobs.get(model_id)
+            if job is not None and job.status not in ("queued", "downloading"):
+                del self._jobs[model_id]
+                self._save()
+
+    def queue(self) -> List[Dict[str, Any]]:
+        """All downloads: active first, then queued in the order they'll start, then the rest"""
+        with self._lock:
+            order = {"downloading": 0, "queued": 1, "paused": 2}
+            jobs = sorted(
+                self._jobs.values(),
+                key=lambda job: (order.get(job.status, 3),) + self._rank(job),
+            )
+            return [job.to_dict() for job in jobs]
+
+    def position(self, model_id: str) -> Optional[int]:
+        """1-based place of a queued download in the start order"""
+        with self._lock:
+            queued = sorted((job for job in self._jobs.values() if job.status == "queued"), key=self._rank)
+            for index, job in enumerate(queued):
+                if job.model_id == model_id:
+                    return index + 1
+            return None
+
+    def limits(self) -> Dict[str, Any]:
+        rate = self.limiter.rate
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_mb_per_second": round(rate / (1024 * 1024), 3) if rate else None,
+        }
+
+    # Commands
+
+    def submit(
+        self,
+        model_id: str,
+        request: Dict[str, Any],
+        token: Optional[str] = None,
+        priority: int = 0,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> DownloadJob:
+        """Queue a download, replacing a finished, cancelled or paused job of the same model"""
+        with self._lock:
+            current = self._jobs.get(model_id)
+            if current is not None and current.status in ("queued", "downloading"):
+                return current
+            self._sequence += 1
+            job = DownloadJob(model_id, request, token, priority, self._sequence, extra)
+            self._jobs[model_id] = job
+            self._save()
+            self._schedule()
+            return job
+
+    def pause(self, model_id: str) -> DownloadJob:
+        """Stop a download, keeping its partial files so it can resume"""
+        return self._stop(model_id, "paused")
+
+    def cancel(self, model_id: str) -> DownloadJob:
+        """Stop a download and delete its partial files"""
+        return self._stop(model_id, "cancelled")
+
+    def resume(self, model_id: str, token: Optional[str] = None) -> DownloadJob:
+        """Queue a paused, cancelled or failed download again"""
+        with self._lock:
+            job = self._require(model_id)
+            if job.status in ("queued", "downloading"):
+                return job
+            if job.status == "completed":
+                raise ValueError(f"Download of {model_id} already completed")
+            job.reset()
+            if token:
+                job.token = token
+            self._sequence += 1
+            job.sequence = self._sequence
+            self._save()
+            self._schedule()
+            return job
+
+    def set_priority(self, model_id: str, priority: int) -> DownloadJob:
+        with self._lock:
+            job = self._require(model_id)
+            job.priority = priority
+            self._save()
+            return job
+
+    def configure(self, max_concurrent: Optional[int] = None, max_bytes_per_second: Optional[float] = None) -> None:
+        """Change the global limits; a rate of 0 removes the bandwidth cap"""
+        with self._lock:
+            if max_concurrent is not None:
+                self.max_concurrent = max_concurrent
+            if max_bytes_per_second is not None:
+                self.limiter.rate = max_bytes_per_second or None
+            self._save()
+            self._schedule()
+
+    def start(self) -> None:
+        """Start downloads restored from the state file"""
+        with self._lock:
+            self._schedule()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop active downloads for shutdown; they're saved as queued and resume on the next start"""
+        with self._lock:
+            self._stopping = True
+            for model_id in self._threads:
+                job = self._jobs[model_id]
+                job.stop_reason = "queued"
+                job.cancel_event.set()
+            threads = list(self._threads.values())
+        for thread in threads:
+            thread.join(timeout)
+
+    def wait(self, model_id: str, timeout: Optional[float] = None) -> bool:
+        """Block until a download is no longer queued or active; False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            while True:
+                job = self._jobs.get(model_id)
+                if job is None or (job.status not in ("queued", "downloading") and model_id not in self._threads):
+                    return True
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+
+    # Internals
+
+    def _require(self, model_id: str) -> DownloadJob:
+        job = self._jobs.get(model_id)
+        if job is None:
+            raise KeyError(model_id)
+        return job
+
+    @staticmethod
+    def _rank(job: DownloadJob) -> Tuple[int, int]:
+        # Higher priority first, then first come first served
+        return (-job.priority, job.sequence)
+
+    def _stop(self, model_id: str, state: str) -> DownloadJob:
+        with self._lock:
+            job = self._require(model_id)
+            if job.status in FINISHED_STATES:
+                raise ValueError(f"Download of {model_id} already {job.status}")
+            if model_id in self._threads:
+                # The runner stops at its next chunk and _run records the state
+                job.stop_reason = state
+                job.cancel_event.set()
+                return job
+            if job.status == state:
+                return job
+            if state == "cancelled":
+                self._cleanup(job)
+            job.progress.finish(state)
+            self._save()
+            self._changed.notify_all()
+            return job
+
+    def _cleanup(self, job: DownloadJob) -> None:
+        try:
+            self.cleanup(job)
+        except Exception as e:
+            logger.error(f"Failed to clean up cancelled download of {job.model_id}: {e}")
+
+    def _schedule(self) -> None:
+        """Start the best queued downloads while there are free slots (lock held)"""
+        if self._stopping:
+            return
+        queued = sorted((job for job in self._jobs.values() if job.status == "queued"), key=self._rank)
+        for job in queued[:max(self.max_concurrent - len(self._threads), 0)]:
+            job.progress.set_status("downloading")
+            thread = threading.Thread(target=self._run, args=(job,), name=f"download-{job.model_id}", daemon=True)
+            self._threads[job.model_id] = thread
+            thread.start()
+        if queued:
+            self._save()
+
+    def _run(self, job: DownloadJob) -> None:
+        logger.info(f"Starting download for {job.model_id}")
+        try:
+            result = self.runner(job)
+            job.progress.finish("completed", **(result or {}))
+            logger.info(f"Download completed for {job.model_id}")
+        except DownloadCancelled:
+            state = job.stop_reason or "cancelled"
+            logger.info(f"Download of {job.model_id} {state}")
+            if state == "cancelled":
+                self._cleanup(job)
+            if state == "queued":
+                job.reset()
+            else:
+                job.progress.finish(state)
+        except Exception as e:
+            logger.error(f"Download failed for {job.model_id}: {e}")
+            job.progress.finish("failed", error=str(e))
+        finally:
+            with self._lock:
+                self._threads.pop(job.model_id, None)
+                self._save()
+                self._schedule()
+                self._changed.notify_all()
+
+    def _save(self) -> None:
+        if self.state_file is None:
+            return
+        save_json_file(self.state_file, {
+            "max_concurrent": self.max_concurrent,
+            "max_bytes_per_second": self.limiter.rate,
+            "sequence": self._sequence,
+            "downloads": [job.to_dict() for job in self._jobs.values()],
+        })
+
+    def _restore(self) -> None:
+        if self.state_file is None:
+            return
+        state = load_json_file(self.state_file, default={})
+        self.max_concurrent = state.get("max_concurrent", self.max_concurrent)
+        self.limiter.rate = state.get("max_bytes_per_second", self.limiter.rate)
+        self._sequence = state.get("sequence", 0)
+        for entry in state.get("downloads", []):
+            # Downloads interrupted by the restart resume from their partial files
+            status = "queued" if entry["status"] == "downloading" else entry["status"]
+            job = DownloadJob(
+                entry["model_id"],
+                entry.get("request", {}),
+                priority=entry.get("priority", 0),
+                sequence=entry.get("sequence", 0),
+                extra=entry.get("extra"),
+                status=status,
+            )
+            if status != "queued":
+                job.progress.finish(status, **{key: entry[key] for key in ("error", "local_path") if key in entry})
+            self._jobs[job.model_id] = job
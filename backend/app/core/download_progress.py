@@ -0,0 +1,134 @@
+"""
+Thread-safe byte-level progress tracking for model downloads
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# Throughput is averaged over this many recent seconds
+SPEED_WINDOW = 5.0
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+class DownloadProgress:
+    """
+    Progress of one model download: per-file and aggregate bytes, current
+    throughput and ETA. Updated from download threads, read from requests.
+    """
+
+    def __init__(self, model_id: str, status: str = "downloading"):
+        self.model_id = model_id
+        self.status = status
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.bytes_done = 0
+        self.bytes_total = 0
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.extra: Dict[str, Any] = {}
+        # Incremented on every change, so watchers can tell when to send an update
+        self.version = 0
+        self._samples: "deque[Tuple[float, int]]" = deque()
+        self._lock = threading.Lock()
+
+    def set_files(self, files: Iterable[Tuple[str, int]]) -> None:
+        """Declare the files to download as (path, size) pairs"""
+        with self._lock:
+            self.files = {
+                path: {"path": path, "bytes_done": 0, "bytes_total": size, "status": "pending"}
+                for path, size in files
+            }
+            self.bytes_total = sum(entry["bytes_total"] for entry in self.files.values())
+            self.bytes_done = 0
+            self._record_sample()
+
+    def add_bytes(self, path: str, count: int) -> None:
+        with self._lock:
+            entry = self.files.get(path)
+            if entry is not None:
+                entry["bytes_done"] += count
+                entry["status"] = "downloading"
+            self.bytes_done += count
+            self._record_sample()
+
+    def resume_file(self, path: str, count: int) -> None:
+        """Count bytes a previous attempt already downloaded, without counting them as throughput"""
+        with self._lock:
+            entry = self.files.get(path)
+            if entry is not None:
+                entry["bytes_done"] += count
+                entry["status"] = "downloading"
+            self.bytes_done += count
+            self._record_sample(throughput=False)
+
+    def finish_file(self, path: str, skipped: bool = False) -> None:
+        """Mark a file done; skipped files already on disk count as fully downloaded"""
+        with self._lock:
+            entry = self.files.get(path)
+            if entry is None:
+                return
+            remaining = entry["bytes_total"] - entry["bytes_done"]
+            if remaining > 0:
+                entry["bytes_done"] += remaining
+                self.bytes_done += remaining
+            entry["status"] = "skipped" if skipped else "completed"
+            self._record_sample(throughput=not skipped)
+
+    def set_status(self, status: str) -> None:
+        with self._lock:
+            self.status = status
+            self.version += 1
+
+    def finish(self, status: str, **extra) -> None:
+        with self._lock:
+            self.status = status
+            self.extra.update(extra)
+            self.finished_at = time.time()
+            self.version += 1
+
+    def speed(self) -> float:
+        """Bytes per second over the recent window"""
+        with self._lock:
+            return self._speed()
+
+    def snapshot(self, include_files: bool = True) -> Dict[str, Any]:
+        with self._lock:
+            speed = self._speed() if self.status == "downloading" else 0.0
+            remaining = max(self.bytes_total - self.bytes_done, 0)
+            snapshot = {
+                "status": self.status,
+                "progress": round(100 * self.bytes_done / self.bytes_total, 2) if self.bytes_total else (
+                    100 if self.status == "completed" else 0
+                ),
+                "bytes_done": self.bytes_done,
+                "bytes_total": self.bytes_total,
+                "mb_per_second": round(speed / (1024 * 1024), 3),
+                "eta_seconds": round(remaining / speed, 1) if speed > 0 and self.status == "downloading" else None,
+                "files_done": sum(1 for entry in self.files.values() if entry["status"] in ("completed", "skipped")),
+                "files_total": len(self.files),
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                **self.extra,
+            }
+            if include_files:
+                snapshot["files"] = [dict(entry) for entry in self.files.values()]
+            return snapshot
+
+    def _record_sample(self, throughput: bool = True) -> None:
+        self.version += 1
+        now = time.monotonic()
+        if not throughput:
+            # Bytes that were already on disk don't count towards throughput
+            self._samples.clear()
+        self._samples.append((now, self.bytes_done))
+        while len(self._samples) > 2 and now - self._samples[0][0] > SPEED_WINDOW:
+            self._samples.popleft()
+
+    def _speed(self) -> float:
+        if len(self._samples) < 2:
+            return 0.0
+        (start_time, start_bytes), (end_time, end_bytes) = self._samples[0], self._samples[-1]
+        elapsed = end_time - start_time
+        return (end_bytes - start_bytes) / elapsed if elapsed > 0 else 0.0
+
@@ -0,0 +1,235 @@
+"""
+Batch offline evaluation of fine-tuned models
+"""
+import json
+import logging
+import math
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import torch
+
+from app.core.storage import save_json_file
+from app.core.trainer import format_instruction, format_training_texts
+
+logger = logging.getLogger(__name__)
+
+RESULTS_FILE = "results.jsonl"
+SUMMARY_FILE = "summary.json"
+
+# Held-out splits to prefer, in order, before falling back to "train"
+EVAL_SPLITS = ("test", "validation", "train")
+
+
+def select_eval_split(dataset, split: Optional[str] = None):
+    """Pick the requested split, or the first held-out split the dataset has"""
+    if split:
+        if split not in dataset:
+            raise ValueError(f"Split '{split}' not found. Available splits: {list(dataset.keys())}")
+        return dataset[split], split
+
+    for candidate in EVAL_SPLITS:
+        if candidate in dataset:
+            return dataset[candidate], candidate
+    raise ValueError(f"No usable split found. Available splits: {list(dataset.keys())}")
+
+
+def build_eval_examples(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Turn dataset rows into evaluation examples.
+
+    Every example has the full training-format text used for loss. Examples
+    in instruction format also get the prompt up to the response and the
+    reference output used for exact match.
+    """
+    if not rows:
+        return []
+
+    columns = {key: [row.get(key, "") for row in rows] for key in rows[0]}
+    texts = format_training_texts(columns)
+
+    examples = []
+    for i, (row, text) in enumerate(zip(rows, texts)):
+        example = {"index": i, "text": text}
+        if "instruction" in row and row.get("output"):
+            example["prompt"] = format_instruction(row["instruction"], row.get("input", ""))
+            example["reference"] = row["output"]
+        examples.append(example)
+    return examples
+
+
+def length_sorted_batches(lengths: List[int], batch_size: int) -> List[List[int]]:
+    """Group example indices into batches of similar length, longest first, to minimize padding"""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def pad_batch(sequences: List[List[int]], pad_token_id: int, left: bool = False):
+    """Pad token ID lists into input_ids and attention_mask tensors"""
+    max_length = max(len(seq) for seq in sequences)
+    input_ids = torch.full((len(sequences), max_length), pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(sequences), max_length), dtype=torch.long)
+
+    for row, seq in enumerate(sequences):
+        if left:
+            input_ids[row, max_length - len(seq):] = torch.tensor(seq)
+            attention_mask[row, max_length - len(seq):] = 1
+        else:
+            input_ids[row, :len(seq)] = torch.tensor(seq)
+            attention_mask[row, :len(seq)] = 1
+
+    return input_ids, attention_mask
+
+
+def normalize_answer(text: str) -> str:
+    """Normalize text for exact-match comparison"""
+    return " ".join(text.split()).lower()
+
+
+def batch_token_losses(model, input_ids, attention_mask):
+    """Summed next-token loss and predicted-token count for each sequence in a batch"""
+    device = getattr(model, "device", torch.device("cpu"))
+    input_ids = input_ids.to(device)
+    attention_mask = attention_mask.to(device)
+
+    logits = model(input_ids=input_ids, attention_mask=attention_mask).logits.float()
+    shift_logits = logits[:, :-1, :]
+    shift_labels = input_ids[:, 1:]
+    shift_mask = attention_mask[:, 1:].float()
+
+    token_losses = torch.nn.functional.cross_entropy(
+        shift_logits.reshape(-1, shift_logits.size(-1)),
+        shift_labels.reshape(-1),
+        reduction="none"
+    ).view(shift_labels.shape)
+
+    return (token_losses * shift_mask).sum(dim=1).tolist(), shift_mask.sum(dim=1).tolist()
+
+
+def generate_answers(model, tokenizer, prompts: List[str], pad_token_id: int, max_length: int, max_new_tokens: int) -> List[str]:
+    """Greedily generate answers for a batch of prompts, left-padded so generation starts aligned"""
+    encoded = [tokenizer(prompt, truncation=True, max_length=max_length)["input_ids"] for prompt in prompts]
+    input_ids, attention_mask = pad_batch(encoded, pad_token_id, left=True)
+
+    device = getattr(model, "device", torch.device("cpu"))
+    outputs = model.generate(
+        input_ids=input_ids.to(device),
+        attention_mask=attention_mask.to(device),
+        max_new_tokens=max_new_tokens,
+        do_sample=False,
+        pad_token_id=pad_token_id,
+        eos_token_id=tokenizer.eos_token_id
+    )
+    return tokenizer.batch_decode(outputs[:, input_ids.shape[1]:], skip_special_tokens=True)
+
+
+def run_evaluation(
+    model_loader: Callable[[], Any],
+    examples: List[Dict[str, Any]],
+    output_dir: Path,
+    batch_size: int = 8,
+    max_length: int = 512,
+    exact_match: bool = False,
+    max_new_tokens: int = 64,
+    lock=None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Evaluate a model over examples in length-sorted, padded batches.
+
+    Per-example results are appended to results.jsonl as each batch
+    finishes, and the aggregate summary is written to summary.json.
+
+    Args:
+        model_loader: Returns (model, tokenizer); called once per batch so a
+            shared base model has the right adapter active
+        examples: Output of build_eval_examples
+        output_dir: Directory to write results to
+        batch_size: Examples per forward pass
+        max_length: Truncation length for texts and prompts
+        exact_match: Also generate answers and compare them to references
+        max_new_tokens: Generation length for exact match
+        lock: Held around each batch so other users of a shared model can't
+            switch its adapter mid-batch
+        on_progress: Called with (processed, total) after each batch
+
+    Returns:
+        The evaluation summary
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    results_file = output_dir / RESULTS_FILE
+    results_file.write_text("")
+    lock = lock or nullcontext()
+
+    with lock:
+        _, tokenizer = model_loader()
+    pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+
+    encoded = [
+        tokenizer(example["text"], truncation=True, max_length=max_length)["input_ids"]
+        for example in examples
+    ]
+    total_loss, total_tokens, processed = 0.0, 0, 0
+    exact_matches, em_total = 0, 0
+    start_time = time.perf_counter()
+
+    for batch in length_sorted_batches([len(ids) for ids in encoded], batch_size):
+        batch_results = {i: {"index": i, "tokens": len(encoded[i])} for i in batch}
+
+        with lock, torch.no_grad():
+            model, _ = model_loader()
+
+            # Loss and perplexity
+            input_ids, attention_mask = pad_batch([encoded[i] for i in batch], pad_token_id)
+            losses, counts = batch_token_losses(model, input_ids, attention_mask)
+            for i, loss, count in zip(batch, losses, counts):
+                total_loss += loss
+                total_tokens += int(count)
+                batch_results[i]["loss"] = round(loss / count, 6) if count else None
+
+            # Exact match against reference outputs
+            em_batch = [i for i in batch if "reference" in examples[i]]
+            if exact_match and em_batch:
+                predictions = generate_answers(
+                    model, tokenizer, [examples[i]["prompt"] for i in em_batch],
+                    pad_token_id, max_length, max_new_tokens
+                )
+                for i, prediction in zip(em_batch, predictions):
+                    match = normalize_answer(prediction) == normalize_answer(examples[i]["reference"])
+                    exact_matches += int(match)
+                    batch_results[i]["prediction"] = prediction.strip()
+                    batch_results[i]["exact_match"] = match
+                em_total += len(em_batch)
+
+        _append_results(results_file, [batch_results[i] for i in batch])
+        processed += len(batch)
+        if on_progress:
+            on_progress(processed, len(examples))
+
+    elapsed = time.perf_counter() - start_time
+    mean_loss = total_loss / total_tokens if total_tokens else None
+
+    summary = {
+        "examples": len(examples),
+        "tokens": total_tokens,
+        "loss": round(mean_loss, 6) if mean_loss is not None else None,
+        "perplexity": round(math.exp(mean_loss), 4) if mean_loss is not None else None,
+        "exact_match": round(exact_matches / em_total, 4) if em_total else None,
+        "exact_match_examples": em_total,
+        "duration_seconds": round(elapsed, 3),
+        "examples_per_second": round(len(examples) / elapsed, 2) if elapsed > 0 else None,
+        "tokens_per_second": round(total_tokens / elapsed, 2) if elapsed > 0 else None,
+        "results_path": str(results_file),
+    }
+    save_json_file(output_dir / SUMMARY_FILE, summary)
+
+    return summary
+
+
+def _append_results(results_file: Path, results: List[Dict[str, Any]]):
+    """Append per-example results to a JSON lines file"""
+    with open(results_file, "a", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
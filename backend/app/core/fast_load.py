@@ -0,0 +1,278 @@
+"""
+Fast model loading from memory-mapped safetensors
+
+transformers maps safetensors shards and hands out tensors backed by the
+mapping when they already have the requested dtype: nothing is copied and
+pages are read on first touch. Weights stored in another dtype (e.g. a
+bfloat16 checkpoint loaded as float32 on CPU) are read and converted
+instead, holding both copies in memory during the load.
+
+So each local model is converted once into the dtype it's loaded with,
+next to the original in a hidden .converted directory, and later loads
+map the converted shards. The other files of the model directory (config,
+tokenizer, custom modeling code) are copied alongside, so the converted
+copy loads like the original. Conversions write to a temporary directory
+that replaces the target in one rename; the original files, which may be
+hardlinks into the blob store, are only ever read.
+
+Whether a load was zero-copy is measured, not assumed: on Linux the loaded
+parameters' addresses are looked up in this process's memory mappings of
+the shard files.
+"""
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import psutil
+
+from app.core.lazy_imports import LazyModule
+from app.core.model_index import DTYPE_BYTES, parameters_by_dtype
+from app.core.storage import load_json_file, save_json_file
+
+torch = LazyModule("torch")
+transformers = LazyModule("transformers")
+safetensors = LazyModule("safetensors")
+safetensors_torch = LazyModule("safetensors.torch")
+
+logger = logging.getLogger(__name__)
+
+CONVERTED_DIRNAME = ".converted"
+CONVERSION_FILE = "conversion.json"
+
+# Safetensors names of the dtypes weights are converted between
+SAFETENSORS_DTYPES = {"float32": "F32", "float16": "F16", "bfloat16": "BF16"}
+CONVERTIBLE_DTYPES = {"F64", "F32", "F16", "BF16"}
+
+# Weight files, which are not copied next to the converted shards; every other file is
+WEIGHT_SUFFIXES = {".safetensors", ".bin", ".pt", ".pth", ".ckpt", ".h5", ".msgpack", ".gguf"}
+
+# Free disk space kept on top of a conversion's size
+DISK_HEADROOM = 0.1
+
+RSS_SAMPLE_INTERVAL = 0.01
+
+_locks: Dict[Path, threading.Lock] = {}
+_locks_lock = threading.Lock()
+
+
+def dtype_name(dtype) -> str:
+    return str(dtype).replace("torch.", "")
+
+
+def converted_dir(model_dir: Path, dtype) -> Path:
+    """Where the converted copy of a model directory is kept"""
+    return model_dir.parent / CONVERTED_DIRNAME / model_dir.name / dtype_name(dtype)
+
+
+def _fingerprint(model_dir: Path) -> Dict[str, Any]:
+    """Shard sizes and mtimes, to notice a re-downloaded model"""
+    return {
+        shard.name: [shard.stat().st_size, shard.stat().st_mtime_ns]
+        for shard in sorted(model_dir.glob("*.safetensors"))
+    }
+
+
+def needs_conversion(model_dir: Path, dtype) -> bool:
+    """Whether loading a model's safetensors weights as dtype would convert them"""
+    target = SAFETENSORS_DTYPES.get(dtype_name(dtype))
+    stored = set(parameters_by_dtype(model_dir)) & CONVERTIBLE_DTYPES
+    return bool(target and stored and stored != {target})
+
+
+def is_converted(model_dir: Path, dtype) -> bool:
+    """Whether an up-to-date converted copy exists"""
+    record = load_json_file(converted_dir(model_dir, dtype) / CONVERSION_FILE, default={})
+    return bool(record) and record.get("source") == _fingerprint(model_dir)
+
+
+def _lock_for(path: Path) -> threading.Lock:
+    with _locks_lock:
+        return _locks.setdefault(path, threading.Lock())
+
+
+def convert_model(model_dir: Path, dtype) -> Dict[str, Any]:
+    """
+    Write a copy of a model's safetensors weights in another dtype, one shard
+    at a time, unless an up-to-date copy exists.
+
+    Returns:
+        The conversion record: dtype, path, size and duration
+    """
+    target = converted_dir(model_dir, dtype)
+    with _lock_for(target):
+        if is_converted(model_dir, dtype):
+            return load_json_file(target / CONVERSION_FILE)
+
+        started = time.perf_counter()
+        torch_dtype = getattr(torch, dtype_name(dtype))
+        staging = target.with_name(f"{target.name}.tmp-{os.getpid()}")
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+        try:
+            for shard in sorted(model_dir.glob("*.safetensors")):
+                tensors = {}
+                with safetensors.safe_open(str(shard), framework="pt") as f:
+                    for name in f.keys():
+                        tensor = f.get_tensor(name)
+                        tensors[name] = tensor.to(torch_dtype) if tensor.is_floating_point() else tensor
+                safetensors_torch.save_file(tensors, str(staging / shard.name), metadata={"format": "pt"})
+                del tensors
+
+            # Config, tokenizer and any custom code loaded with trust_remote_code
+            for path in model_dir.iterdir():
+                if path.is_file() and path.suffix not in WEIGHT_SUFFIXES:
+                    shutil.copy2(path, staging / path.name)
+            config = load_json_file(staging / "config.json", default={})
+            for key in ("dtype", "torch_dtype"):
+                if key in config:
+                    config[key] = dtype_name(dtype)
+            if config:
+                save_json_file(staging / "config.json", config)
+
+            size_bytes = sum(shard.stat().st_size for shard in staging.glob("*.safetensors"))
+            record = {
+                "dtype": dtype_name(dtype),
+                "path": str(target),
+                "size_mb": round(size_bytes / (1024 * 1024), 2),
+                "seconds": round(time.perf_counter() - started, 2),
+                "source": _fingerprint(model_dir),
+            }
+            save_json_file(staging / CONVERSION_FILE, record)
+
+            shutil.rmtree(target, ignore_errors=True)
+            os.replace(staging, target)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+    logger.info(f"Converted {model_dir} to {record['dtype']} in {record['seconds']}s ({record['size_mb']} MB)")
+    return record
+
+
+def remove_converted(model_dir: Path) -> None:
+    """Delete all converted copies of a model directory"""
+    shutil.rmtree(model_dir.parent / CONVERTED_DIRNAME / model_dir.name, ignore_errors=True)
+
+
+class PeakRss:
+    """Samples this process's RSS on a thread to find its peak during a block"""
+
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.start_bytes = 0
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        self.peak_bytes = max(self.peak_bytes, self.process.memory_info().rss)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self) -> "PeakRss":
+        self.start_bytes = self.peak_bytes = self.process.memory_info().rss
+        self._thread = threading.Thread(target=self._run, name="peak-rss", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def mapped_parameter_bytes(model, shards) -> Optional[Tuple[int, int]]:
+    """
+    Bytes of a model's parameters that live in this process's memory
+    mappings of the given files, and the total, or None where the mappings
+    can't be read (outside Linux)
+    """
+    paths = {str(Path(shard).resolve()) for shard in shards}
+    ranges = []
+    try:
+        with open("/proc/self/maps") as f:
+            for line in f:
+                fields = line.split(maxsplit=5)
+                if len(fields) == 6 and fields[5].strip() in paths:
+                    start, end = fields[0].split("-")
+                    ranges.append((int(start, 16), int(end, 16)))
+    except OSError:
+        return None
+
+    mapped = total = 0
+    for parameter in model.parameters():
+        size = parameter.numel() * parameter.element_size()
+        total += size
+        address = parameter.data_ptr()
+        if any(start <= address < end for start, end in ranges):
+            mapped += size
+    return mapped, total
+
+
+def _has_disk_space(model_dir: Path, dtype) -> bool:
+    needed = sum(parameters_by_dtype(model_dir).values()) * DTYPE_BYTES[SAFETENSORS_DTYPES[dtype_name(dtype)]]
+    return shutil.disk_usage(model_dir.parent).free > needed * (1 + DISK_HEADROOM)
+
+
+def load_causal_lm(model_path: str, dtype=None, convert: bool = True, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Load a causal LM with from_pretrained, mapping its safetensors weights
+    zero-copy where possible.
+
+    A local model stored in another dtype is converted once (when convert is
+    set and there's disk space for the copy) and loaded from the converted
+    shards. Loads onto a device_map skip conversion, as the weights are
+    copied to the device anyway.
+
+    Returns:
+        The model and a load report: time, peak RSS, whether the weights
+        were found mapped without copying (None where that can't be
+        measured) and whether a converted copy was used
+    """
+    model_dir = Path(model_path)
+    report: Dict[str, Any] = {
+        "path": model_path,
+        "dtype": dtype_name(dtype) if dtype is not None else None,
+        "converted": False,
+        "conversion_seconds": None,
+    }
+    load_path = model_path
+
+    with PeakRss() as rss:
+        started = time.perf_counter()
+        if dtype is not None and kwargs.get("device_map") is None and any(model_dir.glob("*.safetensors")):
+            if needs_conversion(model_dir, dtype):
+                if not is_converted(model_dir, dtype) and convert and _has_disk_space(model_dir, dtype):
+                    report["conversion_seconds"] = convert_model(model_dir, dtype)["seconds"]
+                if is_converted(model_dir, dtype):
+                    load_path = str(converted_dir(model_dir, dtype))
+                    report["converted"] = True
+
+        model = transformers.AutoModelForCausalLM.from_pretrained(
+            load_path,
+            dtype=dtype,
+            low_cpu_mem_usage=True,
+            **kwargs
+        )
+        report["seconds"] = round(time.perf_counter() - started, 3)
+
+    mapped = mapped_parameter_bytes(model, Path(load_path).glob("*.safetensors"))
+    if mapped is None:
+        report["zero_copy"] = None
+    else:
+        report["mapped_bytes"], parameter_bytes = mapped
+        report["zero_copy"] = parameter_bytes > 0 and report["mapped_bytes"] == parameter_bytes
+    report["peak_rss_bytes"] = rss.peak_bytes
+    report["rss_increase_bytes"] = rss.peak_bytes - rss.start_bytes
+    logger.info(
+        f"Loaded {model_path} in {report['seconds']}s, peak RSS {rss.peak_bytes / (1024 * 1024):.0f} MB"
+        f" (+{report['rss_increase_bytes'] / (1024 * 1024):.0f} MB), zero-copy: {report['zero_copy']}"
+    )
+    return model, report
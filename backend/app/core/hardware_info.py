@@ -0,0 +1,199 @@
+"""
+Static hardware facts, detected once, and subprocess-free Linux readers
+"""
+import json
+import logging
+import os
+import platform
+import plistlib
+import shutil
+import subprocess
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+PROC_CPUINFO = Path("/proc/cpuinfo")
+SYS_DRM_DIR = Path("/sys/class/drm")
+PROC_NVIDIA_GPUS_DIR = Path("/proc/driver/nvidia/gpus")
+
+
+def _run(command: List[str], timeout: float = 5) -> Optional[str]:
+    """Run a command and return its stdout, or None if it fails"""
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except Exception:
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+
+def read_linux_cpu_model(cpuinfo_path: Path = PROC_CPUINFO) -> Optional[str]:
+    """CPU model name from /proc/cpuinfo"""
+    try:
+        for line in cpuinfo_path.read_text().splitlines():
+            key, _, value = line.partition(":")
+            # x86 uses "model name", ARM boards often only have "Hardware"/"Model"
+            if key.strip() in ("model name", "Hardware", "Model") and value.strip():
+                return value.strip()
+    except OSError:
+        pass
+    return None
+
+
+def read_linux_nvidia_gpu_names(gpus_dir: Path = PROC_NVIDIA_GPUS_DIR) -> List[str]:
+    """NVIDIA GPU names from the driver's /proc entries"""
+    names = []
+    for info_file in sorted(gpus_dir.glob("*/information")):
+        try:
+            for line in info_file.read_text().splitlines():
+                key, _, value = line.partition(":")
+                if key.strip() == "Model":
+                    names.append(value.strip())
+                    break
+        except OSError:
+            continue
+    return names
+
+
+def find_nvidia_smi() -> Optional[str]:
+    """Path of nvidia-smi, also where Windows drivers put it outside PATH"""
+    path = shutil.which("nvidia-smi")
+    if path is None and platform.system() == "Windows":
+        drive = Path(os.environ.get("SystemDrive", "C:") + "\\")
+        fallback = drive / "Program Files" / "NVIDIA Corporation" / "NVSMI" / "nvidia-smi.exe"
+        path = str(fallback) if fallback.exists() else None
+    return path
+
+
+def detect_nvidia_gpu_names(nvidia_smi: Optional[str]) -> List[str]:
+    """
+    NVIDIA GPU names, from /proc on Linux and otherwise from nvidia-smi.
+
+    WSL2 and Windows have no /proc/driver/nvidia entries, so the subprocess
+    runs whenever /proc yields nothing.
+    """
+    if platform.system() == "Linux":
+        names = read_linux_nvidia_gpu_names()
+        if names:
+            return names
+
+    if nvidia_smi is None:
+        return []
+    output = _run([nvidia_smi, "--query-gpu=name", "--format=csv,noheader"])
+    return [line.strip() for line in output.splitlines() if line.strip()] if output else []
+
+
+def _read_int(path: Path) -> Optional[int]:
+    try:
+        return int(path.read_text().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def read_linux_drm_gpus(drm_dir: Path = SYS_DRM_DIR) -> List[Dict[str, Any]]:
+    """
+    Load and VRAM usage of GPUs whose driver exposes them in sysfs (amdgpu and
+    similar). NVIDIA's proprietary driver doesn't publish these counters.
+    """
+    gpus = []
+    for card in sorted(drm_dir.glob("card[0-9]*")):
+        device = card / "device"
+        busy = _read_int(device / "gpu_busy_percent")
+        vram_total = _read_int(device / "mem_info_vram_total")
+        if busy is None or not vram_total:
+            continue
+
+        vram_used = _read_int(device / "mem_info_vram_used") or 0
+        temperature = None
+        for hwmon in sorted(device.glob("hwmon/hwmon*")):
+            millidegrees = _read_int(hwmon / "temp1_input")
+            if millidegrees is not None:
+                temperature = round(millidegrees / 1000, 1)
+                break
+
+        gpus.append({
+            "id": len(gpus),
+            "name": card.name,
+            "load": float(busy),
+            "memory_used": round(vram_used / (1024**2), 1),  # MB, like GPUtil
+            "memory_total": round(vram_total / (1024**2), 1),
+            "memory_util": round(vram_used / vram_total * 100, 1),
+            "temperature": temperature
+        })
+    return gpus
+
+
+def detect_cpu_model() -> str:
+    """CPU model name, using the cheapest source for this OS"""
+    system = platform.system()
+    cpu_model = None
+    if system == "Linux":
+        cpu_model = read_linux_cpu_model()
+    elif system == "Darwin":
+        output = _run(["sysctl", "-n", "machdep.cpu.brand_string"], timeout=2)
+        cpu_model = output.strip() if output else None
+    return cpu_model or platform.processor() or "Unknown"
+
+
+def detect_apple_silicon_gpu_name() -> Optional[str]:
+    """GPU name of an Apple Silicon Mac from system_profiler"""
+    if platform.system() != "Darwin" or platform.machine() != "arm64":
+        return None
+
+    output = _run(["system_profiler", "SPDisplaysDataType", "-json"])
+    if not output:
+        return None
+    try:
+        for display in json.loads(output).get("SPDisplaysDataType", []):
+            if "sppci_model" in display:
+                return display["sppci_model"]
+    except ValueError:
+        pass
+    return None
+
+
+def detect_apfs_container_size() -> Optional[int]:
+    """Size in bytes of the APFS container holding the root volume (macOS)"""
+    if platform.system() != "Darwin":
+        return None
+
+    output = _run(["diskutil", "info", "-plist", "/"])
+    if not output:
+        return None
+    try:
+        data = plistlib.loads(output.encode())
+    except Exception:
+        return None
+    return data.get("APFSContainerSize", data.get("IOKitSize")) or None
+
+
+@lru_cache(maxsize=1)
+def get_static_facts() -> Dict[str, Any]:
+    """
+    Hardware facts that don't change while the server runs.
+
+    Detected on first call (the sampler's first sample, at startup) and
+    memoized, so the subprocesses behind them run once per process.
+    """
+    uname = platform.uname()
+    nvidia_smi = find_nvidia_smi()
+    facts = {
+        "system": uname.system,
+        "node_name": uname.node,
+        "release": uname.release,
+        "version": uname.version,
+        "machine": uname.machine,
+        "processor": uname.processor,
+        "cpu_model": detect_cpu_model(),
+        "cores_logical": psutil.cpu_count(logical=True),
+        "cores_physical": psutil.cpu_count(logical=False),
+        "apple_gpu_name": detect_apple_silicon_gpu_name(),
+        "disk_total_bytes": detect_apfs_container_size(),
+        "nvidia_smi": nvidia_smi,
+        "nvidia_gpu_names": detect_nvidia_gpu_names(nvidia_smi),
+    }
+    logger.info(f"Detected hardware: {facts['cpu_model']}, {facts['cores_logical']} logical cores")
+    return facts
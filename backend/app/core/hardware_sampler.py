@@ -0,0 +1,115 @@
+"""
+Background hardware sampler with a bounded time-series ring buffer
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Default sampling interval and history length (30 minutes at 2 s)
+DEFAULT_INTERVAL = 2.0
+DEFAULT_MAX_SAMPLES = 900
+# Time between priming and the first sample, so rate counters span a real interval
+DEFAULT_PRIME_SECONDS = 0.5
+
+
+class HardwareSampler:
+    """
+    Collects hardware samples on a background thread at a fixed interval.
+
+    Samples are kept in a ring buffer, so readers get the latest sample or a
+    history slice without ever waiting on a measurement themselves. Each
+    sample is a dict produced by collect() with a "time" epoch timestamp
+    added by the sampler.
+
+    Counters that report usage since their previous read (like psutil's
+    non-blocking cpu_percent) are read once by prime() when the thread
+    starts, and the first sample is taken prime_seconds later.
+    """
+
+    def __init__(
+        self,
+        collect: Callable[[], Dict[str, Any]],
+        interval: float = DEFAULT_INTERVAL,
+        max_samples: int = DEFAULT_MAX_SAMPLES,
+        prime: Optional[Callable[[], None]] = None,
+        prime_seconds: float = DEFAULT_PRIME_SECONDS,
+    ):
+        self.collect = collect
+        self.interval = interval
+        self.prime = prime
+        self.prime_seconds = prime_seconds
+        self._samples: "deque[Dict[str, Any]]" = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampled = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start the sampling thread; does nothing if it is already running"""
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="hardware-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the sampling thread"""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def sample_now(self) -> Dict[str, Any]:
+        """Take one sample immediately and add it to the buffer"""
+        sample = self.collect()
+        sample["time"] = time.time()
+        with self._lock:
+            self._samples.append(sample)
+        self._sampled.set()
+        return sample
+
+    def wait_latest(self, timeout: float) -> Dict[str, Any]:
+        """Most recent sample, waiting up to timeout for the first one before taking one immediately"""
+        self._sampled.wait(timeout)
+        return self.latest() or self.sample_now()
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """Most recent sample, or None before the first one"""
+        with self._lock:
+            return self._samples[-1] if self._samples else None
+
+    def history(self, since: Optional[float] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Samples taken after `since` (epoch seconds), oldest first, at most the newest `limit`"""
+        with self._lock:
+            samples = list(self._samples)
+        if since is not None:
+            samples = [s for s in samples if s["time"] > since]
+        if limit is not None:
+            samples = samples[-limit:] if limit > 0 else []
+        return samples
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def _run(self) -> None:
+        if self.prime is not None:
+            try:
+                self.prime()
+            except Exception as e:
+                logger.warning(f"Hardware sampler priming failed: {e}")
+            self._stop.wait(self.prime_seconds)
+        while not self._stop.is_set():
+            try:
+                self.sample_now()
+            except Exception as e:
+                logger.warning(f"Hardware sampling failed: {e}")
+            self._stop.wait(self.interval)
@@ -0,0 +1,523 @@
+"""
+Model snapshot downloads from the Hugging Face Hub over plain HTTP
+
+Large files are fetched as parallel HTTP range requests into a
+preallocated file, interrupted downloads resume from where each part
+stopped (within a download after a dropped connection, and across
+downloads), and every file is verified against the repo's hashes before
+it is moved into place. With a blob store, verified files are stored once by
+content and files already stored for another model aren't downloaded again.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import httpx
+from huggingface_hub import constants
+from huggingface_hub.utils import filter_repo_objects
+
+from app.core.blob_store import BlobStore
+from app.core.download_progress import DownloadProgress
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+TIMEOUT = httpx.Timeout(30.0, read=60.0)
+
+# Files at least this large are split into parallel range requests
+PARALLEL_THRESHOLD = 64 * 1024 * 1024
+PARTS_PER_FILE = 4
+MAX_PARALLEL_FILES = 4
+
+# Suffixes of files still being written and of their resume state
+INCOMPLETE_SUFFIX = ".incomplete"
+STATE_SUFFIX = ".incomplete.json"
+STATE_SAVE_INTERVAL = 1.0
+
+# Retries of a file after a transient error, each resuming its parts where they stopped
+MAX_RETRIES = 3
+RETRY_BACKOFF = 1.0
+
+# Default selection: safetensors weights, tokenizer and config, skipping
+# alternative exports (ONNX, OpenVINO, Core ML, original checkpoints)
+DEFAULT_ALLOW_PATTERNS = [
+    "*.json",
+    "*.safetensors",
+    "tokenizer.model",
+    "*.tiktoken",
+    "merges.txt",
+    "vocab.txt",
+]
+DEFAULT_IGNORE_PATTERNS = ["onnx/", "openvino/", "coreml/", "original/"]
+# Weights to use instead for repos that publish no safetensors
+FALLBACK_WEIGHT_PATTERNS = ["pytorch_model*.bin"]
+
+
+class IntegrityError(Exception):
+    """A downloaded file doesn't match the hash published by the Hub"""
+
+
+class RangeNotSupported(Exception):
+    """The server ignored a range request"""
+
+
+class DownloadCancelled(Exception):
+    """The download was stopped through its cancel event"""
+
+
+@dataclass
+class RepoFile:
+    """
+    A file in a repo snapshot. sha256 is published for LFS files; other
+    files carry their git blob ID (a sha1 over a "blob <size>" header).
+    """
+    path: str
+    size: int
+    sha256: Optional[str] = None
+    blob_id: Optional[str] = None
+
+
+class RateLimiter:
+    """
+    Caps the combined throughput of all connections of one download.
+
+    A parent limiter caps several downloads together; bytes must fit under
+    both caps. rate may be changed while downloads run.
+    """
+
+    def __init__(self, bytes_per_second: Optional[float] = None, parent: Optional["RateLimiter"] = None):
+        self.rate = bytes_per_second
+        self.parent = parent
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, count: int) -> float:
+        """Book count bytes; returns how long to wait before sending them"""
+        delay = 0.0
+        if self.rate:
+            with self._lock:
+                now = time.monotonic()
+                self._next = max(self._next, now) + count / self.rate
+                delay = self._next - now
+        if self.parent is not None:
+            delay = max(delay, self.parent.reserve(count))
+        return delay
+
+    def consume(self, count: int, cancel_event: Optional[threading.Event] = None) -> None:
+        """Block until count more bytes fit under the cap, or until cancel_event is set"""
+        delay = self.reserve(count)
+        if delay <= 0:
+            return
+        if cancel_event is not None:
+            cancel_event.wait(delay)
+        else:
+            time.sleep(delay)
+
+
+def is_transient(error: Exception) -> bool:
+    """Dropped connections, timeouts and server-side errors, which are worth retrying"""
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return False
+
+
+def _endpoint(endpoint: Optional[str]) -> str:
+    # HF_ENDPOINT points this at a mirror or a local stand-in
+    return (endpoint or constants.ENDPOINT).rstrip("/")
+
+
+def auth_headers(token: Optional[str]) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {token}"} if token else {}
+
+
+def fetch_repo_files(
+    client: httpx.Client,
+    repo_id: str,
+    revision: str = "main",
+    token: Optional[str] = None,
+    endpoint: Optional[str] = None,
+) -> Tuple[str, List[RepoFile]]:
+    """
+    List a model repo's files with their sizes and hashes.
+
+    Returns:
+        The resolved commit hash and the files at that commit
+    """
+    url = f"{_endpoint(endpoint)}/api/models/{repo_id}/revision/{quote(revision, safe='')}"
+    response = client.get(url, params={"blobs": "true"}, headers=auth_headers(token))
+    response.raise_for_status()
+    info = response.json()
+
+    files = []
+    for sibling in info.get("siblings", []):
+        lfs = sibling.get("lfs") or {}
+        files.append(RepoFile(
+            path=sibling["rfilename"],
+            size=lfs.get("size", sibling.get("size") or 0),
+            sha256=lfs.get("sha256"),
+            # For LFS files the blob is the pointer, not the content
+            blob_id=None if lfs else sibling.get("blobId"),
+        ))
+    return info.get("sha") or revision, files
+
+
+def select_files(
+    files: List[RepoFile],
+    allow_patterns: Optional[List[str]] = None,
+    ignore_patterns: Optional[List[str]] = None,
+) -> List[RepoFile]:
+    """
+    Filter repo files by glob patterns (a trailing "/" matches a directory).
+
+    Without any patterns, keeps the default selection; repos without
+    safetensors weights fall back to PyTorch .bin weights.
+    """
+    if allow_patterns is not None or ignore_patterns is not None:
+        return list(filter_repo_objects(
+            files, allow_patterns=allow_patterns, ignore_patterns=ignore_patterns, key=lambda f: f.path
+        ))
+
+    selected = select_files(files, DEFAULT_ALLOW_PATTERNS, DEFAULT_IGNORE_PATTERNS)
+    if not any(repo_file.path.endswith(".safetensors") for repo_file in selected):
+        selected = select_files(files, DEFAULT_ALLOW_PATTERNS + FALLBACK_WEIGHT_PATTERNS, DEFAULT_IGNORE_PATTERNS)
+    return selected
+
+
+def file_url(repo_id: str, path: str, revision: str, endpoint: Optional[str] = None) -> str:
+    return f"{_endpoint(endpoint)}/{repo_id}/resolve/{quote(revision, safe='')}/{quote(path)}"
+
+
+def verify_file(path: Path, repo_file: RepoFile) -> None:
+    """Check a file against its published sha256 or git blob ID"""
+    if repo_file.sha256:
+        digest = hashlib.sha256()
+        expected = repo_file.sha256
+    elif repo_file.blob_id:
+        digest = hashlib.sha1(f"blob {path.stat().st_size}\0".encode())
+        expected = repo_file.blob_id
+    else:
+        return
+
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+
+    if digest.hexdigest() != expected:
+        raise IntegrityError(f"Hash mismatch for {repo_file.path}: expected {expected}, got {digest.hexdigest()}")
+
+
+def plan_parts(size: int, parts: int = PARTS_PER_FILE) -> List[List[int]]:
+    """Split a file into [start, end, bytes_done] byte ranges (end inclusive)"""
+    if size < PARALLEL_THRESHOLD or parts <= 1:
+        return [[0, max(size - 1, 0), 0]]
+    part_size = -(-size // parts)
+    return [[start, min(start + part_size, size) - 1, 0] for start in range(0, size, part_size)]
+
+
+class _FileDownload:
+    """One file's download: its parts, their resume state and the partial file"""
+
+    def __init__(
+        self,
+        client: httpx.Client,
+        url: str,
+        destination: Path,
+        size: int,
+        token: Optional[str],
+        on_bytes: Callable[[int], None],
+        limiter: RateLimiter,
+        cancel_event: Optional[threading.Event] = None,
+    ):
+        self.client = client
+        self.url = url
+        self.destination = destination
+        self.size = size
+        self.token = token
+        self.on_bytes = on_bytes
+        self.limiter = limiter
+        self.cancel_event = cancel_event
+        self.temp_path = destination.with_name(destination.name + INCOMPLETE_SUFFIX)
+        self.state_path = destination.with_name(destination.name + STATE_SUFFIX)
+        self.parts: List[List[int]] = []
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+
+    def load_or_plan(self) -> int:
+        """Resume from a saved state if one matches; returns the bytes already on disk"""
+        try:
+            state = json.loads(self.state_path.read_text())
+            if state["url"] == self.url and state["size"] == self.size and self.temp_path.exists():
+                self.parts = state["parts"]
+                return sum(part[2] for part in self.parts)
+        except (OSError, ValueError, KeyError):
+            pass
+        self.restart(plan_parts(self.size))
+        return 0
+
+    def restart(self, parts: List[List[int]]) -> None:
+        self.destination.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.temp_path, "wb") as f:
+            f.truncate(self.size)
+        self.parts = parts
+        self.save_state(force=True)
+
+    def save_state(self, force: bool = False) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._saved_at < STATE_SAVE_INTERVAL:
+                return
+            self._saved_at = now
+            self.state_path.write_text(json.dumps({"url": self.url, "size": self.size, "parts": self.parts}))
+
+    def run(self, parallel: bool = True) -> None:
+        pending = [part for part in self.parts if part[0] + part[2] <= part[1]]
+        try:
+            if len(pending) > 1 and parallel:
+                with ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix="download-part") as pool:
+                    for future in [pool.submit(self.fetch_part, part) for part in pending]:
+                        future.result()
+            else:
+                for part in pending:
+                    self.fetch_part(part)
+        except RangeNotSupported:
+            # Fall back to one sequential stream from the start
+            logger.info(f"Server ignored range requests for {self.url}; downloading in one stream")
+            self.on_bytes(-sum(part[2] for part in self.parts))
+            self.restart(plan_parts(self.size, parts=1))
+            self.fetch_part(self.parts[0])
+        finally:
+            self.save_state(force=True)
+
+    def fetch_part(self, part: List[int]) -> None:
+        start, end, done = part
+        headers = auth_headers(self.token)
+        if done or len(self.parts) > 1:
+            headers["Range"] = f"bytes={start + done}-{end}"
+
+        # Auth headers are dropped on redirects to another host (the LFS CDN)
+        with self.client.stream("GET", self.url, headers=headers, follow_redirects=True) as response:
+            response.raise_for_status()
+            if "Range" in headers and response.status_code != 206:
+                if len(self.parts) > 1:
+                    raise RangeNotSupported(self.url)
+                # Single stream: start over from the beginning
+                self.on_bytes(-done)
+                part[2] = done = 0
+
+            with open(self.temp_path, "r+b") as f:
+                f.seek(start + done)
+                # Chunks as they arrive, so an interrupted part keeps everything it received
+                for chunk in response.iter_bytes():
+                    self.limiter.consume(len(chunk), self.cancel_event)
+                    self.check_cancelled()
+                    f.write(chunk)
+                    part[2] += len(chunk)
+                    self.on_bytes(len(chunk))
+                    self.save_state()
+
+    def check_cancelled(self) -> None:
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise DownloadCancelled(self.url)
+
+    def finish(self, repo_file: RepoFile, blob_store: Optional[BlobStore] = None, model: Optional[str] = None) -> None:
+        try:
+            verify_file(self.temp_path, repo_file)
+        except IntegrityError:
+            self.discard()
+            raise
+        if blob_store is not None:
+            blob_store.add(
+                model, repo_file.path, self.temp_path, self.destination, repo_file.sha256, repo_file.blob_id
+            )
+        else:
+            self.temp_path.replace(self.destination)
+        self.state_path.unlink(missing_ok=True)
+
+    def discard(self) -> None:
+        self.temp_path.unlink(missing_ok=True)
+        self.state_path.unlink(missing_ok=True)
+
+
+def download_file(
+    client: httpx.Client,
+    repo_file: RepoFile,
+    url: str,
+    destination: Path,
+    token: Optional[str] = None,
+    progress: Optional[DownloadProgress] = None,
+    limiter: Optional[RateLimiter] = None,
+    blob_store: Optional[BlobStore] = None,
+    model: Optional[str] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> None:
+    """
+    Download one file, resuming a previous partial download of it.
+
+    Transient errors are retried up to MAX_RETRIES times with exponential
+    backoff, resuming from the parts' offsets. With a blob store, the file
+    is stored in it, linked into place and recorded in the manifest of
+    model. Setting cancel_event stops the transfer with DownloadCancelled,
+    keeping the partial file for a resume.
+    """
+    progress = progress or DownloadProgress(repo_file.path)
+    file_download = _FileDownload(
+        client,
+        url,
+        destination,
+        repo_file.size,
+        token,
+        on_bytes=lambda count: progress.add_bytes(repo_file.path, count),
+        limiter=limiter or RateLimiter(),
+        cancel_event=cancel_event,
+    )
+    file_download.check_cancelled()
+
+    resumed = file_download.load_or_plan()
+    if resumed:
+        logger.info(f"Resuming {repo_file.path} at {resumed} of {repo_file.size} bytes")
+        progress.resume_file(repo_file.path, resumed)
+
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            file_download.run()
+            break
+        except Exception as e:
+            if attempt == MAX_RETRIES or not is_transient(e):
+                raise
+            # run() saved the parts' offsets; the next attempt requests only what's missing
+            delay = RETRY_BACKOFF * 2 ** attempt
+            done = sum(part[2] for part in file_download.parts)
+            logger.warning(f"Retrying {repo_file.path} at {done} of {repo_file.size} bytes in {delay:.0f}s: {e}")
+            if cancel_event is not None:
+                cancel_event.wait(delay)
+            else:
+                time.sleep(delay)
+            file_download.check_cancelled()
+
+    file_download.finish(repo_file, blob_store, model)
+    progress.finish_file(repo_file.path)
+
+
+def _verify_existing(destination: Path, repo_file: RepoFile, blob_store: Optional[BlobStore]) -> bool:
+    """
+    Check a file already on disk against its hash. A corrupt file is deleted,
+    along with its blob when it shares the blob's storage, so both are fetched again.
+    """
+    try:
+        verify_file(destination, repo_file)
+        return True
+    except IntegrityError as e:
+        logger.warning(f"{e}; downloading it again")
+
+    digest = None
+    if blob_store is not None:
+        digest = repo_file.sha256 or (repo_file.blob_id and blob_store.find_blob_id(repo_file.blob_id))
+    if digest and blob_store.has(digest) and os.path.samefile(blob_store.blob_path(digest), destination):
+        blob_store.discard(digest)
+    destination.unlink()
+    return False
+
+
+def _link_stored(blob_store: Optional[BlobStore], model: str, repo_file: RepoFile, destination: Path) -> bool:
+    """Link a file from the blob store if its content is already stored"""
+    if blob_store is None:
+        return False
+    digest = repo_file.sha256 or (repo_file.blob_id and blob_store.find_blob_id(repo_file.blob_id))
+    return bool(digest) and blob_store.link(model, repo_file.path, digest, destination, repo_file.blob_id)
+
+
+def download_snapshot(
+    repo_id: str,
+    local_dir: Path,
+    revision: str = "main",
+    token: Optional[str] = None,
+    endpoint: Optional[str] = None,
+    progress: Optional[DownloadProgress] = None,
+    max_bytes_per_second: Optional[float] = None,
+    max_parallel_files: int = MAX_PARALLEL_FILES,
+    allow_patterns: Optional[List[str]] = None,
+    ignore_patterns: Optional[List[str]] = None,
+    blob_store: Optional[BlobStore] = None,
+    shared_limiter: Optional[RateLimiter] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> Path:
+    """
+    Download the files of a model repo selected by select_files into local_dir.
+
+    Files are fetched concurrently, large files in parallel parts. Files
+    already present that match their published hash are skipped and partial
+    files resume, so an interrupted download continues where it left off.
+    With a blob store, files whose content is already stored are linked
+    instead of downloaded, and local_dir's manifest is keyed by its folder
+    name.
+
+    shared_limiter caps this download together with others; setting
+    cancel_event stops all transfers promptly with DownloadCancelled. When
+    one file fails for good, cancel_event is set to stop the others and the
+    file's error is raised.
+    """
+    progress = progress or DownloadProgress(repo_id)
+    limiter = RateLimiter(max_bytes_per_second, parent=shared_limiter)
+    limits = httpx.Limits(max_connections=max_parallel_files * PARTS_PER_FILE)
+    cancel_event = cancel_event or threading.Event()
+
+    with httpx.Client(timeout=TIMEOUT, limits=limits) as client:
+        commit, files = fetch_repo_files(client, repo_id, revision, token, endpoint)
+        files = select_files(files, allow_patterns, ignore_patterns)
+        if not files:
+            raise ValueError(f"No files of {repo_id} match the download patterns")
+        progress.set_files((repo_file.path, repo_file.size) for repo_file in files)
+        logger.info(f"Downloading {len(files)} files of {repo_id}@{commit[:12]}")
+
+        if blob_store is not None:
+            blob_store.begin(local_dir.name, repo_id, commit)
+
+        def fetch(repo_file: RepoFile) -> None:
+            destination = local_dir / repo_file.path
+            if destination.exists() and destination.stat().st_size == repo_file.size:
+                if _verify_existing(destination, repo_file, blob_store):
+                    progress.finish_file(repo_file.path, skipped=True)
+                    return
+            if _link_stored(blob_store, local_dir.name, repo_file, destination):
+                logger.info(f"Linked {repo_file.path} from the blob store")
+                progress.finish_file(repo_file.path, skipped=True)
+                return
+            download_file(
+                client,
+                repo_file,
+                file_url(repo_id, repo_file.path, commit, endpoint),
+                destination,
+                token,
+                progress,
+                limiter,
+                blob_store,
+                local_dir.name,
+                cancel_event,
+            )
+
+        # Files already on disk are hashed in the pool too, alongside the downloads
+        with ThreadPoolExecutor(max_workers=max_parallel_files, thread_name_prefix="download-file") as pool:
+            futures = [pool.submit(fetch, repo_file) for repo_file in files]
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            if any(future.exception() for future in done):
+                # Stop the other transfers at their next chunk instead of waiting for them
+                cancel_event.set()
+                for future in futures:
+                    future.cancel()
+
+    errors = [future.exception() for future in futures if not future.cancelled() and future.exception()]
+    if errors:
+        # Report the failure itself, not the cancellations it caused
+        raise next((error for error in errors if not isinstance(error, DownloadCancelled)), errors[0])
+
+    return local_dir
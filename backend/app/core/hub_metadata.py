@@ -0,0 +1,292 @@
+"""
+Cached, concurrent access to Hugging Face Hub model metadata
+
+Hub calls run on a bounded thread pool, so they never block the event
+loop and fan out at most MAX_CONCURRENT_REQUESTS at a time. Results are
+cached per request and token scope (a hash of the token, never the token
+itself) and saved to disk:
+
+- entries younger than fresh_seconds are served without a Hub call;
+- older entries are served immediately and refreshed in the background
+  (stale-while-revalidate), up to stale_seconds;
+- in offline mode, or when a Hub call fails, any cached entry is served.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from huggingface_hub import HfApi, ModelCard, hf_hub_download
+
+from app.core.storage import load_json_file, save_json_file
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = Path("./hub_cache/metadata.json")
+FRESH_SECONDS = 15 * 60
+STALE_SECONDS = 7 * 24 * 60 * 60
+MAX_CONCURRENT_REQUESTS = 8
+MAX_CACHE_ENTRIES = 2000
+# Changes are batched into one write of the cache file at most this often
+SAVE_INTERVAL = 5.0
+
+# Fields of search results; safetensors carries parameter counts per dtype
+SEARCH_EXPAND = [
+    "author", "downloads", "likes", "tags", "pipeline_tag", "lastModified",
+    "cardData", "config", "safetensors", "gated", "library_name",
+]
+
+# Serve only cached metadata; HF_HUB_OFFLINE is honoured as well
+OFFLINE_ENV = "SLM_HUB_OFFLINE"
+
+
+class HubOffline(Exception):
+    """Offline mode is on and the requested metadata isn't cached"""
+
+
+def token_scope(token: Optional[str]) -> str:
+    """Cache partition for a token: gated and private results differ per token"""
+    if not token:
+        return "anonymous"
+    return "token-" + hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+def model_to_dict(model) -> Dict[str, Any]:
+    """Plain, JSON-serializable fields of a huggingface_hub ModelInfo"""
+    card_data = getattr(model, "card_data", None)
+    safetensors = getattr(model, "safetensors", None)
+    siblings = getattr(model, "siblings", None)
+    return {
+        "id": model.id,
+        "author": model.author,
+        "downloads": model.downloads or 0,
+        "likes": model.likes or 0,
+        "tags": model.tags or [],
+        "pipeline_tag": model.pipeline_tag,
+        "last_modified": model.last_modified.isoformat() if model.last_modified else None,
+        "gated": getattr(model, "gated", None),
+        "library_name": getattr(model, "library_name", None),
+        "card_data": card_data.to_dict() if card_data is not None else None,
+        "config": getattr(model, "config", None),
+        "safetensors": {"parameters": safetensors.parameters, "total": safetensors.total} if safetensors else None,
+        "siblings": [
+            {"rfilename": sibling.rfilename, "size": sibling.size} for sibling in siblings
+        ] if siblings is not None else None,
+    }
+
+
+class MetadataCache:
+    """
+    Timestamped cache entries, saved to a JSON file.
+
+    Writes are batched: a change marks the cache dirty and schedules a save
+    save_interval seconds later, so a burst of puts costs a single write.
+    flush() saves pending changes at once, e.g. on shutdown.
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_entries: int = MAX_CACHE_ENTRIES, save_interval: float = SAVE_INTERVAL):
+        self.path = path
+        self.max_entries = max_entries
+        self.save_interval = save_interval
+        # Bumped on every change, so derived indexes know when to rebuild
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._timer: Optional[threading.Timer] = None
+        self._entries: Dict[str, Dict[str, Any]] = load_json_file(path, default={}) if path else {}
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = {"value": value, "fetched_at": time.time()}
+            self.generation += 1
+            if len(self._entries) > self.max_entries:
+                oldest = sorted(self._entries, key=lambda k: self._entries[k]["fetched_at"])
+                for stale_key in oldest[:len(self._entries) - self.max_entries]:
+                    del self._entries[stale_key]
+            if not self.path:
+                return
+            self._dirty = True
+            if self._timer is None:
+                self._timer = threading.Timer(self.save_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        """Save pending changes to the cache file"""
+        with self._save_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._dirty:
+                    return
+                self._dirty = False
+                entries = dict(self._entries)
+            # Serialized outside the lock, so lookups and puts don't wait for the disk
+            save_json_file(self.path, entries)
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            return list(self._entries.items())
+
+
+class HubMetadata:
+    """Model info, search results and model cards from the Hub, through the cache"""
+
+    def __init__(
+        self,
+        cache_file: Optional[Path] = CACHE_FILE,
+        fresh_seconds: float = FRESH_SECONDS,
+        stale_seconds: float = STALE_SECONDS,
+        max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+        offline: Optional[bool] = None,
+    ):
+        self.cache = MetadataCache(cache_file)
+        self.fresh_seconds = fresh_seconds
+        self.stale_seconds = stale_seconds
+        # None follows the environment
+        self._offline = offline
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="hub-metadata")
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def offline(self) -> bool:
+        if self._offline is not None:
+            return self._offline
+        return any(
+            os.environ.get(name, "").lower() in ("1", "true", "yes", "on") for name in (OFFLINE_ENV, "HF_HUB_OFFLINE")
+        )
+
+    @offline.setter
+    def offline(self, value: Optional[bool]) -> None:
+        self._offline = value
+
+    # Hub calls
+
+    async def model_info(self, model_id: str, token: Optional[str] = None, files_metadata: bool = False) -> Dict[str, Any]:
+        def fetch():
+            return model_to_dict(HfApi(token=token).model_info(model_id, files_metadata=files_metadata))
+
+        return await self._cached(self._key("model_info", token, model_id, files_metadata), fetch)
+
+    async def model_infos(self, model_ids: List[str], token: Optional[str] = None) -> List[Optional[Dict[str, Any]]]:
+        """Info of several models, fetched concurrently; None for models that failed"""
+        results = await asyncio.gather(*(self.model_info(model_id, token) for model_id in model_ids), return_exceptions=True)
+        infos = []
+        for model_id, result in zip(model_ids, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to get info for {model_id}: {result}")
+                infos.append(None)
+            else:
+                infos.append(result)
+        return infos
+
+    async def search(
+        self,
+        query: Optional[str] = None,
+        task: Optional[str] = None,
+        sort: str = "downloads",
+        limit: int = 20,
+        token: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        def fetch():
+            models = HfApi(token=token).list_models(
+                search=query, task=task, sort=sort, direction=-1, limit=limit, expand=SEARCH_EXPAND
+            )
+            return [model_to_dict(model) for model in models]
+
+        return await self._cached(self._key("search", token, query, task, sort, limit), fetch)
+
+    async def model_card(self, model_id: str, token: Optional[str] = None) -> Optional[str]:
+        def fetch():
+            return ModelCard.load(model_id, token=token).text
+
+        return await self._cached(self._key("model_card", token, model_id), fetch)
+
+    async def model_config(self, model_id: str, token: Optional[str] = None) -> Dict[str, Any]:
+        """The repo's config.json"""
+        def fetch():
+            with open(hf_hub_download(model_id, "config.json", token=token)) as f:
+                return json.load(f)
+
+        return await self._cached(self._key("model_config", token, model_id), fetch)
+
+    # Caching
+
+    @staticmethod
+    def _key(kind: str, token: Optional[str], *args) -> str:
+        return f"{kind}:{token_scope(token)}:{json.dumps(args)}"
+
+    def cached(self, kind: str) -> List[Tuple[str, list, Dict[str, Any]]]:
+        """Cached entries of one kind as (token scope, request arguments, entry), without Hub calls"""
+        entries = []
+        for key, entry in self.cache.items():
+            entry_kind, scope, args = key.split(":", 2)
+            if entry_kind == kind:
+                entries.append((scope, json.loads(args), entry))
+        return entries
+
+    async def _cached(self, key: str, fetch: Callable[[], Any]) -> Any:
+        entry = self.cache.get(key)
+        if entry is not None:
+            age = time.time() - entry["fetched_at"]
+            if self.offline or age < self.fresh_seconds:
+                return entry["value"]
+            if age < self.stale_seconds:
+                # Serve now, refresh for the next request
+                self._submit(key, fetch)
+                return entry["value"]
+        if self.offline:
+            raise HubOffline(f"Offline mode: no cached Hub metadata for {key}")
+
+        try:
+            return await asyncio.wrap_future(self._submit(key, fetch))
+        except Exception as e:
+            if entry is None:
+                raise
+            logger.warning(f"Hub request failed, serving cached metadata: {e}")
+            return entry["value"]
+
+    def _submit(self, key: str, fetch: Callable[[], Any]) -> Future:
+        """Run fetch on the pool, sharing one call between concurrent requests for key"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._executor.submit(self._fetch_and_store, key, fetch)
+                self._inflight[key] = future
+                future.add_done_callback(lambda done: self._done(key, done))
+            return future
+
+    def _fetch_and_store(self, key: str, fetch: Callable[[], Any]) -> Any:
+        value = fetch()
+        self.cache.put(key, value)
+        return value
+
+    def _done(self, key: str, future: Future) -> None:
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        if future.exception() is not None:
+            logger.debug(f"Hub request {key} failed: {future.exception()}")
+
+    def wait_idle(self, timeout: Optional[float] = None) -> None:
+        """Wait for in-flight requests, including background refreshes"""
+        with self._lock:
+            futures = list(self._inflight.values())
+        for future in futures:
+            try:
+                future.result(timeout)
+            except Exception:
+                pass
@@ -0,0 +1,147 @@
+"""
+Per-conversation KV-cache store for prompt prefix reuse in the playground
+"""
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Eviction limits for the conversation cache store
+DEFAULT_MAX_ENTRIES = 32
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+@dataclass
+class CachedPrefix:
+    """Past key/values of a conversation and the token IDs they were computed for"""
+    model_key: str
+    token_ids: List[int]
+    past_key_values: Any
+    nbytes: int
+    # Replies generated in the conversation, as sent to the client mapped to as decoded
+    raw_responses: Dict[str, str] = field(default_factory=dict)
+
+
+def cache_nbytes(past_key_values) -> int:
+    """Total size of the key/value tensors held by a transformers cache"""
+    layers = getattr(past_key_values, "layers", None)
+    if layers is not None:
+        tensors = [t for layer in layers for t in (getattr(layer, "keys", None), getattr(layer, "values", None))]
+    else:
+        tensors = list(getattr(past_key_values, "key_cache", [])) + list(getattr(past_key_values, "value_cache", []))
+    return sum(t.numel() * t.element_size() for t in tensors if t is not None)
+
+
+def common_prefix_length(a: List[int], b: List[int]) -> int:
+    """Number of leading tokens two sequences share"""
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+class ConversationKVCache:
+    """
+    LRU store of past key/values keyed by conversation ID.
+
+    An entry is checked out while its conversation is generating, so two
+    concurrent requests for the same conversation never mutate one cache;
+    the second simply runs without reuse. Entries are evicted least recently
+    used first once either the entry or the byte budget is exceeded.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedPrefix]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+
+    def checkout(self, conversation_id: str, model_key: str, token_ids: List[int]) -> Tuple[Optional[Any], int]:
+        """
+        Take the cached prefix for a conversation out of the store.
+
+        Returns the past key/values cropped to the prefix shared with
+        token_ids, and the number of reused tokens. At least one prompt token
+        is always left uncached so the model has something to prefill.
+        """
+        with self._lock:
+            entry = self._entries.pop(conversation_id, None)
+            if entry is not None:
+                self.total_bytes -= entry.nbytes
+
+        if entry is None or entry.model_key != model_key:
+            return None, 0
+
+        reused = min(common_prefix_length(entry.token_ids, token_ids), len(token_ids) - 1)
+        if reused <= 0:
+            return None, 0
+
+        entry.past_key_values.crop(reused)
+        return entry.past_key_values, reused
+
+    def raw_responses(self, conversation_id: str, model_key: str) -> Dict[str, str]:
+        """The replies stored with a conversation's cache, cleaned text mapped to decoded text"""
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None or entry.model_key != model_key:
+                return {}
+            return dict(entry.raw_responses)
+
+    def store(
+        self,
+        conversation_id: str,
+        model_key: str,
+        token_ids: List[int],
+        past_key_values,
+        raw_responses: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """Save the past key/values of a conversation and evict entries over budget"""
+        cached_length = past_key_values.get_seq_length()
+        entry = CachedPrefix(
+            model_key=model_key,
+            token_ids=list(token_ids[:cached_length]),
+            past_key_values=past_key_values,
+            nbytes=cache_nbytes(past_key_values),
+            raw_responses=dict(raw_responses or {}),
+        )
+
+        with self._lock:
+            previous = self._entries.pop(conversation_id, None)
+            if previous is not None:
+                self.total_bytes -= previous.nbytes
+            self._entries[conversation_id] = entry
+            self.total_bytes += entry.nbytes
+
+            while self._entries and (len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes):
+                evicted_id, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= evicted.nbytes
+                logger.info(f"Evicted KV cache for conversation {evicted_id} ({evicted.nbytes} bytes)")
+
+    def drop(self, conversation_id: str) -> bool:
+        """Remove a conversation's cache; returns False if it wasn't cached"""
+        with self._lock:
+            entry = self._entries.pop(conversation_id, None)
+            if entry is None:
+                return False
+            self.total_bytes -= entry.nbytes
+            return True
+
+    def drop_model(self, model_key: str) -> int:
+        """Remove every conversation cached for a model; returns how many were removed"""
+        with self._lock:
+            conversation_ids = [cid for cid, entry in self._entries.items() if entry.model_key == model_key]
+            for conversation_id in conversation_ids:
+                self.total_bytes -= self._entries.pop(conversation_id).nbytes
+        return len(conversation_ids)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, conversation_id: str) -> bool:
+        return conversation_id in self._entries
@@ -0,0 +1,116 @@
+"""
+Deferred imports of the ML stack (torch, transformers, peft) and background warm-up
+"""
+import importlib
+import logging
+import threading
+import time
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Imported by the background warm-up, heaviest first
+WARM_UP_MODULES = (
+    "torch",
+    "transformers",
+    "peft",
+    "datasets",
+    "app.core.trainer",
+    "app.core.evaluator",
+)
+
+
+class LazyModule:
+    """
+    Stand-in for a module that imports it on first attribute access.
+
+    `torch = LazyModule("torch")` lets module-level code refer to
+    `torch.float16` or `transformers.AutoTokenizer` inside functions without
+    paying for the import until one of them runs.
+    """
+
+    def __init__(self, name: str):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self) -> ModuleType:
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self.__dict__["_name"])
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr: str, value: Any) -> None:
+        setattr(self._load(), attr, value)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<LazyModule {self.__dict__['_name']} ({state})>"
+
+
+class WarmUp:
+    """Imports the ML stack on a background thread once the server is up"""
+
+    def __init__(self, modules: Sequence[str] = WARM_UP_MODULES):
+        self.modules = tuple(modules)
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._hooks: List[Callable[[], None]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._done = threading.Event()
+
+    def on_ready(self, hook: Callable[[], None]) -> Callable[[], None]:
+        """Register a function to run on the warm-up thread after the imports"""
+        self._hooks.append(hook)
+        return hook
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="ml-warm-up", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def status(self) -> Dict[str, Any]:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.finished_at or time.time()) - self.started_at, 3)
+        return {
+            "state": self.state,
+            "seconds": elapsed,
+            "modules": dict(self.timings),
+            "error": self.error,
+        }
+
+    def _run(self) -> None:
+        self.state = "loading"
+        self.started_at = time.time()
+        try:
+            for name in self.modules:
+                start_time = time.perf_counter()
+                importlib.import_module(name)
+                self.timings[name] = round(time.perf_counter() - start_time, 3)
+            for hook in self._hooks:
+                hook()
+            self.state = "ready"
+            logger.info(f"ML stack warmed up in {time.time() - self.started_at:.1f}s")
+        except Exception as e:
+            # Requests still import what they need on first use
+            self.state = "failed"
+            self.error = str(e)
+            logger.warning(f"ML stack warm-up failed: {e}")
+        finally:
+            self.finished_at = time.time()
+            self._done.set()
+
+
+warm_up = WarmUp()
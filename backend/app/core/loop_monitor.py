@@ -0,0 +1,161 @@
+"""
+Event-loop blocking detector for debugging handlers that do blocking work
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Debug mode is off unless enabled through the environment
+ENABLED_ENV = "SLM_DEBUG_LOOP_BLOCKING"
+THRESHOLD_ENV = "SLM_LOOP_BLOCK_THRESHOLD_MS"
+DEFAULT_THRESHOLD = 0.1
+
+MAX_EVENTS = 200
+UNKNOWN_ROUTE = "<unknown>"
+
+
+class BlockingDetector:
+    """
+    Detects event-loop stalls longer than a threshold and captures the stack
+    of the code that caused them.
+
+    A heartbeat task on the event loop records when it last ran. A watchdog
+    thread notices when the heartbeat is overdue, snapshots the loop thread's
+    stack while it is still blocked, and attributes the stall to the route
+    whose endpoint appears in that stack. When the loop wakes, the heartbeat
+    records the stall's full duration.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, enabled: bool = False):
+        self.threshold = threshold
+        self.enabled = enabled
+        self.events: "deque[Dict[str, Any]]" = deque(maxlen=MAX_EVENTS)
+        self.route_stats: Dict[str, Dict[str, float]] = {}
+        self._endpoints: Dict[Any, str] = {}
+        self._lock = threading.Lock()
+        self._last_beat = time.monotonic()
+        self._pending: Optional[Dict[str, Any]] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> "BlockingDetector":
+        threshold_ms = os.environ.get(THRESHOLD_ENV)
+        return cls(
+            threshold=float(threshold_ms) / 1000 if threshold_ms else DEFAULT_THRESHOLD,
+            enabled=os.environ.get(ENABLED_ENV, "").lower() in ("1", "true", "yes"),
+        )
+
+    def attach(self, app) -> None:
+        """Map endpoint code objects to route paths, for attributing stalls"""
+        for route in getattr(app, "routes", []):
+            endpoint = getattr(route, "endpoint", None)
+            code = getattr(endpoint, "__code__", None)
+            if code is not None:
+                self._endpoints[code] = route.path
+
+    def start(self) -> None:
+        """Start the heartbeat on the running loop and the watchdog thread"""
+        loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._heartbeat = loop.create_task(self._beat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-blocking-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Event-loop blocking detector enabled (threshold {self.threshold * 1000:.0f} ms)")
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            try:
+                await self._heartbeat
+            except asyncio.CancelledError:
+                pass
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.events.clear()
+            self.route_stats.clear()
+
+    def blocking_time(self, route: str) -> float:
+        """Total seconds the loop was blocked by a route"""
+        return self.route_stats.get(route, {}).get("total_seconds", 0.0)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "threshold_ms": round(self.threshold * 1000, 1),
+                "routes": {route: dict(stats) for route, stats in self.route_stats.items()},
+                "events": list(self.events),
+            }
+
+    async def _beat(self) -> None:
+        interval = self.threshold / 4
+        while True:
+            before = time.monotonic()
+            self._last_beat = before
+            await asyncio.sleep(interval)
+            stalled = time.monotonic() - before - interval
+            if stalled > self.threshold:
+                self._record(stalled)
+
+    def _watch(self) -> None:
+        interval = self.threshold / 4
+        while not self._stop.wait(interval):
+            overdue = time.monotonic() - self._last_beat
+            if overdue > self.threshold and self._pending is None:
+                self._pending = self._capture()
+
+    def _capture(self) -> Dict[str, Any]:
+        """Snapshot the loop thread's stack and find the route it's serving"""
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return {"route": UNKNOWN_ROUTE, "stack": []}
+
+        summary = traceback.extract_stack(frame)
+        route = UNKNOWN_ROUTE
+        while frame is not None:
+            if frame.f_code in self._endpoints:
+                route = self._endpoints[frame.f_code]
+                break
+            frame = frame.f_back
+        return {"route": route, "stack": traceback.format_list(summary)}
+
+    def _record(self, duration: float) -> None:
+        pending, self._pending = self._pending, None
+        pending = pending or {"route": UNKNOWN_ROUTE, "stack": []}
+        event = {
+            "route": pending["route"],
+            "duration_ms": round(duration * 1000, 1),
+            "stack": pending["stack"],
+            "time": time.time(),
+        }
+
+        with self._lock:
+            self.events.append(event)
+            stats = self.route_stats.setdefault(event["route"], {"stalls": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            stats["stalls"] += 1
+            stats["total_seconds"] = round(stats["total_seconds"] + duration, 4)
+            stats["max_seconds"] = round(max(stats["max_seconds"], duration), 4)
+
+        logger.warning(
+            f"Event loop blocked for {event['duration_ms']:.0f} ms in {event['route']}\n" + "".join(event["stack"])
+        )
+
+
+detector = BlockingDetector.from_env()
@@ -0,0 +1,146 @@
+"""
+Merge-and-export of fine-tuned LoRA adapters into standalone inference models
+"""
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from app.core.lazy_imports import LazyModule
+from app.core.storage import load_json_file, save_json_file
+
+torch = LazyModule("torch")
+transformers = LazyModule("transformers")
+peft = LazyModule("peft")
+
+logger = logging.getLogger(__name__)
+
+# Downloaded models directory
+MODELS_DIR = Path("./downloaded_models")
+
+ADAPTER_CONFIG_FILE = "adapter_config.json"
+EXPORT_INFO_FILE = "export_info.json"
+MERGED_MODEL_DIRNAME = "merged_model"
+
+EXPORT_DTYPES = ("float32", "bfloat16", "float16")
+EXPORT_QUANTIZATIONS = ("int8_dynamic",)
+
+
+def resolve_base_model_path(base_model_id: str) -> str:
+    """Prefer a downloaded copy of the base model, falling back to the Hub ID"""
+    local_path = MODELS_DIR / base_model_id.replace("/", "_")
+    return str(local_path) if local_path.exists() else base_model_id
+
+
+def load_export_info(merged_dir: Path) -> Optional[Dict[str, Any]]:
+    """Load the export manifest of a merged model, or None if it was never exported"""
+    return load_json_file(merged_dir / EXPORT_INFO_FILE, default={}) or None
+
+
+def load_merged_model(adapter_dir: Path):
+    """
+    Load a LoRA adapter's base model and merge the adapter into it.
+
+    Returns:
+        The merged float32 CPU model, its tokenizer and the base model ID
+    """
+    adapter_config = load_json_file(adapter_dir / ADAPTER_CONFIG_FILE, default={})
+    base_model_id = adapter_config.get("base_model_name_or_path")
+    if not base_model_id:
+        raise ValueError(f"No LoRA adapter found in {adapter_dir}")
+
+    base_model_path = resolve_base_model_path(base_model_id)
+    logger.info(f"Merging adapter {adapter_dir} into {base_model_path}")
+
+    # Merge in float32 on CPU so rounding happens once, after the merge
+    base_model = transformers.AutoModelForCausalLM.from_pretrained(
+        base_model_path,
+        dtype=torch.float32,
+        low_cpu_mem_usage=True
+    )
+    model = peft.PeftModel.from_pretrained(base_model, str(adapter_dir))
+    model = model.merge_and_unload()
+
+    # Fine-tunes don't save a tokenizer; use the base model's
+    tokenizer_source = adapter_dir if (adapter_dir / "tokenizer_config.json").exists() else base_model_path
+    tokenizer = transformers.AutoTokenizer.from_pretrained(str(tokenizer_source))
+
+    return model, tokenizer, base_model_id
+
+
+def export_merged_model(
+    job_id: str,
+    adapter_dir: Path,
+    output_dir: Path,
+    dtype: str = "float32",
+    quantization: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Merge a LoRA adapter into its base weights and save a standalone model.
+
+    The merged weights are written as safetensors together with the tokenizer
+    and an export manifest. int8 dynamic quantization cannot be serialized to
+    safetensors, so it is recorded in the manifest and applied at load time.
+
+    A re-export removes the previous manifest first and replaces the output
+    directory only once the new one is complete, so loads never see partial
+    weights.
+
+    Args:
+        job_id: Training job the adapter belongs to
+        adapter_dir: Directory holding the job's LoRA adapter
+        output_dir: Directory to write the merged model to
+        dtype: Weight dtype of the exported model
+        quantization: Optional load-time quantization ("int8_dynamic")
+
+    Returns:
+        The export manifest
+    """
+    if dtype not in EXPORT_DTYPES:
+        raise ValueError(f"Unsupported export dtype: {dtype}")
+    if quantization is not None and quantization not in EXPORT_QUANTIZATIONS:
+        raise ValueError(f"Unsupported quantization: {quantization}")
+    if quantization == "int8_dynamic" and dtype != "float32":
+        raise ValueError("int8_dynamic quantization requires float32 weights")
+
+    # Loads trust the manifest, so drop it before anything replaces the weights
+    (output_dir / EXPORT_INFO_FILE).unlink(missing_ok=True)
+
+    start_time = time.perf_counter()
+    model, tokenizer, base_model_id = load_merged_model(adapter_dir)
+    model = model.to(getattr(torch, dtype))
+
+    # Write next to the output and swap it in with one rename, so a failed
+    # export never leaves partial shards behind a manifest
+    staging = output_dir.with_name(f"{output_dir.name}.tmp-{os.getpid()}")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    try:
+        model.save_pretrained(str(staging), safe_serialization=True)
+        tokenizer.save_pretrained(str(staging))
+
+        size_bytes = sum(f.stat().st_size for f in staging.glob("*.safetensors"))
+        export_info = {
+            "job_id": job_id,
+            "base_model": base_model_id,
+            "dtype": dtype,
+            "quantization": quantization,
+            "format": "safetensors",
+            "path": str(output_dir),
+            "size_mb": round(size_bytes / (1024 * 1024), 2),
+            "duration_seconds": round(time.perf_counter() - start_time, 2),
+            "created_at": datetime.now().isoformat(),
+        }
+        save_json_file(staging / EXPORT_INFO_FILE, export_info)
+
+        shutil.rmtree(output_dir, ignore_errors=True)
+        os.replace(staging, output_dir)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    logger.info(f"[{job_id}] Exported merged model to {output_dir}")
+
+    return export_info
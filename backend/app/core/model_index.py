@@ -0,0 +1,211 @@
+"""
+Parameter counts and memory estimates from config.json and safetensors headers
+
+Works from what's cheap to read: the JSON header of each safetensors shard
+(tensor shapes and dtypes, never the weights), config.json, or the
+equivalent fields of cached Hub metadata. Estimates follow the trainer's
+setup - LoRA on q/k/v/o_proj with TrainingConfig's defaults - and are
+meant for warnings, not exact accounting.
+"""
+import json
+import struct
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# Bytes per element of safetensors dtypes
+DTYPE_BYTES = {
+    "F64": 8, "I64": 8, "U64": 8,
+    "F32": 4, "I32": 4, "U32": 4,
+    "F16": 2, "BF16": 2, "I16": 2, "U16": 2,
+    "F8_E4M3": 1, "F8_E5M2": 1, "I8": 1, "U8": 1, "BOOL": 1,
+}
+
+# Bytes per weight when loaded; 4-bit NF4 also stores a block-wise absmax scale
+BYTES_PER_PARAM = {"fp32": 4.0, "fp16": 2.0, "4bit": 0.5625}
+
+# TrainingConfig defaults
+DEFAULT_LORA_R = 8
+DEFAULT_BATCH_SIZE = 4
+DEFAULT_SEQ_LEN = 512
+LORA_TARGET_MODULES = ("q_proj", "k_proj", "v_proj", "o_proj")
+
+# LoRA weights train in fp32: weight, gradient and two Adam moments
+LORA_BYTES_PER_PARAM = 16
+# Loss over fp32 logits keeps the logits and their gradient
+LOGIT_BYTES = 8
+# Python, torch and the CUDA context
+RUNTIME_OVERHEAD_BYTES = 512 * 1024 * 1024
+
+# Model types whose MLP has gate, up and down projections
+GATED_MLP_MODEL_TYPES = {"llama", "mistral", "mixtral", "qwen2", "qwen3", "gemma", "gemma2", "phi3", "olmo", "stablelm"}
+
+# Config fields kept in the index, with the names other architectures use for them
+CONFIG_FIELDS = {
+    "hidden_size": ("hidden_size", "n_embd", "d_model"),
+    "intermediate_size": ("intermediate_size", "n_inner", "ffn_dim"),
+    "num_hidden_layers": ("num_hidden_layers", "n_layer", "num_layers"),
+    "num_attention_heads": ("num_attention_heads", "n_head"),
+    "num_key_value_heads": ("num_key_value_heads",),
+    "head_dim": ("head_dim",),
+    "vocab_size": ("vocab_size",),
+    "max_position_embeddings": ("max_position_embeddings", "n_positions"),
+    "tie_word_embeddings": ("tie_word_embeddings",),
+    "torch_dtype": ("torch_dtype",),
+}
+
+
+def read_safetensors_header(path: Path) -> Dict[str, Any]:
+    """Tensor names mapped to {"dtype", "shape", "data_offsets"}, without reading the weights"""
+    with open(path, "rb") as f:
+        (header_size,) = struct.unpack("<Q", f.read(8))
+        if header_size > path.stat().st_size - 8:
+            raise ValueError(f"{path.name} is not a safetensors file")
+        header = json.loads(f.read(header_size))
+    header.pop("__metadata__", None)
+    return header
+
+
+def parameters_by_dtype(model_dir: Path) -> Dict[str, int]:
+    """Number of weights per dtype in a model directory's safetensors files; empty if it has none"""
+    counts: Dict[str, int] = {}
+    for shard in sorted(model_dir.glob("*.safetensors")):
+        for tensor in read_safetensors_header(shard).values():
+            count = 1
+            for dim in tensor["shape"]:
+                count *= dim
+            counts[tensor["dtype"]] = counts.get(tensor["dtype"], 0) + count
+    return counts
+
+
+def summarize_config(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """The architecture fields of a config.json, under their Llama-style names"""
+    config = config or {}
+    summary = {
+        "model_type": config.get("model_type"),
+        "architecture": (config.get("architectures") or [None])[0],
+    }
+    for field, names in CONFIG_FIELDS.items():
+        summary[field] = next((config[name] for name in names if config.get(name) is not None), None)
+    return summary
+
+
+def _dims(config: Optional[Dict[str, Any]]) -> Optional[Dict[str, int]]:
+    """Layer dimensions of a summarized config, or None if it lacks them"""
+    if not config:
+        return None
+    hidden, layers, vocab = config.get("hidden_size"), config.get("num_hidden_layers"), config.get("vocab_size")
+    if not (hidden and layers and vocab):
+        return None
+    heads = config.get("num_attention_heads") or 1
+    head_dim = config.get("head_dim") or hidden // heads
+    return {
+        "hidden": hidden,
+        "layers": layers,
+        "vocab": vocab,
+        "heads": heads,
+        "intermediate": config.get("intermediate_size") or 4 * hidden,
+        "q_dim": head_dim * heads,
+        "kv_dim": head_dim * (config.get("num_key_value_heads") or heads),
+    }
+
+
+def estimate_parameters(config: Optional[Dict[str, Any]]) -> Optional[int]:
+    """Weights of a decoder-only transformer with the summarized config's shape"""
+    dims = _dims(config)
+    if dims is None:
+        return None
+    hidden = dims["hidden"]
+    attention = 2 * hidden * dims["q_dim"] + 2 * hidden * dims["kv_dim"]
+    mlp_matrices = 3 if config.get("model_type") in GATED_MLP_MODEL_TYPES else 2
+    per_layer = attention + mlp_matrices * hidden * dims["intermediate"] + 2 * hidden
+    embeddings = dims["vocab"] * hidden
+    lm_head = 0 if config.get("tie_word_embeddings") else embeddings
+    return dims["layers"] * per_layer + embeddings + hidden + lm_head
+
+
+def lora_parameters(config: Optional[Dict[str, Any]], r: int = DEFAULT_LORA_R) -> Optional[int]:
+    """Trainable weights of LoRA adapters of rank r on q/k/v/o_proj"""
+    dims = _dims(config)
+    if dims is None:
+        return None
+    hidden = dims["hidden"]
+    per_layer = r * (hidden + dims["q_dim"]) * 2 + r * (hidden + dims["kv_dim"]) * 2
+    return dims["layers"] * per_layer
+
+
+def estimate_memory(
+    num_parameters: int,
+    config: Optional[Dict[str, Any]] = None,
+    lora_r: int = DEFAULT_LORA_R,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    seq_len: int = DEFAULT_SEQ_LEN,
+) -> Dict[str, Any]:
+    """
+    Expected peak memory for inference and LoRA training at each precision.
+
+    Activations follow Korthikanti et al., "Reducing Activation Recomputation
+    in Large Transformer Models": s*b*h*(34 + 5*a*s/h) bytes per layer in
+    16-bit. The 4-bit path (QLoRA) uses gradient checkpointing, keeping only
+    each layer's input plus one layer's activations. Without the config's
+    dimensions only weights and overhead are counted.
+    """
+    dims = _dims(config)
+    lora = lora_parameters(config, lora_r) or 0
+    estimates: Dict[str, Any] = {}
+    for precision, bytes_per_param in BYTES_PER_PARAM.items():
+        weights = int(num_parameters * bytes_per_param)
+        # Compute runs in fp32 on the fp32 path, in fp16 otherwise
+        scale = 2 if precision == "fp32" else 1
+        kv_cache = activations = 0
+        if dims:
+            hidden, layers = dims["hidden"], dims["layers"]
+            kv_cache = 2 * layers * dims["kv_dim"] * seq_len * 2 * scale
+            tokens = batch_size * seq_len
+            layer_activations = tokens * hidden * (34 + 5 * dims["heads"] * seq_len / hidden) * scale
+            if precision == "4bit":
+                layer_inputs = layers * tokens * hidden * 2 * scale
+                activations = int(layer_inputs + layer_activations)
+            else:
+                activations = int(layers * layer_activations)
+            activations += tokens * dims["vocab"] * LOGIT_BYTES
+        estimates[precision] = {
+            "weights_bytes": weights,
+            "inference_bytes": weights + kv_cache + RUNTIME_OVERHEAD_BYTES,
+            "training_bytes": weights + lora * LORA_BYTES_PER_PARAM + activations + RUNTIME_OVERHEAD_BYTES,
+        }
+    estimates["lora_parameters"] = lora or None
+    estimates["assumptions"] = {"lora_r": lora_r, "batch_size": batch_size, "seq_len": seq_len}
+    return estimates
+
+
+def weights_bytes(counts: Dict[str, int]) -> int:
+    """Size of weights stored with the given per-dtype counts"""
+    return sum(count * DTYPE_BYTES.get(dtype, 4) for dtype, count in counts.items())
+
+
+def build_profile(
+    config: Optional[Dict[str, Any]],
+    counts: Optional[Dict[str, int]] = None,
+    size_bytes: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Parameter count, size and memory estimates of a model.
+
+    config is a summarize_config() result; counts are weights per dtype
+    from safetensors headers. The parameter count comes from the headers
+    when there are any, otherwise from the config's shape.
+    """
+    num_parameters = sum(counts.values()) if counts else None
+    source = "safetensors" if num_parameters else None
+    if not num_parameters:
+        num_parameters = estimate_parameters(config)
+        source = "config" if num_parameters else None
+    if size_bytes is None and counts:
+        size_bytes = weights_bytes(counts)
+    return {
+        "num_parameters": num_parameters,
+        "parameters_source": source,
+        "parameters_by_dtype": counts or None,
+        "size_bytes": size_bytes,
+        "memory": estimate_memory(num_parameters, config) if num_parameters else None,
+    }
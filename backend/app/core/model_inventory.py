@@ -0,0 +1,157 @@
+"""
+Persistent inventory of downloaded models
+
+Each model directory's size, file count, revision, config summary and
+parameter counts are computed once and kept in .inventory.json in the
+models directory. An entry is rescanned only when its directory's mtime
+changes, so listing models costs one stat per model instead of one per file.
+"""
+import logging
+import struct
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.core.blob_store import BlobStore, BLOBS_DIRNAME
+from app.core.model_index import parameters_by_dtype, summarize_config
+from app.core.storage import load_json_file, save_json_file
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_FILENAME = ".inventory.json"
+INVENTORY_VERSION = 2
+
+# Directories smaller than this are empty or barely started downloads
+MIN_MODEL_BYTES = 1024 * 1024
+
+
+def scan_model_dir(model_dir: Path, manifest: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Describe one model directory by walking its files"""
+    size_bytes = 0
+    file_count = 0
+    for path in model_dir.rglob("*"):
+        if path.is_file():
+            size_bytes += path.stat().st_size
+            file_count += 1
+
+    config = summarize_config(load_json_file(model_dir / "config.json", default={}))
+    try:
+        counts = parameters_by_dtype(model_dir)
+    except (OSError, ValueError, KeyError, TypeError, struct.error) as e:
+        logger.warning(f"Could not read safetensors headers in {model_dir}: {e}")
+        counts = {}
+
+    manifest = manifest or {}
+    return {
+        # Folder names replace "/" with "_", so prefer the ID recorded at download time
+        "model_id": manifest.get("model_id") or model_dir.name.replace("_", "/"),
+        "local_path": str(model_dir),
+        "size_mb": size_bytes / (1024 * 1024),
+        "size_bytes": size_bytes,
+        "file_count": file_count,
+        "revision": manifest.get("revision"),
+        "architecture": config["architecture"],
+        "model_type": config["model_type"],
+        "num_parameters": sum(counts.values()) or None,
+        "parameters_by_dtype": counts,
+        "config": config,
+        "mtime": model_dir.stat().st_mtime,
+    }
+
+
+class ModelInventory:
+    """Cached descriptions of the model directories in models_dir, by folder name"""
+
+    def __init__(self, models_dir: Path):
+        self.models_dir = models_dir
+        self.path = models_dir / INVENTORY_FILENAME
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            data = load_json_file(self.path, default={})
+            self._entries = data.get("models", {}) if data.get("version") == INVENTORY_VERSION else {}
+        return self._entries
+
+    def _save(self) -> None:
+        save_json_file(self.path, {"version": INVENTORY_VERSION, "models": self._entries})
+
+    def _scan(self, folder: str) -> Dict[str, Any]:
+        manifest = BlobStore(self.models_dir / BLOBS_DIRNAME).load_manifest(folder)
+        return scan_model_dir(self.models_dir / folder, manifest)
+
+    def update(self, folder: str) -> Optional[Dict[str, Any]]:
+        """Rescan one model directory, e.g. after its download completes"""
+        with self._lock:
+            entries = self._load()
+            if (self.models_dir / folder).is_dir():
+                entries[folder] = self._scan(folder)
+            else:
+                entries.pop(folder, None)
+            self._save()
+            return entries.get(folder)
+
+    def get(self, folder: str) -> Optional[Dict[str, Any]]:
+        """One model directory's entry, rescanned if it changed; None if it doesn't exist"""
+        with self._lock:
+            entries = self._load()
+            model_dir = self.models_dir / folder
+            if not model_dir.is_dir():
+                if entries.pop(folder, None) is not None:
+                    self._save()
+                return None
+            entry = entries.get(folder)
+            if entry is None or entry["mtime"] != model_dir.stat().st_mtime:
+                entry = entries[folder] = self._scan(folder)
+                self._save()
+            return entry
+
+    def remove(self, folder: str) -> None:
+        with self._lock:
+            if self._load().pop(folder, None) is not None:
+                self._save()
+
+    def refresh(self) -> Dict[str, Dict[str, Any]]:
+        """Rescan the model directories whose mtime changed and drop deleted ones"""
+        with self._lock:
+            entries = self._load()
+            changed = False
+            current = set()
+            if self.models_dir.exists():
+                for model_dir in self.models_dir.iterdir():
+                    # Skip the blob store and other hidden entries
+                    if model_dir.name.startswith(".") or not model_dir.is_dir():
+                        continue
+                    current.add(model_dir.name)
+                    entry = entries.get(model_dir.name)
+                    if entry is None or entry["mtime"] != model_dir.stat().st_mtime:
+                        entries[model_dir.name] = self._scan(model_dir.name)
+                        changed = True
+            for folder in set(entries) - current:
+                del entries[folder]
+                changed = True
+            if changed:
+                self._save()
+            return dict(entries)
+
+    def models(self) -> List[Dict[str, Any]]:
+        """Downloaded models sorted by model ID"""
+        entries = self.refresh()
+        return sorted(
+            (entry for entry in entries.values() if entry["size_bytes"] > MIN_MODEL_BYTES),
+            key=lambda entry: entry["model_id"],
+        )
+
+
+_inventories: Dict[Path, ModelInventory] = {}
+_inventories_lock = threading.Lock()
+
+
+def get_inventory(models_dir: Path) -> ModelInventory:
+    """The shared inventory of a models directory"""
+    key = models_dir.resolve()
+    with _inventories_lock:
+        if key not in _inventories:
+            _inventories[key] = ModelInventory(models_dir)
+        return _inventories[key]
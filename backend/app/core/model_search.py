@@ -0,0 +1,163 @@
+"""
+Local full-text and tag search over known models
+
+Indexes every model the server knows about without the network: the
+downloaded models and all Hub metadata fetched earlier (model info,
+search results and model cards). Hub entries keep the token scope they
+were fetched with, so gated or private models only show up for the same
+token. The index is rebuilt only when the metadata cache or the models
+directory changes.
+"""
+import bisect
+import re
+import threading
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from app.core.hub_metadata import HubMetadata, token_scope
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Characters of a model card that are indexed
+MAX_CARD_CHARS = 20_000
+
+# Sort keys of the Hub's search; trending isn't cached, so it falls back to downloads
+SORT_FIELDS = {"downloads": "downloads", "likes": "likes", "lastModified": "last_modified", "last_modified": "last_modified"}
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def local_model(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """A downloaded model's inventory entry in the shape of cached Hub metadata"""
+    model_id = entry["model_id"]
+    architecture = entry.get("architecture")
+    counts = entry.get("parameters_by_dtype") or {}
+    return {
+        "id": model_id,
+        "author": model_id.split("/")[0] if "/" in model_id else None,
+        "downloads": 0,
+        "likes": 0,
+        "tags": [tag for tag in (entry.get("model_type"), architecture) if tag],
+        "pipeline_tag": "text-generation" if architecture and architecture.endswith("ForCausalLM") else None,
+        "last_modified": None,
+        "config": entry.get("config"),
+        "safetensors": {"parameters": counts, "total": sum(counts.values())} if counts else None,
+        "siblings": None,
+    }
+
+
+class ModelSearchIndex:
+    """Inverted index from words of model IDs, tags and cards to model IDs"""
+
+    def __init__(self):
+        self._models: Dict[str, Dict[str, Any]] = {}
+        # Token scopes a Hub model was seen with; None for downloaded models, visible to everyone
+        self._scopes: Dict[str, Optional[Set[str]]] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._vocabulary: List[str] = []
+        self._signature: Optional[Hashable] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def refresh(self, hub_metadata: HubMetadata, downloaded: Iterable[Dict[str, Any]]) -> None:
+        """Rebuild from the metadata cache and the downloaded models' inventory entries if either changed"""
+        downloaded = list(downloaded)
+        # Holding the cache itself keeps identity comparisons valid
+        signature = (
+            hub_metadata.cache,
+            hub_metadata.cache.generation,
+            tuple(sorted((entry["model_id"], entry["mtime"]) for entry in downloaded)),
+        )
+        with self._lock:
+            if signature != self._signature:
+                self._build(hub_metadata, downloaded)
+                self._signature = signature
+
+    def _build(self, hub_metadata: HubMetadata, downloaded: List[Dict[str, Any]]) -> None:
+        models: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        scopes: Dict[str, Optional[Set[str]]] = {}
+        for kind in ("search", "model_info"):
+            for scope, _, entry in hub_metadata.cached(kind):
+                values = entry["value"] if kind == "search" else [entry["value"]]
+                for model in values:
+                    # The most recently fetched copy of a model wins
+                    if model["id"] not in models or models[model["id"]][0] <= entry["fetched_at"]:
+                        models[model["id"]] = (entry["fetched_at"], model)
+                    scopes.setdefault(model["id"], set()).add(scope)
+
+        for entry in downloaded:
+            model_id = entry["model_id"]
+            if model_id not in models:
+                models[model_id] = (0, local_model(entry))
+            scopes[model_id] = None
+
+        cards = {}
+        for _, args, entry in hub_metadata.cached("model_card"):
+            if args and args[0] in models and entry["value"]:
+                cards[args[0]] = entry["value"][:MAX_CARD_CHARS]
+
+        postings: Dict[str, Set[str]] = {}
+        for model_id, (_, model) in models.items():
+            card_data = model.get("card_data") or {}
+            text = " ".join([
+                model_id,
+                model.get("pipeline_tag") or "",
+                " ".join(model.get("tags") or []),
+                " ".join(str(value) for value in (card_data.get("language"), card_data.get("base_model")) if value),
+                cards.get(model_id, ""),
+            ])
+            for token in set(tokenize(text)):
+                postings.setdefault(token, set()).add(model_id)
+
+        self._models = {model_id: model for model_id, (_, model) in models.items()}
+        self._scopes = scopes
+        self._postings = postings
+        self._vocabulary = sorted(postings)
+
+    def _matching(self, token: str) -> Set[str]:
+        """Models with a word starting with token"""
+        matches: Set[str] = set()
+        start = bisect.bisect_left(self._vocabulary, token)
+        for word in self._vocabulary[start:]:
+            if not word.startswith(token):
+                break
+            matches |= self._postings[word]
+        return matches
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        task: Optional[str] = None,
+        sort: str = "downloads",
+        limit: int = 20,
+        token: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Models matching every word of query and, if given, the task, in Hub search order"""
+        scope = token_scope(token)
+        with self._lock:
+            candidates = set(self._models)
+            query_text = (query or "").lower()
+            for word in tokenize(query):
+                candidates &= self._matching(word)
+            if query_text:
+                # Like the Hub, also match the query as a substring of the ID
+                candidates |= {model_id for model_id in self._models if query_text in model_id.lower()}
+
+            results = []
+            for model_id in candidates:
+                visible = self._scopes.get(model_id)
+                if visible is not None and not visible & {"anonymous", scope}:
+                    continue
+                model = self._models[model_id]
+                if task and model.get("pipeline_tag") != task and task not in (model.get("tags") or []):
+                    continue
+                results.append(model)
+
+        field = SORT_FIELDS.get(sort, "downloads")
+        empty = "" if field == "last_modified" else 0
+        results.sort(key=lambda model: model["id"])
+        results.sort(key=lambda model: model.get(field) or empty, reverse=True)
+        return results[:limit]
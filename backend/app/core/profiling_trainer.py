@@ -0,0 +1,59 @@
+"""
+Trainer hooks that feed a TrainingProfiler
+"""
+import time
+
+from transformers import Trainer, TrainerCallback
+
+from app.core.training_profiler import TrainingProfiler, synchronize
+
+
+class ProfilerCallback(TrainerCallback):
+    """Times the optimizer step and closes each step record"""
+
+    def __init__(self, profiler: TrainingProfiler):
+        self.profiler = profiler
+
+    def on_pre_optimizer_step(self, args, state, control, **kwargs):
+        self.profiler.begin_optimizer()
+
+    def on_optimizer_step(self, args, state, control, **kwargs):
+        self.profiler.end_optimizer()
+
+    def on_step_end(self, args, state, control, **kwargs):
+        self.profiler.end_step()
+
+
+class ProfilingTrainer(Trainer):
+    """Trainer that splits each step into data loading, forward and backward time"""
+
+    def __init__(self, *args, profiler: TrainingProfiler, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.profiler = profiler
+        self._forward_time = 0.0
+        self.add_callback(ProfilerCallback(profiler))
+
+    def get_batch_samples(self, epoch_iterator, num_batches, device):
+        self.profiler.begin_step()
+        start_time = time.perf_counter()
+        batch_samples = super().get_batch_samples(epoch_iterator, num_batches, device)
+        self.profiler.add("data_loading", time.perf_counter() - start_time)
+        return batch_samples
+
+    def compute_loss(self, model, inputs, *args, **kwargs):
+        start_time = time.perf_counter()
+        result = super().compute_loss(model, inputs, *args, **kwargs)
+        synchronize()
+        self._forward_time += time.perf_counter() - start_time
+        return result
+
+    def training_step(self, model, inputs, *args, **kwargs):
+        self.profiler.count_tokens(inputs)
+        self._forward_time = 0.0
+        start_time = time.perf_counter()
+        loss = super().training_step(model, inputs, *args, **kwargs)
+        synchronize()
+        elapsed = time.perf_counter() - start_time
+        self.profiler.add("forward", self._forward_time)
+        self.profiler.add("backward", max(elapsed - self._forward_time, 0.0))
+        return loss
@@ -0,0 +1,262 @@
+"""
+Per-job resource accounting for training worker processes
+"""
+import logging
+import subprocess
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import psutil
+
+from app.core.hardware_info import get_static_facts
+from app.core.storage import load_json_file, save_json_file
+
+logger = logging.getLogger(__name__)
+
+RESOURCES_FILE = "resources.json"
+
+DEFAULT_INTERVAL = 2.0
+DEFAULT_MAX_SAMPLES = 300
+
+# Extra memory kept free when admitting a job, on top of its estimate
+ADMISSION_HEADROOM = 0.1
+
+
+def read_peak_rss(pid: int) -> Optional[int]:
+    """Peak resident set size (VmHWM) of a process on Linux, in bytes"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def query_gpu_process_memory() -> Dict[int, int]:
+    """GPU memory used per process ID, from nvidia-smi when an NVIDIA driver is present"""
+    facts = get_static_facts()
+    if not facts["nvidia_gpu_names"] or not facts["nvidia_smi"]:
+        return {}
+    try:
+        result = subprocess.run(
+            [facts["nvidia_smi"], "--query-compute-apps=pid,used_memory", "--format=csv,noheader,nounits"],
+            capture_output=True,
+            text=True,
+            timeout=5
+        )
+    except Exception:
+        return {}
+    if result.returncode != 0:
+        return {}
+
+    usage: Dict[int, int] = {}
+    for line in result.stdout.splitlines():
+        try:
+            pid, used_mb = (field.strip() for field in line.split(","))
+            usage[int(pid)] = usage.get(int(pid), 0) + int(used_mb) * 1024 * 1024
+        except ValueError:
+            continue
+    return usage
+
+
+def sample_process_tree(process: psutil.Process) -> Dict[str, Any]:
+    """
+    Resource counters of a process and its children.
+
+    CPU time and I/O are cumulative; RSS is current. I/O counters are not
+    available on macOS and are reported as None there.
+    """
+    processes = [process]
+    try:
+        processes += process.children(recursive=True)
+    except psutil.Error:
+        pass
+
+    cpu_seconds, rss, peak_rss = 0.0, 0, 0
+    read_bytes, write_bytes, io_available = 0, 0, False
+    pids = []
+    for proc in processes:
+        try:
+            with proc.oneshot():
+                times = proc.cpu_times()
+                memory = proc.memory_info()
+                io = proc.io_counters() if hasattr(proc, "io_counters") else None
+        except psutil.Error:
+            continue
+
+        pids.append(proc.pid)
+        cpu_seconds += times.user + times.system
+        rss += memory.rss
+        peak_rss += read_peak_rss(proc.pid) or memory.rss
+        if io is not None:
+            io_available = True
+            read_bytes += io.read_bytes
+            write_bytes += io.write_bytes
+
+    gpu_usage = query_gpu_process_memory()
+
+    return {
+        "time": time.time(),
+        "cpu_seconds": round(cpu_seconds, 3),
+        "rss_bytes": rss,
+        "peak_rss_bytes": peak_rss,
+        "io_read_bytes": read_bytes if io_available else None,
+        "io_write_bytes": write_bytes if io_available else None,
+        "gpu_memory_bytes": sum(gpu_usage.get(pid, 0) for pid in pids) if gpu_usage else None,
+    }
+
+
+class JobResourceMonitor:
+    """
+    Samples the resources of one training worker process on a background
+    thread and keeps a summary plus a bounded sample history in the job's
+    resources.json.
+    """
+
+    def __init__(
+        self,
+        job_id: str,
+        pid: int,
+        output_path: Path,
+        interval: float = DEFAULT_INTERVAL,
+        max_samples: int = DEFAULT_MAX_SAMPLES,
+        model: Optional[str] = None,
+        expected_peak_bytes: Optional[int] = None,
+    ):
+        self.job_id = job_id
+        self.pid = pid
+        self.output_path = output_path
+        self.interval = interval
+        self._process = psutil.Process(pid)
+        self._samples: "deque[Dict[str, Any]]" = deque(maxlen=max_samples)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.summary: Dict[str, Any] = {
+            "job_id": job_id,
+            "pid": pid,
+            "model": model,
+            "expected_peak_bytes": expected_peak_bytes,
+            "status": "running",
+            "started_at": datetime.now().isoformat(),
+            "cpu_seconds": 0.0,
+            "cpu_percent": 0.0,
+            "rss_bytes": 0,
+            "peak_rss_bytes": 0,
+            "io_read_bytes": None,
+            "io_write_bytes": None,
+            "gpu_memory_bytes": None,
+            "peak_gpu_memory_bytes": None,
+        }
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name=f"resources-{self.job_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self, status: str = "finished") -> Dict[str, Any]:
+        """Stop sampling and write the final summary"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            self.summary["status"] = status
+            self.summary["finished_at"] = datetime.now().isoformat()
+        self._save()
+        return self.snapshot(include_samples=False)
+
+    def snapshot(self, include_samples: bool = True) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = dict(self.summary)
+            if include_samples:
+                snapshot["samples"] = list(self._samples)
+        return snapshot
+
+    def sample(self) -> None:
+        """Take one sample and fold it into the summary"""
+        sample = sample_process_tree(self._process)
+
+        with self._lock:
+            previous = self._samples[-1] if self._samples else None
+            self._samples.append(sample)
+
+            # The tree's counters drop once the worker exits; keep the last real values
+            summary = self.summary
+            if sample["rss_bytes"]:
+                if previous is not None and sample["time"] > previous["time"]:
+                    cpu_delta = sample["cpu_seconds"] - previous["cpu_seconds"]
+                    summary["cpu_percent"] = round(max(cpu_delta, 0) / (sample["time"] - previous["time"]) * 100, 1)
+                summary["cpu_seconds"] = max(summary["cpu_seconds"], sample["cpu_seconds"])
+                summary["rss_bytes"] = sample["rss_bytes"]
+                summary["peak_rss_bytes"] = max(summary["peak_rss_bytes"], sample["peak_rss_bytes"], sample["rss_bytes"])
+                summary["io_read_bytes"] = sample["io_read_bytes"]
+                summary["io_write_bytes"] = sample["io_write_bytes"]
+            if sample["gpu_memory_bytes"] is not None:
+                summary["gpu_memory_bytes"] = sample["gpu_memory_bytes"]
+                summary["peak_gpu_memory_bytes"] = max(summary["peak_gpu_memory_bytes"] or 0, sample["gpu_memory_bytes"])
+
+    def _save(self) -> None:
+        save_json_file(self.output_path, self.snapshot())
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sample()
+                self._save()
+            except psutil.NoSuchProcess:
+                break
+            except Exception as e:
+                logger.warning(f"[{self.job_id}] Resource sampling failed: {e}")
+            self._stop.wait(self.interval)
+
+
+def load_job_resources(job_dir: Path) -> Optional[Dict[str, Any]]:
+    """Load a job's saved resource record, or None if it was never monitored"""
+    return load_json_file(job_dir / RESOURCES_FILE, default={}) or None
+
+
+def estimate_job_memory(records: Iterable[Dict[str, Any]], model: str) -> Optional[int]:
+    """Peak RSS of the largest finished run of the same model, or None without history"""
+    peaks = [
+        record["peak_rss_bytes"] for record in records
+        if record.get("model") == model and record.get("status") == "finished" and record.get("peak_rss_bytes")
+    ]
+    return max(peaks) if peaks else None
+
+
+def check_admission(
+    required_bytes: Optional[int],
+    running: Iterable[Dict[str, Any]],
+    available_bytes: Optional[int] = None,
+) -> Tuple[bool, str]:
+    """
+    Decide whether a job expected to need required_bytes at peak fits in memory.
+
+    Running jobs may still grow to their own estimated peak, so that headroom
+    is reserved before comparing against available memory.
+    """
+    if required_bytes is None:
+        return True, "No resource history for this model"
+
+    if available_bytes is None:
+        available_bytes = psutil.virtual_memory().available
+
+    reserved = sum(
+        max((job.get("expected_peak_bytes") or 0) - (job.get("rss_bytes") or 0), 0)
+        for job in running
+    )
+    needed = int(required_bytes * (1 + ADMISSION_HEADROOM))
+    free = available_bytes - reserved
+
+    gb = 1024 ** 3
+    if needed > free:
+        return False, (
+            f"Not enough memory: job needs ~{needed / gb:.1f} GB, "
+            f"{free / gb:.1f} GB free after {reserved / gb:.1f} GB reserved for running jobs"
+        )
+    return True, f"Job needs ~{needed / gb:.1f} GB of {free / gb:.1f} GB free"
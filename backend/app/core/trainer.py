@@ -2,12 +2,14 @@
 QLoRA Fine-tuning Trainer Module
 """
 import os
+import sys
 import json
+import time
 import torch
 import logging
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from dataclasses import dataclass
 
 from transformers import (
@@ -16,6 +18,7 @@ from transformers import (
     TrainingArguments,
     Trainer,
     DataCollatorForLanguageModeling,
+    TrainerCallback,
 )
 from peft import (
     LoraConfig,
@@ -28,11 +31,81 @@ try:
 except ImportError:
     KBIT_TRAINING_AVAILABLE = False
 from datasets import load_dataset
+
+from app.core.fast_load import load_causal_lm
+from app.core.model_export import resolve_base_model_path
+from app.core.profiling_trainer import ProfilingTrainer
+from app.core.training_profiler import TrainingProfiler
 import transformers
 
 logger = logging.getLogger(__name__)
 
 
+def format_instruction(instruction: str, input_text: str = "", output: str = "") -> str:
+    """Format an example in the instruction-following format used for training"""
+    if input_text:
+        return f"### Instruction:\n{instruction}\n\n### Input:\n{input_text}\n\n### Response:\n{output}"
+    return f"### Instruction:\n{instruction}\n\n### Response:\n{output}"
+
+
+def format_training_texts(examples: Dict[str, list]) -> List[str]:
+    """Turn a batch of dataset examples into the texts the model is trained on"""
+    # Check what fields are available in the dataset
+    if 'text' in examples:
+        # Dataset has a 'text' field - use it directly
+        return examples['text']
+
+    if 'instruction' in examples:
+        # Dataset has instruction format - combine fields
+        texts = []
+        for i in range(len(examples['instruction'])):
+            instruction = examples['instruction'][i]
+            input_text = examples.get('input', [''] * len(examples['instruction']))[i]
+            output = examples.get('output', [''] * len(examples['instruction']))[i]
+            texts.append(format_instruction(instruction, input_text, output))
+        return texts
+
+    # Use first available field
+    first_field = list(examples.keys())[0]
+    return examples[first_field]
+
+
+PROGRESS_FILE = "progress.json"
+
+
+class ProgressCallback(TrainerCallback):
+    """Writes step, loss and token throughput to progress.json at every log step"""
+
+    def __init__(self, output_dir: Path):
+        self.progress_file = output_dir / PROGRESS_FILE
+        self._last_time = None
+        self._last_tokens = 0
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self._last_time = time.perf_counter()
+        self._last_tokens = state.num_input_tokens_seen
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        now = time.perf_counter()
+        tokens = state.num_input_tokens_seen
+        elapsed = now - self._last_time if self._last_time is not None else 0
+        tokens_per_second = (tokens - self._last_tokens) / elapsed if elapsed > 0 else None
+        self._last_time, self._last_tokens = now, tokens
+
+        progress = {
+            "step": state.global_step,
+            "max_steps": state.max_steps,
+            "epoch": state.epoch,
+            "loss": (logs or {}).get("loss"),
+            "tokens_seen": tokens,
+            "tokens_per_second": round(tokens_per_second, 2) if tokens_per_second is not None else None,
+            "updated_at": datetime.now().isoformat()
+        }
+        self.progress_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.progress_file, "w") as f:
+            json.dump(progress, f)
+
+
 @dataclass
 class TrainingConfig:
     """Training configuration"""
@@ -50,6 +123,8 @@ class TrainingConfig:
     warmup_steps: int = 100
     logging_steps: int = 10
     save_steps: int = 100
+    profile: bool = False
+    peak_tflops: Optional[float] = None
 
 
 class QLoRATrainer:
@@ -61,6 +136,7 @@ class QLoRATrainer:
         self.model = None
         self.tokenizer = None
         self.trainer = None
+        self.profiler = TrainingProfiler(enabled=config.profile)
         self.logs_dir = Path("./training_jobs/logs")
         self.checkpoints_dir = Path("./training_jobs/checkpoints")
         self.logs_dir.mkdir(parents=True, exist_ok=True)
@@ -96,10 +172,11 @@ class QLoRATrainer:
     def prepare_model(self):
         """Prepare model with QLoRA (if CUDA available) or regular LoRA"""
         self.log_message("INFO", "Loading tokenizer...")
-        self.tokenizer = AutoTokenizer.from_pretrained(
-            self.config.model_name,
-            trust_remote_code=True
-        )
+        with self.profiler.phase("tokenizer_load"):
+            self.tokenizer = AutoTokenizer.from_pretrained(
+                self.config.model_name,
+                trust_remote_code=True
+            )
         self.tokenizer.pad_token = self.tokenizer.eos_token
         self.tokenizer.padding_side = "right"
 
@@ -109,13 +186,14 @@ class QLoRATrainer:
         if use_quantization:
             self.log_message("INFO", "CUDA detected - Loading model with 4-bit quantization (QLoRA)...")
             # Load model with 4-bit quantization for GPU
-            model = AutoModelForCausalLM.from_pretrained(
-                self.config.model_name,
-                load_in_4bit=True,
-                torch_dtype=torch.float16,
-                device_map="auto",
-                trust_remote_code=True,
-            )
+            with self.profiler.phase("model_load"):
+                model = AutoModelForCausalLM.from_pretrained(
+                    self.config.model_name,
+                    load_in_4bit=True,
+                    torch_dtype=torch.float16,
+                    device_map="auto",
+                    trust_remote_code=True,
+                )
             self.log_message("INFO", "Preparing model for k-bit training...")
             model = prepare_model_for_kbit_training(model)
         else:
@@ -124,12 +202,27 @@ class QLoRATrainer:
             device = "mps" if torch.backends.mps.is_available() else "cpu"
             self.log_message("INFO", f"Using device: {device}")
 
-            model = AutoModelForCausalLM.from_pretrained(
-                self.config.model_name,
-                torch_dtype=torch.float32,  # Use float32 for CPU/MPS
-                device_map=device,
-                trust_remote_code=True,
-            )
+            with self.profiler.phase("model_load"):
+                if device == "cpu":
+                    # Downloaded copies load from mapped safetensors, converted once to float32
+                    model, load_report = load_causal_lm(
+                        resolve_base_model_path(self.config.model_name),
+                        dtype=torch.float32,
+                        trust_remote_code=True,
+                    )
+                    self.log_message(
+                        "INFO",
+                        f"Model loaded in {load_report['seconds']:.1f}s, "
+                        f"peak RSS {load_report['peak_rss_bytes'] / (1024 ** 3):.2f} GB "
+                        f"(zero-copy: {load_report['zero_copy']}, converted copy: {load_report['converted']})"
+                    )
+                else:
+                    model = AutoModelForCausalLM.from_pretrained(
+                        self.config.model_name,
+                        torch_dtype=torch.float32,  # Use float32 for CPU/MPS
+                        device_map=device,
+                        trust_remote_code=True,
+                    )
 
         self.log_message("INFO", f"Applying LoRA with r={self.config.lora_r}, alpha={self.config.lora_alpha}")
         # Configure LoRA
@@ -142,12 +235,13 @@ class QLoRATrainer:
             task_type="CAUSAL_LM"
         )
 
-        self.model = get_peft_model(model, lora_config)
+        with self.profiler.phase("lora_injection"):
+            self.model = get_peft_model(model, lora_config)
         self.model.print_trainable_parameters()
         self.log_message("INFO", "Model prepared successfully")
 
-    def prepare_dataset(self):
-        """Load and prepare dataset"""
+    def load_dataset_source(self):
+        """Load the raw dataset from an uploaded dataset, a local file or the Hub"""
         self.log_message("INFO", f"Loading dataset from {self.config.dataset_path}")
 
         # Check if dataset_path is a local dataset name (from uploaded datasets)
@@ -206,33 +300,18 @@ class QLoRATrainer:
                 # Try loading as HuggingFace dataset name
                 dataset = load_dataset(self.config.dataset_path)
 
+        return dataset
+
+    def prepare_dataset(self):
+        """Load and prepare dataset"""
+        with self.profiler.phase("dataset_load"):
+            dataset = self.load_dataset_source()
+
         self.log_message("INFO", f"Dataset loaded: {len(dataset['train'])} examples")
 
         # Tokenize dataset
         def tokenize_function(examples):
-            # Check what fields are available in the dataset
-            if 'text' in examples:
-                # Dataset has a 'text' field - use it directly
-                texts = examples['text']
-            elif 'instruction' in examples:
-                # Dataset has instruction format - combine fields
-                texts = []
-                for i in range(len(examples['instruction'])):
-                    instruction = examples['instruction'][i]
-                    input_text = examples.get('input', [''] * len(examples['instruction']))[i]
-                    output = examples.get('output', [''] * len(examples['instruction']))[i]
-
-                    # Format as instruction-following format
-                    if input_text:
-                        text = f"### Instruction:\n{instruction}\n\n### Input:\n{input_text}\n\n### Response:\n{output}"
-                    else:
-                        text = f"### Instruction:\n{instruction}\n\n### Response:\n{output}"
-                    texts.append(text)
-            else:
-                # Use first available field
-                first_field = list(examples.keys())[0]
-                texts = examples[first_field]
-
+            texts = format_training_texts(examples)
             return self.tokenizer(
                 texts,
                 truncation=True,
@@ -241,11 +320,12 @@ class QLoRATrainer:
             )
 
         self.log_message("INFO", "Tokenizing dataset...")
-        tokenized_dataset = dataset.map(
-            tokenize_function,
-            batched=True,
-            remove_columns=dataset["train"].column_names
-        )
+        with self.profiler.phase("tokenization"):
+            tokenized_dataset = dataset.map(
+                tokenize_function,
+                batched=True,
+                remove_columns=dataset["train"].column_names
+            )
 
         return tokenized_dataset["train"]
 
@@ -280,6 +360,7 @@ class QLoRATrainer:
                     optim="paged_adamw_8bit",
                     logging_dir=f"{self.config.output_dir}/logs",
                     report_to=["none"],  # Disable wandb/tensorboard
+                    include_num_input_tokens_seen=True,
                 )
             else:
                 # CPU/MPS training without fp16 and with standard AdamW
@@ -298,6 +379,7 @@ class QLoRATrainer:
                     optim="adamw_torch",  # Use standard AdamW for CPU/MPS
                     logging_dir=f"{self.config.output_dir}/logs",
                     report_to=["none"],  # Disable wandb/tensorboard
+                    include_num_input_tokens_seen=True,
                 )
 
             # Data collator
@@ -306,25 +388,35 @@ class QLoRATrainer:
                 mlm=False
             )
 
-            # Create trainer
-            self.trainer = Trainer(
+            # Create trainer (the profiling trainer also times each step)
+            trainer_kwargs = {}
+            trainer_class = Trainer
+            if self.profiler.enabled:
+                trainer_class = ProfilingTrainer
+                trainer_kwargs["profiler"] = self.profiler
+
+            self.trainer = trainer_class(
                 model=self.model,
                 args=training_args,
                 train_dataset=train_dataset,
                 data_collator=data_collator,
+                callbacks=[ProgressCallback(Path(self.config.output_dir))],
+                **trainer_kwargs
             )
 
             self.log_message("INFO", f"Starting training - Epochs: {self.config.num_epochs}")
 
             # Train
-            self.trainer.train()
+            with self.profiler.phase("training"):
+                self.trainer.train()
 
             self.log_message("INFO", "Training completed successfully")
 
             # Save final model
             final_output_dir = Path(self.config.output_dir) / "final_model"
             self.log_message("INFO", f"Saving final model to {final_output_dir}")
-            self.trainer.save_model(str(final_output_dir))
+            with self.profiler.phase("save"):
+                self.trainer.save_model(str(final_output_dir))
 
             return True
 
@@ -333,6 +425,19 @@ class QLoRATrainer:
             logger.exception(f"Training error for job {self.job_id}")
             return False
 
+        finally:
+            # A partial profile still shows where a failed run spent its time
+            if self.profiler.enabled:
+                try:
+                    report = self.profiler.save_report(Path(self.config.output_dir), self.model, self.config.peak_tflops)
+                    self.log_message(
+                        "INFO",
+                        f"Profile saved - {report['tokens_per_second']} tokens/sec, bottleneck: {report['bottleneck']}"
+                    )
+                except Exception as e:
+                    # Must not replace the training result
+                    logger.warning(f"Could not save profile for job {self.job_id}: {e}")
+
 
 def start_training_job(job_id: str, config: Dict[str, Any]) -> bool:
     """
@@ -354,8 +459,11 @@ def start_training_job(job_id: str, config: Dict[str, Any]) -> bool:
             num_epochs=config.get("epochs", 3),
             batch_size=config.get("batch_size", 4),
             learning_rate=config.get("learning_rate", 2e-4),
+            max_seq_length=config.get("max_seq_length", 512),
             lora_r=config.get("lora_r", 8),
             lora_alpha=config.get("lora_alpha", 16),
+            profile=config.get("profile", False),
+            peak_tflops=config.get("peak_tflops"),
         )
 
         # Create trainer
@@ -369,3 +477,16 @@ def start_training_job(job_id: str, config: Dict[str, Any]) -> bool:
     except Exception as e:
         logger.exception(f"Failed to start training job {job_id}")
         return False
+
+
+def run_training_process(job_id: str, config: Dict[str, Any]):
+    """
+    Entry point of a training worker process.
+
+    Exits with status 0 on success and 1 on failure, so the parent can tell
+    the outcome from the exit code alone.
+    """
+    logging.basicConfig(level=logging.INFO)
+    success = start_training_job(job_id, config)
+    sys.exit(0 if success else 1)
+
@@ -0,0 +1,202 @@
+"""
+Phase and step-time profiler for QLoRA training runs
+
+Imports torch lazily, so the API can read saved reports without loading the
+ML stack; the Trainer hooks that feed the profiler are in profiling_trainer.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.core.lazy_imports import LazyModule
+from app.core.storage import load_json_file, save_json_file
+
+torch = LazyModule("torch")
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FILE = "profile.json"
+
+# Per-step records kept in the report; totals always cover every step
+MAX_STEP_RECORDS = 1000
+
+# Dense fp16/bf16 tensor-core peak TFLOPS, matched against the CUDA device name
+GPU_PEAK_TFLOPS = {
+    "H100": 989.0,
+    "A100": 312.0,
+    "L40S": 362.0,
+    "A10G": 125.0,
+    "A10": 125.0,
+    "L4": 121.0,
+    "V100": 125.0,
+    "T4": 65.0,
+    "RTX 4090": 165.0,
+    "RTX 3090": 71.0,
+}
+
+# Phases grouped by the resource that bounds them
+PHASE_GROUPS = {
+    "io": ("tokenizer_load", "model_load", "dataset_load", "save"),
+    "tokenization": ("tokenization",),
+}
+
+
+def detect_peak_tflops() -> Optional[float]:
+    """Peak TFLOPS of the current CUDA device, or None when unknown (including CPU/MPS)"""
+    if not torch.cuda.is_available():
+        return None
+    name = torch.cuda.get_device_name(0)
+    for key, tflops in GPU_PEAK_TFLOPS.items():
+        if key in name:
+            return tflops
+    return None
+
+
+def training_flops_per_token(model) -> int:
+    """
+    Approximate training FLOPs per token for a LoRA model.
+
+    Every weight costs 2 FLOPs per token forward and 2 more backward to
+    propagate activation gradients; only trainable weights also need weight
+    gradients (2 more). Attention score FLOPs are ignored.
+    """
+    total = sum(p.numel() for p in model.parameters())
+    trainable = sum(p.numel() for p in model.parameters() if p.requires_grad)
+    return 4 * total + 2 * trainable
+
+
+def synchronize():
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+
+
+class TrainingProfiler:
+    """
+    Records wall time per setup phase and per optimizer step.
+
+    When disabled every method is a cheap no-op, so the trainer can call it
+    unconditionally.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.phases: Dict[str, float] = {}
+        self.steps: List[Dict[str, float]] = []
+        self.step_totals = {"data_loading": 0.0, "forward": 0.0, "backward": 0.0, "optimizer": 0.0, "total": 0.0}
+        self.step_count = 0
+        self.tokens = 0
+        self.padded_tokens = 0
+        self._current: Optional[Dict[str, float]] = None
+        self._step_start = 0.0
+        self._optimizer_start = 0.0
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a setup phase"""
+        if not self.enabled:
+            yield
+            return
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            synchronize()
+            self.phases[name] = round(self.phases.get(name, 0.0) + time.perf_counter() - start_time, 4)
+
+    # Step hooks, called by ProfilingTrainer and ProfilerCallback
+
+    def begin_step(self):
+        self._step_start = time.perf_counter()
+        self._current = {"data_loading": 0.0, "forward": 0.0, "backward": 0.0, "optimizer": 0.0}
+
+    def add(self, part: str, seconds: float):
+        if self._current is not None:
+            self._current[part] += seconds
+
+    def count_tokens(self, inputs: Dict[str, Any]):
+        input_ids = inputs.get("input_ids")
+        if input_ids is None:
+            return
+        self.padded_tokens += input_ids.numel()
+        attention_mask = inputs.get("attention_mask")
+        self.tokens += int(attention_mask.sum()) if attention_mask is not None else input_ids.numel()
+
+    def begin_optimizer(self):
+        synchronize()
+        self._optimizer_start = time.perf_counter()
+
+    def end_optimizer(self):
+        synchronize()
+        self.add("optimizer", time.perf_counter() - self._optimizer_start)
+
+    def end_step(self):
+        if self._current is None:
+            return
+        synchronize()
+        step = self._current
+        step["total"] = time.perf_counter() - self._step_start
+        for part, seconds in step.items():
+            self.step_totals[part] += seconds
+        self.step_count += 1
+        if len(self.steps) < MAX_STEP_RECORDS:
+            self.steps.append({part: round(seconds, 5) for part, seconds in step.items()})
+        self._current = None
+
+    def report(self, model=None, peak_tflops: Optional[float] = None) -> Dict[str, Any]:
+        """Build the structured profile report"""
+        training_time = self.step_totals["total"]
+        compute_time = self.step_totals["forward"] + self.step_totals["backward"] + self.step_totals["optimizer"]
+
+        tokens_per_second = self.tokens / training_time if training_time > 0 else None
+        padded_tokens_per_second = self.padded_tokens / training_time if training_time > 0 else None
+
+        flops_per_token = training_flops_per_token(model) if model is not None else None
+        achieved_tflops = None
+        if flops_per_token and padded_tokens_per_second:
+            achieved_tflops = flops_per_token * padded_tokens_per_second / 1e12
+        peak_tflops = peak_tflops or detect_peak_tflops()
+        mfu = achieved_tflops / peak_tflops if achieved_tflops and peak_tflops else None
+
+        # Where the time went, grouped by bounding resource
+        breakdown = {
+            group: round(sum(self.phases.get(name, 0.0) for name in names), 4)
+            for group, names in PHASE_GROUPS.items()
+        }
+        breakdown["data_loading"] = round(self.step_totals["data_loading"], 4)
+        breakdown["compute"] = round(compute_time, 4)
+        bottleneck = max(breakdown, key=breakdown.get) if any(breakdown.values()) else None
+
+        steps = self.step_count
+        return {
+            "created_at": datetime.now().isoformat(),
+            "phases": self.phases,
+            "steps": {
+                "count": steps,
+                "total": {part: round(seconds, 4) for part, seconds in self.step_totals.items()},
+                "mean": {part: round(seconds / steps, 5) for part, seconds in self.step_totals.items()} if steps else {},
+                "records": self.steps,
+            },
+            "tokens": self.tokens,
+            "padded_tokens": self.padded_tokens,
+            "tokens_per_second": round(tokens_per_second, 2) if tokens_per_second else None,
+            "padded_tokens_per_second": round(padded_tokens_per_second, 2) if padded_tokens_per_second else None,
+            "flops_per_token": flops_per_token,
+            "achieved_tflops": round(achieved_tflops, 4) if achieved_tflops else None,
+            "peak_tflops": peak_tflops,
+            "mfu": round(mfu, 4) if mfu else None,
+            "breakdown": breakdown,
+            "bottleneck": bottleneck,
+        }
+
+    def save_report(self, output_dir: Path, model=None, peak_tflops: Optional[float] = None) -> Dict[str, Any]:
+        report = self.report(model, peak_tflops)
+        save_json_file(output_dir / PROFILE_FILE, report)
+        return report
+
+
+def load_profile_report(job_dir: Path) -> Optional[Dict[str, Any]]:
+    """Load a job's profile report, or None if it was not profiled"""
+    return load_json_file(job_dir / PROFILE_FILE, default={}) or None
@@ -1,11 +1,49 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from app.api.routes import models, download, hardware, jobs, datasets, playground
+from app.core.metrics import REGISTRY, CONTENT_TYPE, MetricsMiddleware, monitor_event_loop_lag
+from app.core.loop_monitor import detector as blocking_detector
+from app.core.lazy_imports import warm_up as ml_warm_up
+
+# torch/transformers/peft are imported on first use; set to 0 to skip preloading them
+WARM_UP_ENV = "SLM_WARM_UP_ML"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 하드웨어 샘플러 시작/종료
+    hardware.sampler.start()
+    # 재시작 전에 대기 중이던 다운로드 재개
+    download.download_manager.start()
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    # 디버그 모드: 이벤트 루프 블로킹 감지
+    if blocking_detector.enabled:
+        blocking_detector.attach(app)
+        blocking_detector.start()
+    # ML 스택은 서버가 요청을 받기 시작한 뒤 백그라운드에서 로드
+    if os.environ.get(WARM_UP_ENV, "1") != "0":
+        asyncio.get_running_loop().call_soon(ml_warm_up.start)
+    yield
+    if blocking_detector.enabled:
+        await blocking_detector.stop()
+    lag_monitor.cancel()
+    with suppress(asyncio.CancelledError):
+        await lag_monitor
+    hardware.sampler.stop(timeout=5)
+    download.download_manager.stop(timeout=5)
+    # 배치로 모아 둔 Hub 메타데이터 캐시 변경 사항 저장
+    models.hub_metadata.cache.flush()
+
 
 app = FastAPI(
     title="SLM Fine-tuning API",
     description="Backend API for QLoRA-based Small Language Model Fine-tuning Platform",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS 설정
@@ -17,6 +55,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 요청 메트릭 수집
+app.add_middleware(MetricsMiddleware)
+
 # 라우터 등록
 app.include_router(models.router, prefix="/api/models", tags=["models"])
 app.include_router(download.router, prefix="/api/download", tags=["download"])
@@ -31,4 +72,13 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {"status": "healthy", "ml_stack": ml_warm_up.status()}
+
+@app.get("/metrics")
+async def metrics():
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/debug/loop-blocking")
+async def loop_blocking_report():
+    """Event-loop stalls and per-route blocking time (SLM_DEBUG_LOOP_BLOCKING=1)"""
+    return blocking_detector.report()
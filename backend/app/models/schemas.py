@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict, Field, validator
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime
 from enum import Enum
 
@@ -52,12 +52,29 @@ class CreateDatasetRequest(BaseModel):
     })
 
 
-class ChatRequest(BaseModel):
+class GenerationParams(BaseModel):
+    """Sampling parameters for playground generation"""
+    max_new_tokens: int = Field(default=256, ge=1, le=2048, description="Max tokens to generate")
+    do_sample: bool = Field(default=True, description="Sample instead of greedy decoding")
+    temperature: float = Field(default=0.7, gt=0, le=2.0, description="Sampling temperature")
+    top_p: float = Field(default=0.9, gt=0, le=1.0, description="Nucleus sampling probability mass")
+    top_k: int = Field(default=50, ge=0, le=1000, description="Top-k sampling (0 disables)")
+    repetition_penalty: float = Field(default=1.2, ge=1.0, le=2.0, description="Repetition penalty")
+    no_repeat_ngram_size: int = Field(
+        default=3, ge=0, le=10,
+        description="Block repeated n-grams (0 disables; costs a scan of the sequence per step)"
+    )
+
+
+class ChatRequest(GenerationParams):
     """Request model for playground chat"""
     model_id: str = Field(..., description="Model ID (base: or ft: prefix)")
     message: str = Field(..., min_length=1, max_length=10000, description="User message")
     history: List[Dict[str, str]] = Field(default=[], description="Conversation history")
-    max_new_tokens: int = Field(default=256, ge=1, le=2048, description="Max tokens to generate")
+    conversation_id: Optional[str] = Field(None, max_length=200, description="Conversation ID for KV-cache reuse")
+    draft_model_id: Optional[str] = Field(
+        None, description="Smaller model (base: or ft: prefix) that drafts tokens for speculative decoding"
+    )
 
     @validator('model_id')
     def validate_model_id(cls, v):
@@ -66,12 +83,115 @@ class ChatRequest(BaseModel):
             raise ValueError('model_id must start with "base:" or "ft:" prefix')
         return v
 
-    model_config = ConfigDict(json_schema_extra={
+    @validator('draft_model_id')
+    def validate_draft_model_id(cls, v):
+        """Ensure draft_model_id has correct prefix"""
+        if v is not None and not (v.startswith('base:') or v.startswith('ft:')):
+            raise ValueError('draft_model_id must start with "base:" or "ft:" prefix')
+        return v
+
+    model_config = ConfigDict(protected_namespaces=(), json_schema_extra={
         "example": {
-            "model_id": "base:TinyLlama/TinyLlama-1.1B-Chat-v1.0",
+            "model_id": "ft:ft-001",
             "message": "Hello, how are you?",
             "history": [],
-            "max_new_tokens": 256
+            "max_new_tokens": 256,
+            "temperature": 0.7,
+            "draft_model_id": "base:TinyLlama/TinyLlama-1.1B-Chat-v1.0"
+        }
+    })
+
+
+class CompareRequest(GenerationParams):
+    """Request model for running one prompt list against several playground models"""
+    model_ids: List[str] = Field(..., min_length=1, max_length=10, description="Models to compare (base: or ft: prefix)")
+    prompts: List[str] = Field(..., min_length=1, max_length=50, description="Prompts sent to every model")
+
+    @validator('model_ids')
+    def validate_model_ids(cls, v):
+        """Ensure every model_id has a correct prefix and appears once"""
+        for model_id in v:
+            if not (model_id.startswith('base:') or model_id.startswith('ft:')):
+                raise ValueError('model_ids must start with "base:" or "ft:" prefix')
+        if len(set(v)) != len(v):
+            raise ValueError('model_ids must not contain duplicates')
+        return v
+
+    @validator('prompts')
+    def validate_prompts(cls, v):
+        """Ensure no prompt is empty"""
+        if any(not prompt.strip() for prompt in v):
+            raise ValueError('prompts must not be empty')
+        return v
+
+    model_config = ConfigDict(protected_namespaces=(), json_schema_extra={
+        "example": {
+            "model_ids": ["base:TinyLlama/TinyLlama-1.1B-Chat-v1.0", "ft:ft-001", "ft:ft-002"],
+            "prompts": ["What is your refund policy?", "How do I reset my password?"],
+            "max_new_tokens": 128,
+            "do_sample": False
+        }
+    })
+
+
+class ExportModelRequest(BaseModel):
+    """Request model for merging a fine-tuned adapter into a standalone model"""
+    dtype: Literal["float32", "bfloat16", "float16"] = Field(default="float32", description="Weight dtype of the exported model")
+    quantization: Optional[Literal["int8_dynamic"]] = Field(None, description="Load-time quantization for CPU inference")
+
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "dtype": "bfloat16",
+            "quantization": None
+        }
+    })
+
+
+class EvaluateModelRequest(BaseModel):
+    """Request model for batch offline evaluation of a fine-tuned model"""
+    dataset: Optional[str] = Field(None, description="Held-out dataset (uploaded name, file path or Hub ID); defaults to the job's dataset")
+    split: Optional[str] = Field(None, description="Dataset split; defaults to test, then validation, then train")
+    max_samples: Optional[int] = Field(None, ge=1, description="Evaluate at most this many examples")
+    batch_size: int = Field(default=8, ge=1, le=256, description="Examples per forward pass")
+    max_length: int = Field(default=512, ge=8, le=8192, description="Truncation length in tokens")
+    exact_match: bool = Field(default=False, description="Generate answers and compare them to reference outputs")
+    max_new_tokens: int = Field(default=64, ge=1, le=1024, description="Generation length for exact match")
+
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "dataset": "customer-support-qa-test",
+            "batch_size": 16,
+            "exact_match": True
+        }
+    })
+
+
+class CpuInferenceConfig(BaseModel):
+    """CPU inference mode for a playground model"""
+    mode: Literal["float32", "bfloat16", "int8"] = Field(default="float32", description="Weight format used on CPU")
+    compile: bool = Field(default=False, description="Compile the forward pass with torch.compile")
+
+
+class CpuThreadsConfig(BaseModel):
+    """Intra-op thread count for CPU inference"""
+    threads: int = Field(..., ge=1, le=512, description="Number of intra-op threads")
+
+
+class CpuBenchmarkRequest(BaseModel):
+    """Request model for benchmarking CPU inference modes"""
+    model_id: str = Field(..., description="Model ID (base: or ft: prefix)")
+    modes: List[Literal["float32", "bfloat16", "int8"]] = Field(default=["float32", "bfloat16", "int8"], min_length=1)
+    compile: bool = Field(default=False, description="Compile each mode with torch.compile")
+    prompt: str = Field(default="Explain what a language model is.", min_length=1, max_length=2000)
+    max_new_tokens: int = Field(default=32, ge=1, le=512)
+
+    model_config = ConfigDict(protected_namespaces=(), json_schema_extra={
+        "example": {
+            "model_id": "base:TinyLlama/TinyLlama-1.1B-Chat-v1.0",
+            "modes": ["float32", "bfloat16", "int8"],
+            "compile": False,
+            "prompt": "Explain what a language model is.",
+            "max_new_tokens": 32
         }
     })
 
@@ -87,6 +207,7 @@ class ModelInfo(BaseModel):
     last_modified: Optional[datetime] = None
     description: Optional[str] = None
     size_gb: Optional[float] = None
+    num_parameters: Optional[int] = None
 
 class ModelSearchResponse(BaseModel):
     models: List[ModelInfo]
@@ -105,5 +226,6 @@ class ModelDetailResponse(BaseModel):
     last_modified: Optional[datetime] = None
     description: Optional[str] = None
     size_gb: Optional[float] = None
+    num_parameters: Optional[int] = None
     model_card: Optional[str] = None
     config: Optional[dict] = None
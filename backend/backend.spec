@@ -23,6 +23,11 @@ hiddenimports = [
     'pydantic',
     'psutil',
     'gputil',
+    # Imported lazily by app.core.lazy_imports, invisible to import analysis
+    'torch',
+    'transformers',
+    'peft',
+    'datasets',
 ]
 
 a = Analysis(
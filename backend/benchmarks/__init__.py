@@ -0,0 +1,3 @@
+"""
+Benchmark suite for backend hot paths (run with: python -m benchmarks.run)
+"""
@@ -0,0 +1,205 @@
+"""
+Benchmarks for metadata, log and hardware endpoints
+"""
+import json
+from datetime import datetime
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from benchmarks.harness import Result, benchmark, measure, patched, working_directory
+
+from app.main import app
+from app.api.routes import datasets as datasets_module
+from app.api.routes import download as download_module
+from app.api.routes import models as models_module
+from app.api.routes import jobs as jobs_module
+from app.core.storage import save_json_file
+from app.core.trainer import QLoRATrainer, TrainingConfig
+
+client = TestClient(app)
+
+METADATA_RECORDS = 10_000
+LOG_LINES = 100_000
+LOG_APPENDS = 20
+MODELS = 50
+FILES_PER_MODEL = 200
+CACHED_HUB_MODELS = 2000
+
+
+def _jobs_patches(root: Path):
+    jobs_dir = root / "training_jobs"
+    return (
+        (jobs_module, "JOBS_DIR", jobs_dir),
+        (jobs_module, "JOBS_META_FILE", jobs_dir / "jobs_meta.json"),
+        (jobs_module, "LOGS_DIR", jobs_dir / "logs"),
+        (jobs_module, "CHECKPOINTS_DIR", jobs_dir / "checkpoints"),
+    )
+
+
+@benchmark("jobs_metadata_10k")
+def bench_jobs_metadata(root: Path) -> Result:
+    """List all jobs and get one job's info with 10k jobs on disk"""
+    jobs_dir = root / "training_jobs"
+    save_json_file(jobs_dir / "jobs_meta.json", [
+        {
+            "id": f"ft-{i:05d}",
+            "name": f"Job {i}",
+            "model": "TinyLlama/TinyLlama-1.1B-Chat-v1.0",
+            "dataset": f"dataset-{i % 50}",
+            "status": "completed",
+            "progress": 100,
+            "createdAt": "2025-01-01",
+        }
+        for i in range(METADATA_RECORDS)
+    ])
+
+    with patched(*_jobs_patches(root)):
+        list_time = measure(lambda: client.get("/api/jobs"))
+        get_time = measure(lambda: client.get(f"/api/jobs/ft-{METADATA_RECORDS - 1:05d}/info"))
+
+    return Result(
+        value=list_time["median"] + get_time["median"],
+        unit="s",
+        details={"list": list_time, "get": get_time, "records": METADATA_RECORDS},
+    )
+
+
+@benchmark("datasets_metadata_10k")
+def bench_datasets_metadata(root: Path) -> Result:
+    """List all datasets and get one dataset with 10k datasets on disk"""
+    datasets_dir = root / "uploaded_datasets"
+    save_json_file(datasets_dir / "datasets_meta.json", [
+        {
+            "id": f"dataset-{i:05d}",
+            "name": f"Dataset {i}",
+            "description": "Synthetic benchmark dataset",
+            "format": "json",
+            "size": 1000 + i,
+        }
+        for i in range(METADATA_RECORDS)
+    ])
+
+    with patched(
+        (datasets_module, "DATASETS_DIR", datasets_dir),
+        (datasets_module, "DATASETS_META_FILE", datasets_dir / "datasets_meta.json"),
+    ):
+        list_time = measure(lambda: client.get("/api/datasets"))
+        get_time = measure(lambda: client.get(f"/api/datasets/dataset-{METADATA_RECORDS - 1:05d}"))
+
+    return Result(
+        value=list_time["median"] + get_time["median"],
+        unit="s",
+        details={"list": list_time, "get": get_time, "records": METADATA_RECORDS},
+    )
+
+
+@benchmark("job_logs_100k")
+def bench_job_logs(root: Path) -> Result:
+    """Append training log lines to, and read, a job log holding 100k lines"""
+    job_id = "ft-bench"
+    logs_dir = root / "training_jobs" / "logs"
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    save_json_file(logs_dir / f"{job_id}.json", [
+        {"timestamp": timestamp, "level": "INFO", "message": f"Step {i} - Loss: 0.5"} for i in range(LOG_LINES)
+    ])
+
+    with working_directory(root), patched(*_jobs_patches(root)):
+        trainer = QLoRATrainer(TrainingConfig(model_name="", dataset_path="", output_dir=str(root)), job_id)
+
+        def append():
+            for i in range(LOG_APPENDS):
+                trainer.log_message("INFO", f"Benchmark line {i}")
+
+        append_time = measure(append, repeat=1, warmup=0)
+        read_time = measure(lambda: client.get(f"/api/jobs/{job_id}/logs"), repeat=3)
+
+    total = len(json.loads((logs_dir / f"{job_id}.json").read_text()))
+    per_append = append_time["median"] / LOG_APPENDS
+
+    return Result(
+        value=per_append + read_time["median"],
+        unit="s",
+        details={
+            "append_seconds_per_line": per_append,
+            "read": read_time,
+            "lines": total,
+        },
+    )
+
+
+@benchmark("hardware_endpoints", tolerance=0.5)
+def bench_hardware(root: Path) -> Result:
+    """Latency of each hardware endpoint"""
+    endpoints = ["stats", "cpu", "memory", "gpu", "disk", "system-info", "history"]
+    client.get("/api/hardware/stats")
+
+    details = {endpoint: measure(lambda e=endpoint: client.get(f"/api/hardware/{e}"), repeat=30) for endpoint in endpoints}
+    return Result(
+        value=sum(timing["median"] for timing in details.values()),
+        unit="s",
+        details=details,
+    )
+
+
+@benchmark("download_list_50_models", tolerance=0.5)
+def bench_download_list(root: Path) -> Result:
+    """List downloaded models with 50 models of 200 files each on disk"""
+    models_dir = root / "downloaded_models"
+    for i in range(MODELS):
+        model_dir = models_dir / f"bench-org_model-{i:02d}"
+        model_dir.mkdir(parents=True)
+        (model_dir / "config.json").write_text('{"architectures": ["LlamaForCausalLM"], "model_type": "llama"}')
+        (model_dir / "weights.bin").write_bytes(bytes(2 * 1024 * 1024))
+        for j in range(FILES_PER_MODEL - 2):
+            (model_dir / f"file-{j:03d}.txt").write_text("x")
+
+    with patched((download_module, "MODELS_DIR", models_dir)):
+        first_time = measure(lambda: client.get("/api/download/list"), repeat=1, warmup=0)
+        list_time = measure(lambda: client.get("/api/download/list"), repeat=20)
+
+    return Result(
+        value=list_time["median"],
+        unit="s",
+        details={"first": first_time, "list": list_time, "models": MODELS, "files_per_model": FILES_PER_MODEL},
+    )
+
+
+@benchmark("models_search_offline_2k", tolerance=0.5)
+def bench_models_search_offline(root: Path) -> Result:
+    """Search 2,000 cached Hub models and 50 downloaded models with the Hub offline"""
+    from app.core.hub_metadata import HubMetadata
+
+    metadata = HubMetadata(cache_file=root / "hub_cache" / "metadata.json", offline=True)
+    for page in range(CACHED_HUB_MODELS // 100):
+        metadata.cache.put(f'search:anonymous:["page-{page}"]', [
+            {
+                "id": f"org-{page}/model-{i}",
+                "tags": ["llama", f"tag-{i % 10}"],
+                "pipeline_tag": "text-generation",
+                "downloads": page * 100 + i,
+            }
+            for i in range(100)
+        ])
+
+    models_dir = root / "downloaded_models"
+    for i in range(MODELS):
+        model_dir = models_dir / f"bench-org_local-model-{i:02d}"
+        model_dir.mkdir(parents=True)
+        (model_dir / "config.json").write_text('{"architectures": ["LlamaForCausalLM"], "model_type": "llama"}')
+        (model_dir / "weights.bin").write_bytes(bytes(2 * 1024 * 1024))
+
+    params = {"query": "model tag-3"}
+    with patched(
+        (download_module, "MODELS_DIR", models_dir),
+        (models_module, "hub_metadata", metadata),
+        (models_module, "search_index", models_module.ModelSearchIndex()),
+    ):
+        first_time = measure(lambda: client.get("/api/models/search", params=params), repeat=1, warmup=0)
+        search_time = measure(lambda: client.get("/api/models/search", params=params), repeat=20)
+
+    return Result(
+        value=search_time["median"],
+        unit="s",
+        details={"first": first_time, "search": search_time, "cached_models": CACHED_HUB_MODELS, "downloaded_models": MODELS},
+    )
@@ -0,0 +1,107 @@
+"""
+Benchmarks for tokenization and playground generation with a tiny local model
+"""
+import json
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from benchmarks.harness import Result, benchmark, build_tiny_model, patched, synthetic_text, working_directory
+
+from app.main import app
+from app.api.routes import playground
+from app.core import cpu_inference, model_export
+from app.core.trainer import QLoRATrainer, TrainingConfig
+
+client = TestClient(app)
+
+TOKENIZATION_EXAMPLES = 5_000
+GENERATION_REQUESTS = 5
+GENERATION_TOKENS = 64
+BASE_MODEL_ID = "bench/tiny-llama"
+
+
+def _tiny_model(root: Path) -> Path:
+    model_dir = root / "downloaded_models" / BASE_MODEL_ID.replace("/", "_")
+    if not model_dir.exists():
+        build_tiny_model(model_dir)
+    return model_dir
+
+
+@benchmark("tokenization_throughput")
+def bench_tokenization(root: Path) -> Result:
+    """Tokenize a synthetic instruction dataset through QLoRATrainer.prepare_dataset"""
+    from transformers import AutoTokenizer
+
+    model_dir = _tiny_model(root)
+    dataset_path = root / "bench_dataset.json"
+    dataset_path.write_text(json.dumps([
+        {"instruction": synthetic_text(i, 12), "output": synthetic_text(i + 1, 36)} for i in range(TOKENIZATION_EXAMPLES)
+    ]))
+
+    with working_directory(root):
+        config = TrainingConfig(
+            model_name=str(model_dir),
+            dataset_path=str(dataset_path),
+            output_dir=str(root / "tokenization_output"),
+            max_seq_length=128,
+        )
+        trainer = QLoRATrainer(config, "ft-bench-tokenize")
+        trainer.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+
+        start_time = time.perf_counter()
+        tokenized = trainer.prepare_dataset()
+        elapsed = time.perf_counter() - start_time
+
+    tokens = len(tokenized) * config.max_seq_length
+    return Result(
+        value=tokens / elapsed,
+        unit="tokens/s",
+        higher_is_better=True,
+        details={"examples": len(tokenized), "seconds": elapsed},
+    )
+
+
+@benchmark("playground_generation")
+def bench_generation(root: Path) -> Result:
+    """Greedy generation through /api/playground/chat on a tiny model"""
+    models_dir = _tiny_model(root).parent
+
+    with patched(
+        (playground, "MODELS_DIR", models_dir),
+        (model_export, "MODELS_DIR", models_dir),
+        (playground, "FINETUNED_MODELS_DIR", root / "training_jobs"),
+        (playground, "model_cache", {}),
+        (playground, "base_models", {}),
+        (playground, "cpu_config", {"threads": None, "models": {}}),
+        (cpu_inference, "CPU_CONFIG_FILE", root / "cpu_inference_config.json"),
+    ):
+        request = {
+            "model_id": f"base:{BASE_MODEL_ID}",
+            "message": synthetic_text(0, 16),
+            "max_new_tokens": GENERATION_TOKENS,
+            "do_sample": False,
+            "repetition_penalty": 1.0,
+            "no_repeat_ngram_size": 0,
+        }
+
+        # The first request loads the model; time it separately
+        start_time = time.perf_counter()
+        client.post("/api/playground/chat", json=request).raise_for_status()
+        first_request = time.perf_counter() - start_time
+
+        generated = 0
+        start_time = time.perf_counter()
+        for _ in range(GENERATION_REQUESTS):
+            response = client.post("/api/playground/chat", json=request)
+            response.raise_for_status()
+            generated += response.json()["stats"]["generated_tokens"]
+        elapsed = time.perf_counter() - start_time
+
+    return Result(
+        value=generated / elapsed,
+        unit="tokens/s",
+        higher_is_better=True,
+        details={"requests": GENERATION_REQUESTS, "generated_tokens": generated, "first_request_seconds": first_request},
+    )
@@ -0,0 +1,85 @@
+"""
+Benchmark for backend startup: a fresh server process until /health answers
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+from benchmarks.harness import Result, benchmark
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+STARTUP_TIMEOUT = 120
+WARM_UP_TIMEOUT = 300
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get_json(url: str):
+    with urllib.request.urlopen(url, timeout=1) as response:
+        return json.loads(response.read())
+
+
+def _wait_for(predicate, timeout: float, process: subprocess.Popen):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if predicate():
+                return
+        except OSError:
+            pass
+        time.sleep(0.02)
+    raise TimeoutError(f"Server did not become ready within {timeout}s")
+
+
+@benchmark("startup_time", tolerance=0.6)
+def bench_startup(root: Path) -> Result:
+    """Seconds from launching a fresh server process until /health answers"""
+    env = dict(os.environ, PYTHONPATH=str(BACKEND_DIR), HF_HUB_OFFLINE="1")
+
+    # Import cost alone, in a fresh interpreter
+    import_seconds = float(subprocess.check_output(
+        [sys.executable, "-c", "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"],
+        cwd=root,
+        env=env,
+    ))
+
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/health"
+    start_time = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=root,
+        env=env,
+    )
+    try:
+        _wait_for(lambda: _get_json(url)["status"] == "healthy", STARTUP_TIMEOUT, process)
+        health_seconds = time.perf_counter() - start_time
+
+        # The ML stack keeps loading in the background after /health answers
+        _wait_for(lambda: _get_json(url)["ml_stack"]["state"] in ("ready", "failed"), WARM_UP_TIMEOUT, process)
+        warm_up = _get_json(url)["ml_stack"]
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    return Result(
+        value=health_seconds,
+        unit="s",
+        details={
+            "import_seconds": import_seconds,
+            "ml_warm_up_seconds": warm_up["seconds"],
+            "ml_warm_up_state": warm_up["state"],
+            "ml_modules": warm_up["modules"],
+        },
+    )
@@ -0,0 +1,210 @@
+"""
+Benchmark harness: registration, timing, patching and baseline comparison
+"""
+import os
+import platform
+import statistics
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# Benchmarks must never reach the Hugging Face Hub
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+
+@dataclass
+class Result:
+    """Outcome of one benchmark: a primary value compared against the baseline, plus details"""
+    value: float
+    unit: str
+    higher_is_better: bool = False
+    details: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "value": round(self.value, 6),
+            "unit": self.unit,
+            "higher_is_better": self.higher_is_better,
+            "details": self.details,
+        }
+
+
+@dataclass
+class Benchmark:
+    name: str
+    func: Callable[[Path], Result]
+    description: str
+    # Allowed regression as a fraction; None uses the run's default
+    tolerance: Optional[float] = None
+
+
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+
+def benchmark(name: str, tolerance: Optional[float] = None):
+    """
+    Register a benchmark function taking a scratch directory and returning a Result.
+
+    Benchmarks of a few milliseconds, or of a single process launch, vary
+    more between runs; give them a wider tolerance.
+    """
+    def decorator(func):
+        BENCHMARKS[name] = Benchmark(name, func, (func.__doc__ or "").strip(), tolerance)
+        return func
+    return decorator
+
+
+def measure(func: Callable[[], Any], repeat: int = 5, warmup: int = 1) -> Dict[str, float]:
+    """Run func several times and return median/min/max wall time in seconds"""
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start_time)
+    return {
+        "median": statistics.median(timings),
+        "min": min(timings),
+        "max": max(timings),
+        "repeat": repeat,
+    }
+
+
+@contextmanager
+def patched(*patches):
+    """Temporarily set module attributes: patched((module, "NAME", value), ...)"""
+    missing = object()
+    saved = [(module, name, getattr(module, name, missing)) for module, name, _ in patches]
+    for module, name, value in patches:
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for module, name, value in reversed(saved):
+            if value is missing:
+                delattr(module, name)
+            else:
+                setattr(module, name, value)
+
+
+@contextmanager
+def working_directory(path: Path):
+    """Run with path as the current directory (the app uses relative data paths)"""
+    previous = Path.cwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def environment() -> Dict[str, Any]:
+    """Machine facts recorded with results; baselines are only compared on a matching environment"""
+    import psutil
+    from app.core.hardware_info import detect_cpu_model
+
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "cpu_model": detect_cpu_model(),
+        "cpu_count": psutil.cpu_count(logical=True),
+        "memory_gb": round(psutil.virtual_memory().total / 1024 ** 3),
+    }
+
+
+def median_result(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """The run with the median value of repeated runs of one benchmark, listing every run's value"""
+    ranked = sorted(runs, key=lambda run: run["value"])
+    result = dict(ranked[(len(ranked) - 1) // 2])
+    result["runs"] = [run["value"] for run in runs]
+    return result
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float,
+    tolerances: Optional[Dict[str, Optional[float]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Compare results to a baseline.
+
+    A benchmark regresses when its value is worse than the baseline by more
+    than its tolerance (a fraction: 0.3 means 30% slower or 30% less
+    throughput); tolerances overrides the default tolerance per benchmark.
+    """
+    tolerances = tolerances or {}
+    rows = []
+    for name, result in results.items():
+        allowed = tolerances.get(name)
+        if allowed is None:
+            allowed = tolerance
+        base = baseline.get(name)
+        if not base or not base.get("value"):
+            rows.append({
+                "name": name, "value": result["value"], "baseline": None, "change": None,
+                "tolerance": allowed, "regressed": False,
+            })
+            continue
+
+        change = (result["value"] - base["value"]) / base["value"]
+        worse = -change if result["higher_is_better"] else change
+        rows.append({
+            "name": name,
+            "value": result["value"],
+            "baseline": base["value"],
+            "change": round(change, 4),
+            "tolerance": allowed,
+            "regressed": worse > allowed,
+        })
+    return rows
+
+
+def build_tiny_model(model_dir: Path, seed: int = 0) -> Path:
+    """Save a tiny randomly-initialized Llama model and word-level tokenizer to model_dir"""
+    import torch
+    import transformers
+    from tokenizers import Tokenizer, models, pre_tokenizers
+
+    words = ["<unk>", "<pad>", "<s>", "</s>", "user", "assistant", ":", "#", "Instruction", "Response"]
+    words += [f"w{i}" for i in range(246)]
+    vocab = {word: i for i, word in enumerate(words)}
+
+    backend = Tokenizer(models.WordLevel(vocab=vocab, unk_token="<unk>"))
+    backend.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer = transformers.PreTrainedTokenizerFast(
+        tokenizer_object=backend,
+        unk_token="<unk>",
+        pad_token="<pad>",
+        bos_token="<s>",
+        eos_token="</s>",
+        model_input_names=["input_ids", "attention_mask"],
+    )
+
+    torch.manual_seed(seed)
+    config = transformers.LlamaConfig(
+        vocab_size=len(vocab),
+        hidden_size=64,
+        intermediate_size=128,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=4,
+        max_position_embeddings=512,
+        pad_token_id=vocab["<pad>"],
+        bos_token_id=vocab["<s>"],
+        eos_token_id=vocab["</s>"],
+    )
+    model = transformers.LlamaForCausalLM(config)
+
+    model_dir.mkdir(parents=True, exist_ok=True)
+    model.save_pretrained(str(model_dir))
+    tokenizer.save_pretrained(str(model_dir))
+    return model_dir
+
+
+def synthetic_text(i: int, words: int = 24) -> str:
+    return " ".join(f"w{(i * 7 + j) % 246}" for j in range(words))
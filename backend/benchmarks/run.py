@@ -0,0 +1,128 @@
+"""
+Run the benchmark suite and compare against this machine's baseline
+
+    python -m benchmarks.run                      # run all, compare, exit 1 on regression
+    python -m benchmarks.run --only job_logs_100k
+    python -m benchmarks.run --update-baseline    # record this machine's numbers
+
+Baselines are absolute timings, so they're kept locally (results/ isn't
+committed) and only compared on the environment they were recorded on. The
+first run on a machine records its baseline.
+"""
+import argparse
+import json
+import logging
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.harness import BENCHMARKS, compare, environment, median_result
+
+# Importing the modules registers their benchmarks
+from benchmarks import bench_api, bench_ml, bench_startup  # noqa: F401
+
+BENCHMARKS_DIR = Path(__file__).parent
+DEFAULT_BASELINE = BENCHMARKS_DIR / "results" / "baseline.json"
+DEFAULT_OUTPUT = BENCHMARKS_DIR / "results" / "latest.json"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run backend benchmarks")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT, help="Where to write results JSON")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Baseline results JSON")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.3,
+        help="Allowed regression as a fraction (0.3 = 30%%) for benchmarks without their own tolerance"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark; the median run is reported")
+    parser.add_argument("--update-baseline", action="store_true", help="Overwrite the baseline with these results")
+    return parser.parse_args(argv)
+
+
+def run_benchmarks(names, repeat: int = 1):
+    results = {}
+    for name in names:
+        bench = BENCHMARKS[name]
+        print(f"▶ {name}: {bench.description}", flush=True)
+        runs = []
+        start_time = time.perf_counter()
+        for _ in range(repeat):
+            with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as scratch:
+                runs.append(bench.func(Path(scratch)).to_dict())
+        result = median_result(runs)
+        spread = f", runs {min(result['runs']):.6g}-{max(result['runs']):.6g}" if repeat > 1 else ""
+        print(f"  {result['value']:.6g} {result['unit']}{spread} ({time.perf_counter() - start_time:.1f}s)", flush=True)
+        results[name] = result
+    return results
+
+
+def print_report(rows):
+    print()
+    print(f"{'benchmark':<28} {'value':>14} {'baseline':>14} {'change':>9} {'allowed':>8}")
+    for row in rows:
+        baseline = f"{row['baseline']:.6g}" if row["baseline"] is not None else "-"
+        change = f"{row['change'] * 100:+.1f}%" if row["change"] is not None else "-"
+        allowed = f"{row['tolerance'] * 100:.0f}%"
+        flag = "  REGRESSION" if row["regressed"] else ""
+        print(f"{row['name']:<28} {row['value']:>14.6g} {baseline:>14} {change:>9} {allowed:>8}{flag}")
+
+    regressions = [row["name"] for row in rows if row["regressed"]]
+    if regressions:
+        print()
+        print("!" * 72)
+        print(f"PERFORMANCE REGRESSION (worse than baseline beyond tolerance): {', '.join(regressions)}")
+        print("!" * 72)
+    return regressions
+
+
+def save_baseline(path: Path, report) -> None:
+    baseline = json.loads(path.read_text()) if path.exists() else {"results": {}}
+    if baseline.get("environment") != report["environment"]:
+        # Numbers from another environment can't be mixed with these
+        baseline["results"] = {}
+    baseline["results"].update(report["results"])
+    baseline["environment"] = report["environment"]
+    baseline["created_at"] = report["created_at"]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(baseline, indent=2))
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    names = args.only or list(BENCHMARKS)
+    results = run_benchmarks(names, max(args.repeat, 1))
+
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "environment": environment(),
+        "results": results,
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"\nResults written to {args.output}")
+
+    if args.update_baseline or not args.baseline.exists():
+        save_baseline(args.baseline, report)
+        print(f"Baseline {'updated' if args.update_baseline else 'recorded'}: {args.baseline}")
+        print("Later runs on this machine are compared against it")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())
+    tolerances = {name: BENCHMARKS[name].tolerance for name in names}
+    if baseline.get("environment") != report["environment"]:
+        print("Baseline was recorded on a different environment; not comparing:", baseline.get("environment"))
+        print("Run with --update-baseline to record one for this machine")
+        print_report(compare(results, {}, args.tolerance, tolerances))
+        return 0
+
+    regressions = print_report(compare(results, baseline["results"], args.tolerance, tolerances))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,7 @@
 """
 Standalone server runner for PyInstaller bundled backend
 """
+import multiprocessing
 import sys
 import os
 
@@ -18,6 +19,10 @@ else:
 os.chdir(bundle_dir)
 
 if __name__ == "__main__":
+    # Worker processes (training jobs) are spawned by re-running the bundle's
+    # executable; this runs the worker and exits instead of starting a second server
+    multiprocessing.freeze_support()
+
     import uvicorn
 
     # Run the FastAPI app
@@ -0,0 +1,148 @@
+"""
+Shared fixtures for tests that need a real (tiny) language model
+"""
+
+import os
+
+import pytest
+
+# Tiny test models are built locally; never let transformers/peft reach the Hub
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+
+def build_tiny_model(model_dir, seed: int = 0):
+    """
+    Save a tiny randomly-initialized Llama model and word-level tokenizer to model_dir.
+
+    Everything is created locally so tests never touch the Hugging Face Hub.
+    """
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    from tokenizers import Tokenizer, models, pre_tokenizers
+
+    words = ["<unk>", "<pad>", "<s>", "</s>", "user", "assistant", ":"]
+    words += [f"w{i}" for i in range(57)]
+    vocab = {word: i for i, word in enumerate(words)}
+
+    backend = Tokenizer(models.WordLevel(vocab=vocab, unk_token="<unk>"))
+    backend.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer = transformers.PreTrainedTokenizerFast(
+        tokenizer_object=backend,
+        unk_token="<unk>",
+        pad_token="<pad>",
+        bos_token="<s>",
+        eos_token="</s>",
+        model_input_names=["input_ids", "attention_mask"],
+    )
+
+    torch.manual_seed(seed)
+    config = transformers.LlamaConfig(
+        vocab_size=len(vocab),
+        hidden_size=32,
+        intermediate_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=4,
+        max_position_embeddings=256,
+        pad_token_id=vocab["<pad>"],
+        bos_token_id=vocab["<s>"],
+        eos_token_id=vocab["</s>"],
+    )
+    model = transformers.LlamaForCausalLM(config)
+
+    model_dir.mkdir(parents=True, exist_ok=True)
+    model.save_pretrained(str(model_dir))
+    tokenizer.save_pretrained(str(model_dir))
+    return model_dir
+
+
+def build_tiny_adapter(adapter_dir, base_model_dir, base_model_id: str, seed: int = 0):
+    """
+    Save a LoRA adapter for the tiny model, laid out like QLoRATrainer's final_model.
+    """
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    peft = pytest.importorskip("peft")
+
+    base = transformers.AutoModelForCausalLM.from_pretrained(str(base_model_dir))
+    lora_config = peft.LoraConfig(
+        r=4,
+        lora_alpha=8,
+        target_modules=["q_proj", "v_proj", "k_proj", "o_proj"],
+        lora_dropout=0.0,
+        bias="none",
+        task_type="CAUSAL_LM",
+        init_lora_weights=False,
+    )
+    torch.manual_seed(seed)
+    model = peft.get_peft_model(base, lora_config)
+    model.peft_config["default"].base_model_name_or_path = base_model_id
+    adapter_dir.mkdir(parents=True, exist_ok=True)
+    model.save_pretrained(str(adapter_dir))
+    return adapter_dir
+
+
+@pytest.fixture
+def tiny_model_dirs(tmp_path, monkeypatch):
+    """
+    Point the playground at temporary model directories holding one tiny
+    downloaded base model and two LoRA fine-tunes of it.
+    """
+    from app.api.routes import playground
+    from app.core import model_export, cpu_inference
+
+    models_dir = tmp_path / "downloaded_models"
+    jobs_dir = tmp_path / "training_jobs"
+    base_model_id = "test/tiny-llama"
+
+    base_dir = build_tiny_model(models_dir / base_model_id.replace("/", "_"))
+    build_tiny_adapter(jobs_dir / "ft-001" / "final_model", base_dir, base_model_id, seed=1)
+    build_tiny_adapter(jobs_dir / "ft-002" / "final_model", base_dir, base_model_id, seed=2)
+
+    monkeypatch.setattr(playground, "MODELS_DIR", models_dir)
+    monkeypatch.setattr(model_export, "MODELS_DIR", models_dir)
+    monkeypatch.setattr(playground, "FINETUNED_MODELS_DIR", jobs_dir)
+    monkeypatch.setattr(playground, "model_cache", {})
+    monkeypatch.setattr(playground, "base_models", {})
+    monkeypatch.setattr(playground, "load_reports", {})
+    monkeypatch.setattr(playground, "cpu_config", {"threads": None, "models": {}})
+    monkeypatch.setattr(cpu_inference, "CPU_CONFIG_FILE", tmp_path / "cpu_inference_config.json")
+
+    yield {
+        "models_dir": models_dir,
+        "jobs_dir": jobs_dir,
+        "base_model_id": base_model_id,
+    }
+
+
+@pytest.fixture
+def tiny_draft_model(tiny_model_dirs):
+    """A second, independently loaded tiny base model to draft tokens with"""
+    draft_model_id = "test/tiny-draft"
+    build_tiny_model(tiny_model_dirs["models_dir"] / draft_model_id.replace("/", "_"), seed=3)
+    yield draft_model_id
+
+
+@pytest.fixture
+def fake_hub(tmp_path, monkeypatch):
+    """
+    Point model downloads at a local stand-in for the Hub and a temporary
+    models directory.
+    """
+    from app.api.routes import download
+    from tests.fake_hub import FakeHub
+
+    hub = FakeHub().start()
+    models_dir = tmp_path / "downloaded_models"
+    models_dir.mkdir()
+
+    monkeypatch.setattr(download, "HUB_ENDPOINT", hub.endpoint)
+    monkeypatch.setattr(download, "MODELS_DIR", models_dir)
+    manager = download.DownloadManager(
+        download.run_download, download.cleanup_download, state_file=models_dir / download.DOWNLOAD_QUEUE_FILENAME
+    )
+    monkeypatch.setattr(download, "download_manager", manager)
+
+    yield hub
+    manager.stop(timeout=5)
+    hub.stop()
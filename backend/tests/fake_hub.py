@@ -0,0 +1,137 @@
+"""
+Local HTTP stand-in for the Hugging Face Hub, serving in-memory model repos
+"""
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Set
+from urllib.parse import unquote, urlparse
+
+LFS_SUFFIXES = (".safetensors", ".bin", ".gguf", ".onnx", ".pt")
+
+
+class FakeHub:
+    """
+    Serves /api/models/{repo}/revision/{rev} metadata and
+    /{repo}/resolve/{rev}/{path} file downloads for the repos added to it.
+    """
+
+    def __init__(self, chunk_size: int = 64 * 1024, chunk_delay: float = 0.0, token: Optional[str] = None):
+        self.repos: Dict[str, Dict[str, bytes]] = {}
+        self.commits: Dict[str, str] = {}
+        self.requests: List[Dict[str, Optional[str]]] = []
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.token = token
+        self.support_ranges = True
+        # {path: bytes}: drop the connection of the next response for path after that many bytes
+        self.drop_after: Dict[str, int] = {}
+        # Paths served with content that doesn't match their published hash
+        self.corrupt: Set[str] = set()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def add_repo(self, repo_id: str, files: Dict[str, bytes]) -> str:
+        self.repos[repo_id] = dict(files)
+        self.commits[repo_id] = hashlib.sha1(repo_id.encode()).hexdigest()
+        return self.commits[repo_id]
+
+    def repo_info(self, repo_id: str) -> Dict:
+        siblings = []
+        for path, content in self.repos[repo_id].items():
+            blob_id = hashlib.sha1(f"blob {len(content)}\0".encode() + content).hexdigest()
+            sibling = {"rfilename": path, "size": len(content), "blobId": blob_id}
+            if path.endswith(LFS_SUFFIXES):
+                sibling["lfs"] = {"sha256": hashlib.sha256(content).hexdigest(), "size": len(content), "pointerSize": 134}
+            siblings.append(sibling)
+        return {"id": repo_id, "sha": self.commits[repo_id], "siblings": siblings}
+
+    def start(self) -> "FakeHub":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(self))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def _handler(hub: FakeHub):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            path = unquote(urlparse(self.path).path)
+            hub.requests.append({"path": path, "range": self.headers.get("Range")})
+
+            if hub.token and self.headers.get("Authorization") != f"Bearer {hub.token}":
+                self._send_json(401, {"error": "Cannot access gated repo"})
+                return
+
+            if path.startswith("/api/models/") and "/revision/" in path:
+                repo_id = path[len("/api/models/"):].split("/revision/")[0]
+                if repo_id not in hub.repos:
+                    self._send_json(404, {"error": "Repository not found"})
+                    return
+                self._send_json(200, hub.repo_info(repo_id))
+                return
+
+            if "/resolve/" in path:
+                repo_id, rest = path.lstrip("/").split("/resolve/", 1)
+                file_path = rest.split("/", 1)[1]
+                content = hub.repos.get(repo_id, {}).get(file_path)
+                if content is None:
+                    self._send_json(404, {"error": "Entry not found"})
+                    return
+                if file_path in hub.corrupt:
+                    content = bytes([content[0] ^ 0xFF]) + content[1:]
+                self._send_content(content, hub.drop_after.pop(file_path, None))
+                return
+
+            self._send_json(404, {"error": "Not found"})
+
+        def _send_json(self, status: int, body: Dict):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_content(self, content: bytes, drop_after: Optional[int] = None):
+            byte_range = self.headers.get("Range")
+            if byte_range and hub.support_ranges:
+                start, _, end = byte_range[len("bytes="):].partition("-")
+                start, end = int(start), int(end) if end else len(content) - 1
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{len(content)}")
+                content = content[start:end + 1]
+            else:
+                self.send_response(200)
+            self.send_header("Content-Length", str(len(content)))
+            self.send_header("Accept-Ranges", "bytes" if hub.support_ranges else "none")
+            self.end_headers()
+
+            if drop_after is not None:
+                content = content[:drop_after]
+                self.close_connection = True
+            try:
+                for offset in range(0, len(content), hub.chunk_size):
+                    self.wfile.write(content[offset:offset + hub.chunk_size])
+                    if hub.chunk_delay:
+                        time.sleep(hub.chunk_delay)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
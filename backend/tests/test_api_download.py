@@ -0,0 +1,692 @@
+"""
+Tests for model download endpoints against a local stand-in for the Hub
+"""
+
+import asyncio
+import json
+import os
+import struct
+import threading
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.api.routes import download
+from app.core import hub_download, model_inventory
+from app.core.blob_store import BlobStore
+from app.core.download_progress import DownloadProgress
+from app.core.hub_download import IntegrityError, RateLimiter, download_snapshot
+
+client = TestClient(app)
+
+REPO_ID = "test-org/tiny-model"
+
+
+def _repo_files(weight_bytes=256 * 1024):
+    return {
+        "config.json": b'{"model_type": "llama"}',
+        "tokenizer.json": b'{"version": "1.0"}',
+        "model.safetensors": os.urandom(weight_bytes),
+    }
+
+
+def _download(request):
+    """Queue a download and wait for it to finish"""
+    response = client.post("/api/download/start", json=request)
+    assert download.download_manager.wait(request["model_id"], timeout=30)
+    return response
+
+
+def _parse_events(lines):
+    events = []
+    event = None
+    for line in lines:
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            events.append((event, json.loads(line[len("data: "):])))
+    return events
+
+
+class TestDownloadProgress:
+    """Test byte-level download progress"""
+
+    def test_download_reports_bytes_and_files(self, fake_hub):
+        """Test that a completed download reports per-file and total bytes"""
+        files = _repo_files()
+        fake_hub.add_repo(REPO_ID, files)
+
+        response = _download({"model_id": REPO_ID})
+        assert response.status_code == 200
+        assert response.json()["status"] == "started"
+
+        status = client.get(f"/api/download/status/{REPO_ID}").json()
+        assert status["status"] == "completed"
+        assert status["progress"] == 100
+        assert status["bytes_total"] == sum(len(content) for content in files.values())
+        assert status["bytes_done"] == status["bytes_total"]
+        assert status["files_done"] == status["files_total"] == 3
+        assert {entry["path"]: entry["bytes_done"] for entry in status["files"]} == {
+            path: len(content) for path, content in files.items()
+        }
+
+        local_dir = download.MODELS_DIR / REPO_ID.replace("/", "_")
+        assert (local_dir / "model.safetensors").read_bytes() == files["model.safetensors"]
+
+    def test_progress_reports_speed_and_eta_while_downloading(self, fake_hub, tmp_path):
+        """Test that throughput and ETA are reported mid-download"""
+        fake_hub.chunk_delay = 0.02
+        fake_hub.add_repo(REPO_ID, _repo_files(weight_bytes=4 * 1024 * 1024))
+
+        progress = DownloadProgress(REPO_ID)
+        thread = threading.Thread(
+            target=download_snapshot,
+            args=(REPO_ID, tmp_path / "model"),
+            kwargs={"endpoint": fake_hub.endpoint, "progress": progress},
+        )
+        thread.start()
+
+        mid_download = None
+        while thread.is_alive():
+            snapshot = progress.snapshot()
+            if 0 < snapshot["bytes_done"] < snapshot["bytes_total"] and snapshot["eta_seconds"]:
+                mid_download = snapshot
+            time.sleep(0.02)
+        thread.join()
+
+        assert mid_download is not None
+        assert mid_download["mb_per_second"] > 0
+        assert 0 < mid_download["progress"] < 100
+
+    def test_skips_files_already_downloaded(self, fake_hub, tmp_path):
+        """Test that files already on disk with the right size aren't fetched again"""
+        fake_hub.add_repo(REPO_ID, _repo_files())
+        download_snapshot(REPO_ID, tmp_path / "model", endpoint=fake_hub.endpoint)
+        fake_hub.requests.clear()
+
+        progress = DownloadProgress(REPO_ID)
+        download_snapshot(REPO_ID, tmp_path / "model", endpoint=fake_hub.endpoint, progress=progress)
+
+        assert not [request for request in fake_hub.requests if "/resolve/" in request["path"]]
+        assert progress.snapshot()["files_done"] == 3
+
+    def test_gated_model_without_token(self, fake_hub):
+        """Test that an unauthorized download fails with a token hint"""
+        fake_hub.token = "secret"
+        fake_hub.add_repo(REPO_ID, _repo_files())
+
+        _download({"model_id": REPO_ID})
+
+        status = client.get(f"/api/download/status/{REPO_ID}").json()
+        assert status["status"] == "failed"
+        assert "token" in status["error"]
+
+        _download({"model_id": REPO_ID, "token": "secret"})
+        assert client.get(f"/api/download/status/{REPO_ID}").json()["status"] == "completed"
+
+
+class TestChunkedDownloads:
+    """Test parallel range downloads, resume and integrity checks"""
+
+    @pytest.fixture(autouse=True)
+    def small_parts(self, monkeypatch):
+        # Split anything over 256 KB so tiny test files exercise parallel parts
+        monkeypatch.setattr(hub_download, "PARALLEL_THRESHOLD", 256 * 1024)
+
+    def _resolve_requests(self, hub, path):
+        return [request for request in hub.requests if request["path"].endswith(f"/{path}")]
+
+    def test_large_files_download_in_parallel_ranges(self, fake_hub, tmp_path):
+        """Test that a large file is fetched as one range request per part"""
+        files = _repo_files(weight_bytes=1024 * 1024 + 7)
+        fake_hub.add_repo(REPO_ID, files)
+
+        download_snapshot(REPO_ID, tmp_path / "model", endpoint=fake_hub.endpoint)
+
+        ranges = sorted(request["range"] for request in self._resolve_requests(fake_hub, "model.safetensors"))
+        assert len(ranges) == hub_download.PARTS_PER_FILE
+        assert all(byte_range.startswith("bytes=") for byte_range in ranges)
+        assert (tmp_path / "model" / "model.safetensors").read_bytes() == files["model.safetensors"]
+        assert not list((tmp_path / "model").glob("*.incomplete*"))
+
+    def test_dropped_connection_is_retried_from_its_offset(self, fake_hub, tmp_path, monkeypatch):
+        """Test that a transient failure is retried within the download, resuming where it stopped"""
+        monkeypatch.setattr(hub_download, "RETRY_BACKOFF", 0.01)
+        files = _repo_files(weight_bytes=200 * 1024)
+        fake_hub.add_repo(REPO_ID, files)
+        fake_hub.drop_after["model.safetensors"] = 120 * 1024
+
+        progress = DownloadProgress(REPO_ID)
+        download_snapshot(REPO_ID, tmp_path / "model", endpoint=fake_hub.endpoint, progress=progress)
+
+        first, retry = self._resolve_requests(fake_hub, "model.safetensors")
+        assert first["range"] is None
+        assert int(retry["range"][len("bytes="):].split("-")[0]) >= 64 * 1024
+        assert (tmp_path / "model" / "model.safetensors").read_bytes() == files["model.safetensors"]
+        assert progress.snapshot()["bytes_done"] == progress.snapshot()["bytes_total"]
+
+    def test_interrupted_download_resumes(self, fake_hub, tmp_path, monkeypatch):
+        """Test that a download that failed resumes from the bytes already written"""
+        monkeypatch.setattr(hub_download, "MAX_RETRIES", 0)
+        files = _repo_files(weight_bytes=200 * 1024)
+        fake_hub.add_repo(REPO_ID, files)
+        fake_hub.drop_after["model.safetensors"] = 120 * 1024
+
+        with pytest.raises(httpx.HTTPError):
+            download_snapshot(REPO_ID, tmp_path / "model", endpoint=fake_hub.endpoint)
+        assert (tmp_path / "model" / "model.safetensors.incomplete.json").exists()
+
+        fake_hub.requests.clear()
+        progress = DownloadProgress(REPO_ID)
+        download_snapshot(REPO_ID, tmp_path / "model", endpoint=fake_hub.endpoint, progress=progress)
+
+        (resumed,) = self._resolve_requests(fake_hub, "model.safetensors")
+        start = int(resumed["range"][len("bytes="):].split("-")[0])
+        assert start >= 64 * 1024
+        assert (tmp_path / "model" / "model.safetensors").read_bytes() == files["model.safetensors"]
+        assert progress.snapshot()["bytes_done"] == progress.snapshot()["bytes_total"]
+
+    def test_falls_back_when_server_ignores_ranges(self, fake_hub, tmp_path):
+        """Test that a server without range support still yields a correct file"""
+        files = _repo_files(weight_bytes=1024 * 1024)
+        fake_hub.support_ranges = False
+        fake_hub.add_repo(REPO_ID, files)
+
+        progress = DownloadProgress(REPO_ID)
+        download_snapshot(REPO_ID, tmp_path / "model", endpoint=fake_hub.endpoint, progress=progress)
+
+        assert (tmp_path / "model" / "model.safetensors").read_bytes() == files["model.safetensors"]
+        assert progress.snapshot()["bytes_done"] == progress.snapshot()["bytes_total"]
+
+    @pytest.mark.parametrize("path", ["model.safetensors", "config.json"])
+    def test_hash_mismatch_fails_and_discards_file(self, fake_hub, tmp_path, path):
+        """Test that sha256 (LFS) and git blob hash mismatches are rejected"""
+        fake_hub.add_repo(REPO_ID, _repo_files())
+        fake_hub.corrupt.add(path)
+
+        with pytest.raises(IntegrityError):
+            download_snapshot(REPO_ID, tmp_path / "model", endpoint=fake_hub.endpoint)
+
+        assert not (tmp_path / "model" / path).exists()
+        assert not list((tmp_path / "model").glob(f"{path}.incomplete*"))
+
+    def test_failed_file_stops_the_others(self, fake_hub, tmp_path):
+        """Test that a file failing for good cancels the other transfers instead of waiting for them"""
+        fake_hub.chunk_size = 16 * 1024
+        fake_hub.chunk_delay = 0.05
+        fake_hub.add_repo(REPO_ID, _repo_files(weight_bytes=1024 * 1024))
+        fake_hub.corrupt.add("config.json")
+
+        started = time.monotonic()
+        with pytest.raises(IntegrityError):
+            download_snapshot(REPO_ID, tmp_path / "model", endpoint=fake_hub.endpoint)
+
+        # The weights alone would take 64 chunks * 50 ms
+        assert time.monotonic() - started < 2.0
+        assert not (tmp_path / "model" / "model.safetensors").exists()
+
+    @pytest.mark.parametrize("use_blob_store", [False, True])
+    def test_corrupt_file_on_disk_is_fetched_again(self, fake_hub, tmp_path, use_blob_store):
+        """Test that a file on disk with the right size but wrong content isn't skipped"""
+        files = _repo_files()
+        fake_hub.add_repo(REPO_ID, files)
+        blob_store = BlobStore(tmp_path / ".blobs") if use_blob_store else None
+        download_snapshot(REPO_ID, tmp_path / "model", endpoint=fake_hub.endpoint, blob_store=blob_store)
+
+        weights = tmp_path / "model" / "model.safetensors"
+        with open(weights, "r+b") as f:
+            f.write(bytes([files["model.safetensors"][0] ^ 0xFF]))
+        fake_hub.requests.clear()
+
+        download_snapshot(REPO_ID, tmp_path / "model", endpoint=fake_hub.endpoint, blob_store=blob_store)
+
+        fetched = {request["path"].rsplit("/", 1)[-1] for request in fake_hub.requests if "/resolve/" in request["path"]}
+        assert fetched == {"model.safetensors"}
+        assert weights.read_bytes() == files["model.safetensors"]
+
+    def test_bandwidth_cap(self, fake_hub, tmp_path):
+        """Test that a capped download stays under its bandwidth limit"""
+        fake_hub.add_repo(REPO_ID, {"model.safetensors": os.urandom(512 * 1024)})
+
+        start_time = time.monotonic()
+        download_snapshot(
+            REPO_ID, tmp_path / "model", endpoint=fake_hub.endpoint, max_bytes_per_second=1024 * 1024
+        )
+
+        assert time.monotonic() - start_time >= 0.45
+
+    def test_rate_limiter_paces_consumers(self):
+        """Test that the limiter spaces out chunks to the configured rate"""
+        limiter = RateLimiter(bytes_per_second=400 * 1024)
+
+        start_time = time.monotonic()
+        for _ in range(4):
+            limiter.consume(50 * 1024)
+
+        assert 0.45 <= time.monotonic() - start_time < 1.5
+
+
+class TestDownloadEvents:
+    """Test Server-Sent Events for download progress"""
+
+    def test_events_stream_until_completed(self, fake_hub, monkeypatch):
+        """Test that progress events are streamed and the stream ends on completion"""
+        monkeypatch.setattr(download, "EVENT_INTERVAL", 0.01)
+        fake_hub.chunk_delay = 0.02
+        fake_hub.add_repo(REPO_ID, _repo_files(weight_bytes=2 * 1024 * 1024))
+
+        client.post("/api/download/start", json={"model_id": REPO_ID})
+
+        with client.stream("GET", f"/api/download/events/{REPO_ID}") as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+            events = _parse_events(response.iter_lines())
+
+        assert events[-1][0] == "completed"
+        assert events[-1][1]["bytes_done"] == events[-1][1]["bytes_total"]
+        progress_events = [data for event, data in events if event == "progress"]
+        assert any(0 < data["bytes_done"] < data["bytes_total"] for data in progress_events)
+
+    def test_events_for_unknown_download(self, fake_hub):
+        """Test streaming events of a model that isn't being downloaded"""
+        response = client.get("/api/download/events/unknown/model")
+        assert response.status_code == 404
+
+
+class TestFileSelection:
+    """Test include/exclude patterns and dry runs"""
+
+    FILES = {
+        "config.json": b"{}",
+        "generation_config.json": b"{}",
+        "tokenizer.json": b"{}",
+        "tokenizer_config.json": b"{}",
+        "tokenizer.model": b"spm",
+        "model.safetensors": b"s" * 4096,
+        "pytorch_model.bin": b"b" * 4096,
+        "model.gguf": b"g" * 4096,
+        "onnx/model.onnx": b"o" * 4096,
+        "onnx/config.json": b"{}",
+        "README.md": b"# model",
+    }
+
+    def test_default_selection_skips_duplicate_formats(self, fake_hub):
+        """Test that downloads default to safetensors weights, tokenizer and config"""
+        fake_hub.add_repo(REPO_ID, self.FILES)
+
+        _download({"model_id": REPO_ID})
+
+        local_dir = download.MODELS_DIR / REPO_ID.replace("/", "_")
+        downloaded = sorted(str(path.relative_to(local_dir)) for path in local_dir.rglob("*") if path.is_file())
+        assert downloaded == [
+            "config.json",
+            "generation_config.json",
+            "model.safetensors",
+            "tokenizer.json",
+            "tokenizer.model",
+            "tokenizer_config.json",
+        ]
+
+    def test_default_falls_back_to_bin_weights(self, fake_hub):
+        """Test that repos without safetensors get their PyTorch weights"""
+        files = {path: content for path, content in self.FILES.items() if not path.endswith(".safetensors")}
+        fake_hub.add_repo(REPO_ID, files)
+
+        response = client.post("/api/download/dry-run", json={"model_id": REPO_ID})
+
+        paths = [entry["path"] for entry in response.json()["files"]]
+        assert "pytorch_model.bin" in paths
+        assert "model.gguf" not in paths
+
+    def test_dry_run_with_patterns_lists_files_and_size(self, fake_hub):
+        """Test that a dry run reports the selected files and total size without downloading"""
+        fake_hub.add_repo(REPO_ID, self.FILES)
+
+        response = client.post("/api/download/dry-run", json={
+            "model_id": REPO_ID,
+            "allow_patterns": ["*.gguf", "*.json"],
+            "ignore_patterns": ["onnx/"],
+        })
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["revision"] == fake_hub.commits[REPO_ID]
+        assert sorted(entry["path"] for entry in data["files"]) == [
+            "config.json", "generation_config.json", "model.gguf", "tokenizer.json", "tokenizer_config.json"
+        ]
+        assert data["total_bytes"] == 4096 + 4 * 2
+        assert data["bytes_to_download"] == data["total_bytes"]
+        assert "onnx/model.onnx" in data["excluded"]
+        assert not (download.MODELS_DIR / REPO_ID.replace("/", "_")).exists()
+        assert not [request for request in fake_hub.requests if "/resolve/" in request["path"]]
+
+    def test_dry_run_errors(self, fake_hub):
+        """Test dry runs of missing and gated repos"""
+        response = client.post("/api/download/dry-run", json={"model_id": "missing/model"})
+        assert response.status_code == 404
+
+        fake_hub.token = "secret"
+        fake_hub.add_repo(REPO_ID, self.FILES)
+        response = client.post("/api/download/dry-run", json={"model_id": REPO_ID})
+        assert response.status_code == 401
+        assert "token" in response.json()["detail"]
+
+    def test_patterns_matching_nothing_fail(self, fake_hub):
+        """Test that a download whose patterns match no files fails clearly"""
+        fake_hub.add_repo(REPO_ID, self.FILES)
+
+        _download({"model_id": REPO_ID, "allow_patterns": ["*.xyz"]})
+
+        status = client.get(f"/api/download/status/{REPO_ID}").json()
+        assert status["status"] == "failed"
+        assert "No files" in status["error"]
+
+
+class TestBlobStore:
+    """Test content-addressed storage shared between models"""
+
+    OTHER_REPO_ID = "test-org/tiny-model-instruct"
+
+    def _add_sharing_repos(self, fake_hub):
+        files = _repo_files()
+        # Same tokenizer and weights, different config
+        other_files = {**files, "config.json": b'{"model_type": "llama", "variant": "instruct"}'}
+        fake_hub.add_repo(REPO_ID, files)
+        fake_hub.add_repo(self.OTHER_REPO_ID, other_files)
+        _download({"model_id": REPO_ID})
+        _download({"model_id": self.OTHER_REPO_ID})
+        return files, other_files
+
+    def test_identical_files_are_stored_once(self, fake_hub):
+        """Test that files shared by two models are downloaded and stored once"""
+        files, other_files = self._add_sharing_repos(fake_hub)
+
+        other_dir = download.MODELS_DIR / self.OTHER_REPO_ID.replace("/", "_")
+        for path, content in other_files.items():
+            assert (other_dir / path).read_bytes() == content
+        other_requests = [request["path"] for request in fake_hub.requests if self.OTHER_REPO_ID in request["path"]]
+        assert [path for path in other_requests if "/resolve/" in path] == [
+            f"/{self.OTHER_REPO_ID}/resolve/{fake_hub.commits[self.OTHER_REPO_ID]}/config.json"
+        ]
+
+        store = download.get_blob_store()
+        manifest = store.load_manifest(other_dir.name)
+        assert manifest["model_id"] == self.OTHER_REPO_ID
+        assert manifest["revision"] == fake_hub.commits[self.OTHER_REPO_ID]
+        assert set(manifest["files"]) == set(other_files)
+        assert {entry["link"] for entry in manifest["files"].values()} <= {"reflink", "hardlink"}
+
+        report = client.get("/api/download/storage").json()
+        assert report["models"] == 2
+        assert report["blobs"] == 4
+        assert report["shared_blobs"] == 2
+        assert report["bytes_saved"] == len(files["tokenizer.json"]) + len(files["model.safetensors"])
+
+    def test_delete_keeps_blobs_other_models_use(self, fake_hub):
+        """Test that deleting a model only frees blobs no other model references"""
+        files, other_files = self._add_sharing_repos(fake_hub)
+
+        response = client.delete(f"/api/download/delete/{REPO_ID}")
+        assert response.status_code == 200
+        assert response.json()["blobs_removed"] == 1
+        assert response.json()["bytes_freed"] == len(files["config.json"])
+
+        other_dir = download.MODELS_DIR / self.OTHER_REPO_ID.replace("/", "_")
+        assert (other_dir / "model.safetensors").read_bytes() == other_files["model.safetensors"]
+
+        response = client.delete(f"/api/download/delete/{self.OTHER_REPO_ID}")
+        assert response.json()["blobs_removed"] == 3
+        assert client.get("/api/download/storage").json()["blobs"] == 0
+
+    def test_delete_removes_files_off_the_event_loop(self, fake_hub, monkeypatch):
+        """Test that deleting a model's files and blobs doesn't run on the event loop"""
+        self._add_sharing_repos(fake_hub)
+        calls = []
+        remove_model_files = download.remove_model_files
+
+        def remove_off_loop(folder_name):
+            try:
+                asyncio.get_running_loop()
+                calls.append("event loop")
+            except RuntimeError:
+                calls.append("worker thread")
+            return remove_model_files(folder_name)
+
+        monkeypatch.setattr(download, "remove_model_files", remove_off_loop)
+        assert client.delete(f"/api/download/delete/{REPO_ID}").status_code == 200
+        assert calls == ["worker thread"]
+        assert not (download.MODELS_DIR / REPO_ID.replace("/", "_")).exists()
+
+    def test_store_is_not_listed_as_a_model(self, fake_hub):
+        """Test that the blob store directory doesn't show up as a downloaded model"""
+        fake_hub.add_repo(REPO_ID, _repo_files(weight_bytes=2 * 1024 * 1024))
+        _download({"model_id": REPO_ID})
+
+        models = client.get("/api/download/list").json()["models"]
+        assert [model["model_id"] for model in models] == [REPO_ID]
+
+    def test_falls_back_to_copies(self, fake_hub, monkeypatch):
+        """Test that files are copied where links aren't supported, and not counted as saved"""
+        from app.core import blob_store
+
+        def no_link(source, destination):
+            raise OSError("links not supported")
+
+        monkeypatch.setattr(blob_store, "_reflink", lambda source, destination: False)
+        monkeypatch.setattr(blob_store.os, "link", no_link)
+        self._add_sharing_repos(fake_hub)
+
+        manifest = download.get_blob_store().load_manifest(self.OTHER_REPO_ID.replace("/", "_"))
+        assert {entry["link"] for entry in manifest["files"].values()} == {"copy"}
+        assert client.get("/api/download/storage").json()["bytes_saved"] < 0
+
+
+def _safetensors(shapes):
+    """A float32 safetensors file with zero-filled tensors of the given shapes"""
+    header = {}
+    offset = 0
+    for name, shape in shapes.items():
+        size = 4
+        for dim in shape:
+            size *= dim
+        header[name] = {"dtype": "F32", "shape": shape, "data_offsets": [offset, offset + size]}
+        offset += size
+    header_bytes = json.dumps(header).encode()
+    return struct.pack("<Q", len(header_bytes)) + header_bytes + bytes(offset)
+
+
+class TestModelInventory:
+    """Test the cached inventory behind /api/download/list"""
+
+    FILES = {
+        "config.json": b'{"architectures": ["LlamaForCausalLM"], "model_type": "llama"}',
+        "model.safetensors": _safetensors({"embed.weight": [512, 512], "norm.weight": [512]}),
+    }
+
+    def test_list_describes_downloaded_models(self, fake_hub):
+        """Test that listed models carry revision, architecture and parameter count"""
+        fake_hub.add_repo(REPO_ID, self.FILES)
+        _download({"model_id": REPO_ID})
+
+        models = client.get("/api/download/list").json()["models"]
+
+        assert len(models) == 1
+        model = models[0]
+        assert model["model_id"] == REPO_ID
+        assert model["revision"] == fake_hub.commits[REPO_ID]
+        assert model["architecture"] == "LlamaForCausalLM"
+        assert model["model_type"] == "llama"
+        assert model["num_parameters"] == 512 * 512 + 512
+        assert model["parameters_by_dtype"] == {"F32": 512 * 512 + 512}
+        assert model["memory"]["fp32"]["weights_bytes"] == (512 * 512 + 512) * 4
+        assert model["file_count"] == 2
+        assert model["size_bytes"] == sum(len(content) for content in self.FILES.values())
+
+    def test_only_changed_directories_are_rescanned(self, fake_hub, monkeypatch):
+        """Test that unchanged models are served from the inventory without walking their files"""
+        fake_hub.add_repo(REPO_ID, self.FILES)
+        _download({"model_id": REPO_ID})
+        client.get("/api/download/list")
+
+        scanned = []
+        scan_model_dir = model_inventory.scan_model_dir
+        monkeypatch.setattr(
+            model_inventory, "scan_model_dir",
+            lambda model_dir, manifest=None: scanned.append(model_dir.name) or scan_model_dir(model_dir, manifest)
+        )
+
+        client.get("/api/download/list")
+        assert scanned == []
+
+        # Another process starts fresh from the saved inventory
+        assert model_inventory.ModelInventory(download.MODELS_DIR).models()[0]["model_id"] == REPO_ID
+        assert scanned == []
+
+        model_dir = download.MODELS_DIR / REPO_ID.replace("/", "_")
+        (model_dir / "README.md").write_text("# model")
+        os.utime(model_dir, (time.time() + 10, time.time() + 10))
+        models = client.get("/api/download/list").json()["models"]
+        assert scanned == [model_dir.name]
+        assert models[0]["file_count"] == 3
+
+    def test_deleted_models_leave_the_inventory(self, fake_hub):
+        """Test that deleting a model removes it from the list"""
+        fake_hub.add_repo(REPO_ID, self.FILES)
+        _download({"model_id": REPO_ID})
+        assert client.get("/api/download/list").json()["total"] == 1
+
+        client.delete(f"/api/download/delete/{REPO_ID}")
+
+        assert client.get("/api/download/list").json() == {"models": [], "total": 0}
+
+
+class TestDownloadQueue:
+    """Test queueing, priorities, pause/resume/cancel and the global budget"""
+
+    SLOW_REPO_ID = "test-org/slow-model"
+
+    def _wait_for_bytes(self, model_id, timeout=10):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            status = client.get(f"/api/download/status/{model_id}").json()
+            if status["status"] == "downloading" and status["bytes_done"] > 0:
+                return status
+            time.sleep(0.01)
+        raise AssertionError(f"{model_id} made no progress")
+
+    def _first_request(self, fake_hub, repo_id):
+        return next(
+            index for index, request in enumerate(fake_hub.requests)
+            if request["path"].startswith(f"/{repo_id}/resolve/")
+        )
+
+    def test_priorities_order_the_queue(self, fake_hub):
+        """Test that queued downloads start by priority within the concurrency limit"""
+        fake_hub.chunk_delay = 0.02
+        for repo_id in (REPO_ID, "test-org/low", "test-org/high"):
+            fake_hub.add_repo(repo_id, _repo_files(weight_bytes=1024 * 1024))
+        assert client.put("/api/download/limits", json={"max_concurrent": 1}).json()["max_concurrent"] == 1
+
+        client.post("/api/download/start", json={"model_id": REPO_ID})
+        low = client.post("/api/download/start", json={"model_id": "test-org/low"}).json()
+        high = client.post("/api/download/start", json={"model_id": "test-org/high", "priority": 5}).json()
+        assert (low["queue_position"], high["queue_position"]) == (1, 1)
+
+        queue = client.get("/api/download/queue").json()
+        assert [(entry["model_id"], entry["status"]) for entry in queue["downloads"]] == [
+            (REPO_ID, "downloading"), ("test-org/high", "queued"), ("test-org/low", "queued")
+        ]
+
+        for repo_id in (REPO_ID, "test-org/high", "test-org/low"):
+            assert download.download_manager.wait(repo_id, timeout=30)
+            assert client.get(f"/api/download/status/{repo_id}").json()["status"] == "completed"
+        assert (
+            self._first_request(fake_hub, REPO_ID)
+            < self._first_request(fake_hub, "test-org/high")
+            < self._first_request(fake_hub, "test-org/low")
+        )
+
+    def test_cancel_stops_promptly_and_cleans_up(self, fake_hub):
+        """Test that cancelling a running download stops it and removes its files"""
+        fake_hub.chunk_delay = 0.05
+        fake_hub.add_repo(self.SLOW_REPO_ID, _repo_files(weight_bytes=4 * 1024 * 1024))
+        client.post("/api/download/start", json={"model_id": self.SLOW_REPO_ID})
+        self._wait_for_bytes(self.SLOW_REPO_ID)
+
+        started = time.monotonic()
+        response = client.post(f"/api/download/cancel/{self.SLOW_REPO_ID}")
+        assert response.status_code == 200
+        assert download.download_manager.wait(self.SLOW_REPO_ID, timeout=5)
+        assert time.monotonic() - started < 1.0
+
+        assert client.get(f"/api/download/status/{self.SLOW_REPO_ID}").json()["status"] == "cancelled"
+        assert not (download.MODELS_DIR / self.SLOW_REPO_ID.replace("/", "_")).exists()
+        assert client.post(f"/api/download/cancel/{self.SLOW_REPO_ID}").status_code == 409
+
+    def test_pause_keeps_partial_files_and_resume_continues(self, fake_hub):
+        """Test that a paused download resumes from its partial file"""
+        files = _repo_files(weight_bytes=2 * 1024 * 1024)
+        fake_hub.chunk_delay = 0.05
+        fake_hub.add_repo(self.SLOW_REPO_ID, files)
+        client.post("/api/download/start", json={"model_id": self.SLOW_REPO_ID})
+        self._wait_for_bytes(self.SLOW_REPO_ID)
+
+        assert client.post(f"/api/download/pause/{self.SLOW_REPO_ID}").status_code == 200
+        assert download.download_manager.wait(self.SLOW_REPO_ID, timeout=5)
+        assert client.get(f"/api/download/status/{self.SLOW_REPO_ID}").json()["status"] == "paused"
+        local_dir = download.MODELS_DIR / self.SLOW_REPO_ID.replace("/", "_")
+        assert (local_dir / f"model.safetensors{hub_download.INCOMPLETE_SUFFIX}").exists()
+
+        fake_hub.chunk_delay = 0.0
+        fake_hub.requests.clear()
+        assert client.post(f"/api/download/resume/{self.SLOW_REPO_ID}").json()["status"] in ("queued", "downloading")
+        assert download.download_manager.wait(self.SLOW_REPO_ID, timeout=30)
+
+        assert client.get(f"/api/download/status/{self.SLOW_REPO_ID}").json()["status"] == "completed"
+        assert (local_dir / "model.safetensors").read_bytes() == files["model.safetensors"]
+        weight_requests = [request for request in fake_hub.requests if request["path"].endswith("model.safetensors")]
+        assert weight_requests[0]["range"] and not weight_requests[0]["range"].startswith("bytes=0-")
+
+    def test_queue_survives_restart(self, fake_hub, monkeypatch):
+        """Test that queued and interrupted downloads and the limits are restored after a restart"""
+        fake_hub.chunk_delay = 0.05
+        fake_hub.add_repo(self.SLOW_REPO_ID, _repo_files(weight_bytes=2 * 1024 * 1024))
+        fake_hub.add_repo(REPO_ID, _repo_files())
+        client.put("/api/download/limits", json={"max_concurrent": 1, "max_mb_per_second": 100})
+        client.post("/api/download/start", json={"model_id": self.SLOW_REPO_ID})
+        client.post("/api/download/start", json={"model_id": REPO_ID, "priority": 3})
+        self._wait_for_bytes(self.SLOW_REPO_ID)
+
+        download.download_manager.stop(timeout=5)
+        restarted = download.DownloadManager(
+            download.run_download, download.cleanup_download, state_file=download.download_manager.state_file
+        )
+        assert restarted.limits() == {"max_concurrent": 1, "max_mb_per_second": 100}
+        assert [(entry["model_id"], entry["status"]) for entry in restarted.queue()] == [
+            (REPO_ID, "queued"), (self.SLOW_REPO_ID, "queued")
+        ]
+
+        fake_hub.chunk_delay = 0.0
+        monkeypatch.setattr(download, "download_manager", restarted)
+        restarted.start()
+        for repo_id in (REPO_ID, self.SLOW_REPO_ID):
+            assert restarted.wait(repo_id, timeout=30)
+            assert restarted.get(repo_id).status == "completed"
+
+    def test_global_bandwidth_cap_is_shared(self, fake_hub):
+        """Test that concurrent downloads together stay under the global bandwidth cap"""
+        for repo_id in (REPO_ID, self.SLOW_REPO_ID):
+            fake_hub.add_repo(repo_id, _repo_files(weight_bytes=512 * 1024))
+        client.put("/api/download/limits", json={"max_concurrent": 2, "max_mb_per_second": 1})
+
+        started = time.monotonic()
+        client.post("/api/download/start", json={"model_id": REPO_ID})
+        client.post("/api/download/start", json={"model_id": self.SLOW_REPO_ID})
+        for repo_id in (REPO_ID, self.SLOW_REPO_ID):
+            assert download.download_manager.wait(repo_id, timeout=30)
+
+        # 1 MB at 1 MB/s
+        assert time.monotonic() - started >= 0.9
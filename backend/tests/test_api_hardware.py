@@ -0,0 +1,180 @@
+"""
+Tests for hardware API endpoints
+"""
+
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.api.routes import hardware as hardware_module
+from app.core.hardware_sampler import HardwareSampler
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def fake_sampler(monkeypatch):
+    """Replace the hardware sampler with one collecting numbered fake samples"""
+    counter = {"n": 0}
+
+    def collect():
+        counter["n"] += 1
+        return {"n": counter["n"], "cpu": {"usage": 1.0, "usage_per_core": [1.0, 1.0]}}
+
+    sampler = HardwareSampler(collect, interval=0.01, max_samples=5)
+    monkeypatch.setattr(hardware_module, "sampler", sampler)
+    yield sampler
+    sampler.stop(timeout=1)
+
+
+class TestHardwareSampler:
+    """Test the background sampler's ring buffer"""
+
+    def test_ring_buffer_is_bounded(self):
+        """Test that only the newest max_samples are kept"""
+        counter = iter(range(100))
+        sampler = HardwareSampler(lambda: {"n": next(counter)}, max_samples=3)
+        for _ in range(5):
+            sampler.sample_now()
+
+        assert len(sampler) == 3
+        assert [s["n"] for s in sampler.history()] == [2, 3, 4]
+        assert sampler.latest()["n"] == 4
+
+    def test_history_since_and_limit(self):
+        """Test filtering history by timestamp and count"""
+        counter = iter(range(100))
+        sampler = HardwareSampler(lambda: {"n": next(counter)})
+        first = sampler.sample_now()
+        sampler.sample_now()
+        sampler.sample_now()
+
+        assert [s["n"] for s in sampler.history(since=first["time"])] == [1, 2]
+        assert [s["n"] for s in sampler.history(limit=1)] == [2]
+
+    def test_background_thread_collects_samples(self, fake_sampler):
+        """Test that the sampler keeps collecting until stopped"""
+        fake_sampler.start()
+        deadline = time.time() + 5
+        while len(fake_sampler) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        fake_sampler.stop(timeout=1)
+
+        assert len(fake_sampler) >= 3
+        assert not fake_sampler.running
+
+    def test_first_sample_follows_priming(self):
+        """Test that rate counters are primed before the first sample, so it doesn't report 0% CPU"""
+        events = []
+        sampler = HardwareSampler(
+            lambda: events.append(("sample", time.monotonic())) or {},
+            interval=0.01,
+            prime=lambda: events.append(("prime", time.monotonic())),
+            prime_seconds=0.1,
+        )
+        sampler.start()
+        first = sampler.wait_latest(timeout=5)
+        sampler.stop(timeout=1)
+
+        assert first is not None
+        assert events[0][0] == "prime"
+        assert events[1][0] == "sample"
+        assert events[1][1] - events[0][1] >= 0.1
+
+
+class TestHardwareEndpoints:
+    """Test /hardware endpoints served from the sampler"""
+
+    def test_stats_returns_latest_sample(self, fake_sampler):
+        """Test that /stats serves the newest buffered sample"""
+        fake_sampler.sample_now()
+        response = client.get("/api/hardware/stats")
+
+        assert response.status_code == 200
+        assert response.json()["n"] >= 1
+        assert fake_sampler.running
+
+    def test_history_since(self, fake_sampler):
+        """Test /history returns samples newer than ?since="""
+        first = fake_sampler.sample_now()
+        fake_sampler.sample_now()
+
+        data = client.get("/api/hardware/history", params={"since": first["time"]}).json()
+        assert data["count"] >= 1
+        assert all(s["time"] > first["time"] for s in data["samples"])
+        assert data["latest_time"] == data["samples"][-1]["time"]
+
+    def test_stats_does_not_block(self):
+        """Test that real stats requests return without a blocking CPU measurement"""
+        client.get("/api/hardware/stats")
+        start = time.perf_counter()
+        response = client.get("/api/hardware/stats")
+        elapsed = time.perf_counter() - start
+
+        assert response.status_code == 200
+        assert {"cpu", "memory", "disk", "gpu"} <= set(response.json())
+        assert elapsed < 0.5
+
+
+class TestStaticHardwareFacts:
+    """Test memoized static facts and sysfs readers"""
+
+    def test_static_facts_are_detected_once(self, monkeypatch):
+        """Test that repeated stats requests don't run detection subprocesses"""
+        from app.core import hardware_info
+
+        hardware_info.get_static_facts()
+        calls = []
+        monkeypatch.setattr(hardware_info.subprocess, "run", lambda *a, **k: calls.append(a))
+
+        hardware_module.collect_sample()
+        client.get("/api/hardware/system-info")
+        assert calls == []
+        assert hardware_info.get_static_facts()["cpu_model"]
+
+    def test_read_linux_cpu_model(self, tmp_path):
+        """Test parsing the CPU model from /proc/cpuinfo"""
+        from app.core.hardware_info import read_linux_cpu_model
+
+        cpuinfo = tmp_path / "cpuinfo"
+        cpuinfo.write_text("processor\t: 0\nmodel name\t: Test CPU @ 3.00GHz\nflags\t: fpu\n")
+        assert read_linux_cpu_model(cpuinfo) == "Test CPU @ 3.00GHz"
+        assert read_linux_cpu_model(tmp_path / "missing") is None
+
+    def test_read_linux_drm_gpus(self, tmp_path):
+        """Test reading GPU load and VRAM from sysfs"""
+        from app.core.hardware_info import read_linux_drm_gpus
+
+        device = tmp_path / "card0" / "device"
+        (device / "hwmon" / "hwmon0").mkdir(parents=True)
+        (device / "gpu_busy_percent").write_text("37\n")
+        (device / "mem_info_vram_total").write_text(str(8 * 1024**3))
+        (device / "mem_info_vram_used").write_text(str(2 * 1024**3))
+        (device / "hwmon" / "hwmon0" / "temp1_input").write_text("55000")
+        (tmp_path / "card0-HDMI-A-1").mkdir()
+
+        gpus = read_linux_drm_gpus(tmp_path)
+        assert len(gpus) == 1
+        assert gpus[0]["load"] == 37.0
+        assert gpus[0]["memory_total"] == 8192.0
+        assert gpus[0]["memory_util"] == 25.0
+        assert gpus[0]["temperature"] == 55.0
+
+    def test_nvidia_gpu_names_fall_back_to_nvidia_smi(self, monkeypatch):
+        """Test that NVIDIA GPUs are found through nvidia-smi without /proc entries (WSL2, Windows)"""
+        from app.core import hardware_info
+
+        commands = []
+
+        def fake_run(command, timeout=5):
+            commands.append(command)
+            return "NVIDIA GeForce RTX 4090\nNVIDIA GeForce RTX 4090\n"
+
+        monkeypatch.setattr(hardware_info, "read_linux_nvidia_gpu_names", lambda: [])
+        monkeypatch.setattr(hardware_info, "_run", fake_run)
+
+        assert hardware_info.detect_nvidia_gpu_names("/usr/bin/nvidia-smi") == ["NVIDIA GeForce RTX 4090"] * 2
+        assert commands[0][0] == "/usr/bin/nvidia-smi"
+        assert hardware_info.detect_nvidia_gpu_names(None) == []
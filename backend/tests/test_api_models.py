@@ -0,0 +1,401 @@
+"""
+Tests for the Hub model endpoints and their metadata cache, with a mocked HfApi
+"""
+
+import json
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi.testclient import TestClient
+from huggingface_hub.hf_api import ModelInfo as HubModelInfo
+
+from app.main import app
+from app.api.routes import download, models
+from app.core import hub_metadata
+from app.core.hub_metadata import HubMetadata
+from app.core.model_index import (
+    BYTES_PER_PARAM,
+    estimate_memory,
+    estimate_parameters,
+    lora_parameters,
+    parameters_by_dtype,
+    summarize_config,
+)
+from app.core.storage import load_json_file
+from tests.conftest import build_tiny_model
+
+client = TestClient(app)
+
+HUB_DELAY = 0.2
+
+GB = 1024 ** 3
+
+# TinyLlama-1.1B's config.json and its safetensors parameter count
+TINYLLAMA_CONFIG = {
+    "architectures": ["LlamaForCausalLM"],
+    "model_type": "llama",
+    "hidden_size": 2048,
+    "intermediate_size": 5632,
+    "num_hidden_layers": 22,
+    "num_attention_heads": 32,
+    "num_key_value_heads": 4,
+    "vocab_size": 32000,
+    "max_position_embeddings": 2048,
+    "tie_word_embeddings": False,
+    "torch_dtype": "bfloat16",
+}
+TINYLLAMA_PARAMETERS = 1_100_048_384
+
+
+def _hub_model(model_id, downloads=100, **fields):
+    return HubModelInfo(
+        id=model_id,
+        author=model_id.split("/")[0],
+        downloads=downloads,
+        likes=5,
+        tags=["text-generation", "llama"],
+        pipeline_tag="text-generation",
+        lastModified="2024-05-01T00:00:00.000Z",
+        **fields,
+    )
+
+
+class FakeHfApi:
+    """Stands in for HfApi, recording calls and the tokens they were made with"""
+
+    def __init__(self):
+        self.calls = []
+        self.downloads = 100
+        self.fail = False
+        self.delay = HUB_DELAY
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, token=None):
+        api = MagicMock()
+        api.model_info.side_effect = lambda model_id, **kwargs: self._call("model_info", token, model_id)
+        api.list_models.side_effect = lambda **kwargs: self._call("list_models", token, kwargs.get("search"))
+        return api
+
+    def _call(self, method, token, arg):
+        with self._lock:
+            self.calls.append((method, token, arg))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if self.fail:
+                raise ConnectionError("Network is unreachable")
+            if method == "model_info":
+                if arg.startswith("missing/"):
+                    raise ValueError(f"Repository not found: {arg}")
+                return _hub_model(
+                    arg,
+                    downloads=self.downloads,
+                    siblings=[
+                        {"rfilename": "config.json", "size": 700},
+                        {"rfilename": "model.safetensors", "size": 2 * TINYLLAMA_PARAMETERS},
+                        {"rfilename": "pytorch_model.bin", "size": 2 * TINYLLAMA_PARAMETERS},
+                    ],
+                    safetensors={"parameters": {"BF16": TINYLLAMA_PARAMETERS}, "total": TINYLLAMA_PARAMETERS},
+                )
+            return [
+                _hub_model(f"org/{arg}-{i}", downloads=self.downloads - i, safetensors={"parameters": {"F16": 10 ** 9}, "total": 10 ** 9})
+                for i in range(3)
+            ]
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+@pytest.fixture
+def fake_hf_api(tmp_path, monkeypatch):
+    """Mock HfApi and ModelCard and give the routes a fresh metadata cache"""
+    api = FakeHfApi()
+    card = MagicMock()
+    card.load.return_value.text = "# Model card"
+    config_file = tmp_path / "hub_files" / "config.json"
+    config_file.parent.mkdir()
+    config_file.write_text(json.dumps(TINYLLAMA_CONFIG))
+
+    def hf_hub_download(repo_id, filename, **kwargs):
+        api.calls.append(("hf_hub_download", kwargs.get("token"), repo_id))
+        return str(config_file)
+
+    monkeypatch.setattr(hub_metadata, "HfApi", api)
+    monkeypatch.setattr(hub_metadata, "ModelCard", card)
+    monkeypatch.setattr(hub_metadata, "hf_hub_download", hf_hub_download)
+    monkeypatch.setattr(download, "MODELS_DIR", tmp_path / "downloaded_models")
+    metadata = HubMetadata(cache_file=tmp_path / "hub_cache" / "metadata.json", max_concurrency=4, offline=False)
+    monkeypatch.setattr(models, "hub_metadata", metadata)
+    yield api
+    metadata.wait_idle(timeout=5)
+
+
+class TestHubMetadataCache:
+    """Test cached, concurrent Hub metadata calls"""
+
+    def test_recommended_models_fan_out_concurrently(self, fake_hf_api):
+        """Test that recommended models are fetched in parallel within the pool bound, then cached"""
+        started = time.monotonic()
+        response = client.get("/api/models/recommended/small-language-models")
+        elapsed = time.monotonic() - started
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == len(models.RECOMMENDED_MODELS)
+        assert data["models"][0]["id"] == models.RECOMMENDED_MODELS[0]
+        assert data["models"][0]["last_modified"].startswith("2024-05-01")
+        # Six calls on four workers take two rounds, not six
+        assert fake_hf_api.max_active == 4
+        assert elapsed < HUB_DELAY * 4
+
+        fake_hf_api.calls.clear()
+        assert client.get("/api/models/recommended/small-language-models").json() == data
+        assert fake_hf_api.calls == []
+
+    def test_cache_is_scoped_by_token(self, fake_hf_api, tmp_path):
+        """Test that results fetched with different tokens are cached separately and tokens aren't stored"""
+        client.get("/api/models/org/model")
+        client.get("/api/models/org/model", params={"token": "hf_secret"})
+        client.get("/api/models/org/model", params={"token": "hf_secret"})
+
+        info_calls = [call for call in fake_hf_api.calls if call[0] == "model_info"]
+        assert [token for _, token, _ in info_calls] == [None, "hf_secret"]
+        models.hub_metadata.cache.flush()
+        assert "hf_secret" not in (tmp_path / "hub_cache" / "metadata.json").read_text()
+
+    def test_cache_writes_are_batched(self, tmp_path, monkeypatch):
+        """Test that a burst of puts is saved in one write, after the save interval or on flush"""
+        writes = []
+        monkeypatch.setattr(hub_metadata, "save_json_file", lambda path, data: writes.append(len(data)))
+        cache = hub_metadata.MetadataCache(tmp_path / "metadata.json", save_interval=0.2)
+
+        for i in range(50):
+            cache.put(f"key-{i}", i)
+        assert writes == []
+        time.sleep(0.5)
+        assert writes == [50]
+
+        cache.put("key-50", 50)
+        cache.flush()
+        cache.flush()
+        assert writes == [50, 51]
+
+    def test_stale_entries_are_served_while_revalidating(self, fake_hf_api):
+        """Test that an expired entry is returned at once and refreshed in the background"""
+        models.hub_metadata.fresh_seconds = 0
+        assert client.get("/api/models/search", params={"query": "llama"}).json()["models"][0]["downloads"] == 100
+
+        fake_hf_api.downloads = 200
+        started = time.monotonic()
+        stale = client.get("/api/models/search", params={"query": "llama"}).json()
+        assert time.monotonic() - started < HUB_DELAY
+        assert stale["models"][0]["downloads"] == 100
+
+        models.hub_metadata.wait_idle(timeout=5)
+        models.hub_metadata.fresh_seconds = 60
+        assert client.get("/api/models/search", params={"query": "llama"}).json()["models"][0]["downloads"] == 200
+
+    def test_offline_mode_serves_the_saved_cache(self, fake_hf_api, tmp_path, monkeypatch):
+        """Test that offline mode answers from the cache saved by an earlier run, without the Hub"""
+        client.get("/api/models/search", params={"query": "llama"})
+        detail = client.get("/api/models/org/model").json()
+        fake_hf_api.calls.clear()
+        models.hub_metadata.cache.flush()
+
+        offline = HubMetadata(cache_file=tmp_path / "hub_cache" / "metadata.json", offline=True)
+        monkeypatch.setattr(models, "hub_metadata", offline)
+
+        # The local index also finds the model whose details were fetched: it's tagged llama
+        results = client.get("/api/models/search", params={"query": "llama"}).json()
+        assert sorted(model["id"] for model in results["models"]) == ["org/llama-0", "org/llama-1", "org/llama-2", "org/model"]
+        assert client.get("/api/models/org/model").json() == detail
+        assert fake_hf_api.calls == []
+
+        response = client.get("/api/models/search", params={"query": "mistral"})
+        assert response.status_code == 200
+        assert response.json()["total"] == 0
+
+    def test_network_errors_fall_back_to_cached_results(self, fake_hf_api):
+        """Test that expired entries are still served when the Hub can't be reached"""
+        models.hub_metadata.fresh_seconds = 0
+        models.hub_metadata.stale_seconds = 0
+        first = client.get("/api/models/search", params={"query": "llama"}).json()
+
+        fake_hf_api.fail = True
+        response = client.get("/api/models/search", params={"query": "llama"})
+
+        assert response.status_code == 200
+        assert response.json() == first
+        # Uncached queries are answered from the local index instead of failing
+        assert client.get("/api/models/search", params={"query": "qwen"}).json() == {"models": [], "total": 0}
+
+    def test_concurrent_requests_share_one_call(self, fake_hf_api):
+        """Test that simultaneous requests for the same metadata make a single Hub call"""
+        responses = []
+        threads = [
+            threading.Thread(target=lambda: responses.append(client.get("/api/models/org/shared")))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert [response.status_code for response in responses] == [200] * 4
+        assert [call for call in fake_hf_api.calls if call[0] == "model_info"] == [("model_info", None, "org/shared")]
+
+    def test_model_detail(self, fake_hf_api):
+        """Test the model detail response built from cached metadata"""
+        data = client.get("/api/models/org/model").json()
+
+        assert data["id"] == "org/model"
+        assert data["author"] == "org"
+        assert data["model_card"] == "# Model card"
+        assert data["config"]["available"] is True
+        assert client.get("/api/models/missing/model").status_code == 404
+        assert data["tags"] == ["text-generation", "llama"]
+
+
+class TestModelIndex:
+    """Test parameter counts, sizes and memory estimates from configs and safetensors headers"""
+
+    def test_config_estimate_matches_safetensors(self, tmp_path):
+        """Test that the parameter and LoRA counts derived from config.json match the real model"""
+        peft = pytest.importorskip("peft")
+        model_dir = build_tiny_model(tmp_path / "tiny")
+        config = summarize_config(load_json_file(model_dir / "config.json"))
+
+        assert estimate_parameters(config) == sum(parameters_by_dtype(model_dir).values())
+        assert estimate_parameters(summarize_config(TINYLLAMA_CONFIG)) == TINYLLAMA_PARAMETERS
+
+        transformers = pytest.importorskip("transformers")
+        model = peft.get_peft_model(
+            transformers.AutoModelForCausalLM.from_pretrained(str(model_dir)),
+            peft.LoraConfig(r=8, target_modules=["q_proj", "v_proj", "k_proj", "o_proj"], task_type="CAUSAL_LM"),
+        )
+        assert lora_parameters(config, r=8) == model.get_nb_trainable_parameters()[0]
+
+    def test_memory_estimates_by_precision(self):
+        """Test that estimates shrink with precision and training needs more than inference"""
+        memory = estimate_memory(TINYLLAMA_PARAMETERS, summarize_config(TINYLLAMA_CONFIG))
+
+        for precision, bytes_per_param in BYTES_PER_PARAM.items():
+            assert memory[precision]["weights_bytes"] == int(TINYLLAMA_PARAMETERS * bytes_per_param)
+            assert memory[precision]["training_bytes"] > memory[precision]["inference_bytes"]
+        assert memory["4bit"]["training_bytes"] < memory["fp16"]["training_bytes"] < memory["fp32"]["training_bytes"]
+        # QLoRA fine-tuning of a 1.1B model fits a small GPU
+        assert memory["4bit"]["training_bytes"] < 4 * GB
+        assert memory["lora_parameters"] == 2_252_800
+
+        # Without the config's dimensions, only the weights are known
+        assert estimate_memory(10 ** 9)["fp16"]["training_bytes"] < memory["fp16"]["training_bytes"]
+
+    def test_search_results_carry_sizes(self, fake_hf_api):
+        """Test that search results report parameter counts and weight sizes from safetensors metadata"""
+        model = client.get("/api/models/search", params={"query": "llama"}).json()["models"][0]
+
+        assert model["num_parameters"] == 10 ** 9
+        assert model["size_gb"] == round(2 * 10 ** 9 / GB, 2)
+
+    def test_detail_from_hub_metadata(self, fake_hf_api):
+        """Test that details combine the Hub's safetensors counts, config.json and file sizes"""
+        data = client.get("/api/models/org/model").json()
+
+        assert data["num_parameters"] == TINYLLAMA_PARAMETERS
+        # The default download skips pytorch_model.bin when safetensors weights exist
+        assert data["size_gb"] == round((2 * TINYLLAMA_PARAMETERS + 700) / GB, 2)
+        config = data["config"]
+        assert config["model_type"] == "llama"
+        assert config["num_key_value_heads"] == 4
+        assert config["parameters_source"] == "safetensors"
+        assert set(config["memory"]) >= {"fp32", "fp16", "4bit"}
+
+    def test_detail_prefers_the_downloaded_copy(self, fake_hf_api):
+        """Test that a downloaded model is profiled from its own files without fetching config.json"""
+        model_dir = build_tiny_model(download.MODELS_DIR / "org_tiny")
+        data = client.get("/api/models/org/tiny").json()
+
+        assert data["num_parameters"] == sum(parameters_by_dtype(model_dir).values())
+        assert data["config"]["hidden_size"] == 32
+        assert data["size_gb"] == round(sum(p.stat().st_size for p in model_dir.iterdir()) / GB, 2)
+        assert not [call for call in fake_hf_api.calls if call[0] == "hf_hub_download"]
+
+
+def _downloaded_model(model_id, config):
+    """A downloaded model directory, large enough to be listed, with the given config.json"""
+    model_dir = download.MODELS_DIR / model_id.replace("/", "_")
+    model_dir.mkdir(parents=True)
+    (model_dir / "config.json").write_text(json.dumps(config))
+    (model_dir / "model.bin").write_bytes(bytes(2 * 1024 * 1024))
+    return model_dir
+
+
+class TestLocalSearch:
+    """Test searching downloaded models and cached Hub metadata without the Hub"""
+
+    def test_offline_search_finds_downloaded_models(self, fake_hf_api, monkeypatch):
+        """Test that downloaded models are found by ID words and config tags, within the task filter"""
+        _downloaded_model("acme/tiny-chat", TINYLLAMA_CONFIG)
+        _downloaded_model("acme/encoder", {"architectures": ["BertModel"], "model_type": "bert"})
+        models.hub_metadata.offline = True
+
+        started = time.monotonic()
+        results = client.get("/api/models/search", params={"query": "tiny"}).json()
+        assert time.monotonic() - started < HUB_DELAY
+        assert [model["id"] for model in results["models"]] == ["acme/tiny-chat"]
+
+        assert client.get("/api/models/search", params={"query": "llama"}).json()["total"] == 1
+        # Only the causal LM counts as text generation
+        assert client.get("/api/models/search", params={"query": "acme"}).json()["total"] == 1
+        assert client.get("/api/models/search", params={"query": "bert", "task": "bert"}).json()["total"] == 1
+        assert fake_hf_api.calls == []
+
+    def test_cached_metadata_and_cards_are_indexed(self, fake_hf_api):
+        """Test that earlier search results, model info and model card text are searchable offline"""
+        client.get("/api/models/search", params={"query": "qwen"})
+        client.get("/api/models/org/model")
+        models.hub_metadata.offline = True
+
+        assert client.get("/api/models/search", params={"query": "qwen"}).json()["total"] == 3
+        results = client.get("/api/models/search", params={"query": "model card"}).json()
+        assert [model["id"] for model in results["models"]] == ["org/model"]
+        assert results["models"][0]["num_parameters"] == TINYLLAMA_PARAMETERS
+
+    def test_results_are_scoped_by_token(self, fake_hf_api):
+        """Test that models seen only with a token aren't found by searches without it"""
+        client.get("/api/models/search", params={"query": "private", "token": "hf_secret"})
+        models.hub_metadata.offline = True
+
+        assert client.get("/api/models/search", params={"query": "private"}).json()["total"] == 0
+        assert client.get("/api/models/search", params={"query": "private", "token": "hf_secret"}).json()["total"] == 3
+
+    def test_hub_results_are_merged_with_local_matches(self, fake_hf_api):
+        """Test that Hub results come first, followed by local matches the Hub didn't return"""
+        _downloaded_model("acme/llama-local", TINYLLAMA_CONFIG)
+
+        results = client.get("/api/models/search", params={"query": "llama"}).json()
+
+        assert [model["id"] for model in results["models"]] == ["org/llama-0", "org/llama-1", "org/llama-2", "acme/llama-local"]
+        assert client.get("/api/models/search", params={"query": "llama", "limit": 2}).json()["total"] == 2
+
+    def test_search_takes_milliseconds(self, fake_hf_api):
+        """Test that searching thousands of cached models is fast once the index is built"""
+        for page in range(20):
+            models.hub_metadata.cache.put(
+                f'search:anonymous:["page-{page}"]',
+                [{"id": f"org{page}/model-{i}", "tags": ["llama", f"tag-{i % 7}"], "pipeline_tag": "text-generation",
+                  "downloads": i} for i in range(100)],
+            )
+        models.search_local("model", "text-generation", "downloads", 20, None)
+
+        started = time.monotonic()
+        for _ in range(10):
+            results = models.search_local("tag 3", "text-generation", "downloads", 20, None)
+        assert (time.monotonic() - started) / 10 < 0.05
+        assert len(results) == 20
+        assert all("tag-3" in model["tags"] for model in results)
@@ -0,0 +1,149 @@
+"""
+Tests for batch offline evaluation of fine-tuned models
+"""
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+torch = pytest.importorskip("torch")
+peft = pytest.importorskip("peft")
+
+from app.main import app
+from app.api.routes import jobs as jobs_module
+from app.core import evaluator
+from app.core.evaluator import length_sorted_batches, pad_batch, run_evaluation, build_eval_examples
+from app.core.storage import save_json_file, load_json_file
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def eval_jobs(tiny_model_dirs, tmp_path, monkeypatch):
+    """Register the tiny fine-tunes as jobs and write a held-out dataset"""
+    monkeypatch.chdir(tmp_path)
+    jobs_dir = tiny_model_dirs["jobs_dir"]
+    monkeypatch.setattr(jobs_module, "JOBS_DIR", jobs_dir)
+    monkeypatch.setattr(jobs_module, "JOBS_META_FILE", jobs_dir / "jobs_meta.json")
+
+    dataset_file = tmp_path / "held_out.json"
+    rows = [
+        {"instruction": " ".join(f"w{j}" for j in range(i % 7 + 1)), "input": "", "output": f"w{i}"}
+        for i in range(10)
+    ]
+    dataset_file.write_text(json.dumps(rows))
+
+    save_json_file(jobs_dir / "jobs_meta.json", [
+        {"id": "ft-001", "status": "completed", "model": tiny_model_dirs["base_model_id"], "dataset": str(dataset_file)},
+        {"id": "ft-003", "status": "pending", "model": tiny_model_dirs["base_model_id"], "dataset": str(dataset_file)},
+    ])
+    yield {**tiny_model_dirs, "dataset_file": dataset_file}
+
+
+def _evaluate(job_id, **body):
+    response = client.post(f"/api/jobs/{job_id}/evaluate", json=body or None)
+    assert response.status_code == 200
+    jobs_module.running_evaluations[job_id].join(timeout=120)
+    return client.get(f"/api/jobs/{job_id}/evaluate").json()
+
+
+class TestEvaluationBatching:
+    """Test length-sorted batching helpers"""
+
+    def test_batches_group_similar_lengths(self):
+        """Test that batches are sorted longest first and cover every example once"""
+        batches = length_sorted_batches([3, 10, 1, 7, 5], batch_size=2)
+        assert batches == [[1, 3], [4, 0], [2]]
+
+    def test_pad_batch_masks_padding(self):
+        """Test right and left padding with attention masks"""
+        input_ids, attention_mask = pad_batch([[5, 6, 7], [8]], pad_token_id=0)
+        assert input_ids.tolist() == [[5, 6, 7], [8, 0, 0]]
+        assert attention_mask.tolist() == [[1, 1, 1], [1, 0, 0]]
+
+        input_ids, attention_mask = pad_batch([[5, 6, 7], [8]], pad_token_id=0, left=True)
+        assert input_ids.tolist() == [[5, 6, 7], [0, 0, 8]]
+        assert attention_mask.tolist() == [[1, 1, 1], [0, 0, 1]]
+
+    def test_batching_does_not_change_loss(self, eval_jobs, tmp_path):
+        """Test that padded batches give the same loss as one example at a time"""
+        from app.api.routes import playground
+
+        rows = json.loads(eval_jobs["dataset_file"].read_text())
+        examples = build_eval_examples(rows)
+        loader = lambda: playground.load_model("ft-001", "fine-tuned")
+
+        batched = run_evaluation(loader, examples, tmp_path / "batched", batch_size=4)
+        single = run_evaluation(loader, examples, tmp_path / "single", batch_size=1)
+        assert batched["loss"] == pytest.approx(single["loss"], rel=1e-4)
+
+
+class TestEvaluateJobModel:
+    """Test POST /jobs/{job_id}/evaluate endpoint"""
+
+    def test_evaluate_reports_perplexity(self, eval_jobs):
+        """Test that evaluation writes per-example results and a summary"""
+        evaluation = _evaluate("ft-001", batch_size=4)
+        assert evaluation["status"] == "completed"
+        assert evaluation["split"] == "train"
+        assert evaluation["processed"] == evaluation["total"] == 10
+        assert evaluation["perplexity"] > 1
+        assert evaluation["tokens_per_second"] > 0
+        assert evaluation["exact_match"] is None
+
+        output_dir = eval_jobs["jobs_dir"] / "ft-001" / "evaluation"
+        results = [json.loads(line) for line in (output_dir / "results.jsonl").read_text().splitlines()]
+        assert sorted(r["index"] for r in results) == list(range(10))
+        assert load_json_file(output_dir / "summary.json", default={})["perplexity"] == evaluation["perplexity"]
+
+    def test_progress_is_served_without_rewriting_metadata(self, eval_jobs, monkeypatch):
+        """Test that per-batch progress is kept in memory, not saved to jobs_meta.json after every batch"""
+        saves = []
+        save_jobs_metadata = jobs_module.save_jobs_metadata
+
+        def counting_save(jobs):
+            saves.append(len(jobs))
+            save_jobs_metadata(jobs)
+
+        monkeypatch.setattr(jobs_module, "save_jobs_metadata", counting_save)
+        progress = []
+        run_evaluation = evaluator.run_evaluation
+
+        def recording_run_evaluation(*args, on_progress, **kwargs):
+            def on_batch(processed, total):
+                on_progress(processed, total)
+                progress.append(client.get("/api/jobs/ft-001/evaluate").json()["processed"])
+            return run_evaluation(*args, on_progress=on_batch, **kwargs)
+
+        monkeypatch.setattr(evaluator, "run_evaluation", recording_run_evaluation)
+        evaluation = _evaluate("ft-001", batch_size=1)
+
+        assert evaluation["status"] == "completed"
+        assert progress == list(range(1, 11))
+        # Started, split selected, finished
+        assert len(saves) == 3
+        assert "ft-001" not in jobs_module.evaluation_states
+
+    def test_evaluate_exact_match(self, eval_jobs):
+        """Test that exact match generates predictions for instruction rows"""
+        evaluation = _evaluate("ft-001", exact_match=True, max_new_tokens=2, max_samples=4)
+        assert evaluation["status"] == "completed"
+        assert evaluation["exact_match_examples"] == 4
+        assert 0 <= evaluation["exact_match"] <= 1
+
+        results_file = eval_jobs["jobs_dir"] / "ft-001" / "evaluation" / "results.jsonl"
+        results = [json.loads(line) for line in results_file.read_text().splitlines()]
+        assert all("prediction" in r and "exact_match" in r for r in results)
+
+    def test_evaluate_missing_split_fails(self, eval_jobs):
+        """Test that an unknown split marks the evaluation failed"""
+        evaluation = _evaluate("ft-001", split="test")
+        assert evaluation["status"] == "failed"
+        assert "test" in evaluation["error"]
+
+    def test_evaluate_not_found(self, eval_jobs):
+        """Test evaluating unknown jobs and jobs without a fine-tuned model"""
+        assert client.post("/api/jobs/missing/evaluate").status_code == 404
+        assert client.post("/api/jobs/ft-003/evaluate").status_code == 404
+        assert client.get("/api/jobs/missing/evaluate").status_code == 404
@@ -0,0 +1,102 @@
+"""
+Tests for the event-loop blocking detector
+"""
+
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.loop_monitor import BlockingDetector
+
+
+def _test_app(detector):
+    """A small app with one blocking and one well-behaved async handler"""
+    from contextlib import asynccontextmanager
+    import asyncio
+
+    @asynccontextmanager
+    async def lifespan(app):
+        detector.attach(app)
+        detector.start()
+        yield
+        await detector.stop()
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.get("/blocking/{item_id}")
+    async def blocking_handler(item_id: str):
+        time.sleep(0.3)
+        return {"item_id": item_id}
+
+    @app.get("/awaiting")
+    async def awaiting_handler():
+        await asyncio.sleep(0.3)
+        return {}
+
+    return app
+
+
+class TestBlockingDetector:
+    """Test stall detection, stack capture and per-route blocking time"""
+
+    def test_blocking_handler_is_caught_with_stack(self):
+        """Test that a sync sleep in an async handler is attributed to its route"""
+        detector = BlockingDetector(threshold=0.05, enabled=True)
+        with TestClient(_test_app(detector)) as client:
+            client.get("/blocking/1")
+            client.get("/awaiting")
+            time.sleep(0.1)
+
+        report = detector.report()
+        assert "/blocking/{item_id}" in report["routes"]
+        assert "/awaiting" not in report["routes"]
+        assert detector.blocking_time("/blocking/{item_id}") >= 0.25
+
+        event = report["events"][0]
+        assert event["duration_ms"] >= 250
+        assert any("time.sleep(0.3)" in line for line in event["stack"])
+
+    def test_detector_disabled_by_default(self, monkeypatch):
+        """Test that debug mode is opt-in through the environment"""
+        monkeypatch.delenv("SLM_DEBUG_LOOP_BLOCKING", raising=False)
+        assert not BlockingDetector.from_env().enabled
+
+        monkeypatch.setenv("SLM_DEBUG_LOOP_BLOCKING", "1")
+        monkeypatch.setenv("SLM_LOOP_BLOCK_THRESHOLD_MS", "250")
+        detector = BlockingDetector.from_env()
+        assert detector.enabled
+        assert detector.threshold == 0.25
+
+
+class TestAppHandlersDoNotBlock:
+    """Regression tests: hot handlers must not stall the event loop"""
+
+    @pytest.fixture
+    def app_detector(self, monkeypatch):
+        from app.main import app
+        from app import main
+
+        detector = BlockingDetector(threshold=0.1, enabled=True)
+        monkeypatch.setattr(main, "blocking_detector", detector)
+        with TestClient(app) as client:
+            yield client, detector
+
+    def test_chat_generation_runs_off_the_loop(self, tiny_model_dirs, app_detector):
+        """Test that playground generation doesn't block the event loop"""
+        client, detector = app_detector
+        response = client.post("/api/playground/chat", json={
+            "model_id": "ft:ft-001", "message": "w1 w2", "do_sample": False, "max_new_tokens": 4
+        })
+        assert response.status_code == 200
+        assert detector.blocking_time("/api/playground/chat") == 0.0
+
+    def test_hardware_stats_do_not_block(self, app_detector):
+        """Test that hardware polling doesn't block the event loop"""
+        client, detector = app_detector
+        for _ in range(3):
+            client.get("/api/hardware/stats")
+            client.get("/api/hardware/cpu")
+        assert detector.blocking_time("/api/hardware/stats") == 0.0
+        assert detector.blocking_time("/api/hardware/cpu") == 0.0
@@ -0,0 +1,119 @@
+"""
+Tests for the Prometheus metrics endpoint
+"""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.core import metrics
+from app.core.metrics import Counter, Histogram, Registry
+
+client = TestClient(app)
+
+
+def _sample(text, line_prefix):
+    """Value of the first exposition line starting with line_prefix"""
+    for line in text.splitlines():
+        if line.startswith(line_prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+
+class TestRegistry:
+    """Test metric types and text exposition"""
+
+    def test_counter_and_histogram_render(self):
+        """Test counter values and cumulative histogram buckets"""
+        registry = Registry()
+        counter = registry.register(Counter("things_total", "Things", ("kind",)))
+        histogram = registry.register(Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0)))
+
+        counter.inc(kind="a")
+        counter.inc(2, kind="a")
+        histogram.observe(0.05, route="/x")
+        histogram.observe(0.5, route="/x")
+        histogram.observe(5, route="/x")
+
+        text = registry.render()
+        assert "# TYPE things_total counter" in text
+        assert 'things_total{kind="a"} 3' in text
+        assert 'latency_seconds_bucket{route="/x",le="0.1"} 1' in text
+        assert 'latency_seconds_bucket{route="/x",le="1"} 2' in text
+        assert 'latency_seconds_bucket{route="/x",le="+Inf"} 3' in text
+        assert 'latency_seconds_count{route="/x"} 3' in text
+
+    def test_collectors_run_at_scrape(self):
+        """Test that collect callbacks refresh gauges before rendering"""
+        registry = Registry()
+        gauge = registry.gauge("queue_depth", "Depth")
+        registry.on_collect(lambda: gauge.set(7))
+        assert "queue_depth 7" in registry.render()
+
+
+class TestMetricsEndpoint:
+    """Test GET /metrics"""
+
+    def test_requests_are_recorded_per_route_template(self):
+        """Test that latency is labeled with the route template, not the raw path"""
+        client.get("/api/jobs/does-not-exist/evaluate")
+        client.get("/api/jobs/another-missing/evaluate")
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        text = response.text
+        count = _sample(text, 'http_request_duration_seconds_count{method="GET",route="/api/jobs/{job_id}/evaluate"}')
+        assert count >= 2
+        assert 'status="404"' in text
+        assert "does-not-exist" not in text
+
+    def test_unmatched_routes_share_one_label(self):
+        """Test that unknown paths don't create a label per path"""
+        client.get("/no/such/path-1")
+        text = client.get("/metrics").text
+        assert 'route="<unmatched>"' in text
+        assert "path-1" not in text
+
+    def test_app_gauges_are_exposed(self):
+        """Test playground, training and event-loop metrics are present"""
+        text = client.get("/metrics").text
+        for name in (
+            "http_requests_in_flight",
+            "event_loop_lag_seconds",
+            "playground_queue_depth",
+            "playground_model_cache_requests_total",
+            "playground_model_bytes_resident",
+            "training_jobs_active",
+            "training_job_tokens_per_second",
+        ):
+            assert f"# TYPE {name} " in text
+
+    def test_model_cache_hits_and_misses(self, tiny_model_dirs):
+        """Test that playground loads count as cache misses then hits"""
+        from app.api.routes import playground
+
+        misses = playground.model_cache_requests.value(result="miss")
+        hits = playground.model_cache_requests.value(result="hit")
+        playground.load_model("ft-001", "fine-tuned")
+        playground.load_model("ft-001", "fine-tuned")
+
+        assert playground.model_cache_requests.value(result="miss") == misses + 1
+        assert playground.model_cache_requests.value(result="hit") == hits + 1
+        assert _sample(client.get("/metrics").text, "playground_model_bytes_resident") > 0
+
+    def test_event_loop_lag_is_measured(self):
+        """Test that a blocked loop shows up as lag"""
+        import time
+
+        async def run():
+            task = asyncio.create_task(metrics.monitor_event_loop_lag(interval=0.01))
+            await asyncio.sleep(0)
+            time.sleep(0.1)
+            await asyncio.sleep(0.05)
+            task.cancel()
+
+        asyncio.run(run())
+        assert metrics.event_loop_lag_max_seconds.value() >= 0.05
@@ -0,0 +1,118 @@
+"""
+Tests for merge-and-export of fine-tuned models
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+torch = pytest.importorskip("torch")
+peft = pytest.importorskip("peft")
+
+from app.main import app
+from app.api.routes import jobs as jobs_module
+from app.api.routes import playground
+from app.core.storage import save_json_file, load_json_file
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def export_jobs(tiny_model_dirs, monkeypatch):
+    """Register the tiny fine-tunes as jobs in a temporary jobs directory"""
+    jobs_dir = tiny_model_dirs["jobs_dir"]
+    monkeypatch.setattr(jobs_module, "JOBS_DIR", jobs_dir)
+    monkeypatch.setattr(jobs_module, "JOBS_META_FILE", jobs_dir / "jobs_meta.json")
+    save_json_file(jobs_dir / "jobs_meta.json", [
+        {"id": "ft-001", "status": "completed", "model": tiny_model_dirs["base_model_id"]},
+        {"id": "ft-002", "status": "completed", "model": tiny_model_dirs["base_model_id"]},
+        {"id": "ft-003", "status": "pending", "model": tiny_model_dirs["base_model_id"]},
+    ])
+    yield tiny_model_dirs
+
+
+def _export(job_id, **body):
+    response = client.post(f"/api/jobs/{job_id}/export", json=body or None)
+    assert response.status_code == 200
+    jobs_module.running_exports[job_id].join(timeout=120)
+    return client.get(f"/api/jobs/{job_id}/export").json()
+
+
+def _logits(model, tokenizer, text="user : w1 w2 w3"):
+    inputs = tokenizer(text, return_tensors="pt")
+    with torch.no_grad():
+        return model(**inputs).logits
+
+
+class TestExportJobModel:
+    """Test POST /jobs/{job_id}/export endpoint"""
+
+    def test_export_matches_adapter_outputs(self, export_jobs):
+        """Test that a float32 export reproduces the adapter model and skips PEFT"""
+        adapter_model, tokenizer = playground.load_model("ft-001", "fine-tuned")
+        expected = _logits(adapter_model, tokenizer)
+
+        export = _export("ft-001")
+        assert export["status"] == "completed"
+        assert export["format"] == "safetensors"
+
+        merged_dir = export_jobs["jobs_dir"] / "ft-001" / "merged_model"
+        assert list(merged_dir.glob("*.safetensors"))
+        assert load_json_file(merged_dir / "export_info.json", default=None)["job_id"] == "ft-001"
+
+        merged_model, tokenizer = playground.load_model("ft-001", "fine-tuned")
+        assert not isinstance(merged_model, peft.PeftModel)
+        assert torch.allclose(_logits(merged_model, tokenizer), expected, atol=1e-4)
+
+    def test_export_bfloat16(self, export_jobs):
+        """Test exporting with bfloat16 weights"""
+        export = _export("ft-002", dtype="bfloat16")
+        assert export["status"] == "completed"
+        assert export["dtype"] == "bfloat16"
+
+        model, _ = playground.load_model("ft-002", "fine-tuned")
+        assert next(model.parameters()).dtype == torch.bfloat16
+
+    def test_export_int8_dynamic(self, export_jobs):
+        """Test that int8 dynamic quantization is applied when the export is loaded"""
+        export = _export("ft-001", quantization="int8_dynamic")
+        assert export["quantization"] == "int8_dynamic"
+
+        model, _ = playground.load_model("ft-001", "fine-tuned")
+        assert isinstance(model.model.layers[0].self_attn.q_proj, torch.ao.nn.quantized.dynamic.Linear)
+
+    def test_failed_reexport_leaves_no_manifest(self, export_jobs, monkeypatch):
+        """Test that a re-export failing mid-write removes the old manifest and keeps no partial output"""
+        assert _export("ft-001")["status"] == "completed"
+        merged_dir = export_jobs["jobs_dir"] / "ft-001" / "merged_model"
+        shards = {f.name: f.read_bytes() for f in merged_dir.glob("*.safetensors")}
+
+        def fail_save(*args, **kwargs):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(type(playground.load_model("ft-001", "fine-tuned")[1]), "save_pretrained", fail_save)
+        export = _export("ft-001", dtype="bfloat16")
+
+        assert export["status"] == "failed"
+        assert not (merged_dir / "export_info.json").exists()
+        assert {f.name: f.read_bytes() for f in merged_dir.glob("*.safetensors")} == shards
+        assert [p.name for p in merged_dir.parent.iterdir() if p.name.startswith("merged_model")] == ["merged_model"]
+
+        # Without a manifest the playground serves the adapter again
+        model, _ = playground.load_model("ft-001", "fine-tuned")
+        assert isinstance(model, peft.PeftModel)
+
+    def test_export_rejects_int8_with_half_precision(self, export_jobs):
+        """Test that int8 quantization can't be combined with a half-precision dtype"""
+        response = client.post("/api/jobs/ft-001/export", json={"dtype": "float16", "quantization": "int8_dynamic"})
+        assert response.status_code == 400
+
+    def test_export_untrained_job(self, export_jobs):
+        """Test exporting a job that has no fine-tuned model"""
+        response = client.post("/api/jobs/ft-003/export")
+        assert response.status_code == 404
+
+    def test_export_nonexistent_job(self, export_jobs):
+        """Test exporting a job that doesn't exist"""
+        response = client.post("/api/jobs/ft-999/export")
+        assert response.status_code == 404
+        assert client.get("/api/jobs/ft-999/export").status_code == 404
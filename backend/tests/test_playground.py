@@ -0,0 +1,533 @@
+"""
+Tests for playground model loading and inference
+"""
+
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("peft")
+
+from app.main import app
+from app.api.routes import playground
+from app.core import fast_load
+
+client = TestClient(app)
+
+
+def _logits(model, tokenizer, text="user : w1 w2 w3"):
+    inputs = tokenizer(text, return_tensors="pt")
+    with torch.no_grad():
+        return model(**inputs).logits
+
+
+class TestAdapterServing:
+    """Test LoRA adapters served over a shared base model"""
+
+    def test_fine_tunes_share_one_base_model(self, tiny_model_dirs):
+        """Test that two fine-tunes of the same base load the base weights once"""
+        model_a, _ = playground.load_model("ft-001", "fine-tuned")
+        model_b, _ = playground.load_model("ft-002", "fine-tuned")
+
+        assert model_a is model_b
+        assert len(playground.base_models) == 1
+        resident = playground.base_models[tiny_model_dirs["base_model_id"]]
+        assert resident.adapters == {"ft-001", "ft-002"}
+        assert resident.model.active_adapter == "ft-002"
+
+    def test_switching_adapters_changes_outputs(self, tiny_model_dirs):
+        """Test that each adapter and the plain base produce their own outputs"""
+        model, tokenizer = playground.load_model("ft-001", "fine-tuned")
+        logits_a = _logits(model, tokenizer)
+
+        model, tokenizer = playground.load_model("ft-002", "fine-tuned")
+        logits_b = _logits(model, tokenizer)
+
+        model, tokenizer = playground.load_model(tiny_model_dirs["base_model_id"], "base")
+        logits_base = _logits(model, tokenizer)
+
+        model, tokenizer = playground.load_model("ft-001", "fine-tuned")
+        logits_a_again = _logits(model, tokenizer)
+
+        assert not torch.allclose(logits_a, logits_b)
+        assert not torch.allclose(logits_a, logits_base)
+        assert torch.allclose(logits_a, logits_a_again)
+
+    def test_missing_fine_tuned_model(self, tiny_model_dirs):
+        """Test loading a fine-tuned model that doesn't exist"""
+        with pytest.raises(playground.HTTPException) as exc_info:
+            playground.load_model("ft-999", "fine-tuned")
+
+        assert exc_info.value.status_code == 404
+
+    def test_list_and_unload_adapters(self, tiny_model_dirs):
+        """Test listing resident models and unloading an adapter"""
+        playground.load_model("ft-001", "fine-tuned")
+        playground.load_model("ft-002", "fine-tuned")
+
+        response = client.get("/api/playground/loaded")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 1
+        assert data["models"][0]["adapters"] == ["ft-001", "ft-002"]
+
+        response = client.delete("/api/playground/adapters/ft-001")
+        assert response.status_code == 200
+        resident = playground.base_models[tiny_model_dirs["base_model_id"]]
+        assert resident.adapters == {"ft-002"}
+
+        response = client.delete("/api/playground/adapters/ft-001")
+        assert response.status_code == 404
+
+
+    def test_unload_waits_for_running_inference(self, tiny_model_dirs):
+        """Test that an adapter isn't deleted while another request holds the inference lock"""
+        playground.load_model("ft-001", "fine-tuned")
+        resident = playground.base_models[tiny_model_dirs["base_model_id"]]
+
+        responses = []
+        with playground.inference_lock:
+            unload = threading.Thread(
+                target=lambda: responses.append(client.delete("/api/playground/adapters/ft-001"))
+            )
+            unload.start()
+            unload.join(timeout=0.5)
+            assert unload.is_alive()
+            assert "ft-001" in resident.adapters
+
+        unload.join(timeout=10)
+        assert responses[0].status_code == 200
+        assert "ft-001" not in resident.adapters
+
+
+class TestConversationKVCache:
+    """Test KV-cache reuse across playground conversation turns"""
+
+    def _chat(self, message, history, conversation_id="conv-1", model_id="base:test/tiny-llama"):
+        response = client.post("/api/playground/chat", json={
+            "model_id": model_id,
+            "message": message,
+            "history": history,
+            "conversation_id": conversation_id,
+        })
+        assert response.status_code == 200
+        return response.json()
+
+    def test_second_turn_reuses_prefix(self, tiny_model_dirs, monkeypatch):
+        """Test that a follow-up turn only prefills tokens after the cached prefix"""
+        monkeypatch.setattr(playground, "kv_cache", playground.ConversationKVCache())
+
+        first = self._chat("w1 w2 w3", [])
+        assert first["stats"]["reused_prompt_tokens"] == 0
+
+        history = [
+            {"role": "user", "content": "w1 w2 w3"},
+            {"role": "assistant", "content": first["response"]},
+        ]
+        second = self._chat("w4 w5", history)
+
+        # Everything up to (at least) the first user turn is served from cache
+        _, tokenizer = playground.load_model("test/tiny-llama", "base")
+        first_turn_tokens = len(tokenizer("user: w1 w2 w3")["input_ids"])
+        assert second["stats"]["reused_prompt_tokens"] >= first_turn_tokens
+        assert second["stats"]["reused_prompt_tokens"] < second["stats"]["prompt_tokens"]
+
+    def test_reuse_extends_past_cleaned_reply(self, tiny_model_dirs, monkeypatch):
+        """Test that the cached reply is reused even though the client sends back its cleaned text"""
+        monkeypatch.setattr(playground, "kv_cache", playground.ConversationKVCache())
+        # Cleaning changes every word, so the cleaned reply re-tokenizes to unknown tokens
+        monkeypatch.setattr(playground, "clean_response", lambda text: text.upper())
+
+        first = self._chat("w1 w2 w3", [])
+        assert first["response"]
+        history = [
+            {"role": "user", "content": "w1 w2 w3"},
+            {"role": "assistant", "content": first["response"]},
+        ]
+        second = self._chat("w4 w5", history)
+        assert second["stats"]["reused_prompt_tokens"] > first["stats"]["prompt_tokens"]
+
+        history += [
+            {"role": "user", "content": "w4 w5"},
+            {"role": "assistant", "content": second["response"]},
+        ]
+        third = self._chat("w6", history)
+        assert third["stats"]["reused_prompt_tokens"] > second["stats"]["prompt_tokens"]
+
+    def test_cache_is_per_model(self, tiny_model_dirs, monkeypatch):
+        """Test that a cached prefix isn't reused by a different model"""
+        monkeypatch.setattr(playground, "kv_cache", playground.ConversationKVCache())
+
+        first = self._chat("w1 w2 w3", [])
+        history = [
+            {"role": "user", "content": "w1 w2 w3"},
+            {"role": "assistant", "content": first["response"]},
+        ]
+        second = self._chat("w4 w5", history, model_id="ft:ft-001")
+        assert second["stats"]["reused_prompt_tokens"] == 0
+
+    def test_long_conversation_keeps_newest_message(self, tiny_model_dirs, monkeypatch):
+        """Test that a conversation longer than MAX_PROMPT_TOKENS drops its oldest turns, not the new message"""
+        monkeypatch.setattr(playground, "kv_cache", playground.ConversationKVCache())
+        monkeypatch.setattr(playground, "MAX_PROMPT_TOKENS", 48)
+        history = []
+        for i in range(20):
+            history.append({"role": "user", "content": f"w{i} w{i + 1}"})
+            history.append({"role": "assistant", "content": f"w{i + 2}"})
+
+        _, tokenizer = playground.load_model("test/tiny-llama", "base")
+        inputs, dropped = playground.fit_prompt(tokenizer, "w50 w51", history, None)
+        tokens = tokenizer.convert_ids_to_tokens(inputs["input_ids"][0].tolist())
+        assert len(tokens) <= 48
+        assert tokens[-6:] == ["user", ":", "w50", "w51", "assistant", ":"]
+        assert 0 < dropped < len(history)
+        # The newest history messages are the ones kept
+        assert tokens[-9:-6] == ["assistant", ":", "w21"]
+
+        response = self._chat("w50 w51", history)
+        assert response["stats"]["prompt_tokens"] <= 48
+        assert response["stats"]["dropped_history_messages"] == dropped
+
+    def test_fit_prompt_tokenizes_each_message_once(self, tiny_model_dirs, monkeypatch):
+        """Test that dropping many old messages doesn't re-tokenize the prompt per message"""
+        monkeypatch.setattr(playground, "MAX_PROMPT_TOKENS", 48)
+        history = [{"role": "user", "content": f"w{i % 40} w{(i + 1) % 40}"} for i in range(200)]
+        _, tokenizer = playground.load_model("test/tiny-llama", "base")
+
+        calls = []
+        original_call = type(tokenizer).__call__
+
+        def counting_call(self, *args, **kwargs):
+            calls.append(args)
+            return original_call(self, *args, **kwargs)
+
+        monkeypatch.setattr(type(tokenizer), "__call__", counting_call)
+        inputs, dropped = playground.fit_prompt(tokenizer, "w1 w2", history, None)
+
+        assert inputs["input_ids"].shape[1] <= 48
+        assert dropped > 150
+        assert len(calls) <= 5
+
+    def test_eviction_respects_limits(self, tiny_model_dirs, monkeypatch):
+        """Test that old conversations are evicted once the store is full"""
+        monkeypatch.setattr(playground, "kv_cache", playground.ConversationKVCache(max_entries=2))
+
+        for i in range(3):
+            self._chat("w1 w2", [], conversation_id=f"conv-{i}")
+
+        assert len(playground.kv_cache) == 2
+        assert "conv-0" not in playground.kv_cache
+        assert playground.kv_cache.total_bytes > 0
+
+        response = client.delete("/api/playground/conversations/conv-2")
+        assert response.status_code == 200
+        assert client.delete("/api/playground/conversations/conv-2").status_code == 404
+
+
+class TestCpuInferenceMode:
+    """Test per-model CPU inference modes"""
+
+    def test_int8_mode_quantizes_linear_layers(self, tiny_model_dirs):
+        """Test that int8 mode serves a dynamically quantized copy"""
+        response = client.put("/api/playground/cpu-config/base:test/tiny-llama", json={"mode": "int8"})
+        assert response.status_code == 200
+
+        model, _ = playground.load_model("test/tiny-llama", "base")
+        assert isinstance(model.model.layers[0].self_attn.q_proj, torch.ao.nn.quantized.dynamic.Linear)
+        assert playground.base_models == {}
+
+        response = client.post("/api/playground/chat", json={"model_id": "base:test/tiny-llama", "message": "w1 w2"})
+        assert response.status_code == 200
+
+    def test_int8_mode_for_adapter_merges_private_copy(self, tiny_model_dirs):
+        """Test that an int8 fine-tune is merged instead of sharing the base"""
+        client.put("/api/playground/cpu-config/ft:ft-001", json={"mode": "int8"})
+
+        model, _ = playground.load_model("ft-001", "fine-tuned")
+        assert not isinstance(model, playground.peft.PeftModel)
+        assert isinstance(model.model.layers[0].self_attn.q_proj, torch.ao.nn.quantized.dynamic.Linear)
+
+    def test_bfloat16_mode_uses_separate_resident_base(self, tiny_model_dirs):
+        """Test that bfloat16 mode loads its own resident base copy"""
+        client.put("/api/playground/cpu-config/ft:ft-001", json={"mode": "bfloat16"})
+
+        model, _ = playground.load_model("ft-001", "fine-tuned")
+        expected = torch.bfloat16 if playground.cpu_supports_bf16() else torch.float32
+        assert model.base_model.model.model.embed_tokens.weight.dtype == expected
+
+        playground.load_model("test/tiny-llama", "base")
+        assert len(playground.base_models) == 2
+
+    def test_mode_change_unloads_stale_resident_base(self, tiny_model_dirs):
+        """Test that changing a base model's mode unloads the resident copy it was served from"""
+        base_model_id = tiny_model_dirs["base_model_id"]
+        playground.load_model(base_model_id, "base")
+        assert list(playground.base_models) == [base_model_id]
+
+        client.put(f"/api/playground/cpu-config/base:{base_model_id}", json={"mode": "bfloat16"})
+        assert playground.base_models == {}
+
+        playground.load_model(base_model_id, "base")
+        assert len(playground.base_models) == 1
+        client.delete(f"/api/playground/cpu-config/base:{base_model_id}")
+        assert playground.base_models == {}
+
+    def test_mode_change_detaches_fine_tune(self, tiny_model_dirs):
+        """Test that changing a fine-tune's mode detaches it, keeping bases still in use"""
+        base_model_id = tiny_model_dirs["base_model_id"]
+        playground.load_model("ft-001", "fine-tuned")
+        resident = playground.base_models[base_model_id]
+
+        # The default copy still serves the base model itself
+        client.put("/api/playground/cpu-config/ft:ft-001", json={"mode": "bfloat16"})
+        assert playground.base_models == {base_model_id: resident}
+        assert resident.adapters == set()
+
+        # A copy only the fine-tune used is unloaded
+        playground.load_model("ft-001", "fine-tuned")
+        assert len(playground.base_models) == 2
+        client.put("/api/playground/cpu-config/ft:ft-001", json={"mode": "int8"})
+        assert playground.base_models == {base_model_id: resident}
+
+    def test_mode_change_waits_for_running_inference(self, tiny_model_dirs):
+        """Test that a model isn't evicted while another request holds the inference lock"""
+        playground.load_model("test/tiny-llama", "base")
+
+        responses = []
+        with playground.inference_lock:
+            update = threading.Thread(
+                target=lambda: responses.append(
+                    client.put("/api/playground/cpu-config/base:test/tiny-llama", json={"mode": "int8"})
+                )
+            )
+            update.start()
+            update.join(timeout=0.5)
+            assert update.is_alive()
+            assert len(playground.base_models) == 1
+
+        update.join(timeout=10)
+        assert responses[0].status_code == 200
+        assert playground.base_models == {}
+
+    def test_reset_and_threads(self, tiny_model_dirs):
+        """Test resetting a model's mode and setting the thread count"""
+        client.put("/api/playground/cpu-config/base:test/tiny-llama", json={"mode": "int8"})
+        assert client.delete("/api/playground/cpu-config/base:test/tiny-llama").status_code == 200
+        assert client.delete("/api/playground/cpu-config/base:test/tiny-llama").status_code == 404
+
+        threads = torch.get_num_threads()
+        response = client.put("/api/playground/cpu-config", json={"threads": threads})
+        assert response.status_code == 200
+        assert client.get("/api/playground/cpu-config").json()["threads"] == threads
+
+        assert client.put("/api/playground/cpu-config/tiny", json={"mode": "int8"}).status_code == 400
+        assert client.put("/api/playground/cpu-config", json={"threads": 0}).status_code == 422
+
+    def test_cpu_config_calls_torch_off_the_event_loop(self, monkeypatch):
+        """Test that the CPU config endpoints, which may import torch, don't run it on the event loop"""
+        calls = []
+
+        def on_event_loop():
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return False
+            return True
+
+        def read_cpu_support():
+            calls.append(on_event_loop())
+            return {"cuda_available": False, "bf16_supported": False, "threads": 2}
+
+        def set_intra_op_threads(threads):
+            calls.append(on_event_loop())
+            return threads
+
+        monkeypatch.setattr(playground, "read_cpu_support", read_cpu_support)
+        monkeypatch.setattr(playground, "set_intra_op_threads", set_intra_op_threads)
+        monkeypatch.setattr(playground, "save_cpu_config", lambda config: None)
+        monkeypatch.setitem(playground.cpu_config, "threads", None)
+
+        assert client.get("/api/playground/cpu-config").json()["threads"] == 2
+        assert client.put("/api/playground/cpu-config", json={"threads": 3}).json()["threads"] == 3
+        assert calls == [False, False]
+
+    def test_benchmark_compares_modes(self, tiny_model_dirs):
+        """Test benchmarking CPU modes against the float32 path"""
+        response = client.post("/api/playground/cpu-benchmark", json={
+            "model_id": "ft:ft-001",
+            "modes": ["float32", "int8"],
+            "prompt": "w1 w2 w3",
+            "max_new_tokens": 4
+        })
+
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert set(results) == {"float32", "int8"}
+        for result in results.values():
+            assert result["generated_tokens"] == 4
+            assert result["tokens_per_second"] > 0
+            assert "resident_memory_mb" in result
+        assert results["float32"]["speedup_vs_float32"] == 1.0
+
+
+class TestGenerationParams:
+    """Test generation parameters and speculative decoding in /playground/chat"""
+
+    def _chat(self, **body):
+        payload = {"model_id": "ft:ft-001", "message": "w1 w2 w3", "do_sample": False, "max_new_tokens": 6}
+        payload.update(body)
+        return client.post("/api/playground/chat", json=payload)
+
+    def test_generation_params_are_applied(self, tiny_model_dirs):
+        """Test that max_new_tokens and greedy decoding come from the request"""
+        first = self._chat(max_new_tokens=3, no_repeat_ngram_size=0)
+        second = self._chat(max_new_tokens=3, no_repeat_ngram_size=0)
+
+        assert first.status_code == 200
+        assert first.json()["stats"]["generated_tokens"] <= 3
+        assert first.json()["response"] == second.json()["response"]
+
+    def test_invalid_generation_params(self, tiny_model_dirs):
+        """Test that out-of-range parameters are rejected"""
+        assert self._chat(temperature=0).status_code == 422
+        assert self._chat(top_p=1.5).status_code == 422
+        assert self._chat(max_new_tokens=0).status_code == 422
+        assert self._chat(model_id="tiny").status_code == 422
+        assert self._chat(draft_model_id="tiny").status_code == 422
+
+    def test_speculative_decoding_matches_greedy_output(self, tiny_model_dirs, tiny_draft_model):
+        """Test that greedy assisted decoding produces the target model's own output"""
+        plain = self._chat(no_repeat_ngram_size=0, repetition_penalty=1.0)
+        assisted = self._chat(no_repeat_ngram_size=0, repetition_penalty=1.0, draft_model_id=f"base:{tiny_draft_model}")
+
+        assert assisted.status_code == 200
+        assert assisted.json()["response"] == plain.json()["response"]
+
+        speculative = assisted.json()["stats"]["speculative"]
+        assert speculative["draft_tokens_proposed"] > 0
+        assert 0.0 <= speculative["acceptance_rate"] <= 1.0
+        assert speculative["estimated_speedup"] >= 1.0
+
+    def test_draft_sharing_target_weights_is_rejected(self, tiny_model_dirs):
+        """Test that a draft served from the target's own resident base is rejected"""
+        response = self._chat(draft_model_id="base:test/tiny-llama")
+        assert response.status_code == 400
+
+
+class TestCompareModels:
+    """Test /playground/compare side-by-side comparison"""
+
+    def _compare(self, **body):
+        payload = {
+            "model_ids": ["base:test/tiny-llama", "ft:ft-001", "ft:ft-002"],
+            "prompts": ["w1 w2 w3", "w4 w5"],
+            "do_sample": False,
+            "max_new_tokens": 4
+        }
+        payload.update(body)
+        return client.post("/api/playground/compare", json=payload)
+
+    def test_outputs_are_aligned_by_prompt(self, tiny_model_dirs):
+        """Test that every prompt has one response per model, matching chat output"""
+        response = self._compare()
+        assert response.status_code == 200
+        data = response.json()
+
+        assert [r["prompt"] for r in data["results"]] == ["w1 w2 w3", "w4 w5"]
+        for result in data["results"]:
+            assert set(result["responses"]) == {"base:test/tiny-llama", "ft:ft-001", "ft:ft-002"}
+
+        chat = client.post("/api/playground/chat", json={
+            "model_id": "ft:ft-002", "message": "w4 w5", "do_sample": False, "max_new_tokens": 4
+        })
+        assert data["results"][1]["responses"]["ft:ft-002"] == chat.json()["response"]
+
+        for model in data["models"]:
+            assert len(model["outputs"]) == 2
+            assert model["mean_latency"] > 0
+            assert "tokens_per_second" in model
+
+    def test_fine_tunes_share_one_resident_base(self, tiny_model_dirs):
+        """Test that a base model and its fine-tunes run on one copy of the weights"""
+        data = self._compare().json()
+        assert data["resident_weight_copies"] == 1
+        assert len(playground.base_models) == 1
+        ft_001 = next(m for m in data["models"] if m["model_id"] == "ft:ft-001")
+        assert sorted(ft_001["shares_weights_with"]) == ["base:test/tiny-llama", "ft:ft-002"]
+
+    def test_invalid_compare_requests(self, tiny_model_dirs):
+        """Test that bad model lists and missing models are rejected"""
+        assert self._compare(model_ids=[]).status_code == 422
+        assert self._compare(model_ids=["ft:ft-001", "ft:ft-001"]).status_code == 422
+        assert self._compare(model_ids=["tiny"]).status_code == 422
+        assert self._compare(prompts=[" "]).status_code == 422
+        assert self._compare(model_ids=["ft:missing"]).status_code == 404
+
+
+class TestFastLoad:
+    """Test loading safetensors weights through memory maps and converted copies"""
+
+    def test_matching_dtype_loads_without_conversion(self, tiny_model_dirs):
+        """Test that float32 weights loaded as float32 are mapped directly and reported"""
+        playground.load_model(tiny_model_dirs["base_model_id"], "base")
+
+        (report,) = playground.load_reports.values()
+        assert report["zero_copy"] is True
+        assert report["converted"] is False
+        assert report["seconds"] > 0
+        assert report["peak_rss_bytes"] >= report["rss_increase_bytes"] >= 0
+        assert not (tiny_model_dirs["models_dir"] / fast_load.CONVERTED_DIRNAME).exists()
+
+        response = client.post(f"/api/playground/convert/{tiny_model_dirs['base_model_id']}")
+        assert response.json()["status"] == "not_needed"
+        assert client.post("/api/playground/convert/test/missing").status_code == 404
+
+    def test_other_dtype_is_converted_once(self, tiny_model_dirs):
+        """Test that a model is converted on its first load in another dtype and mapped afterwards"""
+        model_dir = tiny_model_dirs["models_dir"] / "test_tiny-llama"
+        shard = model_dir / "model.safetensors"
+        # The download may have hardlinked the shard into the blob store
+        blob = tiny_model_dirs["models_dir"] / "blob.safetensors"
+        blob.hardlink_to(shard)
+        original = blob.read_bytes()
+
+        # Custom code loaded with trust_remote_code must sit next to the converted shards
+        (model_dir / "modeling_custom.py").write_text("# custom modeling code\n")
+        (model_dir / "pytorch_model.bin").write_bytes(b"legacy weights")
+
+        model, report = fast_load.load_causal_lm(str(model_dir), dtype=torch.bfloat16)
+        assert report["converted"] is True
+        assert report["zero_copy"] is True
+        assert report["conversion_seconds"] is not None
+        target = fast_load.converted_dir(model_dir, torch.bfloat16)
+        assert (target / "modeling_custom.py").exists()
+        assert (target / "tokenizer.json").exists()
+        assert not (target / "pytorch_model.bin").exists()
+        assert fast_load.is_converted(model_dir, torch.bfloat16)
+        assert next(model.parameters()).dtype == torch.bfloat16
+
+        expected = playground.transformers.AutoModelForCausalLM.from_pretrained(str(model_dir), dtype=torch.bfloat16)
+        tokenizer = playground.transformers.AutoTokenizer.from_pretrained(str(model_dir))
+        assert torch.equal(_logits(model, tokenizer), _logits(expected, tokenizer))
+
+        _, report = fast_load.load_causal_lm(str(model_dir), dtype=torch.bfloat16)
+        assert report["converted"] is True
+        assert report["conversion_seconds"] is None
+
+        # Weights changed in memory never reach the mapped files
+        mapped, report = fast_load.load_causal_lm(str(model_dir), dtype=torch.float32)
+        assert report["zero_copy"] is True
+        with torch.no_grad():
+            for parameter in mapped.parameters():
+                parameter.add_(1)
+        assert blob.read_bytes() == original
+
+        # A re-downloaded model is converted again
+        shard.touch()
+        assert not fast_load.is_converted(model_dir, torch.bfloat16)
+        _, report = fast_load.load_causal_lm(str(model_dir), dtype=torch.bfloat16, convert=False)
+        assert report["converted"] is False
+        assert report["zero_copy"] is False
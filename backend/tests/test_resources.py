@@ -0,0 +1,203 @@
+"""
+Tests for per-job resource accounting
+"""
+
+import json
+import subprocess
+import time
+import sys
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.api.routes import download
+from app.api.routes import jobs as jobs_module
+from app.core.resource_monitor import JobResourceMonitor, check_admission, estimate_job_memory
+from app.core.storage import save_json_file
+
+client = TestClient(app)
+
+GB = 1024 ** 3
+
+# Burns CPU, holds ~50 MB and writes a file, then waits for stdin to close
+WORKER_SCRIPT = """
+import sys, time
+data = bytearray(50 * 1024 * 1024)
+with open(sys.argv[1], "wb") as f:
+    f.write(b"x" * (4 * 1024 * 1024))
+end = time.time() + 0.3
+while time.time() < end:
+    pass
+sys.stdin.read()
+"""
+
+
+class UnstartedThread:
+    """Stands in for the training supervisor thread"""
+
+    def __init__(self, target, daemon=None):
+        self.target = target
+
+    def start(self):
+        pass
+
+    def is_alive(self):
+        return False
+
+
+class ExitingProcess:
+    """Stands in for the training worker process; exits with the given code"""
+
+    def __init__(self, exitcode):
+        self.code = exitcode
+        self.exitcode = None
+
+    def __call__(self, target, args, name, daemon):
+        return self
+
+    def start(self):
+        self.popen = subprocess.Popen([sys.executable, "-c", f"import sys; sys.exit({self.code})"])
+        self.pid = self.popen.pid
+
+    def join(self):
+        self.exitcode = self.popen.wait()
+
+
+@pytest.fixture
+def resource_jobs(tmp_path, monkeypatch):
+    """Temporary jobs directory with one finished and one new job"""
+    jobs_dir = tmp_path / "training_jobs"
+    monkeypatch.setattr(jobs_module, "JOBS_DIR", jobs_dir)
+    monkeypatch.setattr(jobs_module, "JOBS_META_FILE", jobs_dir / "jobs_meta.json")
+    monkeypatch.setattr(jobs_module, "resource_monitors", {})
+    save_json_file(jobs_dir / "jobs_meta.json", [
+        {
+            "id": "ft-001", "status": "completed", "model": "big/model",
+            "resources": {"model": "big/model", "status": "finished", "peak_rss_bytes": 4096 * GB}
+        },
+        {"id": "ft-002", "status": "pending", "model": "big/model"},
+        {"id": "ft-003", "status": "pending", "model": "other/model"},
+    ])
+    yield jobs_dir
+
+
+class TestJobResourceMonitor:
+    """Test sampling a worker process"""
+
+    def test_monitor_accounts_worker_process(self, tmp_path):
+        """Test that CPU time, memory and I/O of a worker are recorded"""
+        worker = subprocess.Popen(
+            [sys.executable, "-c", WORKER_SCRIPT, str(tmp_path / "out.bin")],
+            stdin=subprocess.PIPE
+        )
+        monitor = JobResourceMonitor("ft-001", worker.pid, tmp_path / "resources.json", interval=0.05, model="m")
+        try:
+            monitor.start()
+            while not (tmp_path / "out.bin").exists() or monitor.snapshot()["cpu_seconds"] < 0.2:
+                time.sleep(0.05)
+                assert worker.poll() is None
+        finally:
+            worker.communicate(timeout=10)
+        summary = monitor.stop()
+
+        assert summary["status"] == "finished"
+        assert summary["cpu_seconds"] >= 0.2
+        assert summary["peak_rss_bytes"] >= 50 * 1024 * 1024
+        if summary["io_write_bytes"] is not None:
+            assert summary["io_write_bytes"] >= 0
+        assert (tmp_path / "resources.json").exists()
+        assert monitor.snapshot()["samples"]
+
+
+class TestAdmission:
+    """Test admission decisions from resource history"""
+
+    def test_estimate_uses_same_model_history(self):
+        """Test that the estimate is the largest finished peak of the same model"""
+        records = [
+            {"model": "a", "status": "finished", "peak_rss_bytes": 2 * GB},
+            {"model": "a", "status": "finished", "peak_rss_bytes": 3 * GB},
+            {"model": "a", "status": "running", "peak_rss_bytes": 9 * GB},
+            {"model": "b", "status": "finished", "peak_rss_bytes": 8 * GB},
+        ]
+        assert estimate_job_memory(records, "a") == 3 * GB
+        assert estimate_job_memory(records, "c") is None
+
+    def test_running_jobs_reserve_headroom(self):
+        """Test that running jobs' remaining growth is reserved"""
+        running = [{"expected_peak_bytes": 6 * GB, "rss_bytes": 2 * GB}]
+        assert check_admission(4 * GB, [], available_bytes=8 * GB)[0]
+        assert not check_admission(4 * GB, running, available_bytes=8 * GB)[0]
+        assert check_admission(None, running, available_bytes=0)[0]
+
+    def test_start_rejects_job_that_does_not_fit(self, resource_jobs):
+        """Test that /start refuses a job whose model needed more memory before"""
+        response = client.post("/api/jobs/ft-002/start")
+        assert response.status_code == 503
+        assert "Not enough memory" in response.json()["detail"]
+
+    def test_start_warns_on_config_estimate(self, resource_jobs, tmp_path, monkeypatch):
+        """Test that a model's first job starts with a warning when its config-based estimate doesn't fit"""
+        models_dir = tmp_path / "downloaded_models"
+        model_dir = models_dir / "other_model"
+        model_dir.mkdir(parents=True)
+        # A trillion-parameter config: far beyond any test machine's memory
+        (model_dir / "config.json").write_text(json.dumps({
+            "model_type": "llama", "hidden_size": 32768, "intermediate_size": 131072,
+            "num_hidden_layers": 80, "num_attention_heads": 256, "vocab_size": 128000,
+        }))
+        monkeypatch.setattr(download, "MODELS_DIR", models_dir)
+        monkeypatch.setattr(jobs_module, "get_static_facts", lambda: {"nvidia_gpu_names": []})
+        monkeypatch.setattr(jobs_module, "running_jobs", {})
+        # Don't actually train
+        monkeypatch.setattr(jobs_module, "threading", SimpleNamespace(Thread=UnstartedThread))
+        jobs = json.loads((resource_jobs / "jobs_meta.json").read_text())
+        jobs[2].update(batch_size=1, max_seq_length=64)
+        save_json_file(resource_jobs / "jobs_meta.json", jobs)
+
+        response = client.post("/api/jobs/ft-003/start")
+
+        assert response.status_code == 200
+        assert "Not enough memory" in response.json()["warning"]
+        admission = json.loads((resource_jobs / "jobs_meta.json").read_text())[2]["admission"]
+        assert admission["expected_peak_bytes"] is None
+        assert admission["model_estimate"]["assumptions"] == {"lora_r": 8, "batch_size": 1, "seq_len": 64}
+
+
+    @pytest.mark.parametrize("exitcode,status", [(0, "finished"), (1, "failed")])
+    def test_run_is_recorded_with_its_outcome(self, resource_jobs, monkeypatch, exitcode, status):
+        """Test that a worker that exits with an error is recorded as failed, not finished"""
+        threads = []
+        monkeypatch.setattr(
+            jobs_module, "threading",
+            SimpleNamespace(Thread=lambda target, daemon: threads.append(UnstartedThread(target)) or threads[-1])
+        )
+        process = ExitingProcess(exitcode)
+        monkeypatch.setattr(
+            jobs_module, "multiprocessing", SimpleNamespace(get_context=lambda method: SimpleNamespace(Process=process))
+        )
+
+        assert client.post("/api/jobs/ft-003/start").status_code == 200
+        threads[0].target()
+
+        job = json.loads((resource_jobs / "jobs_meta.json").read_text())[2]
+        assert job["resources"]["status"] == status
+        assert job["status"] == ("completed" if exitcode == 0 else "failed")
+        assert json.loads((resource_jobs / "ft-003" / "resources.json").read_text())["status"] == status
+
+
+class TestJobResourcesEndpoint:
+    """Test GET /jobs/{job_id}/resources endpoint"""
+
+    def test_resources_from_file(self, resource_jobs):
+        """Test that a finished job's saved resources are returned"""
+        save_json_file(resource_jobs / "ft-001" / "resources.json", {"job_id": "ft-001", "status": "finished", "cpu_seconds": 1.5})
+        data = client.get("/api/jobs/ft-001/resources").json()
+        assert data["cpu_seconds"] == 1.5
+
+    def test_resources_not_available(self, resource_jobs):
+        """Test jobs that never ran and unknown jobs"""
+        assert client.get("/api/jobs/ft-003/resources").json()["status"] == "not_available"
+        assert client.get("/api/jobs/missing/resources").status_code == 404
@@ -0,0 +1,132 @@
+"""
+Tests for lazy ML imports and background warm-up
+"""
+
+import json
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+from app.core.lazy_imports import LazyModule, WarmUp
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Runs run_server.py the way a PyInstaller bundle's executable does
+FROZEN_LAUNCHER = """
+import multiprocessing, multiprocessing.spawn, runpy, sys
+import uvicorn
+
+sys.frozen = True
+sys._MEIPASS = {backend_dir!r}
+sys.executable = {executable!r}
+# PyInstaller's runtime hook makes freeze_support work on every platform
+multiprocessing.freeze_support = multiprocessing.spawn.freeze_support
+uvicorn.run = lambda *args, **kwargs: sys.exit("server started")
+
+if sys.argv[1:2] == ["-c"]:
+    # The resource tracker
+    exec(sys.argv[2])
+    sys.exit()
+sys.argv[0] = {run_server!r}
+runpy.run_path({run_server!r}, run_name="__main__")
+"""
+
+
+def write_marker(path: str):
+    """Target of the worker process spawned from the emulated bundle"""
+    Path(path).write_text(str(os.getpid()))
+
+
+class TestLazyImports:
+    """Test that the server starts without importing the ML stack"""
+
+    def test_app_import_skips_ml_stack(self, tmp_path):
+        """Test that importing app.main and the profile report loader loads none of torch, transformers or peft"""
+        code = (
+            "import json, sys; import app.main, app.core.training_profiler; "
+            "print(json.dumps([m for m in ('torch', 'transformers', 'peft', 'datasets') if m in sys.modules]))"
+        )
+        output = subprocess.check_output(
+            [sys.executable, "-c", code],
+            cwd=tmp_path,
+            env=dict(os.environ, PYTHONPATH=str(BACKEND_DIR)),
+        )
+
+        assert json.loads(output.decode().strip().splitlines()[-1]) == []
+
+    def test_lazy_module_imports_on_first_access(self):
+        """Test that a LazyModule imports its module only when used"""
+        module = LazyModule("json")
+        assert "not loaded" in repr(module)
+
+        assert module.dumps({"a": 1}) == '{"a": 1}'
+        assert "not loaded" not in repr(module)
+
+
+class TestWarmUp:
+    """Test the background warm-up of the ML stack"""
+
+    def test_warm_up_imports_modules_and_runs_hooks(self):
+        """Test that warm-up imports its modules, then runs its hooks"""
+        warm_up = WarmUp(modules=("json", "csv"))
+        calls = []
+        warm_up.on_ready(lambda: calls.append("hook"))
+        assert warm_up.status()["state"] == "pending"
+
+        warm_up.start()
+        assert warm_up.wait(timeout=10)
+
+        status = warm_up.status()
+        assert status["state"] == "ready"
+        assert set(status["modules"]) == {"json", "csv"}
+        assert calls == ["hook"]
+
+    def test_warm_up_failure_is_reported(self):
+        """Test that a failed import is reported instead of raised"""
+        warm_up = WarmUp(modules=("no_such_module_for_warm_up",))
+        warm_up.start()
+        assert warm_up.wait(timeout=10)
+
+        status = warm_up.status()
+        assert status["state"] == "failed"
+        assert "no_such_module_for_warm_up" in status["error"]
+
+
+class TestFrozenEntryPoint:
+    """Test worker processes spawned from the bundled server"""
+
+    def test_spawned_worker_runs_target_instead_of_server(self, tmp_path):
+        """Test that a worker spawned by re-running run_server.py runs its target and exits"""
+        executable = tmp_path / "backend-server"
+        launcher = tmp_path / "launcher.py"
+        launcher.write_text(FROZEN_LAUNCHER.format(
+            backend_dir=str(BACKEND_DIR),
+            executable=str(executable),
+            run_server=str(BACKEND_DIR / "run_server.py"),
+        ))
+        executable.write_text(f"#!/bin/sh\nexec {sys.executable} {launcher} \"$@\"\n")
+        executable.chmod(0o755)
+
+        marker = tmp_path / "worker.txt"
+        code = textwrap.dedent(f"""
+            import multiprocessing, sys
+            sys.frozen = True
+            sys.executable = {str(executable)!r}
+            from tests.test_startup import write_marker
+            process = multiprocessing.get_context("spawn").Process(target=write_marker, args=({str(marker)!r},))
+            process.start()
+            process.join(60)
+            sys.exit(process.exitcode)
+        """)
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            timeout=120,
+        )
+
+        assert result.returncode == 0, result.stderr
+        assert marker.read_text().isdigit()
@@ -0,0 +1,123 @@
+"""
+Tests for the training profiler
+"""
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+torch = pytest.importorskip("torch")
+peft = pytest.importorskip("peft")
+
+from app.main import app
+from app.api.routes import jobs as jobs_module
+from app.core.storage import save_json_file
+from app.core.trainer import QLoRATrainer, TrainingConfig
+from app.core.training_profiler import TrainingProfiler
+from tests.conftest import build_tiny_model
+
+client = TestClient(app)
+
+
+def train_profiled(tmp_path):
+    """Train the tiny model for a few steps with profiling enabled; returns the result and output dir"""
+    model_dir = build_tiny_model(tmp_path / "tiny-llama")
+
+    dataset_file = tmp_path / "train.json"
+    dataset_file.write_text(json.dumps([
+        {"instruction": f"w{i} w{i + 1}", "input": "", "output": f"w{i + 2}"} for i in range(8)
+    ]))
+
+    output_dir = tmp_path / "training_jobs" / "ft-001"
+    config = TrainingConfig(
+        model_name=str(model_dir),
+        dataset_path=str(dataset_file),
+        output_dir=str(output_dir),
+        num_epochs=1,
+        batch_size=2,
+        gradient_accumulation_steps=2,
+        warmup_steps=0,
+        max_seq_length=32,
+        save_steps=1000,
+        profile=True,
+        peak_tflops=1.0,
+    )
+    return QLoRATrainer(config, "ft-001").train(), output_dir
+
+
+@pytest.fixture
+def profiled_run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    succeeded, output_dir = train_profiled(tmp_path)
+    assert succeeded
+    yield output_dir
+
+
+class TestTrainingProfiler:
+    """Test phase and step timing"""
+
+    def test_disabled_profiler_records_nothing(self):
+        """Test that phases are no-ops when profiling is off"""
+        profiler = TrainingProfiler(enabled=False)
+        with profiler.phase("model_load"):
+            pass
+        assert profiler.phases == {}
+
+    def test_profile_report_covers_phases_and_steps(self, profiled_run):
+        """Test that a profiled run saves phase times, step splits and throughput"""
+        report = json.loads((profiled_run / "profile.json").read_text())
+
+        for phase in ("tokenizer_load", "model_load", "lora_injection", "dataset_load", "tokenization", "training", "save"):
+            assert phase in report["phases"]
+
+        # 8 examples / batch 2 / accumulation 2
+        assert report["steps"]["count"] == 2
+        assert len(report["steps"]["records"]) == 2
+        for part in ("data_loading", "forward", "backward", "optimizer"):
+            assert report["steps"]["total"][part] > 0
+
+        assert report["tokens"] > 0
+        assert report["padded_tokens"] >= report["tokens"]
+        assert report["tokens_per_second"] > 0
+        assert report["flops_per_token"] > 0
+        assert report["mfu"] > 0
+        assert report["bottleneck"] in report["breakdown"]
+
+    def test_failed_profile_save_keeps_training_result(self, tmp_path, monkeypatch):
+        """Test that an error saving the profile doesn't turn a finished run into a failed one"""
+        monkeypatch.chdir(tmp_path)
+
+        def fail(*args, **kwargs):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(TrainingProfiler, "save_report", fail)
+        succeeded, output_dir = train_profiled(tmp_path)
+
+        assert succeeded
+        assert (output_dir / "final_model").exists()
+        assert not (output_dir / "profile.json").exists()
+
+    def test_progress_reports_token_throughput(self, profiled_run):
+        """Test that training progress with tokens seen is written for /metrics"""
+        progress = json.loads((profiled_run / "progress.json").read_text())
+        assert progress["step"] == 2
+        assert progress["tokens_seen"] > 0
+
+
+class TestJobProfileEndpoint:
+    """Test GET /jobs/{job_id}/profile endpoint"""
+
+    def test_profile_endpoint(self, profiled_run, monkeypatch):
+        """Test serving a saved profile and jobs without one"""
+        jobs_dir = profiled_run.parent
+        monkeypatch.setattr(jobs_module, "JOBS_DIR", jobs_dir)
+        monkeypatch.setattr(jobs_module, "JOBS_META_FILE", jobs_dir / "jobs_meta.json")
+        save_json_file(jobs_dir / "jobs_meta.json", [{"id": "ft-001"}, {"id": "ft-002"}])
+
+        data = client.get("/api/jobs/ft-001/profile").json()
+        assert data["job_id"] == "ft-001"
+        assert data["steps"]["count"] == 2
+
+        assert client.get("/api/jobs/ft-002/profile").json()["status"] == "not_profiled"
+        assert client.get("/api/jobs/missing/profile").status_code == 404
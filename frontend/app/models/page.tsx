@@ -146,6 +146,9 @@ export default function ModelsPage() {
             fetchDownloadedModels();
             // 성공 알림 (선택사항)
             console.log(`✓ Model ${modelId} downloaded successfully`);
+          } else if (statusData.status === "cancelled") {
+            clearInterval(interval);
+            delete downloadIntervalsRef.current[modelId];
           } else if (statusData.status === "failed") {
             clearInterval(interval);
             delete downloadIntervalsRef.current[modelId];
@@ -342,6 +345,16 @@ export default function ModelsPage() {
                     <p className="text-neutral-500 mb-1 text-[10px]">SIZE</p>
                     <span className="font-medium text-xs">{model.size_mb.toFixed(2)} MB</span>
                   </div>
+                  {model.memory && (
+                    <div>
+                      <p className="text-neutral-500 mb-1 text-[10px]">TRAINING MEMORY (EST.)</p>
+                      <span className="font-medium text-xs">
+                        {(model.memory["4bit"].training_bytes / 1024 ** 3).toFixed(1)} GB 4-bit GPU
+                        {" / "}
+                        {(model.memory.fp32.training_bytes / 1024 ** 3).toFixed(1)} GB CPU
+                      </span>
+                    </div>
+                  )}
                   <div className="pt-2">
                     <Button
                       size="sm"
@@ -61,6 +61,10 @@ export default function Home() {
       });
 
       if (response.ok) {
+        const result = await response.json();
+        if (result.warning) {
+          alert(`Job started, but it may run out of memory: ${result.warning}`);
+        }
         await fetchJobs(); // Refresh the list
         // Navigate to job detail page to see progress
         window.location.href = `/jobs/${job.id}`;
@@ -26,10 +26,22 @@ export interface Model {
   size_gb?: number;
 }
 
+export interface MemoryEstimate {
+  weights_bytes: number;
+  inference_bytes: number;
+  training_bytes: number;
+}
+
 export interface DownloadedModel {
   model_id: string;
   local_path: string;
   size_mb: number;
+  num_parameters?: number | null;
+  memory?: {
+    fp32: MemoryEstimate;
+    fp16: MemoryEstimate;
+    "4bit": MemoryEstimate;
+  } | null;
 }
 
 export type DownloadStatusType = "idle" | "downloading" | "completed" | "failed";